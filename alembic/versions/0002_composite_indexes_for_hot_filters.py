@@ -0,0 +1,63 @@
+"""composite indexes for hot filters
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:37:10.022336
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Composite indexes lead with employee_id, making the single-column
+    # employee_id indexes redundant. MySQL needs an index on every FK column at
+    # all times, so each replacement is created before the old index is dropped.
+    with op.batch_alter_table('attendance_records', schema=None) as batch_op:
+        batch_op.create_index('ix_attendance_records_employee_date_clock_out', ['employee_id', 'date', 'clock_out'], unique=False)
+        batch_op.drop_index('ix_attendance_records_employee_id')
+
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_employees_manager_id'), ['manager_id'], unique=False)
+
+    with op.batch_alter_table('leave_balances', schema=None) as batch_op:
+        batch_op.create_index('ix_leave_balances_employee_type_year', ['employee_id', 'leave_type_id', 'year'], unique=False)
+        batch_op.drop_index('ix_leave_balances_employee_id')
+
+    with op.batch_alter_table('leave_requests', schema=None) as batch_op:
+        batch_op.create_index('ix_leave_requests_employee_status_created', ['employee_id', 'status', 'created_at'], unique=False)
+        batch_op.create_index('ix_leave_requests_pending', ['employee_id', 'created_at'], unique=False, sqlite_where=sa.text("status = 'PENDING'"), postgresql_where=sa.text("status = 'PENDING'"))
+        batch_op.drop_index('ix_leave_requests_employee_id')
+
+    with op.batch_alter_table('payslips', schema=None) as batch_op:
+        batch_op.create_index('ix_payslips_employee_created', ['employee_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('payslips', schema=None) as batch_op:
+        batch_op.drop_index('ix_payslips_employee_created')
+
+    with op.batch_alter_table('leave_requests', schema=None) as batch_op:
+        batch_op.create_index('ix_leave_requests_employee_id', ['employee_id'], unique=False)
+        batch_op.drop_index('ix_leave_requests_pending', sqlite_where=sa.text("status = 'PENDING'"), postgresql_where=sa.text("status = 'PENDING'"))
+        batch_op.drop_index('ix_leave_requests_employee_status_created')
+
+    with op.batch_alter_table('leave_balances', schema=None) as batch_op:
+        batch_op.create_index('ix_leave_balances_employee_id', ['employee_id'], unique=False)
+        batch_op.drop_index('ix_leave_balances_employee_type_year')
+
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_employees_manager_id'))
+
+    with op.batch_alter_table('attendance_records', schema=None) as batch_op:
+        batch_op.create_index('ix_attendance_records_employee_id', ['employee_id'], unique=False)
+        batch_op.drop_index('ix_attendance_records_employee_date_clock_out')
@@ -0,0 +1,92 @@
+"""attendance daily rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 02:14:52.418873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = """
+    SUM(CASE WHEN {status} = 'PRESENT' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN {status} = 'LATE' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN {status} = 'ABSENT' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN {status} = 'HALF_DAY' THEN 1 ELSE 0 END),
+"""
+
+
+def upgrade() -> None:
+    op.create_table('attendance_daily_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('present_count', sa.Integer(), nullable=False),
+    sa.Column('late_count', sa.Integer(), nullable=False),
+    sa.Column('absent_count', sa.Integer(), nullable=False),
+    sa.Column('half_day_count', sa.Integer(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.Column('hours_worked', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('employee_id', 'day', name='uq_attendance_daily_rollup')
+    )
+    with op.batch_alter_table('attendance_daily_rollups', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_attendance_daily_rollups_day'), ['day'], unique=False)
+        batch_op.create_index(batch_op.f('ix_attendance_daily_rollups_id'), ['id'], unique=False)
+
+    op.create_table('department_daily_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('present_count', sa.Integer(), nullable=False),
+    sa.Column('late_count', sa.Integer(), nullable=False),
+    sa.Column('absent_count', sa.Integer(), nullable=False),
+    sa.Column('half_day_count', sa.Integer(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.Column('hours_worked', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'department_id', name='uq_department_daily_rollup')
+    )
+    with op.batch_alter_table('department_daily_rollups', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_department_daily_rollups_id'), ['id'], unique=False)
+
+    # Backfill from existing attendance records
+    op.execute(
+        "INSERT INTO attendance_daily_rollups (employee_id, day, department_id, present_count, "
+        "late_count, absent_count, half_day_count, record_count, hours_worked) "
+        "SELECT r.employee_id, r.date, COALESCE(e.department_id, 0), "
+        + COUNTERS.format(status="r.status") +
+        "COUNT(*), COALESCE(SUM(r.hours_worked), 0) "
+        "FROM attendance_records r JOIN employees e ON e.id = r.employee_id "
+        "GROUP BY r.employee_id, r.date, COALESCE(e.department_id, 0)"
+    )
+    op.execute(
+        "INSERT INTO department_daily_rollups (day, department_id, present_count, late_count, "
+        "absent_count, half_day_count, record_count, hours_worked) "
+        "SELECT day, department_id, SUM(present_count), SUM(late_count), SUM(absent_count), "
+        "SUM(half_day_count), SUM(record_count), SUM(hours_worked) "
+        "FROM attendance_daily_rollups GROUP BY day, department_id"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('department_daily_rollups', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_department_daily_rollups_id'))
+
+    op.drop_table('department_daily_rollups')
+    with op.batch_alter_table('attendance_daily_rollups', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_attendance_daily_rollups_id'))
+        batch_op.drop_index(batch_op.f('ix_attendance_daily_rollups_day'))
+
+    op.drop_table('attendance_daily_rollups')
@@ -0,0 +1,41 @@
+"""holidays
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 03:41:08.265913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('holidays',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('holiday_date', sa.Date(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('holiday_date', 'location', name='uq_holiday_date_location')
+    )
+    with op.batch_alter_table('holidays', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_holidays_holiday_date'), ['holiday_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_holidays_id'), ['id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('holidays', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_holidays_id'))
+        batch_op.drop_index(batch_op.f('ix_holidays_holiday_date'))
+
+    op.drop_table('holidays')
@@ -0,0 +1,120 @@
+"""leave ledger
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 04:27:33.914406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+balances = sa.table(
+    'leave_balances',
+    sa.column('id', sa.Integer), sa.column('employee_id', sa.Integer),
+    sa.column('leave_type_id', sa.Integer), sa.column('year', sa.Integer),
+    sa.column('total_days', sa.Float), sa.column('used_days', sa.Float),
+    sa.column('available_days', sa.Float),
+)
+ledger = sa.table(
+    'leave_ledger_entries',
+    sa.column('employee_id', sa.Integer), sa.column('leave_type_id', sa.Integer),
+    sa.column('year', sa.Integer), sa.column('entry_type', sa.String),
+    sa.column('days', sa.Float), sa.column('idempotency_key', sa.String),
+)
+
+
+def upgrade() -> None:
+    op.create_table('leave_ledger_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('leave_type_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('entry_type', sa.Enum('ACCRUAL', 'DEBIT', 'CREDIT', name='leaveledgerentrytype'), nullable=False),
+    sa.Column('days', sa.Float(), nullable=False),
+    sa.Column('leave_request_id', sa.Integer(), nullable=True),
+    sa.Column('idempotency_key', sa.String(length=100), nullable=False),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], ),
+    sa.ForeignKeyConstraint(['leave_request_id'], ['leave_requests.id'], ),
+    sa.ForeignKeyConstraint(['leave_type_id'], ['leave_types.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    with op.batch_alter_table('leave_ledger_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_leave_ledger_entries_balance', ['employee_id', 'leave_type_id', 'year'], unique=False)
+        batch_op.create_index(batch_op.f('ix_leave_ledger_entries_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_leave_ledger_entries_leave_request_id'), ['leave_request_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_leave_ledger_entries_leave_type_id'), ['leave_type_id'], unique=False)
+
+    # Merge duplicate balance rows so (employee, leave type, year) can be unique
+    connection = op.get_bind()
+    duplicates = connection.execute(
+        sa.select(balances.c.employee_id, balances.c.leave_type_id, balances.c.year)
+        .group_by(balances.c.employee_id, balances.c.leave_type_id, balances.c.year)
+        .having(sa.func.count() > 1)
+    ).all()
+    for employee_id, leave_type_id, year in duplicates:
+        rows = connection.execute(
+            sa.select(balances.c.id, balances.c.total_days, balances.c.used_days)
+            .where(balances.c.employee_id == employee_id, balances.c.leave_type_id == leave_type_id,
+                   balances.c.year == year)
+            .order_by(balances.c.id)
+        ).all()
+        total = sum(row.total_days or 0 for row in rows)
+        used = sum(row.used_days or 0 for row in rows)
+        connection.execute(
+            balances.update().where(balances.c.id == rows[0].id)
+            .values(total_days=total, used_days=used, available_days=total - used)
+        )
+        connection.execute(balances.delete().where(balances.c.id.in_([row.id for row in rows[1:]])))
+
+    # The unique constraint leads with employee_id and replaces its index
+    with op.batch_alter_table('leave_balances', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_leave_balance_employee_type_year', ['employee_id', 'leave_type_id', 'year'])
+        batch_op.drop_index('ix_leave_balances_employee_type_year')
+
+    # Opening ledger entries for the existing balances
+    for entry_type, column in (('ACCRUAL', balances.c.total_days), ('DEBIT', balances.c.used_days)):
+        rows = connection.execute(
+            sa.select(balances.c.id, balances.c.employee_id, balances.c.leave_type_id, balances.c.year, column)
+            .where(column != 0)
+        ).all()
+        if rows:
+            connection.execute(ledger.insert(), [
+                {"employee_id": employee_id, "leave_type_id": leave_type_id, "year": year,
+                 "entry_type": entry_type, "days": days,
+                 "idempotency_key": f"opening:{balance_id}:{entry_type.lower()}"}
+                for balance_id, employee_id, leave_type_id, year, days in rows
+            ])
+    connection.execute(
+        balances.update().values(
+            total_days=sa.func.coalesce(balances.c.total_days, 0),
+            used_days=sa.func.coalesce(balances.c.used_days, 0),
+            available_days=sa.func.coalesce(balances.c.total_days, 0) - sa.func.coalesce(balances.c.used_days, 0)
+        )
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('leave_balances', schema=None) as batch_op:
+        batch_op.create_index('ix_leave_balances_employee_type_year', ['employee_id', 'leave_type_id', 'year'], unique=False)
+        batch_op.drop_constraint('uq_leave_balance_employee_type_year', type_='unique')
+
+    with op.batch_alter_table('leave_ledger_entries', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_leave_ledger_entries_leave_type_id'))
+        batch_op.drop_index(batch_op.f('ix_leave_ledger_entries_leave_request_id'))
+        batch_op.drop_index(batch_op.f('ix_leave_ledger_entries_id'))
+        batch_op.drop_index('ix_leave_ledger_entries_balance')
+
+    op.drop_table('leave_ledger_entries')
@@ -0,0 +1,68 @@
+"""calendar sync outbox
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 05:12:40.508211
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('calendar_sync_dead_letters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('leave_request_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('failed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['leave_request_id'], ['leave_requests.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('calendar_sync_dead_letters', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_calendar_sync_dead_letters_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_calendar_sync_dead_letters_leave_request_id'), ['leave_request_id'], unique=False)
+
+    op.create_table('calendar_sync_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('leave_request_id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], ),
+    sa.ForeignKeyConstraint(['leave_request_id'], ['leave_requests.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('calendar_sync_events', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_calendar_sync_events_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_calendar_sync_events_leave_request_id'), ['leave_request_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_calendar_sync_events_next_attempt_at'), ['next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('calendar_sync_events', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_events_next_attempt_at'))
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_events_leave_request_id'))
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_events_id'))
+
+    op.drop_table('calendar_sync_events')
+    with op.batch_alter_table('calendar_sync_dead_letters', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_dead_letters_leave_request_id'))
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_dead_letters_id'))
+
+    op.drop_table('calendar_sync_dead_letters')
@@ -0,0 +1,41 @@
+"""leave accrual runs
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 06:02:18.740935
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('leave_accrual_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=7), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('last_employee_id', sa.Integer(), nullable=False),
+    sa.Column('entries_posted', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('period')
+    )
+    with op.batch_alter_table('leave_accrual_runs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_leave_accrual_runs_id'), ['id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('leave_accrual_runs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_leave_accrual_runs_id'))
+
+    op.drop_table('leave_accrual_runs')
@@ -0,0 +1,49 @@
+"""attendance reminders
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 06:48:51.126774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('attendance_reminders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('reminder_date', sa.Date(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('employee_id', 'reminder_date', name='uq_attendance_reminder_employee_date')
+    )
+    with op.batch_alter_table('attendance_reminders', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_attendance_reminders_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_attendance_reminders_reminder_date'), ['reminder_date'], unique=False)
+
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shift_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_employees_shift_id_shifts', 'shifts', ['shift_id'], ['id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_employees_shift_id_shifts', type_='foreignkey')
+        batch_op.drop_column('shift_id')
+
+    with op.batch_alter_table('attendance_reminders', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_attendance_reminders_reminder_date'))
+        batch_op.drop_index(batch_op.f('ix_attendance_reminders_id'))
+
+    op.drop_table('attendance_reminders')
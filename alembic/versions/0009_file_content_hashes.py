@@ -0,0 +1,37 @@
+"""file content hashes
+
+Existing files keep a NULL hash and are served with a weak ETag until they
+are stored again.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 09:12:37.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('employee_documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_sha256', sa.String(length=64), nullable=True))
+
+    with op.batch_alter_table('payslips', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('payslips', schema=None) as batch_op:
+        batch_op.drop_column('content_sha256')
+
+    with op.batch_alter_table('employee_documents', schema=None) as batch_op:
+        batch_op.drop_column('content_sha256')
@@ -0,0 +1,51 @@
+"""document blob store
+
+Documents stored before this revision stay where they are until
+``python dedupe_documents.py`` moves them into the store.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 11:26:04.582913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('document_blobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('unreferenced_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sha256')
+    )
+    with op.batch_alter_table('document_blobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_document_blobs_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_document_blobs_unreferenced_at'), ['unreferenced_at'], unique=False)
+
+    with op.batch_alter_table('employee_documents', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_employee_documents_content_sha256'), ['content_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('employee_documents', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_employee_documents_content_sha256'))
+
+    with op.batch_alter_table('document_blobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_document_blobs_unreferenced_at'))
+        batch_op.drop_index(batch_op.f('ix_document_blobs_id'))
+
+    op.drop_table('document_blobs')
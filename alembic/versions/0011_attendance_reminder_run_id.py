@@ -0,0 +1,28 @@
+"""attendance reminder run id
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 02:20:10.424905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('attendance_reminders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('run_id', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('attendance_reminders', schema=None) as batch_op:
+        batch_op.drop_column('run_id')
@@ -0,0 +1,182 @@
+"""File downloads: conditional requests, byte ranges and zero-copy sends
+
+``serve_file`` opens and stats the file off the event loop, once, and answers
+from that open descriptor:
+- If-None-Match / If-Modified-Since that still match get a 304;
+- a single Range (guarded by If-Range) gets a 206;
+- anything else gets the whole file.
+
+The ETag is strong when the stored content hash is known. Otherwise it is a
+weak one made from size and mtime.
+
+How the bytes are sent depends on ``FILE_SERVING_MODE``:
+- ``direct``: the response goes through the ASGI server's
+  ``http.response.zerocopysend`` extension when the server offers it, which
+  makes the server ``os.sendfile`` the file into the socket. Otherwise the
+  file is ``os.pread`` in ``FILE_CHUNK_SIZE`` chunks on a worker thread.
+- ``x-accel``: the response carries no body, only an ``X-Accel-Redirect``
+  to ``FILE_ACCEL_REDIRECT_PREFIX`` plus the path below ``UPLOAD_DIR``.
+  nginx then sends the file itself with sendfile and handles ranges.
+  Conditional requests are still answered here, before nginx opens the
+  file.
+"""
+import asyncio
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.api.ranges import parse_range
+from app.config import get_settings
+
+settings = get_settings()
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+
+def _open(path: str) -> Optional[Tuple[int, os.stat_result]]:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    return fd, os.fstat(fd)
+
+
+def _etag(content_sha256: Optional[str], stat: os.stat_result) -> str:
+    if content_sha256:
+        return f'"{content_sha256}"'
+    return f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _not_modified(request: Request, etag: str, stat: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison (RFC 9110 13.1.2)
+        candidates = {_opaque(tag.strip()) for tag in if_none_match.split(",")}
+        return "*" in candidates or _opaque(etag) in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat.st_mtime) <= since
+    return False
+
+
+def _range_applies(request: Request, etag: str, last_modified: str) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    # Strong comparison: a weak ETag never validates a range
+    return (if_range == etag and not etag.startswith("W/")) or if_range == last_modified
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def _accel_path(path: str) -> Optional[str]:
+    root = os.path.realpath(settings.UPLOAD_DIR)
+    target = os.path.realpath(path)
+    if os.path.commonpath([root, target]) != root:
+        return None
+    return settings.FILE_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(os.path.relpath(target, root))
+
+
+class FileSendResponse(Response):
+    """Bytes ``start`` <= offset < ``end`` of an open file descriptor; closes it when done"""
+
+    def __init__(self, fd: int, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.headers["content-length"] = str(end - start)
+        self.fd = fd
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"] == "HEAD" or self.start == self.end:
+                await send({"type": "http.response.body", "body": b""})
+            elif ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+                with os.fdopen(os.dup(self.fd), "rb") as file:
+                    await send({
+                        "type": ZERO_COPY_EXTENSION, "file": file,
+                        "offset": self.start, "count": self.end - self.start
+                    })
+            else:
+                position = self.start
+                while position < self.end:
+                    length = min(settings.FILE_CHUNK_SIZE, self.end - position)
+                    chunk = await asyncio.to_thread(os.pread, self.fd, length, position)
+                    if not chunk:
+                        raise OSError("File truncated while being sent")
+                    position += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": position < self.end})
+        finally:
+            os.close(self.fd)
+        if self.background is not None:
+            await self.background()
+
+
+async def serve_file(
+    request: Request,
+    path: str,
+    filename: str,
+    content_sha256: Optional[str] = None,
+    media_type: Optional[str] = None
+) -> Response:
+    """Respond with the file at ``path`` (404 if it is missing), honouring validators and ranges"""
+    opened = await asyncio.to_thread(_open, path)
+    if opened is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found on server"
+        )
+    fd, stat = opened
+    try:
+        etag = _etag(content_sha256, stat)
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": last_modified,
+            "Cache-Control": "private, no-cache",
+            "Accept-Ranges": "bytes"
+        }
+        if _not_modified(request, etag, stat):
+            os.close(fd)
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        media_type = media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        headers["Content-Disposition"] = content_disposition(filename)
+        if settings.FILE_SERVING_MODE == "x-accel":
+            accel_path = _accel_path(path)
+            if accel_path is not None:
+                os.close(fd)
+                return Response(headers={**headers, "X-Accel-Redirect": accel_path}, media_type=media_type)
+
+        requested = None
+        if _range_applies(request, etag, last_modified):
+            requested = parse_range(request.headers.get("range"), stat.st_size)
+    except BaseException:
+        os.close(fd)
+        raise
+
+    if requested is None:
+        return FileSendResponse(fd, 0, stat.st_size, status.HTTP_200_OK, headers, media_type)
+    start, end = requested
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{stat.st_size}"
+    return FileSendResponse(fd, start, end, status.HTTP_206_PARTIAL_CONTENT, headers, media_type)
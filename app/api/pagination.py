@@ -0,0 +1,101 @@
+"""Keyset (cursor) pagination for list endpoints
+
+List endpoints keep their ``skip``/``limit`` parameters and additionally
+accept an opaque ``cursor``. When a page is full, the response carries an
+``X-Next-Cursor`` header; passing it back as ``cursor`` continues right after
+the last row via an indexed range condition instead of OFFSET, so deep pages
+cost the same as the first one.
+
+A cursor encodes the sort key of the last row, e.g. ``(created_at, id)``; the
+trailing primary key makes the ordering total.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select, and_, literal, or_, String
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return ["dt", value.isoformat()]
+    if isinstance(value, date):
+        return ["d", value.isoformat()]
+    return ["v", value]
+
+
+def _load(item):
+    kind, value = item
+    if kind == "dt":
+        return datetime.fromisoformat(value)
+    if kind == "d":
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([_dump(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_load(item) for item in json.loads(raw)]
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        values = None
+    if values is None or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    return values
+
+
+def _bind(db: AsyncSession, value):
+    # SQLite keeps server_default timestamps as "YYYY-MM-DD HH:MM:SS" text while
+    # SQLAlchemy binds datetimes with microseconds; compare in the stored form
+    if (
+        isinstance(value, datetime) and not value.microsecond
+        and db.bind is not None and db.bind.dialect.name == "sqlite"
+    ):
+        return literal(value.strftime("%Y-%m-%d %H:%M:%S"), String)
+    return value
+
+
+def paginate(
+    db: AsyncSession,
+    query: Select,
+    keys: Sequence,
+    cursor: Optional[str],
+    skip: int,
+    limit: int,
+    descending: bool = True
+) -> Select:
+    """Order ``query`` by ``keys`` and apply the cursor, or fall back to skip/limit"""
+    query = query.order_by(*(key.desc() if descending else key.asc() for key in keys))
+    if not cursor:
+        return query.offset(skip).limit(limit)
+
+    values = [_bind(db, value) for value in decode_cursor(cursor, len(keys))]
+    # (k1, k2, ...) after (v1, v2, ...) in sort order, spelled out so every
+    # backend can turn it into an index range scan
+    conditions = []
+    for position, key in enumerate(keys):
+        ties = [keys[i] == values[i] for i in range(position)]
+        beyond = key < values[position] if descending else key > values[position]
+        conditions.append(and_(*ties, beyond))
+    return query.where(or_(*conditions)).limit(limit)
+
+
+def set_next_cursor(response: Response, keys: Sequence, items: Sequence, limit: int):
+    """Expose the cursor for the next page when this page came back full"""
+    if items and len(items) >= limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, key.key) for key in keys])
@@ -0,0 +1,73 @@
+"""HTTP byte ranges for downloads
+
+``ranged_response`` serves a body of known size and strong ETag whole (200)
+or as the single byte range the client asked for (206). A stale ``If-Range``
+validator or a multi-range request gets the whole body, which RFC 9110
+allows. A range that starts past the end is answered 416.
+"""
+import re
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) with ``end`` exclusive, or None to send the whole body"""
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise _unsatisfiable(size)
+        return max(size - length, 0), size
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise _unsatisfiable(size)
+    return start, end
+
+
+def _unsatisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"}
+    )
+
+
+def ranged_response(
+    request: Request,
+    size: int,
+    etag: str,
+    iter_range: Callable[[int, int], Iterator[bytes]],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """Stream ``iter_range(start, end)`` for the requested range of a ``size``-byte body"""
+    headers = {**(headers or {}), "Accept-Ranges": "bytes", "ETag": etag}
+    requested = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        requested = parse_range(request.headers.get("range"), size)
+
+    if requested is None:
+        start, end = 0, size
+        status_code = status.HTTP_200_OK
+    else:
+        start, end = requested
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        iter_range(start, end), status_code=status_code, media_type=media_type, headers=headers
+    )
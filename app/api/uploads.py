@@ -0,0 +1,205 @@
+"""Streaming multipart uploads into the storage directory
+
+``receive_upload`` reads the request body itself instead of letting the
+framework spool the whole form first. Each chunk off the socket goes through
+the multipart parser, and file bytes are:
+- counted, so the upload is rejected the moment it passes ``max_size``
+  (or up front, from a Content-Length that cannot fit);
+- hashed with SHA-256 and written to a temporary file in ``directory``, by
+  a worker thread, ``WRITE_BUFFER_SIZE`` at a time.
+
+On success the caller gets the closed temporary file with its size and hash,
+and decides where it goes: the digest is only known once the last byte is in,
+so a content-addressed store can keep or drop the file without reading it a
+second time. On any failure the temporary file is removed.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import FormParserError
+from multipart.multipart import parse_options_header
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+MAX_FIELD_SIZE = 64 * 1024
+# Room for the multipart framing and text fields around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+@dataclass
+class ReceivedUpload:
+    """A file received by ``receive_upload`` and the form fields sent with it
+
+    ``path`` is a temporary file that the caller moves into place or removes.
+    """
+    filename: str
+    path: str
+    size: int
+    sha256: str
+    fields: Dict[str, str] = field(default_factory=dict)
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _create_partial(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    return tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+
+
+def _write(fd: int, digest, data: bytes):
+    digest.update(data)
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _discard(fd: int, partial: str):
+    os.close(fd)
+    try:
+        os.remove(partial)
+    except FileNotFoundError:
+        pass
+
+
+class _Parts:
+    """python-multipart callbacks: collects text fields and the file part's bytes"""
+
+    def __init__(self, file_field: str, check_filename: Callable[[str], None]):
+        self.file_field = file_field
+        self.check_filename = check_filename
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.file_data: List[bytes] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._name: Optional[str] = None
+        self._in_file = False
+        self._value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._name = None
+        self._in_file = False
+        self._value = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise _bad_request("Multipart part without a field name")
+        self._name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" in options:
+            if self._name != self.file_field or self.filename is not None:
+                raise _bad_request(f"Expected exactly one file, in the {self.file_field!r} field")
+            filename = options[b"filename"].decode("utf-8", errors="replace")
+            # Clients may send a full path; keep the last component only
+            self.filename = os.path.basename(filename.replace("\\", "/"))
+            self.check_filename(self.filename)
+            self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.file_data.append(data[start:end])
+            return
+        self._value += data[start:end]
+        if len(self._value) > MAX_FIELD_SIZE:
+            raise _bad_request(f"Form field {self._name!r} is too large")
+
+    def on_part_end(self):
+        if not self._in_file:
+            self.fields[self._name] = self._value.decode("utf-8", errors="replace")
+
+
+async def receive_upload(
+    request: Request,
+    file_field: str,
+    directory: str,
+    max_size: int,
+    check_filename: Callable[[str], None]
+) -> ReceivedUpload:
+    """Stream the request's multipart body, receiving its one file into ``directory``
+
+    ``check_filename`` runs as soon as the file part's headers arrive and may
+    raise to reject the upload before any of its data is read.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise _bad_request("Expected a multipart/form-data body")
+    too_large = _bad_request(f"File too large. Maximum size: {max_size} bytes")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        raise too_large
+
+    parts = _Parts(file_field, check_filename)
+    parser = multipart.MultipartParser(params[b"boundary"], parts.callbacks())
+    digest = hashlib.sha256()
+    size = 0
+    buffer: List[bytes] = []
+    buffered = 0
+    fd = partial = None
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except FormParserError:
+                raise _bad_request("Malformed multipart body")
+            if not parts.file_data:
+                continue
+            data = b"".join(parts.file_data)
+            parts.file_data.clear()
+            size += len(data)
+            if size > max_size:
+                raise too_large
+            buffer.append(data)
+            buffered += len(data)
+            if buffered >= WRITE_BUFFER_SIZE:
+                if fd is None:
+                    fd, partial = await asyncio.to_thread(_create_partial, directory)
+                await asyncio.to_thread(_write, fd, digest, b"".join(buffer))
+                buffer, buffered = [], 0
+        try:
+            parser.finalize()
+        except FormParserError:
+            raise _bad_request("Malformed multipart body")
+
+        if parts.filename is None:
+            raise _bad_request(f"No file in the {file_field!r} field")
+        if fd is None:
+            fd, partial = await asyncio.to_thread(_create_partial, directory)
+        if buffer:
+            await asyncio.to_thread(_write, fd, digest, b"".join(buffer))
+        closing, fd = fd, None
+        await asyncio.to_thread(os.close, closing)
+    finally:
+        if fd is not None:
+            await asyncio.to_thread(_discard, fd, partial)
+    return ReceivedUpload(parts.filename, partial, size, digest.hexdigest(), parts.fields)
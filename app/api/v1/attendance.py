@@ -1,33 +1,111 @@
 """Attendance Management API endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response, status
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, date as date_type, timedelta
 
 from app.database import get_db
 from app.schemas import (
     AttendanceClockIn, AttendanceClockOut, AttendanceRecordResponse,
-    AttendanceAdjustment, ShiftResponse
+    AttendanceAdjustment, ShiftResponse, AttendancePunchBatch, AttendancePunchBatchResponse
 )
 from app.models import (
-    AttendanceRecord, Shift, Employee, User, RoleType, AttendanceStatus
+    AttendanceRecord, Shift, RoleType, AttendanceStatus
 )
 from app.auth.dependencies import get_current_user, require_hr_admin
+from app.auth.principal_cache import Principal
+from app.api.pagination import paginate, set_next_cursor
+from app.services.org_tree import manages, team_ids
+from app.services.punches import (
+    ACCEPTED, CLOCK_IN, CLOCK_OUT, DUPLICATE, REJECTED, Punch, apply_punches, hours_between
+)
+from app.services.punch_buffer import PunchRejected, punch_buffer
+from app.services.shift_schedule import ShiftSchedule, shift_schedule
+from app.tasks import reclassify_attendance
+from app.config import get_settings
 
+settings = get_settings()
 router = APIRouter()
 
 
+def verify_kiosk_key(x_api_key: str = Header(...)):
+    """Verify the shared API key of badge terminals and kiosks"""
+    if x_api_key != settings.KIOSK_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key"
+        )
+    return True
+
+
+def _pending_record(
+    punch: dict, schedule: ShiftSchedule, clock_in: Optional[datetime] = None
+) -> AttendanceRecordResponse:
+    """Response for a punch that is still in the write-behind buffer"""
+    timestamp = datetime.fromisoformat(punch["timestamp"])
+    if punch["action"] == CLOCK_IN:
+        clock_in, clock_out = timestamp, None
+    else:
+        clock_out = timestamp
+    shift_id, attendance_status = (
+        schedule.classify_clock_in(clock_in) if clock_in else (None, AttendanceStatus.PRESENT)
+    )
+    hours_worked = hours_between(clock_in, clock_out) if clock_in and clock_out else 0
+    if clock_out:
+        attendance_status = schedule.classify_clock_out(shift_id, attendance_status, hours_worked)
+    return AttendanceRecordResponse(
+        employee_id=punch["employee_id"],
+        shift_id=shift_id,
+        date=timestamp.date(),
+        clock_in=clock_in,
+        clock_out=clock_out,
+        status=attendance_status,
+        hours_worked=hours_worked,
+        geo_location=punch.get("geo_location"),
+        is_reviewed=False,
+        created_at=timestamp,
+        pending=True
+    )
+
+
+def _merge_pending(records, punches: List[dict], schedule: ShiftSchedule) -> List[AttendanceRecordResponse]:
+    """Overlay buffered punches on stored records (newest first)"""
+    items = [AttendanceRecordResponse.model_validate(record) for record in records]
+    for punch in punches:
+        timestamp = datetime.fromisoformat(punch["timestamp"])
+        if punch["action"] == CLOCK_IN:
+            # Already flushed but not yet dropped from the buffer
+            if not any(item.clock_in == timestamp for item in items):
+                items.insert(0, _pending_record(punch, schedule))
+            continue
+        if any(item.clock_out == timestamp for item in items):
+            continue
+        open_item = next(
+            (item for item in items if item.clock_out is None and item.date == timestamp.date()), None
+        )
+        if open_item is not None:
+            open_item.clock_out = timestamp
+            if open_item.clock_in:
+                open_item.hours_worked = hours_between(open_item.clock_in, timestamp)
+            open_item.status = schedule.classify_clock_out(
+                open_item.shift_id, open_item.status, open_item.hours_worked
+            )
+            open_item.pending = True
+    return items
+
+
 @router.post("/clock-in", response_model=AttendanceRecordResponse)
 async def clock_in(
     clock_in_data: AttendanceClockIn,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Record employee clock-in
     
     - Employees can only clock in for themselves
+    - The nearest shift is assigned; clock-ins past its grace period are LATE
     """
     # Verify employee
     if not current_user.employee_id:
@@ -43,16 +121,29 @@ async def clock_in(
             detail="Cannot clock in for another employee"
         )
     
+    # Write-behind: buffer the punch and acknowledge immediately
+    if settings.ATTENDANCE_WRITE_BEHIND:
+        try:
+            punch, _ = await punch_buffer.append(
+                db, clock_in_data.employee_id, CLOCK_IN, clock_in_data.geo_location
+            )
+        except PunchRejected as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=e.detail
+            )
+        return _pending_record(punch, await shift_schedule.get(db))
+    
     today = date_type.today()
     
     # Check if already clocked in today
-    existing_record = db.query(AttendanceRecord).filter(
+    existing_record = await db.scalar(select(AttendanceRecord).where(
         and_(
             AttendanceRecord.employee_id == clock_in_data.employee_id,
             AttendanceRecord.date == today,
             AttendanceRecord.clock_out == None
         )
-    ).first()
+    ))
     
     if existing_record:
         raise HTTPException(
@@ -61,17 +152,21 @@ async def clock_in(
         )
     
     # Create attendance record
+    now = datetime.now()
+    schedule = await shift_schedule.get(db)
+    shift_id, attendance_status = schedule.classify_clock_in(now)
     attendance_record = AttendanceRecord(
         employee_id=clock_in_data.employee_id,
+        shift_id=shift_id,
         date=today,
-        clock_in=datetime.now(),
-        status=AttendanceStatus.PRESENT,
+        clock_in=now,
+        status=attendance_status,
         geo_location=clock_in_data.geo_location
     )
     
     db.add(attendance_record)
-    db.commit()
-    db.refresh(attendance_record)
+    await db.commit()
+    await db.refresh(attendance_record)
     
     return attendance_record
 
@@ -79,13 +174,14 @@ async def clock_in(
 @router.post("/clock-out", response_model=AttendanceRecordResponse)
 async def clock_out(
     clock_out_data: AttendanceClockOut,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Record employee clock-out
     
     - Employees can only clock out for themselves
+    - Records covering less than SHIFT_HALF_DAY_RATIO of their shift are HALF_DAY
     """
     # Verify employee
     if not current_user.employee_id:
@@ -101,16 +197,27 @@ async def clock_out(
             detail="Cannot clock out for another employee"
         )
     
+    # Write-behind: buffer the punch and acknowledge immediately
+    if settings.ATTENDANCE_WRITE_BEHIND:
+        try:
+            punch, clock_in = await punch_buffer.append(db, clock_out_data.employee_id, CLOCK_OUT)
+        except PunchRejected as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=e.detail
+            )
+        return _pending_record(punch, await shift_schedule.get(db), clock_in)
+    
     today = date_type.today()
     
     # Find today's clock-in record
-    attendance_record = db.query(AttendanceRecord).filter(
+    attendance_record = await db.scalar(select(AttendanceRecord).where(
         and_(
             AttendanceRecord.employee_id == clock_out_data.employee_id,
             AttendanceRecord.date == today,
             AttendanceRecord.clock_out == None
         )
-    ).first()
+    ))
     
     if not attendance_record:
         raise HTTPException(
@@ -128,21 +235,65 @@ async def clock_out(
         hours_worked = time_diff.total_seconds() / 3600
         attendance_record.hours_worked = round(hours_worked, 2)
     
-    db.commit()
-    db.refresh(attendance_record)
+    schedule = await shift_schedule.get(db)
+    attendance_record.status = schedule.classify_clock_out(
+        attendance_record.shift_id, attendance_record.status, attendance_record.hours_worked
+    )
+    
+    await db.commit()
+    await db.refresh(attendance_record)
     
     return attendance_record
 
 
+@router.post("/punches", response_model=AttendancePunchBatchResponse)
+async def ingest_punches(
+    batch: AttendancePunchBatch,
+    verified: bool = Depends(verify_kiosk_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Ingest a batch of clock-in/clock-out punches from a terminal
+    
+    - Secured via API Key (X-API-Key header)
+    - Punches are applied in timestamp order per employee with the same rules
+      as clock-in/clock-out; replays of stored punches are reported as duplicates
+    - Returns one result per punch, in input order
+    """
+    if len(batch.punches) > settings.ATTENDANCE_PUNCH_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.ATTENDANCE_PUNCH_BATCH_MAX} punches per batch"
+        )
+    
+    punches = [
+        Punch(p.employee_id, p.action, p.timestamp, p.geo_location) for p in batch.punches
+    ]
+    results = await db.run_sync(apply_punches, punches)
+    await db.commit()
+    
+    # Serialize once here; the generic response path re-validates every
+    # result and costs more than applying the batch
+    body = AttendancePunchBatchResponse(
+        accepted=sum(r.status == ACCEPTED for r in results),
+        duplicates=sum(r.status == DUPLICATE for r in results),
+        rejected=sum(r.status == REJECTED for r in results),
+        results=results
+    )
+    return Response(content=body.model_dump_json(), media_type="application/json")
+
+
 @router.get("/records/{employee_id}", response_model=List[AttendanceRecordResponse])
 async def get_attendance_records(
+    response: Response,
     employee_id: int,
     start_date: Optional[date_type] = None,
     end_date: Optional[date_type] = None,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get employee attendance records for a period
@@ -155,8 +306,7 @@ async def get_attendance_records(
     if current_user.role not in [RoleType.HR_ADMIN, RoleType.EXECUTIVE]:
         if current_user.employee_id != employee_id:
             # Check if user is the employee's manager
-            employee = db.query(Employee).filter(Employee.id == employee_id).first()
-            if not employee or employee.manager_id != current_user.employee_id:
+            if not await manages(db, current_user, employee_id):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="Not authorized to view these records"
@@ -168,33 +318,70 @@ async def get_attendance_records(
     if not end_date:
         end_date = date_type.today()
     
-    records = db.query(AttendanceRecord).filter(
+    query = select(AttendanceRecord).where(
         and_(
             AttendanceRecord.employee_id == employee_id,
             AttendanceRecord.date >= start_date,
             AttendanceRecord.date <= end_date
         )
-    ).order_by(AttendanceRecord.date.desc()).offset(skip).limit(limit).all()
+    )
+    keys = (AttendanceRecord.date, AttendanceRecord.id)
+    records = (await db.scalars(paginate(db, query, keys, cursor, skip, limit))).all()
+    set_next_cursor(response, keys, records, limit)
+    
+    # Unflushed write-behind punches belong on the first page
+    if settings.ATTENDANCE_WRITE_BEHIND and not cursor and not skip:
+        punches = [
+            punch for punch in await punch_buffer.pending_for(employee_id)
+            if start_date.isoformat() <= punch["timestamp"][:10] <= end_date.isoformat()
+        ]
+        if punches:
+            return _merge_pending(records, punches, await shift_schedule.get(db))
     
     return records
 
 
 @router.get("/shifts", response_model=List[ShiftResponse])
 async def list_shifts(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """List all defined shifts"""
-    shifts = db.query(Shift).filter(Shift.is_active == True).all()
+    shifts = (await db.scalars(select(Shift).where(Shift.is_active == True))).all()
     return shifts
 
 
+@router.post("/shifts/reclassify", status_code=status.HTTP_202_ACCEPTED)
+async def reclassify_shift_attendance(
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    current_user: Principal = Depends(require_hr_admin)
+):
+    """
+    Re-score a month of attendance records against the current shifts
+    
+    - Only accessible by HR_ADMIN
+    - Run after changing shift definitions; processed in the background
+    """
+    try:
+        reclassify_attendance.delay(year, month)
+    except:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not queue the reclassification"
+        )
+    
+    return {"status": "queued", "year": year, "month": month}
+
+
 @router.get("/records/review", response_model=List[AttendanceRecordResponse])
 async def list_attendance_for_review(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List unreviewed attendance records for manager approval
@@ -207,19 +394,16 @@ async def list_attendance_for_review(
             detail="Not enough permissions"
         )
     
-    query = db.query(AttendanceRecord).filter(AttendanceRecord.is_reviewed == False)
+    query = select(AttendanceRecord).where(AttendanceRecord.is_reviewed == False)
     
-    # Managers see records from their direct reports
+    # Managers see records from their team
     if current_user.role == RoleType.MANAGER:
-        # Get direct reports
-        direct_reports = db.query(Employee).filter(
-            Employee.manager_id == current_user.employee_id
-        ).all()
-        
-        employee_ids = [emp.id for emp in direct_reports]
-        query = query.filter(AttendanceRecord.employee_id.in_(employee_ids))
+        employee_ids = await team_ids(db, current_user)
+        query = query.where(AttendanceRecord.employee_id.in_(employee_ids))
     
-    records = query.order_by(AttendanceRecord.date.desc()).offset(skip).limit(limit).all()
+    keys = (AttendanceRecord.date, AttendanceRecord.id)
+    records = (await db.scalars(paginate(db, query, keys, cursor, skip, limit))).all()
+    set_next_cursor(response, keys, records, limit)
     return records
 
 
@@ -227,8 +411,8 @@ async def list_attendance_for_review(
 async def request_attendance_adjustment(
     record_id: int,
     adjustment_data: AttendanceAdjustment,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Request adjustment to an attendance record
@@ -237,7 +421,7 @@ async def request_attendance_adjustment(
     - Managers can directly adjust their team's records
     """
     # Get attendance record
-    record = db.query(AttendanceRecord).filter(AttendanceRecord.id == record_id).first()
+    record = await db.get(AttendanceRecord, record_id)
     
     if not record:
         raise HTTPException(
@@ -247,9 +431,8 @@ async def request_attendance_adjustment(
     
     # Authorization check
     if current_user.role == RoleType.MANAGER:
-        # Managers can adjust records for their direct reports
-        employee = db.query(Employee).filter(Employee.id == record.employee_id).first()
-        if not employee or employee.manager_id != current_user.employee_id:
+        # Managers can adjust records for their team
+        if not await manages(db, current_user, record.employee_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to adjust this record"
@@ -261,11 +444,17 @@ async def request_attendance_adjustment(
         record.is_reviewed = True
         record.reviewed_by = current_user.id
         
+        # Re-score against the shift schedule
+        schedule = await shift_schedule.get(db)
+        if record.status != AttendanceStatus.ABSENT:
+            record.shift_id, record.status = schedule.classify_clock_in(record.clock_in)
+        
         # Recalculate hours if both clock in and out exist
         if record.clock_out:
             time_diff = record.clock_out - record.clock_in
             hours_worked = time_diff.total_seconds() / 3600
             record.hours_worked = round(hours_worked, 2)
+            record.status = schedule.classify_clock_out(record.shift_id, record.status, record.hours_worked)
         
     elif current_user.employee_id == record.employee_id:
         # Employees can request adjustments (stored in notes for manager review)
@@ -276,8 +465,8 @@ async def request_attendance_adjustment(
             detail="Not authorized to adjust this record"
         )
     
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     
     return record
 
@@ -285,8 +474,8 @@ async def request_attendance_adjustment(
 @router.put("/records/{record_id}/review", response_model=AttendanceRecordResponse)
 async def review_attendance_record(
     record_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Mark attendance record as reviewed
@@ -299,7 +488,7 @@ async def review_attendance_record(
             detail="Not enough permissions"
         )
     
-    record = db.query(AttendanceRecord).filter(AttendanceRecord.id == record_id).first()
+    record = await db.get(AttendanceRecord, record_id)
     
     if not record:
         raise HTTPException(
@@ -307,10 +496,9 @@ async def review_attendance_record(
             detail="Attendance record not found"
         )
     
-    # Managers can only review records from their direct reports
+    # Managers can only review records from their team
     if current_user.role == RoleType.MANAGER:
-        employee = db.query(Employee).filter(Employee.id == record.employee_id).first()
-        if not employee or employee.manager_id != current_user.employee_id:
+        if not await manages(db, current_user, record.employee_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to review this record"
@@ -319,7 +507,7 @@ async def review_attendance_record(
     record.is_reviewed = True
     record.reviewed_by = current_user.id
     
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     
     return record
@@ -1,17 +1,18 @@
 """Authentication API endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.schemas import LoginRequest, Token, TokenRefresh, TokenAccess, PasswordChange, UserResponse
 from app.models import User
 from app.auth.jwt import (
-    verify_password, 
-    get_password_hash,
+    password_needs_rehash,
     create_access_token, 
     create_refresh_token, 
     verify_token_type
 )
-from app.auth.dependencies import get_current_user
+from app.auth.password_pool import verify_password_async, get_password_hash_async
+from app.auth.dependencies import get_current_user_record
 
 router = APIRouter()
 
@@ -19,7 +20,7 @@ router = APIRouter()
 @router.post("/login", response_model=Token)
 async def login(
     credentials: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Authenticate user and return JWT tokens
@@ -28,9 +29,9 @@ async def login(
     - **password**: User password
     """
     # Find user by email
-    user = db.query(User).filter(User.email == credentials.email).first()
+    user = await db.scalar(select(User).where(User.email == credentials.email))
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not user or not await verify_password_async(credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -43,6 +44,11 @@ async def login(
             detail="User account is inactive"
         )
     
+    # Transparently upgrade hashes made with an outdated work factor
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash_async(credentials.password)
+        await db.commit()
+    
     # Create tokens
     access_token = create_access_token(data={"sub": str(user.id), "role": user.role.value})
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
@@ -57,7 +63,7 @@ async def login(
 @router.post("/refresh", response_model=TokenAccess)
 async def refresh_token(
     token_data: TokenRefresh,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Refresh access token using refresh token
@@ -75,7 +81,7 @@ async def refresh_token(
         )
     
     # Verify user still exists and is active
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await db.get(User, int(user_id))
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -92,8 +98,8 @@ async def refresh_token(
 async def change_password(
     user_id: int,
     password_data: PasswordChange,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_record),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Change user password
@@ -109,22 +115,22 @@ async def change_password(
         )
     
     # Verify old password
-    if not verify_password(password_data.old_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.old_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect old password"
         )
     
     # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    current_user.hashed_password = await get_password_hash_async(password_data.new_password)
+    await db.commit()
     
     return {"message": "Password updated successfully"}
 
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_record)
 ):
     """Get current authenticated user information"""
     return current_user
@@ -1,12 +1,12 @@
 """Employee Management API endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
-import os
-import shutil
-from datetime import datetime
+import asyncio
 
 from app.database import get_db
 from app.schemas import (
@@ -14,8 +14,14 @@ from app.schemas import (
     DepartmentCreate, DepartmentResponse, PositionCreate, PositionResponse,
     DocumentUpload, DocumentResponse
 )
-from app.models import Employee, Department, Position, EmployeeDocument, User, RoleType
+from app.models import Employee, Department, Position, EmployeeDocument, RoleType
 from app.auth.dependencies import get_current_user, require_hr_admin
+from app.auth.principal_cache import Principal
+from app.services import document_blobs
+from app.services.org_tree import manages, team_ids
+from app.api.pagination import paginate, set_next_cursor
+from app.api.files import serve_file
+from app.api.uploads import receive_upload
 from app.config import get_settings
 
 settings = get_settings()
@@ -24,18 +30,21 @@ router = APIRouter()
 
 @router.get("/employees", response_model=List[EmployeeResponse])
 async def list_employees(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     department_id: Optional[int] = None,
     status: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List all employees with pagination and filters
     
     - Accessible by HR_ADMIN and MANAGER
     - Filters: department_id, status
+    - Pagination: skip/limit, or cursor from the X-Next-Cursor header
     """
     # Role check
     if current_user.role not in [RoleType.HR_ADMIN, RoleType.MANAGER]:
@@ -44,27 +53,31 @@ async def list_employees(
             detail="Not enough permissions"
         )
     
-    query = db.query(Employee)
+    query = select(Employee)
     
     # Apply filters
     if department_id:
-        query = query.filter(Employee.department_id == department_id)
+        query = query.where(Employee.department_id == department_id)
     if status:
-        query = query.filter(Employee.employment_status == status)
+        query = query.where(Employee.employment_status == status)
     
-    # Managers only see their direct reports
+    # Managers only see their team
     if current_user.role == RoleType.MANAGER and current_user.employee_id:
-        query = query.filter(Employee.manager_id == current_user.employee_id)
+        query = query.where(Employee.id.in_(await team_ids(db, current_user)))
     
-    employees = query.offset(skip).limit(limit).all()
+    keys = (Employee.id,)
+    employees = (await db.scalars(
+        paginate(db, query, keys, cursor, skip, limit, descending=False)
+    )).all()
+    set_next_cursor(response, keys, employees, limit)
     return employees
 
 
 @router.post("/employees", response_model=EmployeeResponse, status_code=status.HTTP_201_CREATED)
 async def create_employee(
     employee_data: EmployeeCreate,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create new employee profile (onboarding)
@@ -72,7 +85,7 @@ async def create_employee(
     - Only accessible by HR_ADMIN
     """
     # Check if employee number already exists
-    existing = db.query(Employee).filter(Employee.employee_number == employee_data.employee_number).first()
+    existing = await db.scalar(select(Employee).where(Employee.employee_number == employee_data.employee_number))
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -80,7 +93,7 @@ async def create_employee(
         )
     
     # Check if email already exists
-    existing_email = db.query(Employee).filter(Employee.email == employee_data.email).first()
+    existing_email = await db.scalar(select(Employee).where(Employee.email == employee_data.email))
     if existing_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -90,8 +103,8 @@ async def create_employee(
     # Create employee
     employee = Employee(**employee_data.model_dump())
     db.add(employee)
-    db.commit()
-    db.refresh(employee)
+    await db.commit()
+    await db.refresh(employee)
     
     return employee
 
@@ -99,8 +112,8 @@ async def create_employee(
 @router.get("/employees/{employee_id}", response_model=EmployeeDetailResponse)
 async def get_employee(
     employee_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get detailed employee information
@@ -108,7 +121,11 @@ async def get_employee(
     - Accessible by all authenticated users
     - Users can view their own profile or their manager can view
     """
-    employee = db.query(Employee).filter(Employee.id == employee_id).first()
+    employee = await db.scalar(
+        select(Employee)
+        .options(selectinload(Employee.department), selectinload(Employee.position))
+        .where(Employee.id == employee_id)
+    )
     
     if not employee:
         raise HTTPException(
@@ -120,9 +137,9 @@ async def get_employee(
     if current_user.role not in [RoleType.HR_ADMIN, RoleType.EXECUTIVE]:
         # Allow user to view own profile
         if current_user.employee_id != employee_id:
-            # Allow manager to view direct reports
+            # Allow manager to view their team
             if current_user.role == RoleType.MANAGER:
-                if employee.manager_id != current_user.employee_id:
+                if not await manages(db, current_user, employee_id):
                     raise HTTPException(
                         status_code=status.HTTP_403_FORBIDDEN,
                         detail="Not authorized to view this employee"
@@ -140,8 +157,8 @@ async def get_employee(
 async def update_employee(
     employee_id: int,
     employee_data: EmployeeUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update employee information
@@ -149,7 +166,7 @@ async def update_employee(
     - HR_ADMIN can update any employee
     - Employees can update their own basic information
     """
-    employee = db.query(Employee).filter(Employee.id == employee_id).first()
+    employee = await db.get(Employee, employee_id)
     
     if not employee:
         raise HTTPException(
@@ -181,29 +198,51 @@ async def update_employee(
     for field, value in update_data.items():
         setattr(employee, field, value)
     
-    db.commit()
-    db.refresh(employee)
+    await db.commit()
+    await db.refresh(employee)
     
     return employee
 
 
-@router.post("/employees/{employee_id}/documents", response_model=DocumentResponse)
+DOCUMENT_UPLOAD_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["document", "document_type"],
+                "properties": {
+                    "document": {"type": "string", "format": "binary"},
+                    "document_type": {"type": "string"},
+                    "description": {"type": "string"}
+                }
+            }
+        }
+    }
+}
+
+
+@router.post(
+    "/employees/{employee_id}/documents",
+    response_model=DocumentResponse,
+    openapi_extra={"requestBody": DOCUMENT_UPLOAD_BODY}
+)
 async def upload_employee_document(
     employee_id: int,
-    document: UploadFile = File(...),
-    document_type: str = Form(...),
-    description: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Upload employee document
+    Upload employee document (multipart: document, document_type, description)
     
     - HR_ADMIN can upload for any employee
     - Employees can upload their own documents
+    - The file is streamed to storage and rejected as soon as it exceeds MAX_UPLOAD_SIZE
+    - Files are stored once per content: re-uploading known bytes only adds the document record
     """
     # Verify employee exists
-    employee = db.query(Employee).filter(Employee.id == employee_id).first()
+    employee = await db.get(Employee, employee_id)
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -218,51 +257,47 @@ async def upload_employee_document(
                 detail="Not authorized to upload documents for this employee"
             )
     
-    # Validate file extension
-    file_extension = document.filename.split(".")[-1].lower()
-    if file_extension not in settings.allowed_extensions_list:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Allowed: {settings.ALLOWED_EXTENSIONS}"
-        )
-    
-    # Validate file size
-    document.file.seek(0, 2)
-    file_size = document.file.tell()
-    document.file.seek(0)
+    # Release the database connection while the body streams in
+    await db.commit()
     
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE} bytes"
-        )
+    def check_filename(filename: str):
+        file_extension = filename.split(".")[-1].lower()
+        if file_extension not in settings.allowed_extensions_list:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File type not allowed. Allowed: {settings.ALLOWED_EXTENSIONS}"
+            )
     
-    # Create upload directory if not exists
-    upload_dir = os.path.join(settings.UPLOAD_DIR, "employees", str(employee_id))
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_name = f"{timestamp}_{document.filename}"
-    file_path = os.path.join(upload_dir, file_name)
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(document.file, buffer)
-    
-    # Create database record
-    doc_record = EmployeeDocument(
-        employee_id=employee_id,
-        document_type=document_type,
-        file_name=document.filename,
-        file_path=file_path,
-        file_size=file_size,
-        description=description,
-        uploaded_by=current_user.id
+    upload = await receive_upload(
+        request,
+        "document",
+        document_blobs.temp_dir(),
+        settings.MAX_UPLOAD_SIZE,
+        check_filename
     )
-    db.add(doc_record)
-    db.commit()
-    db.refresh(doc_record)
+    
+    try:
+        fields = DocumentUpload(**upload.fields)
+        await asyncio.to_thread(document_blobs.link, upload.path, upload.sha256)
+        doc_record = EmployeeDocument(
+            employee_id=employee_id,
+            document_type=fields.document_type,
+            file_name=upload.filename,
+            file_path=document_blobs.blob_path(upload.sha256),
+            file_size=upload.size,
+            content_sha256=upload.sha256,
+            description=fields.description,
+            uploaded_by=current_user.id
+        )
+        db.add(doc_record)
+        await db.commit()
+    except Exception as e:
+        await asyncio.to_thread(document_blobs.discard, upload.path)
+        if isinstance(e, ValidationError):
+            raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+        raise
+    await asyncio.to_thread(document_blobs.settle, upload.path, upload.sha256)
+    await db.refresh(doc_record)
     
     return doc_record
 
@@ -271,20 +306,22 @@ async def upload_employee_document(
 async def download_employee_document(
     employee_id: int,
     doc_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Download employee document
     
     - HR_ADMIN can download any document
     - Employees can download their own documents
+    - Supports Range, If-Range, If-None-Match and If-Modified-Since
     """
     # Get document record
-    document = db.query(EmployeeDocument).filter(
+    document = await db.scalar(select(EmployeeDocument).where(
         EmployeeDocument.id == doc_id,
         EmployeeDocument.employee_id == employee_id
-    ).first()
+    ))
     
     if not document:
         raise HTTPException(
@@ -300,65 +337,82 @@ async def download_employee_document(
                 detail="Not authorized to access this document"
             )
     
-    # Check if file exists
-    if not os.path.exists(document.file_path):
+    return await serve_file(request, document.file_path, document.file_name, document.content_sha256)
+
+
+@router.delete("/employees/{employee_id}/documents/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_employee_document(
+    employee_id: int,
+    doc_id: int,
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Remove an employee document
+    
+    - Only accessible by HR_ADMIN
+    - The stored file is garbage-collected once no other document shares it
+    """
+    document = await db.scalar(select(EmployeeDocument).where(
+        EmployeeDocument.id == doc_id,
+        EmployeeDocument.employee_id == employee_id
+    ))
+    
+    if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found on server"
+            detail="Document not found"
         )
     
-    return FileResponse(
-        path=document.file_path,
-        filename=document.file_name,
-        media_type='application/octet-stream'
-    )
+    await db.delete(document)
+    await db.commit()
 
 
 # Department endpoints
 @router.get("/departments", response_model=List[DepartmentResponse])
 async def list_departments(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """List all departments"""
-    departments = db.query(Department).all()
+    departments = (await db.scalars(select(Department))).all()
     return departments
 
 
 @router.post("/departments", response_model=DepartmentResponse, status_code=status.HTTP_201_CREATED)
 async def create_department(
     department_data: DepartmentCreate,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create new department (HR_ADMIN only)"""
     department = Department(**department_data.model_dump())
     db.add(department)
-    db.commit()
-    db.refresh(department)
+    await db.commit()
+    await db.refresh(department)
     return department
 
 
 # Position endpoints
 @router.get("/positions", response_model=List[PositionResponse])
 async def list_positions(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """List all positions"""
-    positions = db.query(Position).all()
+    positions = (await db.scalars(select(Position))).all()
     return positions
 
 
 @router.post("/positions", response_model=PositionResponse, status_code=status.HTTP_201_CREATED)
 async def create_position(
     position_data: PositionCreate,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create new position (HR_ADMIN only)"""
     position = Position(**position_data.model_dump())
     db.add(position)
-    db.commit()
-    db.refresh(position)
+    await db.commit()
+    await db.refresh(position)
     return position
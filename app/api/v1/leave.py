@@ -1,42 +1,131 @@
 """Leave Management API endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from datetime import datetime, date as date_type
 from decimal import Decimal
 
+from app.config import get_settings
 from app.database import get_db
 from app.schemas import (
     LeaveTypeResponse, LeaveBalanceResponse, LeaveRequestCreate,
-    LeaveRequestResponse, LeaveRequestAction
+    LeaveRequestResponse, LeaveRequestAction, LeaveRequestBulkAction,
+    LeaveRequestBulkActionResponse, HolidayCreate, HolidayResponse
 )
 from app.models import (
-    LeaveType, LeaveBalance, LeaveRequest, Employee, User, 
-    RoleType, LeaveRequestStatus
+    LeaveType, LeaveBalance, LeaveRequest, Employee, 
+    RoleType, LeaveRequestStatus, Department, Holiday
 )
 from app.auth.dependencies import get_current_user, require_hr_admin
-from app.tasks import sync_calendar_async
+from app.auth.principal_cache import Principal
+from app.api.pagination import paginate, set_next_cursor
+from app.services import calendar_sync, leave_ledger
+from app.services.business_calendar import business_calendar
+from app.services.org_tree import manages, scope_check, team_ids
 
 router = APIRouter()
+settings = get_settings()
 
 
 @router.get("/types", response_model=List[LeaveTypeResponse])
 async def list_leave_types(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """List all available leave types"""
-    leave_types = db.query(LeaveType).filter(LeaveType.is_active == True).all()
+    leave_types = (await db.scalars(select(LeaveType).where(LeaveType.is_active == True))).all()
     return leave_types
 
 
+@router.get("/holidays", response_model=List[HolidayResponse])
+async def list_holidays(
+    year: Optional[int] = None,
+    location: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List holidays of a year
+    
+    - Pass location to get the holidays that apply there (global ones included)
+    """
+    if not year:
+        year = datetime.now().year
+    
+    query = select(Holiday).where(
+        Holiday.holiday_date >= date_type(year, 1, 1),
+        Holiday.holiday_date <= date_type(year, 12, 31)
+    )
+    if location:
+        query = query.where((Holiday.location == None) | (Holiday.location == location))
+    
+    holidays = (await db.scalars(query.order_by(Holiday.holiday_date))).all()
+    return holidays
+
+
+@router.post("/holidays", response_model=HolidayResponse, status_code=status.HTTP_201_CREATED)
+async def create_holiday(
+    holiday_data: HolidayCreate,
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Add a holiday
+    
+    - Only accessible by HR_ADMIN
+    - Omit location for a holiday observed everywhere
+    """
+    existing = await db.scalar(select(Holiday).where(
+        Holiday.holiday_date == holiday_data.holiday_date,
+        Holiday.location == holiday_data.location if holiday_data.location else Holiday.location == None
+    ))
+    
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Holiday already exists for this date and location"
+        )
+    
+    holiday = Holiday(**holiday_data.model_dump())
+    
+    db.add(holiday)
+    await db.commit()
+    await db.refresh(holiday)
+    
+    return holiday
+
+
+@router.delete("/holidays/{holiday_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_holiday(
+    holiday_id: int,
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Remove a holiday
+    
+    - Only accessible by HR_ADMIN
+    """
+    holiday = await db.get(Holiday, holiday_id)
+    
+    if not holiday:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Holiday not found"
+        )
+    
+    await db.delete(holiday)
+    await db.commit()
+
+
 @router.get("/balances/{employee_id}", response_model=List[LeaveBalanceResponse])
 async def get_leave_balances(
     employee_id: int,
     year: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get leave balances for an employee
@@ -49,8 +138,7 @@ async def get_leave_balances(
     if current_user.role not in [RoleType.HR_ADMIN, RoleType.EXECUTIVE]:
         if current_user.employee_id != employee_id:
             # Check if user is the employee's manager
-            employee = db.query(Employee).filter(Employee.id == employee_id).first()
-            if not employee or employee.manager_id != current_user.employee_id:
+            if not await manages(db, current_user, employee_id):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="Not authorized to view these balances"
@@ -60,12 +148,16 @@ async def get_leave_balances(
     if not year:
         year = datetime.now().year
     
-    balances = db.query(LeaveBalance).filter(
-        and_(
-            LeaveBalance.employee_id == employee_id,
-            LeaveBalance.year == year
+    balances = (await db.scalars(
+        select(LeaveBalance)
+        .options(selectinload(LeaveBalance.leave_type))
+        .where(
+            and_(
+                LeaveBalance.employee_id == employee_id,
+                LeaveBalance.year == year
+            )
         )
-    ).all()
+    )).all()
     
     return balances
 
@@ -73,13 +165,15 @@ async def get_leave_balances(
 @router.post("/requests", response_model=LeaveRequestResponse, status_code=status.HTTP_201_CREATED)
 async def create_leave_request(
     request_data: LeaveRequestCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Submit a new leave request
     
     - Employees can only create requests for themselves
+    - total_days counts workdays only: weekends and holidays at the
+      employee's department location are excluded
     """
     # Ensure user has an employee profile
     if not current_user.employee_id:
@@ -89,32 +183,42 @@ async def create_leave_request(
         )
     
     # Validate leave type exists
-    leave_type = db.query(LeaveType).filter(LeaveType.id == request_data.leave_type_id).first()
+    leave_type = await db.get(LeaveType, request_data.leave_type_id)
     if not leave_type or not leave_type.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid leave type"
         )
     
-    # Calculate number of days
-    delta = request_data.end_date - request_data.start_date
-    total_days = delta.days + 1
+    if request_data.end_date < request_data.start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date range"
+        )
+    
+    # Calculate number of working days
+    location = await db.scalar(
+        select(Department.location)
+        .join(Employee, Employee.department_id == Department.id)
+        .where(Employee.id == current_user.employee_id)
+    )
+    calendar = await business_calendar.get(db)
+    total_days = calendar.workdays_between(request_data.start_date, request_data.end_date, location)
     
     if total_days <= 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid date range"
+            detail="No working days in the requested period"
         )
     
-    # Check leave balance
-    current_year = datetime.now().year
-    balance = db.query(LeaveBalance).filter(
+    # Check the balance of the year the leave starts in (the one approval debits)
+    balance = await db.scalar(select(LeaveBalance).where(
         and_(
             LeaveBalance.employee_id == current_user.employee_id,
             LeaveBalance.leave_type_id == request_data.leave_type_id,
-            LeaveBalance.year == current_year
+            LeaveBalance.year == request_data.start_date.year
         )
-    ).first()
+    ))
     
     if balance and balance.available_days < total_days:
         raise HTTPException(
@@ -134,19 +238,22 @@ async def create_leave_request(
     )
     
     db.add(leave_request)
-    db.commit()
-    db.refresh(leave_request)
+    await db.commit()
+    await db.refresh(leave_request)
+    await db.refresh(leave_request, ["leave_type"])
     
     return leave_request
 
 
 @router.get("/requests", response_model=List[LeaveRequestResponse])
 async def list_my_leave_requests(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List logged-in user's leave requests
@@ -157,24 +264,28 @@ async def list_my_leave_requests(
             detail="User is not linked to an employee profile"
         )
     
-    query = db.query(LeaveRequest).filter(
+    query = select(LeaveRequest).options(selectinload(LeaveRequest.leave_type)).where(
         LeaveRequest.employee_id == current_user.employee_id
     )
     
     if status:
-        query = query.filter(LeaveRequest.status == status)
+        query = query.where(LeaveRequest.status == status)
     
-    requests = query.order_by(LeaveRequest.created_at.desc()).offset(skip).limit(limit).all()
+    keys = (LeaveRequest.created_at, LeaveRequest.id)
+    requests = (await db.scalars(paginate(db, query, keys, cursor, skip, limit))).all()
+    set_next_cursor(response, keys, requests, limit)
     return requests
 
 
 @router.get("/requests/team", response_model=List[LeaveRequestResponse])
 async def list_team_leave_requests(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: str = "PENDING",
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List pending leave requests for manager's team
@@ -187,37 +298,93 @@ async def list_team_leave_requests(
             detail="Not enough permissions"
         )
     
-    query = db.query(LeaveRequest)
+    query = select(LeaveRequest).options(selectinload(LeaveRequest.leave_type))
     
-    # Managers see requests from their direct reports
+    # Managers see requests from their team
     if current_user.role == RoleType.MANAGER:
-        # Get direct reports
-        direct_reports = db.query(Employee).filter(
-            Employee.manager_id == current_user.employee_id
-        ).all()
-        
-        employee_ids = [emp.id for emp in direct_reports]
-        query = query.filter(LeaveRequest.employee_id.in_(employee_ids))
+        employee_ids = await team_ids(db, current_user)
+        query = query.where(LeaveRequest.employee_id.in_(employee_ids))
     
     # Filter by status
     if status:
-        query = query.filter(LeaveRequest.status == status)
+        query = query.where(LeaveRequest.status == status)
     
-    requests = query.order_by(LeaveRequest.created_at.desc()).offset(skip).limit(limit).all()
+    keys = (LeaveRequest.created_at, LeaveRequest.id)
+    requests = (await db.scalars(paginate(db, query, keys, cursor, skip, limit))).all()
+    set_next_cursor(response, keys, requests, limit)
     return requests
 
 
+@router.post("/requests/bulk-action", response_model=LeaveRequestBulkActionResponse)
+async def bulk_approve_or_reject_leave_requests(
+    bulk_action: LeaveRequestBulkAction,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Approve or reject many leave requests at once
+    
+    - Accessible by MANAGER and HR_ADMIN
+    - Requests outside the manager's team or no longer pending are reported
+      and skipped; the rest are decided in a single transaction
+    - Approvals are queued for calendar sync in the same transaction
+    - Returns one result per distinct request id, in input order
+    """
+    if current_user.role not in [RoleType.MANAGER, RoleType.HR_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    if len(bulk_action.request_ids) > settings.LEAVE_BULK_ACTION_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.LEAVE_BULK_ACTION_MAX} requests per bulk action"
+        )
+    
+    in_scope = None
+    if current_user.role == RoleType.MANAGER:
+        in_scope = await scope_check(db, current_user)
+    
+    approve = bulk_action.action == "Approve"
+    decisions = await db.run_sync(
+        leave_ledger.decide_requests, bulk_action.request_ids, approve,
+        current_user.id, bulk_action.comment, in_scope
+    )
+    await db.run_sync(calendar_sync.enqueue, [
+        {
+            "employee_id": d.employee_id,
+            "leave_request_id": d.leave_request_id,
+            "status": "approved",
+            "start_date": d.start_date,
+            "end_date": d.end_date
+        }
+        for d in decisions if d.outcome == leave_ledger.APPROVED
+    ])
+    await db.commit()
+    
+    actioned = sum(d.outcome in (leave_ledger.APPROVED, leave_ledger.REJECTED) for d in decisions)
+    return LeaveRequestBulkActionResponse(
+        actioned=actioned,
+        failed=len(decisions) - actioned,
+        results=[
+            {"id": d.leave_request_id, "status": d.outcome, "detail": d.detail} for d in decisions
+        ]
+    )
+
+
 @router.put("/requests/{request_id}/action", response_model=LeaveRequestResponse)
 async def approve_or_reject_leave_request(
     request_id: int,
     action_data: LeaveRequestAction,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Approve or reject a leave request
     
     - Accessible by MANAGER and HR_ADMIN
+    - Approval debits the leave ledger for the year the leave starts in
     """
     if current_user.role not in [RoleType.MANAGER, RoleType.HR_ADMIN]:
         raise HTTPException(
@@ -226,7 +393,7 @@ async def approve_or_reject_leave_request(
         )
     
     # Get leave request
-    leave_request = db.query(LeaveRequest).filter(LeaveRequest.id == request_id).first()
+    leave_request = await db.get(LeaveRequest, request_id)
     
     if not leave_request:
         raise HTTPException(
@@ -241,53 +408,40 @@ async def approve_or_reject_leave_request(
             detail=f"Cannot action request with status: {leave_request.status}"
         )
     
-    # Managers can only approve requests from their direct reports
+    # Managers can only approve requests from their team
     if current_user.role == RoleType.MANAGER:
-        employee = db.query(Employee).filter(Employee.id == leave_request.employee_id).first()
-        if not employee or employee.manager_id != current_user.employee_id:
+        if not await manages(db, current_user, leave_request.employee_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to action this request"
             )
     
-    # Update leave request status
-    if action_data.action == "Approve":
-        leave_request.status = LeaveRequestStatus.APPROVED
-        
-        # Update leave balance
-        current_year = datetime.now().year
-        balance = db.query(LeaveBalance).filter(
-            and_(
-                LeaveBalance.employee_id == leave_request.employee_id,
-                LeaveBalance.leave_type_id == leave_request.leave_type_id,
-                LeaveBalance.year == current_year
-            )
-        ).first()
-        
-        if balance:
-            balance.used_days += leave_request.total_days
-            balance.available_days = balance.total_days - balance.used_days
-        
-        # Trigger calendar sync (async task)
-        try:
-            sync_calendar_async.delay(
-                employee_id=leave_request.employee_id,
-                leave_request_id=leave_request.id,
-                status="approved",
-                start_date=str(leave_request.start_date),
-                end_date=str(leave_request.end_date)
-            )
-        except:
-            pass  # Don't fail the request if async task fails
-        
-    elif action_data.action == "Reject":
-        leave_request.status = LeaveRequestStatus.REJECTED
-    
-    leave_request.approved_by = current_user.id
-    leave_request.approval_comment = action_data.comment
-    leave_request.approved_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(leave_request)
+    # Compare-and-set on PENDING; an approval debits the ledger atomically
+    approve = action_data.action == "Approve"
+    new_status = await db.run_sync(
+        leave_ledger.decide_request, request_id, approve, current_user.id, action_data.comment
+    )
+    
+    if new_status is None:
+        await db.rollback()
+        await db.refresh(leave_request)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot action request with status: {leave_request.status}"
+        )
+    
+    # Queue the calendar sync; delivered by the flush_calendar_sync task
+    if approve:
+        await db.run_sync(calendar_sync.enqueue, [{
+            "employee_id": leave_request.employee_id,
+            "leave_request_id": leave_request.id,
+            "status": "approved",
+            "start_date": leave_request.start_date,
+            "end_date": leave_request.end_date
+        }])
+    
+    await db.commit()
+    await db.refresh(leave_request)
+    await db.refresh(leave_request, ["leave_type"])
     
     return leave_request
@@ -1,22 +1,28 @@
 """Payroll and Compensation API endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from datetime import datetime, date as date_type
 from decimal import Decimal
+import asyncio
 
 from app.database import get_db
 from app.schemas import (
-    PayrollRunCreate, PayrollRunResponse, PayslipResponse,
+    PayrollRunCreate, PayrollRunResponse, PayrollRunDetailResponse, PayslipResponse,
     CompensationUpdate, CompensationHistoryResponse
 )
 from app.models import (
-    PayrollRun, Payslip, Employee, User, RoleType, 
+    PayrollRun, Payslip, Employee, RoleType, 
     PayrollStatus, CompensationHistory
 )
 from app.auth.dependencies import get_current_user, require_hr_admin
+from app.auth.principal_cache import Principal
+from app.api.pagination import paginate, set_next_cursor
+from app.api.files import serve_file
+from app.api.ranges import ranged_response
+from app.services import zip_stream
 from app.tasks import process_payroll_async
 
 router = APIRouter()
@@ -25,8 +31,8 @@ router = APIRouter()
 @router.post("/runs", response_model=PayrollRunResponse, status_code=status.HTTP_201_CREATED)
 async def create_payroll_run(
     payroll_data: PayrollRunCreate,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Initiate a new payroll calculation cycle
@@ -41,12 +47,12 @@ async def create_payroll_run(
         )
     
     # Check for overlapping payroll runs
-    overlapping = db.query(PayrollRun).filter(
+    overlapping = await db.scalar(select(PayrollRun).where(
         and_(
             PayrollRun.period_start <= payroll_data.period_end,
             PayrollRun.period_end >= payroll_data.period_start
         )
-    ).first()
+    ))
     
     if overlapping:
         raise HTTPException(
@@ -63,8 +69,8 @@ async def create_payroll_run(
     )
     
     db.add(payroll_run)
-    db.commit()
-    db.refresh(payroll_run)
+    await db.commit()
+    await db.refresh(payroll_run)
     
     # Trigger async processing
     try:
@@ -77,35 +83,41 @@ async def create_payroll_run(
 
 @router.get("/runs", response_model=List[PayrollRunResponse])
 async def list_payroll_runs(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List all payroll runs
     
     - Only accessible by HR_ADMIN
     """
-    runs = db.query(PayrollRun).order_by(
-        PayrollRun.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    keys = (PayrollRun.created_at, PayrollRun.id)
+    runs = (await db.scalars(
+        paginate(db, select(PayrollRun), keys, cursor, skip, limit)
+    )).all()
+    set_next_cursor(response, keys, runs, limit)
     
     return runs
 
 
-@router.get("/runs/{run_id}", response_model=PayrollRunResponse)
+@router.get("/runs/{run_id}", response_model=PayrollRunDetailResponse)
 async def get_payroll_run(
     run_id: int,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get payroll run details
+    Get payroll run details, including per-shard progress
     
     - Only accessible by HR_ADMIN
     """
-    run = db.query(PayrollRun).filter(PayrollRun.id == run_id).first()
+    run = await db.scalar(
+        select(PayrollRun).options(selectinload(PayrollRun.shards)).where(PayrollRun.id == run_id)
+    )
     
     if not run:
         raise HTTPException(
@@ -116,13 +128,104 @@ async def get_payroll_run(
     return run
 
 
+@router.post("/runs/{run_id}/retry", response_model=PayrollRunDetailResponse)
+async def retry_payroll_run(
+    run_id: int,
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Re-dispatch a failed payroll run
+    
+    - Only accessible by HR_ADMIN
+    - Completed shards are kept; only failed or unfinished shards are recomputed
+    """
+    run = await db.scalar(
+        select(PayrollRun).options(selectinload(PayrollRun.shards)).where(PayrollRun.id == run_id)
+    )
+    
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Payroll run not found"
+        )
+    
+    if run.status != PayrollStatus.FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only failed payroll runs can be retried"
+        )
+    
+    run.status = PayrollStatus.PENDING
+    await db.commit()
+    
+    # Trigger async processing
+    try:
+        process_payroll_async.delay(run.id)
+    except:
+        pass  # Continue even if async task fails
+    
+    return run
+
+
+@router.get("/runs/{run_id}/payslips/archive")
+async def download_payslip_archive(
+    run_id: int,
+    request: Request,
+    department_id: Optional[int] = None,
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Download every rendered payslip of a run as one ZIP archive
+    
+    - Only accessible by HR_ADMIN
+    - department_id limits the archive to one department's employees
+    - The archive is built while it streams, in constant memory; Range and
+      If-Range requests resume an interrupted download
+    """
+    if not await db.scalar(select(PayrollRun.id).where(PayrollRun.id == run_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Payroll run not found"
+        )
+    
+    query = (
+        select(Payslip.id, Payslip.file_path, Employee.employee_number)
+        .join(Employee, Employee.id == Payslip.employee_id)
+        .where(Payslip.payroll_run_id == run_id, Payslip.file_path.isnot(None))
+        .order_by(Payslip.id)
+    )
+    if department_id is not None:
+        query = query.where(Employee.department_id == department_id)
+    files = [
+        (f"{employee_number}_payslip_{payslip_id}.pdf", file_path)
+        for payslip_id, file_path, employee_number in await db.execute(query)
+    ]
+    members = await asyncio.to_thread(zip_stream.stat_members, files)
+    if not members:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No payslip files available"
+        )
+    
+    archive = zip_stream.ZipStream(members)
+    suffix = f"_department_{department_id}" if department_id is not None else ""
+    return ranged_response(
+        request, archive.size, archive.etag, archive.iter_bytes, "application/zip",
+        {"Content-Disposition": f"attachment; filename=payroll_run_{run_id}{suffix}_payslips.zip"}
+    )
+
+
 @router.get("/payslips/{employee_id}", response_model=List[PayslipResponse])
 async def list_payslips(
+    response: Response,
     employee_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List payslips for an employee
@@ -138,9 +241,11 @@ async def list_payslips(
                 detail="Not authorized to view these payslips"
             )
     
-    payslips = db.query(Payslip).filter(
-        Payslip.employee_id == employee_id
-    ).order_by(Payslip.created_at.desc()).offset(skip).limit(limit).all()
+    keys = (Payslip.created_at, Payslip.id)
+    payslips = (await db.scalars(paginate(
+        db, select(Payslip).where(Payslip.employee_id == employee_id), keys, cursor, skip, limit
+    ))).all()
+    set_next_cursor(response, keys, payslips, limit)
     
     return payslips
 
@@ -149,14 +254,16 @@ async def list_payslips(
 async def download_payslip(
     employee_id: int,
     payslip_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Download a specific payslip PDF
     
     - Employees can download their own payslips
     - HR_ADMIN can download all payslips
+    - Supports Range, If-Range, If-None-Match and If-Modified-Since
     """
     # Authorization check
     if current_user.role != RoleType.HR_ADMIN:
@@ -166,12 +273,12 @@ async def download_payslip(
                 detail="Not authorized to download this payslip"
             )
     
-    payslip = db.query(Payslip).filter(
+    payslip = await db.scalar(select(Payslip).where(
         and_(
             Payslip.id == payslip_id,
             Payslip.employee_id == employee_id
         )
-    ).first()
+    ))
     
     if not payslip:
         raise HTTPException(
@@ -185,10 +292,8 @@ async def download_payslip(
             detail="Payslip file not available"
         )
     
-    return FileResponse(
-        path=payslip.file_path,
-        filename=f"payslip_{payslip.id}.pdf",
-        media_type='application/pdf'
+    return await serve_file(
+        request, payslip.file_path, f"payslip_{payslip.id}.pdf", payslip.content_sha256, 'application/pdf'
     )
 
 
@@ -196,8 +301,8 @@ async def download_payslip(
 async def update_compensation(
     employee_id: int,
     compensation_data: CompensationUpdate,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update employee compensation
@@ -205,7 +310,7 @@ async def update_compensation(
     - Only accessible by HR_ADMIN
     """
     # Get employee
-    employee = db.query(Employee).filter(Employee.id == employee_id).first()
+    employee = await db.get(Employee, employee_id)
     
     if not employee:
         raise HTTPException(
@@ -228,8 +333,8 @@ async def update_compensation(
     # Update employee salary
     employee.salary = compensation_data.new_salary
     
-    db.commit()
-    db.refresh(compensation_history)
+    await db.commit()
+    await db.refresh(compensation_history)
     
     return compensation_history
 
@@ -239,16 +344,16 @@ async def get_compensation_history(
     employee_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get compensation change history for an employee
     
     - Only accessible by HR_ADMIN
     """
-    history = db.query(CompensationHistory).filter(
+    history = (await db.scalars(select(CompensationHistory).where(
         CompensationHistory.employee_id == employee_id
-    ).order_by(CompensationHistory.effective_date.desc()).offset(skip).limit(limit).all()
+    ).order_by(CompensationHistory.effective_date.desc()).offset(skip).limit(limit))).all()
     
     return history
@@ -1,6 +1,7 @@
 """Performance and Training API endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import date as date_type
 
@@ -11,9 +12,12 @@ from app.schemas import (
 )
 from app.models import (
     PerformanceReview, TrainingCourse, TrainingEnrollment,
-    Employee, User, RoleType
+    Employee, RoleType
 )
 from app.auth.dependencies import get_current_user, require_hr_admin
+from app.auth.principal_cache import Principal
+from app.api.pagination import paginate, set_next_cursor
+from app.services.org_tree import manages
 
 router = APIRouter()
 
@@ -22,8 +26,8 @@ router = APIRouter()
 @router.post("/performance/reviews", response_model=PerformanceReviewResponse, status_code=status.HTTP_201_CREATED)
 async def create_performance_review(
     review_data: PerformanceReviewCreate,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new performance review cycle
@@ -31,8 +35,8 @@ async def create_performance_review(
     - Only accessible by HR_ADMIN
     """
     # Validate employees exist
-    employee = db.query(Employee).filter(Employee.id == review_data.employee_id).first()
-    reviewer = db.query(Employee).filter(Employee.id == review_data.reviewer_id).first()
+    employee = await db.get(Employee, review_data.employee_id)
+    reviewer = await db.get(Employee, review_data.reviewer_id)
     
     if not employee or not reviewer:
         raise HTTPException(
@@ -43,8 +47,8 @@ async def create_performance_review(
     # Create review
     review = PerformanceReview(**review_data.model_dump())
     db.add(review)
-    db.commit()
-    db.refresh(review)
+    await db.commit()
+    await db.refresh(review)
     
     return review
 
@@ -53,8 +57,8 @@ async def create_performance_review(
 async def submit_review_feedback(
     review_id: int,
     feedback_data: FeedbackCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Submit feedback for a performance review
@@ -62,7 +66,7 @@ async def submit_review_feedback(
     - Employees can submit self-assessment
     - Managers can submit manager feedback
     """
-    review = db.query(PerformanceReview).filter(PerformanceReview.id == review_id).first()
+    review = await db.get(PerformanceReview, review_id)
     
     if not review:
         raise HTTPException(
@@ -72,9 +76,8 @@ async def submit_review_feedback(
     
     # Authorization check
     if current_user.role == RoleType.MANAGER:
-        # Managers can provide feedback for their direct reports
-        employee = db.query(Employee).filter(Employee.id == review.employee_id).first()
-        if not employee or employee.manager_id != current_user.employee_id:
+        # Managers can provide feedback for their team
+        if not await manages(db, current_user, review.employee_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to provide feedback for this review"
@@ -94,8 +97,8 @@ async def submit_review_feedback(
     
     review.status = "COMPLETED"
     
-    db.commit()
-    db.refresh(review)
+    await db.commit()
+    await db.refresh(review)
     
     return review
 
@@ -105,8 +108,8 @@ async def list_manager_reviews(
     manager_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List performance reviews requiring manager action
@@ -127,10 +130,10 @@ async def list_manager_reviews(
             detail="Not authorized to view these reviews"
         )
     
-    reviews = db.query(PerformanceReview).filter(
+    reviews = (await db.scalars(select(PerformanceReview).where(
         PerformanceReview.reviewer_id == manager_id,
         PerformanceReview.status == "PENDING"
-    ).offset(skip).limit(limit).all()
+    ).offset(skip).limit(limit))).all()
     
     return reviews
 
@@ -138,15 +141,20 @@ async def list_manager_reviews(
 # Training Course endpoints
 @router.get("/training/courses", response_model=List[TrainingCourseResponse])
 async def list_training_courses(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """List available training courses"""
-    courses = db.query(TrainingCourse).filter(
-        TrainingCourse.is_active == True
-    ).offset(skip).limit(limit).all()
+    keys = (TrainingCourse.created_at, TrainingCourse.id)
+    courses = (await db.scalars(paginate(
+        db, select(TrainingCourse).where(TrainingCourse.is_active == True),
+        keys, cursor, skip, limit, descending=False
+    ))).all()
+    set_next_cursor(response, keys, courses, limit)
     
     return courses
 
@@ -154,8 +162,8 @@ async def list_training_courses(
 @router.post("/training/courses", response_model=TrainingCourseResponse, status_code=status.HTTP_201_CREATED)
 async def create_training_course(
     course_data: dict,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new training course
@@ -164,8 +172,8 @@ async def create_training_course(
     """
     course = TrainingCourse(**course_data)
     db.add(course)
-    db.commit()
-    db.refresh(course)
+    await db.commit()
+    await db.refresh(course)
     
     return course
 
@@ -173,8 +181,8 @@ async def create_training_course(
 @router.post("/training/enrollments", response_model=EnrollmentResponse, status_code=status.HTTP_201_CREATED)
 async def enroll_in_course(
     enrollment_data: EnrollmentCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Enroll an employee in a training course
@@ -183,10 +191,10 @@ async def enroll_in_course(
     - HR_ADMIN can enroll any employee
     """
     # Verify course exists
-    course = db.query(TrainingCourse).filter(
+    course = await db.scalar(select(TrainingCourse).where(
         TrainingCourse.id == enrollment_data.course_id,
         TrainingCourse.is_active == True
-    ).first()
+    ))
     
     if not course:
         raise HTTPException(
@@ -203,10 +211,10 @@ async def enroll_in_course(
             )
     
     # Check if already enrolled
-    existing = db.query(TrainingEnrollment).filter(
+    existing = await db.scalar(select(TrainingEnrollment).where(
         TrainingEnrollment.employee_id == enrollment_data.employee_id,
         TrainingEnrollment.course_id == enrollment_data.course_id
-    ).first()
+    ))
     
     if existing:
         raise HTTPException(
@@ -217,19 +225,21 @@ async def enroll_in_course(
     # Create enrollment
     enrollment = TrainingEnrollment(**enrollment_data.model_dump())
     db.add(enrollment)
-    db.commit()
-    db.refresh(enrollment)
+    await db.commit()
+    await db.refresh(enrollment)
     
     return enrollment
 
 
 @router.get("/training/enrollments/{employee_id}", response_model=List[EnrollmentResponse])
 async def list_employee_enrollments(
+    response: Response,
     employee_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List employee training enrollments
@@ -245,8 +255,11 @@ async def list_employee_enrollments(
                 detail="Not authorized to view these enrollments"
             )
     
-    enrollments = db.query(TrainingEnrollment).filter(
-        TrainingEnrollment.employee_id == employee_id
-    ).offset(skip).limit(limit).all()
+    keys = (TrainingEnrollment.created_at, TrainingEnrollment.id)
+    enrollments = (await db.scalars(paginate(
+        db, select(TrainingEnrollment).where(TrainingEnrollment.employee_id == employee_id),
+        keys, cursor, skip, limit, descending=False
+    ))).all()
+    set_next_cursor(response, keys, enrollments, limit)
     
     return enrollments
@@ -1,86 +1,56 @@
 """Reports and Analytics API endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime, date as date_type, timedelta
-from io import BytesIO
-import csv
-import openpyxl
 
 from app.database import get_db
 from app.schemas import (
     HeadcountReportResponse, TurnoverReportResponse,
-    LeaveUtilizationReportResponse, AbsenteeismReportResponse
+    LeaveUtilizationReportResponse, AbsenteeismReportResponse,
+    AttendanceHoursReportResponse, LatenessReportResponse
 )
 from app.models import (
-    Employee, LeaveRequest, AttendanceRecord, Department, Position,
-    User, RoleType, EmploymentStatus, AttendanceStatus
+    Employee, LeaveRequest,
+    RoleType, EmploymentStatus
 )
 from app.auth.dependencies import get_current_user, require_hr_admin, require_executive
+from app.auth.principal_cache import Principal
+from app.services import attendance_rollups, exports, headcount
 
 router = APIRouter()
 
 
 @router.get("/headcount", response_model=HeadcountReportResponse)
 async def generate_headcount_report(
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    as_of: Optional[date_type] = Query(None, description="Report headcount as of this date"),
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate employee headcount report
     
     - Only accessible by HR_ADMIN and EXECUTIVE
+    - Served from the headcount snapshot table; pass as_of for history
     """
-    # Total employees
-    total_employees = db.query(Employee).count()
-    
-    # Active employees
-    active_employees = db.query(Employee).filter(
-        Employee.employment_status == EmploymentStatus.ACTIVE
-    ).count()
-    
-    # Inactive employees
-    inactive_employees = db.query(Employee).filter(
-        Employee.employment_status != EmploymentStatus.ACTIVE
-    ).count()
-    
-    # By department
-    by_department = {}
-    dept_counts = db.query(
-        Department.name,
-        func.count(Employee.id)
-    ).join(Employee, Department.id == Employee.department_id).group_by(Department.name).all()
-    
-    for dept_name, count in dept_counts:
-        by_department[dept_name] = count
-    
-    # By position
-    by_position = {}
-    pos_counts = db.query(
-        Position.title,
-        func.count(Employee.id)
-    ).join(Employee, Position.id == Employee.position_id).group_by(Position.title).all()
-    
-    for pos_title, count in pos_counts:
-        by_position[pos_title] = count
+    report = await db.run_sync(headcount.get_headcount_report, as_of)
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No headcount snapshot on or before the requested date"
+        )
     
-    return {
-        "total_employees": total_employees,
-        "active_employees": active_employees,
-        "inactive_employees": inactive_employees,
-        "by_department": by_department,
-        "by_position": by_position
-    }
+    return report
 
 
 @router.get("/turnover", response_model=TurnoverReportResponse)
 async def generate_turnover_report(
     period_start: date_type = Query(...),
     period_end: date_type = Query(...),
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Calculate employee turnover rate for a period
@@ -88,26 +58,26 @@ async def generate_turnover_report(
     - Only accessible by HR_ADMIN and EXECUTIVE
     """
     # Beginning headcount (active at period start)
-    beginning_headcount = db.query(Employee).filter(
+    beginning_headcount = await db.scalar(select(func.count(Employee.id)).where(
         and_(
             Employee.hire_date < period_start,
             Employee.employment_status == EmploymentStatus.ACTIVE
         )
-    ).count()
+    ))
     
     # Ending headcount (active at period end)
-    ending_headcount = db.query(Employee).filter(
+    ending_headcount = await db.scalar(select(func.count(Employee.id)).where(
         Employee.employment_status == EmploymentStatus.ACTIVE
-    ).count()
+    ))
     
     # Terminations during period
-    terminations = db.query(Employee).filter(
+    terminations = await db.scalar(select(func.count(Employee.id)).where(
         and_(
             Employee.employment_status == EmploymentStatus.TERMINATED,
             Employee.updated_at >= period_start,
             Employee.updated_at <= period_end
         )
-    ).count()
+    ))
     
     # Calculate turnover rate
     avg_headcount = (beginning_headcount + ending_headcount) / 2 if beginning_headcount + ending_headcount > 0 else 1
@@ -126,8 +96,8 @@ async def generate_turnover_report(
 @router.get("/leave-utilization", response_model=LeaveUtilizationReportResponse)
 async def generate_leave_utilization_report(
     year: Optional[int] = None,
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Summarize leave utilization
@@ -138,32 +108,32 @@ async def generate_leave_utilization_report(
         year = datetime.now().year
     
     # Total active employees
-    total_employees = db.query(Employee).filter(
+    total_employees = await db.scalar(select(func.count(Employee.id)).where(
         Employee.employment_status == EmploymentStatus.ACTIVE
-    ).count()
+    ))
     
     # Total leave days taken
-    total_leave_days = db.query(func.sum(LeaveRequest.total_days)).filter(
+    total_leave_days = await db.scalar(select(func.sum(LeaveRequest.total_days)).where(
         and_(
             LeaveRequest.status == "APPROVED",
             func.extract('year', LeaveRequest.start_date) == year
         )
-    ).scalar() or 0
+    )) or 0
     
     # Average per employee
     average_per_employee = float(total_leave_days) / total_employees if total_employees > 0 else 0
     
     # By leave type
     by_leave_type = {}
-    leave_type_data = db.query(
+    leave_type_data = (await db.execute(select(
         LeaveRequest.leave_type_id,
         func.sum(LeaveRequest.total_days)
-    ).filter(
+    ).where(
         and_(
             LeaveRequest.status == "APPROVED",
             func.extract('year', LeaveRequest.start_date) == year
         )
-    ).group_by(LeaveRequest.leave_type_id).all()
+    ).group_by(LeaveRequest.leave_type_id))).all()
     
     for leave_type_id, days in leave_type_data:
         by_leave_type[f"leave_type_{leave_type_id}"] = float(days)
@@ -180,118 +150,86 @@ async def generate_leave_utilization_report(
 async def generate_absenteeism_report(
     period_start: date_type = Query(...),
     period_end: date_type = Query(...),
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Calculate absenteeism rate
     
     - Only accessible by HR_ADMIN
+    - Absences come from the daily attendance rollups; workdays come from
+      the business calendar (weekends and each location's holidays excluded)
     """
-    # Calculate total workdays in period
-    delta = period_end - period_start
-    total_days = delta.days + 1
-    
-    # Exclude weekends (rough estimate)
-    total_workdays = total_days * 5 // 7
-    
-    # Count absences
-    total_absences = db.query(AttendanceRecord).filter(
-        and_(
-            AttendanceRecord.date >= period_start,
-            AttendanceRecord.date <= period_end,
-            AttendanceRecord.status == AttendanceStatus.ABSENT
-        )
-    ).count()
-    
-    # Calculate absenteeism rate
-    active_employees = db.query(Employee).filter(
-        Employee.employment_status == EmploymentStatus.ACTIVE
-    ).count()
+    return await db.run_sync(attendance_rollups.get_absenteeism_report, period_start, period_end)
+
+
+@router.get("/attendance-hours", response_model=AttendanceHoursReportResponse)
+async def generate_attendance_hours_report(
+    period_start: date_type = Query(...),
+    period_end: date_type = Query(...),
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Summarize hours worked, overall and per department
     
-    total_possible_workdays = total_workdays * active_employees
-    absenteeism_rate = (total_absences / total_possible_workdays * 100) if total_possible_workdays > 0 else 0
+    - Only accessible by HR_ADMIN
+    - Served from the daily attendance rollups
+    """
+    return await db.run_sync(attendance_rollups.get_hours_report, period_start, period_end)
+
+
+@router.get("/lateness", response_model=LatenessReportResponse)
+async def generate_lateness_report(
+    period_start: date_type = Query(...),
+    period_end: date_type = Query(...),
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Calculate late arrival rates, overall and per department
     
-    return {
-        "period_start": period_start,
-        "period_end": period_end,
-        "total_workdays": total_workdays,
-        "total_absences": total_absences,
-        "absenteeism_rate": round(absenteeism_rate, 2)
-    }
+    - Only accessible by HR_ADMIN
+    - Served from the daily attendance rollups; the rate is late arrivals
+      over attended (non-absent) records
+    """
+    return await db.run_sync(attendance_rollups.get_lateness_report, period_start, period_end)
 
 
 @router.get("/export/{report_type}")
 async def export_report(
     report_type: str,
     format: str = Query("csv", pattern="^(csv|excel)$"),
-    current_user: User = Depends(require_hr_admin),
-    db: Session = Depends(get_db)
+    period_start: Optional[date_type] = Query(None),
+    period_end: Optional[date_type] = Query(None),
+    current_user: Principal = Depends(require_hr_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Export report data in CSV or Excel format
     
     - Only accessible by HR_ADMIN
+    - period_start/period_end filter the leave and attendance exports
+    - Rows are streamed from the database; memory use does not grow with the export
     """
-    if report_type not in ["headcount", "employees", "leave", "attendance"]:
+    spec = exports.EXPORTS.get(report_type)
+    if spec is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid report type"
         )
     
-    # Generate data based on report type
-    if report_type == "employees":
-        employees = db.query(Employee).all()
-        data = [
-            {
-                "Employee Number": emp.employee_number,
-                "Name": f"{emp.first_name} {emp.last_name}",
-                "Email": emp.email,
-                "Department": emp.department.name if emp.department else "",
-                "Position": emp.position.title if emp.position else "",
-                "Status": emp.employment_status.value
-            }
-            for emp in employees
-        ]
-    else:
-        data = [{"message": "Report type not implemented yet"}]
-    
     # Export as CSV
     if format == "csv":
-        output = BytesIO()
-        if data:
-            writer = csv.DictWriter(output, fieldnames=data[0].keys())
-            writer.writeheader()
-            writer.writerows(data)
-        
-        output.seek(0)
         return StreamingResponse(
-            output,
+            exports.stream_csv(db.bind, spec, period_start, period_end),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={report_type}_report.csv"}
         )
     
     # Export as Excel
-    elif format == "excel":
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = report_type.capitalize()
-        
-        if data:
-            # Write headers
-            headers = list(data[0].keys())
-            sheet.append(headers)
-            
-            # Write data
-            for row in data:
-                sheet.append(list(row.values()))
-        
-        output = BytesIO()
-        workbook.save(output)
-        output.seek(0)
-        
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={report_type}_report.xlsx"}
-        )
+    return StreamingResponse(
+        exports.stream_xlsx(db.bind, spec, report_type.capitalize(), period_start, period_end),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename={report_type}_report.xlsx"}
+    )
@@ -1,6 +1,6 @@
 """Webhook endpoints for external integrations"""
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from app.database import get_db
@@ -26,7 +26,7 @@ def verify_webhook_key(x_api_key: str = Header(...)):
 async def receive_payroll_status(
     webhook_data: PayrollStatusWebhook,
     verified: bool = Depends(verify_webhook_key),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Receive payroll status update from external payroll system
@@ -35,7 +35,7 @@ async def receive_payroll_status(
     - Updates payroll run status based on external processing result
     """
     # Find payroll run
-    payroll_run = db.query(PayrollRun).filter(PayrollRun.id == webhook_data.run_id).first()
+    payroll_run = await db.get(PayrollRun, webhook_data.run_id)
     
     if not payroll_run:
         raise HTTPException(
@@ -49,7 +49,7 @@ async def receive_payroll_status(
     elif webhook_data.status == "failure":
         payroll_run.status = PayrollStatus.FAILED
     
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Payroll status updated successfully",
@@ -62,7 +62,7 @@ async def receive_payroll_status(
 async def receive_calendar_sync(
     webhook_data: CalendarSyncWebhook,
     verified: bool = Depends(verify_webhook_key),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Receive calendar sync confirmation from external calendar service
@@ -71,9 +71,7 @@ async def receive_calendar_sync(
     - Confirms that leave has been synced to external calendar
     """
     # Find leave request
-    leave_request = db.query(LeaveRequest).filter(
-        LeaveRequest.id == webhook_data.leave_request_id
-    ).first()
+    leave_request = await db.get(LeaveRequest, webhook_data.leave_request_id)
     
     if not leave_request:
         raise HTTPException(
@@ -103,7 +101,7 @@ async def receive_calendar_sync(
 async def receive_external_event(
     event_data: dict,
     verified: bool = Depends(verify_webhook_key),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generic webhook endpoint for receiving external events
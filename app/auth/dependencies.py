@@ -1,10 +1,12 @@
 """Dependency functions for route authentication and authorization"""
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.database import get_db
 from app.auth.jwt import decode_token
+from app.auth.principal_cache import Principal, principal_cache
 from app.models import User, RoleType
 
 security = HTTPBearer()
@@ -12,9 +14,13 @@ security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get currently authenticated user from JWT token"""
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Get currently authenticated principal from JWT token
+    
+    The principal (id, role, employee_id, is_active) is served from the
+    principal cache; the users table is only read on a cache miss.
+    """
     token = credentials.credentials
     payload = decode_token(token)
     
@@ -26,26 +32,54 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
+    principal = await principal_cache.get(int(user_id))
+    if principal is None:
+        generation = await principal_cache.generation(int(user_id))
+        row = (await db.execute(
+            select(User.id, User.role, User.employee_id, User.is_active)
+            .where(User.id == int(user_id))
+        )).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal = Principal(
+            id=row.id,
+            role=row.role,
+            employee_id=row.employee_id,
+            is_active=bool(row.is_active)
         )
+        await principal_cache.set(principal, generation)
     
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Inactive user"
         )
     
+    return principal
+
+
+async def get_current_user_record(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Load the full users row for handlers that need more than the principal"""
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """Ensure user is active"""
     if not current_user.is_active:
         raise HTTPException(
@@ -61,7 +95,7 @@ class RoleChecker:
     def __init__(self, allowed_roles: List[RoleType]):
         self.allowed_roles = allowed_roles
     
-    def __call__(self, current_user: User = Depends(get_current_user)) -> User:
+    def __call__(self, current_user: Principal = Depends(get_current_user)) -> Principal:
         if current_user.role not in self.allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
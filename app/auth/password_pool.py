@@ -0,0 +1,82 @@
+"""Bounded worker pool for bcrypt password hashing
+
+bcrypt is deliberately slow (~250ms of CPU at 12 rounds). Running it inline in
+an ``async def`` handler freezes the event loop for every other request on the
+worker, so hashing and verification are pushed to a dedicated executor.
+
+The pool admits at most ``PASSWORD_HASH_MAX_PENDING`` jobs (running + queued).
+Beyond that, callers get a 503 with ``Retry-After`` instead of piling up behind
+a queue that would time out anyway.
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from app.auth.jwt import get_password_hash, verify_password
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashPool:
+    """Executor plus admission control for password hashing jobs"""
+
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                # bcrypt releases the GIL while hashing, so threads scale across cores
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` in the pool, rejecting the call if the pool is saturated"""
+        if self.pending >= self.max_pending:
+            logger.warning(f"Password hash pool saturated ({self.pending} pending)")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service busy, please retry",
+                headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordHashPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash without blocking the event loop"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await password_pool.run(get_password_hash, password, settings.BCRYPT_ROUNDS)
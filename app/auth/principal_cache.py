@@ -0,0 +1,276 @@
+"""Cache of authenticated principals used by get_current_user
+
+Every authenticated request needs the caller's role and employee link, but
+not the full ``users`` row. Principals are cached in two tiers:
+
+- an in-process LRU with a very short TTL, so a burst of requests from the
+  same user costs no network round trip at all;
+- Redis with a longer TTL, shared by every API worker.
+
+Writes to ``users`` (password change, deactivation, role change) invalidate
+both tiers once the transaction commits. Other workers may serve their local
+copy for at most ``PRINCIPAL_CACHE_LOCAL_TTL_SECONDS`` after that.
+
+Invalidation also bumps a per-user generation counter, locally and in Redis.
+A cache miss reads the counters before loading the users row and only stores
+the principal if they have not moved, so a load that raced with a commit does
+not re-cache the pre-commit row.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import RoleType, User
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Generation counters only need to outlive the loads that read them
+GENERATION_TTL_SECONDS = 24 * 3600
+
+# KEYS: principal, generation counter
+# ARGV: generation read before the load, principal JSON, ttl
+# Returns 1 if the principal was stored, 0 if it was invalidated meanwhile
+_SET_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then return 0 end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, as needed for authorization decisions"""
+    id: int
+    role: RoleType
+    employee_id: Optional[int]
+    is_active: bool
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "id": self.id,
+            "role": self.role.value,
+            "employee_id": self.employee_id,
+            "is_active": self.is_active,
+        })
+
+    @classmethod
+    def from_json(cls, raw) -> "Principal":
+        data = json.loads(raw)
+        return cls(
+            id=data["id"],
+            role=RoleType(data["role"]),
+            employee_id=data["employee_id"],
+            is_active=data["is_active"],
+        )
+
+
+class PrincipalCache:
+    """Two-tier (local LRU + Redis) principal cache"""
+
+    KEY_PREFIX = "hrms:principal:"
+    GENERATION_PREFIX = "hrms:principal-generation:"
+
+    def __init__(self):
+        self._local: "OrderedDict[int, tuple]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._redis: Optional[aioredis.Redis] = None
+        self._set_script = None
+        self._sync_redis: Optional[redis.Redis] = None
+        self._redis_down_until = 0.0
+        self._background_tasks = set()
+
+    # Local tier
+    def _local_get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return principal
+
+    def _local_set(self, principal: Principal, generation: Optional[int] = None) -> bool:
+        with self._lock:
+            if generation is not None and self._generations.get(principal.id, 0) != generation:
+                return False
+            self._local[principal.id] = (
+                time.monotonic() + settings.PRINCIPAL_CACHE_LOCAL_TTL_SECONDS,
+                principal,
+            )
+            self._local.move_to_end(principal.id)
+            while len(self._local) > settings.PRINCIPAL_CACHE_MAX_ENTRIES:
+                self._local.popitem(last=False)
+            return True
+
+    # Redis tier
+    def _redis_available(self) -> bool:
+        return settings.PRINCIPAL_CACHE_REDIS_ENABLED and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: Exception):
+        # Back off instead of paying a connection timeout on every request
+        logger.warning(f"Principal cache Redis unavailable, using local cache only: {error}")
+        self._redis_down_until = time.monotonic() + settings.PRINCIPAL_CACHE_REDIS_RETRY_SECONDS
+
+    def _get_redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.Redis(**settings.redis_connection_kwargs)
+            self._set_script = self._redis.register_script(_SET_SCRIPT)
+        return self._redis
+
+    def _get_sync_redis(self) -> redis.Redis:
+        if self._sync_redis is None:
+            self._sync_redis = redis.Redis(**settings.redis_connection_kwargs)
+        return self._sync_redis
+
+    async def get(self, user_id: int) -> Optional[Principal]:
+        """Return the cached principal for ``user_id`` or None on a miss"""
+        principal = self._local_get(user_id)
+        if principal is not None or not self._redis_available():
+            return principal
+        try:
+            raw = await self._get_redis().get(f"{self.KEY_PREFIX}{user_id}")
+        except (redis.RedisError, OSError) as e:
+            self._redis_failed(e)
+            return None
+        if raw is None:
+            return None
+        principal = Principal.from_json(raw)
+        self._local_set(principal)
+        return principal
+
+    async def generation(self, user_id: int) -> Tuple[int, Optional[int]]:
+        """Read the invalidation counters of ``user_id`` before loading its row
+
+        Pass the result to ``set``. The Redis counter is None when Redis could
+        not be read; the principal is then only cached locally.
+        """
+        local = self._generations.get(user_id, 0)
+        if not self._redis_available():
+            return local, None
+        try:
+            remote = await self._get_redis().get(f"{self.GENERATION_PREFIX}{user_id}")
+        except (redis.RedisError, OSError) as e:
+            self._redis_failed(e)
+            return local, None
+        return local, int(remote or 0)
+
+    async def set(self, principal: Principal, generation: Tuple[int, Optional[int]]):
+        """Store a freshly loaded principal in both tiers
+
+        Nothing is stored if the principal was invalidated since
+        ``generation`` was read.
+        """
+        local, remote = generation
+        if not self._local_set(principal, local):
+            return
+        if remote is None or not self._redis_available():
+            return
+        self._get_redis()
+        try:
+            stored = await self._set_script(
+                keys=[f"{self.KEY_PREFIX}{principal.id}", f"{self.GENERATION_PREFIX}{principal.id}"],
+                args=[remote, principal.to_json(), settings.PRINCIPAL_CACHE_TTL_SECONDS],
+            )
+        except (redis.RedisError, OSError) as e:
+            self._redis_failed(e)
+            return
+        if not stored:
+            # Another worker invalidated the principal during the load
+            with self._lock:
+                self._local.pop(principal.id, None)
+
+    def _queue_invalidation(self, pipe, user_ids: list):
+        for user_id in user_ids:
+            pipe.incr(f"{self.GENERATION_PREFIX}{user_id}")
+            pipe.expire(f"{self.GENERATION_PREFIX}{user_id}", GENERATION_TTL_SECONDS)
+        pipe.delete(*(f"{self.KEY_PREFIX}{user_id}" for user_id in user_ids))
+
+    async def _redis_invalidate(self, user_ids: list):
+        try:
+            async with self._get_redis().pipeline() as pipe:
+                self._queue_invalidation(pipe, user_ids)
+                await pipe.execute()
+        except (redis.RedisError, OSError) as e:
+            self._redis_failed(e)
+
+    def invalidate(self, *user_ids: int):
+        """Drop principals from both tiers
+
+        Safe to call from sync code (Celery tasks, scripts) and from inside the
+        event loop; in the latter case the Redis update is scheduled on the loop.
+        Redis is tried even while backing off after a failure, since a stale
+        entry left there would be served by every worker.
+        """
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        if not user_ids or not settings.PRINCIPAL_CACHE_REDIS_ENABLED:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            task = loop.create_task(self._redis_invalidate(list(user_ids)))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            return
+        try:
+            with self._get_sync_redis().pipeline() as pipe:
+                self._queue_invalidation(pipe, list(user_ids))
+                pipe.execute()
+        except (redis.RedisError, OSError) as e:
+            self._redis_failed(e)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+# Invalidate cached principals whenever a users row is updated or deleted.
+# Ids are collected at flush time and only dropped after the commit, so a
+# concurrent request cannot re-cache the pre-commit row.
+_PENDING_KEY = "invalidated_principals"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = {
+        obj.id for obj in session.dirty
+        if isinstance(obj, User) and session.is_modified(obj, include_collections=False)
+    }
+    changed.update(obj.id for obj in session.deleted if isinstance(obj, User))
+    if changed:
+        session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        principal_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,14 +1,55 @@
 """Database configuration and session management"""
-from sqlalchemy import create_engine
+import os
+from typing import AsyncIterator
+from sqlalchemy import create_engine, insert, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import get_settings
 import logging
 from sqlalchemy.exc import OperationalError
 
 settings = get_settings()
 
-# Create database engine
+# Migration scripts, used to stamp databases created by init_db()
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic")
+
+# Async driver to use for each backend configured in DATABASE_URL
+ASYNC_DRIVERS = {
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Translate a sync DATABASE_URL into the equivalent async-driver URL"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    return url.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+
+def _pool_options(database_url: str) -> dict:
+    """Pool sizing for the engine
+
+    aiosqlite defaults to NullPool for database files, which opens a
+    connection (and its worker thread) per checkout; pool those too. In-memory
+    databases keep the driver's default.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return {}
+        return {"poolclass": AsyncAdaptedQueuePool, "pool_size": 10, "max_overflow": 20}
+    return {"pool_size": 10, "max_overflow": 20}
+
+
+# Create database engine (used by Celery tasks and maintenance scripts)
 engine = create_engine(
     settings.DATABASE_URL,
     echo=settings.DB_ECHO,
@@ -17,29 +58,60 @@ engine = create_engine(
     max_overflow=20
 )
 
-# Create session factory
+# Create async database engine (used by the API request handlers)
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or get_async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=settings.DB_ECHO,
+    pool_pre_ping=True,
+    **_pool_options(ASYNC_DATABASE_URL)
+)
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # Create base class for models
 Base = declarative_base()
 
 
-def get_db() -> Session:
-    """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+def insert_ignore(table):
+    """INSERT that skips rows colliding with a unique key (MySQL and SQLite)"""
+    return (
+        insert(table)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 def init_db():
-    """Initialize database tables"""
+    """Create the tables of an empty database and stamp it at the latest migration
+
+    A database that already has tables is left alone: its schema may be from
+    an older revision, so upgrade it with ``alembic upgrade head`` instead.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    log = logging.getLogger("app.database")
     try:
-        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            if inspect(connection).get_table_names():
+                log.info("Database already has tables; run `alembic upgrade head` to migrate it")
+                return
+            Base.metadata.create_all(bind=connection)
+            MigrationContext.configure(connection).stamp(ScriptDirectory(ALEMBIC_DIR), "head")
     except OperationalError as e:
-        # Log a clear warning and continue; this allows the app to start in
-        # developer environments where Postgres may not be running.
-        logging.getLogger("app.database").warning(
-            "Could not initialize database (is the DB running?): %s", e
-        )
+        # Log a clear warning and continue; this allows scripts to run in
+        # developer environments where the database may not be running.
+        log.warning("Could not initialize database (is the DB running?): %s", e)
@@ -3,7 +3,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.config import get_settings
-from app.database import init_db
+from app.database import async_engine
+from app.auth.password_pool import password_pool
 import logging
 
 # Import routers
@@ -48,6 +49,7 @@ app.add_middleware(
     allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -89,8 +91,6 @@ async def global_exception_handler(request, exc):
 async def startup_event():
     """Initialize application on startup"""
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
-    init_db()
-    logger.info("Database initialized")
 
 
 # Shutdown event
@@ -98,6 +98,8 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info(f"Shutting down {settings.APP_NAME}")
+    await async_engine.dispose()
+    password_pool.shutdown()
 
 
 if __name__ == "__main__":
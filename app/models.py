@@ -1,10 +1,10 @@
 """SQLAlchemy database models for HRMS"""
 from sqlalchemy import (
     Column, Integer, String, Boolean, DateTime, Date, Float, 
-    ForeignKey, Text, Enum as SQLEnum, JSON, DECIMAL
+    ForeignKey, Text, Enum as SQLEnum, JSON, DECIMAL, UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from datetime import datetime
 from enum import Enum
 from app.database import Base
@@ -32,6 +32,12 @@ class LeaveRequestStatus(str, Enum):
     CANCELLED = "CANCELLED"
 
 
+class LeaveLedgerEntryType(str, Enum):
+    ACCRUAL = "ACCRUAL"
+    DEBIT = "DEBIT"
+    CREDIT = "CREDIT"
+
+
 class AttendanceStatus(str, Enum):
     PRESENT = "PRESENT"
     ABSENT = "ABSENT"
@@ -83,7 +89,8 @@ class Employee(Base):
     employment_status = Column(SQLEnum(EmploymentStatus), default=EmploymentStatus.ACTIVE)
     department_id = Column(Integer, ForeignKey("departments.id"))
     position_id = Column(Integer, ForeignKey("positions.id"))
-    manager_id = Column(Integer, ForeignKey("employees.id"), nullable=True)
+    manager_id = Column(Integer, ForeignKey("employees.id"), nullable=True, index=True)
+    shift_id = Column(Integer, ForeignKey("shifts.id"), nullable=True)  # assigned shift, if any
     
     # Compensation
     salary = Column(DECIMAL(10, 2))
@@ -148,6 +155,7 @@ class EmployeeDocument(Base):
     file_name = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer)
+    content_sha256 = Column(String(64), index=True)  # hex digest of the stored bytes: blob key and download ETag
     description = Column(Text)
     uploaded_by = Column(Integer, ForeignKey("users.id"))
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -156,6 +164,18 @@ class EmployeeDocument(Base):
     employee = relationship("Employee", back_populates="documents")
 
 
+class DocumentBlob(Base):
+    """Content-addressed document file, shared by every EmployeeDocument with the same bytes"""
+    __tablename__ = "document_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    size = Column(Integer)
+    ref_count = Column(Integer, nullable=False, default=0)  # employee_documents rows with this content_sha256
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    unreferenced_at = Column(DateTime(timezone=True), index=True)  # when ref_count last dropped to 0
+
+
 class LeaveType(Base):
     """Leave type definitions"""
     __tablename__ = "leave_types"
@@ -176,11 +196,18 @@ class LeaveType(Base):
 
 
 class LeaveBalance(Base):
-    """Employee leave balance tracking"""
+    """Employee leave balance tracking
+
+    Materialized totals of the leave ledger; change them only through
+    app.services.leave_ledger so that both stay in step.
+    """
     __tablename__ = "leave_balances"
+    __table_args__ = (
+        UniqueConstraint("employee_id", "leave_type_id", "year", name="uq_leave_balance_employee_type_year"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
     leave_type_id = Column(Integer, ForeignKey("leave_types.id"), nullable=False, index=True)
     year = Column(Integer, nullable=False, index=True)
     total_days = Column(Float, default=0)
@@ -193,12 +220,53 @@ class LeaveBalance(Base):
     leave_type = relationship("LeaveType", back_populates="leave_balances")
 
 
+class LeaveLedgerEntry(Base):
+    """Append-only leave balance movements; leave_balances holds their totals"""
+    __tablename__ = "leave_ledger_entries"
+    __table_args__ = (
+        Index("ix_leave_ledger_entries_balance", "employee_id", "leave_type_id", "year"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    leave_type_id = Column(Integer, ForeignKey("leave_types.id"), nullable=False, index=True)
+    year = Column(Integer, nullable=False)
+    entry_type = Column(SQLEnum(LeaveLedgerEntryType), nullable=False)
+    days = Column(Float, nullable=False)
+    leave_request_id = Column(Integer, ForeignKey("leave_requests.id"), nullable=True, index=True)
+    idempotency_key = Column(String(100), unique=True, nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LeaveAccrualRun(Base):
+    """Progress of one month's leave accrual (employees are processed in id order)"""
+    __tablename__ = "leave_accrual_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(7), unique=True, nullable=False)  # YYYY-MM
+    status = Column(String(20), nullable=False, default="running")
+    last_employee_id = Column(Integer, nullable=False, default=0)
+    entries_posted = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class LeaveRequest(Base):
     """Leave request submissions"""
     __tablename__ = "leave_requests"
+    __table_args__ = (
+        Index("ix_leave_requests_employee_status_created", "employee_id", "status", "created_at"),
+        # Approval queues only ever look at pending requests
+        Index(
+            "ix_leave_requests_pending", "employee_id", "created_at",
+            sqlite_where=text("status = 'PENDING'"),
+            postgresql_where=text("status = 'PENDING'")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
     leave_type_id = Column(Integer, ForeignKey("leave_types.id"), nullable=False, index=True)
     start_date = Column(Date, nullable=False, index=True)
     end_date = Column(Date, nullable=False)
@@ -216,6 +284,34 @@ class LeaveRequest(Base):
     leave_type = relationship("LeaveType", back_populates="leave_requests")
 
 
+class CalendarSyncEvent(Base):
+    """Outbox of leave decisions waiting to be sent to the calendar service"""
+    __tablename__ = "calendar_sync_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    leave_request_id = Column(Integer, ForeignKey("leave_requests.id"), nullable=False, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    status = Column(String(20), nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class CalendarSyncDeadLetter(Base):
+    """Calendar sync events given up on, kept for inspection and replay"""
+    __tablename__ = "calendar_sync_dead_letters"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    leave_request_id = Column(Integer, ForeignKey("leave_requests.id"), nullable=False, index=True)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(Text)
+    failed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class Shift(Base):
     """Work shift definitions"""
     __tablename__ = "shifts"
@@ -231,12 +327,30 @@ class Shift(Base):
     attendance_records = relationship("AttendanceRecord", back_populates="shift")
 
 
+class Holiday(Base):
+    """Public holidays; location NULL applies everywhere, otherwise it matches Department.location"""
+    __tablename__ = "holidays"
+    __table_args__ = (
+        UniqueConstraint("holiday_date", "location", name="uq_holiday_date_location"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    holiday_date = Column(Date, nullable=False, index=True)
+    name = Column(String(100), nullable=False)
+    location = Column(String(100), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class AttendanceRecord(Base):
     """Daily attendance records"""
     __tablename__ = "attendance_records"
+    __table_args__ = (
+        # Open-record lookup in clock-in/clock-out and per-employee date ranges
+        Index("ix_attendance_records_employee_date_clock_out", "employee_id", "date", "clock_out"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
     shift_id = Column(Integer, ForeignKey("shifts.id"), nullable=True, index=True)
     date = Column(Date, nullable=False, index=True)
     clock_in = Column(DateTime(timezone=True))
@@ -270,11 +384,42 @@ class PayrollRun(Base):
     
     # Relationships
     payslips = relationship("Payslip", back_populates="payroll_run", cascade="all, delete-orphan")
+    shards = relationship(
+        "PayrollRunShard", back_populates="payroll_run", cascade="all, delete-orphan",
+        order_by="PayrollRunShard.shard_index"
+    )
+
+
+class PayrollRunShard(Base):
+    """Employee-id range of a payroll run processed by one worker task"""
+    __tablename__ = "payroll_run_shards"
+    __table_args__ = (
+        UniqueConstraint("payroll_run_id", "shard_index", name="uq_payroll_run_shard"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    payroll_run_id = Column(Integer, ForeignKey("payroll_runs.id"), nullable=False, index=True)
+    shard_index = Column(Integer, nullable=False)
+    min_employee_id = Column(Integer, nullable=False)
+    max_employee_id = Column(Integer, nullable=False)
+    status = Column(SQLEnum(PayrollStatus), default=PayrollStatus.PENDING, nullable=False)
+    payslip_count = Column(Integer, default=0)
+    total_amount = Column(DECIMAL(12, 2), default=0)
+    attempts = Column(Integer, default=0)
+    error = Column(Text)
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    
+    # Relationships
+    payroll_run = relationship("PayrollRun", back_populates="shards")
 
 
 class Payslip(Base):
     """Individual employee payslips"""
     __tablename__ = "payslips"
+    __table_args__ = (
+        Index("ix_payslips_employee_created", "employee_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
@@ -286,6 +431,7 @@ class Payslip(Base):
     net_salary = Column(DECIMAL(10, 2), nullable=False)
     currency = Column(String(10), default="USD")
     file_path = Column(String(500))
+    content_sha256 = Column(String(64))  # hex digest of the rendered PDF, the download ETag
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -357,3 +503,88 @@ class TrainingEnrollment(Base):
     
     # Relationships
     course = relationship("TrainingCourse", back_populates="enrollments")
+
+
+class HeadcountSnapshot(Base):
+    """Daily headcount per (department, position, status) bucket
+
+    The latest snapshot is kept current by Employee write hooks; earlier
+    dates are frozen history for as-of reporting. Unassigned department or
+    position is stored as 0 so the bucket key stays unique.
+    """
+    __tablename__ = "headcount_snapshots"
+    __table_args__ = (
+        UniqueConstraint(
+            "snapshot_date", "department_id", "position_id", "employment_status",
+            name="uq_headcount_snapshot_bucket"
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, nullable=False, index=True)
+    department_id = Column(Integer, nullable=False, default=0)
+    position_id = Column(Integer, nullable=False, default=0)
+    employment_status = Column(SQLEnum(EmploymentStatus), nullable=False)
+    headcount = Column(Integer, nullable=False, default=0)
+
+
+class AttendanceReminder(Base):
+    """Clock-in reminders sent, at most one per employee and day"""
+    __tablename__ = "attendance_reminders"
+    __table_args__ = (
+        UniqueConstraint("employee_id", "reminder_date", name="uq_attendance_reminder_employee_date"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    reminder_date = Column(Date, nullable=False, index=True)
+    run_id = Column(String(32))  # the reminder run that recorded it
+    sent_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AttendanceDailyRollup(Base):
+    """Per-(employee, day) attendance totals
+
+    Kept current by AttendanceRecord write hooks and the bulk punch path, and
+    rebuilt for recent days by the nightly reconciler. department_id is the
+    employee's department when the row was last computed (0 = unassigned).
+    """
+    __tablename__ = "attendance_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("employee_id", "day", name="uq_attendance_daily_rollup"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    department_id = Column(Integer, nullable=False, default=0)
+    present_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+    half_day_count = Column(Integer, nullable=False, default=0)
+    record_count = Column(Integer, nullable=False, default=0)
+    hours_worked = Column(Float, nullable=False, default=0)
+
+
+class DepartmentDailyRollup(Base):
+    """Per-(department, day) attendance totals, the sum of the employee rollups"""
+    __tablename__ = "department_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "department_id", name="uq_department_daily_rollup"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    department_id = Column(Integer, nullable=False, default=0)
+    present_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+    half_day_count = Column(Integer, nullable=False, default=0)
+    record_count = Column(Integer, nullable=False, default=0)
+    hours_worked = Column(Float, nullable=False, default=0)
+
+
+# Mapper hooks that keep derived tables (attendance rollups, headcount
+# snapshots, document blob counts) in step with their source rows. Imported
+# here so they are active wherever the models are: API, workers and scripts.
+from app.services import attendance_rollups, document_blobs, headcount  # noqa: E402,F401
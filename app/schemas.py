@@ -132,6 +132,7 @@ class EmployeeCreate(EmployeeBase):
     department_id: Optional[int] = None
     position_id: Optional[int] = None
     manager_id: Optional[int] = None
+    shift_id: Optional[int] = None
     salary: Optional[Decimal] = None
     currency: str = "USD"
 
@@ -148,6 +149,7 @@ class EmployeeUpdate(BaseModel):
     department_id: Optional[int] = None
     position_id: Optional[int] = None
     manager_id: Optional[int] = None
+    shift_id: Optional[int] = None
     salary: Optional[Decimal] = None
 
 
@@ -159,6 +161,7 @@ class EmployeeResponse(EmployeeBase, TimestampMixin):
     department_id: Optional[int] = None
     position_id: Optional[int] = None
     manager_id: Optional[int] = None
+    shift_id: Optional[int] = None
     salary: Optional[Decimal] = None
     currency: str
     
@@ -212,6 +215,25 @@ class LeaveTypeResponse(LeaveTypeBase):
         from_attributes = True
 
 
+# Holiday schemas
+class HolidayBase(BaseModel):
+    holiday_date: date
+    name: str
+    location: Optional[str] = None  # None = every location
+
+
+class HolidayCreate(HolidayBase):
+    pass
+
+
+class HolidayResponse(HolidayBase):
+    id: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
 # Leave Balance schemas
 class LeaveBalanceResponse(BaseModel):
     id: int
@@ -253,6 +275,24 @@ class LeaveRequestAction(BaseModel):
     comment: Optional[str] = None
 
 
+class LeaveRequestBulkAction(BaseModel):
+    request_ids: List[int] = Field(..., min_length=1)
+    action: str = Field(..., pattern="^(Approve|Reject)$")
+    comment: Optional[str] = None
+
+
+class LeaveRequestBulkResult(BaseModel):
+    id: int
+    status: str
+    detail: Optional[str] = None
+
+
+class LeaveRequestBulkActionResponse(BaseModel):
+    actioned: int
+    failed: int
+    results: List[LeaveRequestBulkResult]
+
+
 class LeaveRequestResponse(BaseModel):
     id: int
     employee_id: int
@@ -299,13 +339,43 @@ class AttendanceClockOut(BaseModel):
     employee_id: int
 
 
+class AttendancePunch(BaseModel):
+    employee_id: int
+    action: str = Field(..., pattern="^(clock_in|clock_out)$")
+    timestamp: datetime
+    geo_location: Optional[dict] = None
+
+
+class AttendancePunchBatch(BaseModel):
+    punches: List[AttendancePunch]
+
+
+class AttendancePunchResult(BaseModel):
+    index: int
+    employee_id: int
+    action: str
+    status: str
+    record_id: Optional[int] = None
+    detail: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class AttendancePunchBatchResponse(BaseModel):
+    accepted: int
+    duplicates: int
+    rejected: int
+    results: List[AttendancePunchResult]
+
+
 class AttendanceAdjustment(BaseModel):
     adjustment_reason: str
     proposed_time: datetime
 
 
 class AttendanceRecordResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None while a write-behind punch is not flushed
     employee_id: int
     shift_id: Optional[int] = None
     date: date
@@ -319,6 +389,7 @@ class AttendanceRecordResponse(BaseModel):
     reviewed_by: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+    pending: bool = False
     
     class Config:
         from_attributes = True
@@ -344,6 +415,26 @@ class PayrollRunResponse(BaseModel):
         from_attributes = True
 
 
+class PayrollRunShardResponse(BaseModel):
+    shard_index: int
+    min_employee_id: int
+    max_employee_id: int
+    status: PayrollStatus
+    payslip_count: int
+    total_amount: Decimal
+    attempts: int
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class PayrollRunDetailResponse(PayrollRunResponse):
+    shards: List[PayrollRunShardResponse] = []
+
+
 class PayslipResponse(BaseModel):
     id: int
     employee_id: int
@@ -455,6 +546,7 @@ class HeadcountReportResponse(BaseModel):
     inactive_employees: int
     by_department: dict
     by_position: dict
+    as_of: Optional[date] = None
 
 
 class TurnoverReportResponse(BaseModel):
@@ -481,6 +573,24 @@ class AbsenteeismReportResponse(BaseModel):
     absenteeism_rate: float
 
 
+class AttendanceHoursReportResponse(BaseModel):
+    period_start: date
+    period_end: date
+    total_hours: float
+    attendance_records: int
+    average_hours_per_record: float
+    by_department: dict
+
+
+class LatenessReportResponse(BaseModel):
+    period_start: date
+    period_end: date
+    late_arrivals: int
+    half_days: int
+    lateness_rate: float
+    by_department: dict
+
+
 # Webhook schemas
 class PayrollStatusWebhook(BaseModel):
     run_id: int
@@ -0,0 +1 @@
+"""Domain services shared by the API routers and Celery tasks"""
@@ -0,0 +1,252 @@
+"""Clock-in reminders for employees who have not clocked in
+
+``daily_attendance_reminder`` runs every ``ATTENDANCE_REMINDER_INTERVAL_MINUTES``
+during the day. Each run selects, in one anti-join over employees, the
+ACTIVE employees who:
+
+- are due: their assigned shift (``ATTENDANCE_REMINDER_DEFAULT_START`` if
+  they have none) started at least ``ATTENDANCE_REMINDER_GRACE_MINUTES`` ago;
+- have no attendance record today;
+- are not on approved leave overlapping today;
+- have not been reminded today;
+- are not on a holiday at their department's location.
+
+Nobody is reminded on weekends or company-wide holidays. Reminders are
+recorded in ``attendance_reminders`` before their emails are queued, each
+row stamped with the run's id. A run queues emails only for the rows it
+inserted itself, so overlapping or repeated runs never remind anyone twice.
+Emails are queued through ``send_email_notification``, one task per
+``ATTENDANCE_REMINDER_BATCH_SIZE`` employees. A token bucket spaces the
+tasks' countdowns so that the mail relay sees at most
+``ATTENDANCE_REMINDER_EMAILS_PER_SECOND``, while the run itself finishes in
+seconds. The bucket's state is kept in Redis, so back-to-back runs (and
+runs on different workers) share one budget.
+"""
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+from sqlalchemy import exists, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import insert_ignore
+from app.models import (
+    AttendanceRecord, AttendanceReminder, Department, Employee, EmploymentStatus,
+    LeaveRequest, LeaveRequestStatus, Shift
+)
+from app.services.business_calendar import business_calendar
+from app.services.shift_schedule import minute_of_day, parse_hhmm
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (to_email, subject, body) argument tuples of send_email_notification
+Email = Tuple[str, str, str]
+
+
+class TokenBucket:
+    """Paces work at ``rate`` units per second, with bursts of up to ``capacity``
+
+    ``reserve(n)`` takes ``n`` tokens and returns the number of seconds until
+    they are available. Callers schedule the work that far ahead rather than
+    sleeping.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def reserve(self, n: float) -> float:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= n
+        return max(0.0, -self.tokens / self.rate)
+
+
+# KEYS: bucket hash
+# ARGV: rate, capacity, tokens to take, current time (seconds)
+# Returns the seconds until the tokens are available, as a string
+_RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate) - tonumber(ARGV[3])
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(math.max(now, updated)))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return tostring(math.max(0, -tokens / rate))
+"""
+
+
+class SharedTokenBucket:
+    """A TokenBucket whose state lives in Redis under ``key``
+
+    Every run and worker reserving from the same key shares one budget. The
+    key expires once the bucket would be full again. While Redis is
+    unreachable, tokens come from a TokenBucket kept in this process.
+    """
+
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, key: str, rate: float, capacity: float, clock: Callable[[], float] = time.time):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._fallback = TokenBucket(rate, capacity)
+        self._redis: Optional[redis.Redis] = None
+        self._reserve_script = None
+        self._redis_down_until = 0.0
+
+    def _get_script(self):
+        if self._redis is None:
+            self._redis = redis.Redis(**settings.redis_connection_kwargs)
+            self._reserve_script = self._redis.register_script(_RESERVE_SCRIPT)
+        return self._reserve_script
+
+    def reserve(self, n: float) -> float:
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                return float(self._get_script()(
+                    keys=[self.key], args=[self.rate, self.capacity, n, self.clock()]
+                ))
+            except (redis.RedisError, OSError) as e:
+                logger.warning(f"Reminder rate limit Redis unavailable, pacing this worker only: {e}")
+                self._redis_down_until = time.monotonic() + self.REDIS_RETRY_SECONDS
+        return self._fallback.reserve(n)
+
+
+_buckets: Dict[Tuple[float, float], SharedTokenBucket] = {}
+
+
+def email_bucket() -> SharedTokenBucket:
+    """The bucket pacing reminder emails, for the current rate and batch size"""
+    rate, capacity = settings.ATTENDANCE_REMINDER_EMAILS_PER_SECOND, settings.ATTENDANCE_REMINDER_BATCH_SIZE
+    bucket = _buckets.get((rate, capacity))
+    if bucket is None:
+        bucket = _buckets[(rate, capacity)] = SharedTokenBucket(
+            "hrms:attendance_reminders:email_bucket", rate, capacity
+        )
+    return bucket
+
+
+def _queue_emails(emails: List[Email], countdown: float):
+    from app.tasks import send_email_notification
+    send_email_notification.chunks(emails, len(emails)).apply_async(countdown=countdown)
+
+
+def _due_shifts(db: Session, now: datetime):
+    """Condition on Employee.shift_id for employees whose shift started long enough ago"""
+    latest_start = minute_of_day(now) - settings.ATTENDANCE_REMINDER_GRACE_MINUTES
+    default_due = parse_hhmm(settings.ATTENDANCE_REMINDER_DEFAULT_START) <= latest_start
+    due, defaulted = [], []
+    for shift_id, start_time, is_active in db.execute(select(Shift.id, Shift.start_time, Shift.is_active)):
+        try:
+            start = parse_hhmm(start_time) if is_active else None
+        except ValueError:
+            start = None
+        if start is None:
+            defaulted.append(shift_id)  # inactive or unparseable: treated as no shift
+        elif start <= latest_start:
+            due.append(shift_id)
+    if default_due:
+        return or_(Employee.shift_id.is_(None), Employee.shift_id.in_(due + defaulted))
+    return Employee.shift_id.in_(due)
+
+
+def find_unclocked(db: Session, now: datetime) -> List[Tuple[int, str, str]]:
+    """(employee_id, email, first_name) of employees to remind as of ``now``"""
+    today = now.date()
+    calendar = business_calendar.get_sync(db)
+    if not calendar.is_workday(today):
+        return []
+    query = select(Employee.id, Employee.email, Employee.first_name).where(
+        Employee.employment_status == EmploymentStatus.ACTIVE,
+        Employee.hire_date <= today,
+        _due_shifts(db, now),
+        ~exists().where(AttendanceRecord.employee_id == Employee.id, AttendanceRecord.date == today),
+        ~exists().where(
+            LeaveRequest.employee_id == Employee.id,
+            LeaveRequest.status == LeaveRequestStatus.APPROVED,
+            LeaveRequest.start_date <= today,
+            LeaveRequest.end_date >= today
+        ),
+        ~exists().where(AttendanceReminder.employee_id == Employee.id, AttendanceReminder.reminder_date == today)
+    )
+    closed_locations = calendar.holiday_locations(today)
+    if closed_locations:
+        query = query.outerjoin(Department, Department.id == Employee.department_id).where(
+            or_(Department.location.is_(None), Department.location.notin_(closed_locations))
+        )
+    return db.execute(query.order_by(Employee.id)).all()
+
+
+def send_reminders(
+    db: Session,
+    now: Optional[datetime] = None,
+    queue: Callable[[List[Email], float], None] = _queue_emails
+) -> dict:
+    """Remind every employee who should have clocked in by ``now``; returns the run summary"""
+    started = time.perf_counter()
+    now = now or datetime.now()
+    today = now.date()
+    run_id = uuid.uuid4().hex
+    employees = find_unclocked(db, now)
+
+    batch_size = settings.ATTENDANCE_REMINDER_BATCH_SIZE
+    bucket = email_bucket()
+    countdown = 0.0
+    reminded = batches = 0
+    for i in range(0, len(employees), batch_size):
+        batch = employees[i:i + batch_size]
+        db.execute(insert_ignore(AttendanceReminder.__table__), [
+            {"employee_id": employee_id, "reminder_date": today, "run_id": run_id}
+            for employee_id, _, _ in batch
+        ])
+        # A run that overlapped this one may have recorded some of them first
+        inserted = set(db.execute(
+            select(AttendanceReminder.employee_id).where(
+                AttendanceReminder.reminder_date == today,
+                AttendanceReminder.run_id == run_id,
+                AttendanceReminder.employee_id.in_([employee_id for employee_id, _, _ in batch])
+            )
+        ).scalars())
+        db.commit()
+        batch = [row for row in batch if row[0] in inserted]
+        if not batch:
+            continue
+        countdown = bucket.reserve(len(batch))
+        queue([
+            (
+                email,
+                "Attendance reminder",
+                f"Hi {first_name}, we have no clock-in from you for {today.isoformat()}. "
+                f"Please clock in, or request leave if you are away today."
+            )
+            for _, email, first_name in batch
+        ], countdown)
+        reminded += len(batch)
+        batches += 1
+
+    summary = {
+        "date": today.isoformat(),
+        "reminded": reminded,
+        "batches": batches,
+        "last_batch_countdown": round(countdown, 1),
+        "elapsed": round(time.perf_counter() - started, 3)
+    }
+    logger.info(
+        f"Attendance reminders for {summary['date']}: {summary['reminded']} employees in "
+        f"{batches} batches, last batch in {summary['last_batch_countdown']}s"
+    )
+    return summary
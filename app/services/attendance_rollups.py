@@ -0,0 +1,283 @@
+"""Daily attendance rollups: incremental maintenance, reconciliation and reads
+
+``attendance_daily_rollups`` holds one row per (employee, day) with
+present/late/absent/half-day and record counts and summed hours.
+``department_daily_rollups`` holds the same totals per (department, day).
+The attendance reports read only these tables, so a year-long range costs
+a few hundred rows per department, whatever the size of
+``attendance_records``.
+
+Rollups are refreshed for the affected (employee, day) pairs whenever
+attendance records change:
+- AttendanceRecord mapper hooks cover clock-in, clock-out, adjustments
+  and reviews;
+- app.services.punches refreshes explicitly for its bulk writes.
+
+Each refresh recomputes the employee rows from the raw records of those
+days and moves the difference into the department rows. The nightly
+``reconcile_attendance_rollups`` task rebuilds recent days from scratch,
+to correct drift from writes that bypass both paths.
+"""
+import logging
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_, bindparam, case, delete, event, func, insert, inspect, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.database import insert_ignore
+from app.models import (
+    AttendanceDailyRollup, AttendanceRecord, AttendanceStatus, Department,
+    DepartmentDailyRollup, Employee, EmploymentStatus
+)
+from app.services.business_calendar import business_calendar
+
+logger = logging.getLogger(__name__)
+
+employee_rollups = AttendanceDailyRollup.__table__
+department_rollups = DepartmentDailyRollup.__table__
+records = AttendanceRecord.__table__
+
+COUNTERS = ("present_count", "late_count", "absent_count", "half_day_count", "record_count", "hours_worked")
+STATUS_COUNTERS = (
+    (AttendanceStatus.PRESENT, "present_count"),
+    (AttendanceStatus.LATE, "late_count"),
+    (AttendanceStatus.ABSENT, "absent_count"),
+    (AttendanceStatus.HALF_DAY, "half_day_count"),
+)
+
+
+def _aggregate_records(*conditions):
+    """(employee_id, day, department_id, *COUNTERS) per employee-day of raw records"""
+    department_id = func.coalesce(Employee.department_id, 0)
+    return select(
+        records.c.employee_id,
+        records.c.date,
+        department_id,
+        *(func.sum(case((records.c.status == status, 1), else_=0)) for status, _ in STATUS_COUNTERS),
+        func.count(),
+        func.coalesce(func.sum(records.c.hours_worked), 0)
+    ).select_from(
+        records.join(Employee.__table__, Employee.id == records.c.employee_id)
+    ).where(*conditions).group_by(records.c.employee_id, records.c.date, department_id)
+
+
+def _apply_department_deltas(connection: Connection, deltas: Dict[Tuple[date, int], list]):
+    deltas = {key: values for key, values in deltas.items() if any(values)}
+    if not deltas:
+        return
+    connection.execute(insert_ignore(department_rollups), [
+        {"day": day, "department_id": department, **{counter: 0 for counter in COUNTERS}}
+        for day, department in deltas
+    ])
+    connection.execute(
+        update(department_rollups)
+        .where(
+            department_rollups.c.day == bindparam("rollup_day"),
+            department_rollups.c.department_id == bindparam("rollup_department")
+        )
+        .values({
+            counter: department_rollups.c[counter] + bindparam(f"delta_{counter}")
+            for counter in COUNTERS
+        }),
+        [
+            {
+                "rollup_day": day,
+                "rollup_department": department,
+                **{f"delta_{counter}": value for counter, value in zip(COUNTERS, values)}
+            }
+            for (day, department), values in deltas.items()
+        ]
+    )
+
+
+def refresh_employee_days(connection: Connection, keys: Iterable[Tuple[int, date]]):
+    """Recompute the rollups of the given (employee_id, day) pairs from raw records
+
+    The employees x days cross product of ``keys`` is refreshed, which keeps
+    every statement a plain IN filter; extra pairs simply come out unchanged.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    employee_ids = sorted({employee_id for employee_id, _ in keys})
+    days = sorted({day for _, day in keys})
+    in_scope = and_(employee_rollups.c.employee_id.in_(employee_ids), employee_rollups.c.day.in_(days))
+
+    old = connection.execute(
+        select(employee_rollups.c.day, employee_rollups.c.department_id,
+               *(employee_rollups.c[counter] for counter in COUNTERS))
+        .where(in_scope)
+    ).all()
+    new = connection.execute(_aggregate_records(
+        records.c.employee_id.in_(employee_ids), records.c.date.in_(days)
+    )).all()
+
+    connection.execute(delete(employee_rollups).where(in_scope))
+    if new:
+        connection.execute(insert(employee_rollups), [
+            {
+                "employee_id": employee_id, "day": day, "department_id": department,
+                **dict(zip(COUNTERS, values))
+            }
+            for employee_id, day, department, *values in new
+        ])
+
+    deltas = defaultdict(lambda: [0] * len(COUNTERS))
+    for day, department, *values in old:
+        totals = deltas[(day, department)]
+        for i, value in enumerate(values):
+            totals[i] -= value
+    for _, day, department, *values in new:
+        totals = deltas[(day, department)]
+        for i, value in enumerate(values):
+            totals[i] += value
+    _apply_department_deltas(connection, deltas)
+
+
+def reconcile(connection: Connection, start: date, end: date) -> int:
+    """Rebuild both rollup tables for ``start``..``end`` from raw records; returns employee-days"""
+    connection.execute(delete(employee_rollups).where(employee_rollups.c.day.between(start, end)))
+    connection.execute(insert(employee_rollups).from_select(
+        ["employee_id", "day", "department_id", *COUNTERS],
+        _aggregate_records(records.c.date.between(start, end))
+    ))
+    connection.execute(delete(department_rollups).where(department_rollups.c.day.between(start, end)))
+    connection.execute(insert(department_rollups).from_select(
+        ["day", "department_id", *COUNTERS],
+        select(
+            employee_rollups.c.day,
+            employee_rollups.c.department_id,
+            *(func.sum(employee_rollups.c[counter]) for counter in COUNTERS)
+        ).where(employee_rollups.c.day.between(start, end))
+        .group_by(employee_rollups.c.day, employee_rollups.c.department_id)
+    ))
+    return connection.scalar(
+        select(func.count()).select_from(employee_rollups).where(employee_rollups.c.day.between(start, end))
+    )
+
+
+# Reads
+def department_totals(connection: Connection, start: date, end: date) -> List:
+    """Per-department totals over a date range: (department_id, *COUNTERS)"""
+    return connection.execute(
+        select(
+            department_rollups.c.department_id,
+            *(func.coalesce(func.sum(department_rollups.c[counter]), 0) for counter in COUNTERS)
+        )
+        .where(department_rollups.c.day.between(start, end))
+        .group_by(department_rollups.c.department_id)
+    ).all()
+
+
+def _department_names(connection: Connection) -> Dict[int, str]:
+    names = dict(connection.execute(select(Department.id, Department.name)).all())
+    names[0] = "Unassigned"
+    return names
+
+
+def _summarize(session: Session, start: date, end: date):
+    connection = session.connection()
+    rows = department_totals(connection, start, end)
+    names = _department_names(connection)
+    totals = dict.fromkeys(COUNTERS, 0)
+    by_department = {}
+    for department, *values in rows:
+        values = dict(zip(COUNTERS, values))
+        for counter in COUNTERS:
+            totals[counter] += values[counter]
+        by_department[names.get(department, f"department_{department}")] = values
+    return totals, by_department
+
+
+def get_absenteeism_report(session: Session, start: date, end: date) -> dict:
+    """Absences over the workdays active employees could have worked
+
+    Possible workdays are counted per department location, so local
+    holidays only reduce the denominator for the employees they apply to.
+    """
+    totals, _ = _summarize(session, start, end)
+    calendar = business_calendar.get_sync(session)
+    active_by_location = session.execute(
+        select(Department.location, func.count(Employee.id))
+        .select_from(Employee.__table__)
+        .outerjoin(Department.__table__, Department.id == Employee.department_id)
+        .where(Employee.employment_status == EmploymentStatus.ACTIVE)
+        .group_by(Department.location)
+    ).all()
+    total_possible_workdays = sum(
+        count * calendar.workdays_between(start, end, location) for location, count in active_by_location
+    )
+    total_absences = int(totals["absent_count"])
+    rate = (total_absences / total_possible_workdays * 100) if total_possible_workdays > 0 else 0
+    return {
+        "period_start": start,
+        "period_end": end,
+        "total_workdays": calendar.workdays_between(start, end),
+        "total_absences": total_absences,
+        "absenteeism_rate": round(rate, 2)
+    }
+
+
+def get_hours_report(session: Session, start: date, end: date) -> dict:
+    totals, by_department = _summarize(session, start, end)
+    worked_records = totals["record_count"] - totals["absent_count"]
+    return {
+        "period_start": start,
+        "period_end": end,
+        "total_hours": round(float(totals["hours_worked"]), 2),
+        "attendance_records": int(totals["record_count"]),
+        "average_hours_per_record": round(float(totals["hours_worked"]) / worked_records, 2) if worked_records > 0 else 0,
+        "by_department": {
+            name: round(float(values["hours_worked"]), 2) for name, values in by_department.items()
+        }
+    }
+
+
+def get_lateness_report(session: Session, start: date, end: date) -> dict:
+    totals, by_department = _summarize(session, start, end)
+
+    def rate(values) -> float:
+        attended = values["record_count"] - values["absent_count"]
+        return round(values["late_count"] / attended * 100, 2) if attended > 0 else 0
+
+    return {
+        "period_start": start,
+        "period_end": end,
+        "late_arrivals": int(totals["late_count"]),
+        "half_days": int(totals["half_day_count"]),
+        "lateness_rate": rate(totals),
+        "by_department": {name: rate(values) for name, values in by_department.items()}
+    }
+
+
+# Incremental maintenance for ORM writes
+_ROLLUP_ATTRIBUTES = ("employee_id", "date", "status", "hours_worked")
+
+
+@event.listens_for(AttendanceRecord, "after_insert")
+def _record_inserted(mapper, connection, target):
+    refresh_employee_days(connection, {(target.employee_id, target.date)})
+
+
+@event.listens_for(AttendanceRecord, "after_update")
+def _record_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[attribute].history.has_changes() for attribute in _ROLLUP_ATTRIBUTES):
+        return
+    keys = {(target.employee_id, target.date)}
+    employee_history = state.attrs.employee_id.history
+    date_history = state.attrs.date.history
+    if employee_history.deleted or date_history.deleted:
+        keys.add((
+            employee_history.deleted[0] if employee_history.deleted else target.employee_id,
+            date_history.deleted[0] if date_history.deleted else target.date
+        ))
+    refresh_employee_days(connection, keys)
+
+
+@event.listens_for(AttendanceRecord, "after_delete")
+def _record_deleted(mapper, connection, target):
+    refresh_employee_days(connection, {(target.employee_id, target.date)})
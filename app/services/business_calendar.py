@@ -0,0 +1,98 @@
+"""Working-day calendar shared by leave, absenteeism and payroll math
+
+A workday is a Monday-Friday that is not a holiday at the location. Holidays
+live in the ``holidays`` table. A row without a location applies everywhere;
+otherwise it applies to employees whose department has that
+``Department.location``.
+
+For each (location, year) the calendar lazily builds a prefix-sum array over
+the days of the year: ``index[i]`` is the number of workdays before day
+``i``. ``workdays_between`` is then two lookups per calendar year spanned,
+whatever the length of the range.
+
+The holiday table is small and loaded whole. The calendar is rebuilt after a
+commit that changes holidays, and at most every
+``BUSINESS_CALENDAR_TTL_SECONDS`` so that other workers see the changes too.
+"""
+from array import array
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.models import Holiday
+from app.services.generation_cache import GenerationCache
+
+settings = get_settings()
+
+WEEKEND = (5, 6)  # Saturday, Sunday
+
+
+class BusinessCalendar:
+    """Immutable holiday set with per-(location, year) cumulative workday indexes"""
+
+    def __init__(self, holidays: Iterable[Tuple[date, Optional[str]]]):
+        self._everywhere: Set[date] = set()
+        self._by_location: Dict[str, Set[date]] = {}
+        for holiday_date, location in holidays:
+            if location:
+                self._by_location.setdefault(location, set()).add(holiday_date)
+            else:
+                self._everywhere.add(holiday_date)
+        self._indexes: Dict[Tuple[Optional[str], int], array] = {}
+
+    def _location_key(self, location: Optional[str]) -> Optional[str]:
+        # Locations without holidays of their own share the global index
+        return location if location in self._by_location else None
+
+    def holidays_for(self, location: Optional[str] = None) -> Set[date]:
+        location = self._location_key(location)
+        if location is None:
+            return self._everywhere
+        return self._everywhere | self._by_location[location]
+
+    def holiday_locations(self, day: date) -> Set[str]:
+        """Locations with a holiday of their own on ``day``"""
+        return {location for location, days in self._by_location.items() if day in days}
+
+    def _year_index(self, location: Optional[str], year: int) -> array:
+        key = (location, year)
+        index = self._indexes.get(key)
+        if index is None:
+            holidays = self.holidays_for(location)
+            first = date(year, 1, 1)
+            days = (date(year + 1, 1, 1) - first).days
+            index = array("H", [0]) * (days + 1)
+            for i in range(days):
+                day = first + timedelta(days=i)
+                workday = day.weekday() not in WEEKEND and day not in holidays
+                index[i + 1] = index[i] + workday
+            # Concurrent builds produce identical arrays; last writer wins
+            self._indexes[key] = index
+        return index
+
+    def is_workday(self, day: date, location: Optional[str] = None) -> bool:
+        return day.weekday() not in WEEKEND and day not in self.holidays_for(location)
+
+    def workdays_between(self, start: date, end: date, location: Optional[str] = None) -> int:
+        """Workdays in ``start``..``end`` inclusive at ``location`` (None = global holidays only)"""
+        if end < start:
+            return 0
+        location = self._location_key(location)
+        total = 0
+        for year in range(start.year, end.year + 1):
+            index = self._year_index(location, year)
+            first = date(year, 1, 1)
+            lower = (start - first).days if year == start.year else 0
+            upper = (end - first).days + 1 if year == end.year else len(index) - 1
+            total += index[upper] - index[lower]
+        return total
+
+
+_all_holidays = select(Holiday.holiday_date, Holiday.location)
+
+
+business_calendar: GenerationCache[BusinessCalendar] = GenerationCache(
+    _all_holidays, BusinessCalendar, watch=Holiday, ttl_setting="BUSINESS_CALENDAR_TTL_SECONDS"
+)
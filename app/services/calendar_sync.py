@@ -0,0 +1,246 @@
+"""Calendar sync outbox: coalesced, pooled and retried delivery
+
+Leave decisions are not sent to the calendar service inline. ``enqueue``
+writes a ``calendar_sync_events`` row in the transaction that made the
+decision, so a rollback never sends anything and a commit never loses an
+event. A newer event for a leave request replaces any older one still
+waiting, so only the latest decision of a flush window is sent.
+
+The ``flush_calendar_sync`` task runs every ``CALENDAR_SYNC_FLUSH_SECONDS``
+and, batch by batch:
+
+1. claims up to ``CALENDAR_SYNC_BATCH_SIZE`` due events (SKIP LOCKED where
+   the database supports it, so concurrent workers split the work) by moving
+   their ``next_attempt_at`` to a lease deadline, and commits;
+2. posts them over the worker process's shared keep-alive ``httpx.Client``,
+   ``CALENDAR_SYNC_CONCURRENCY`` requests at a time, holding no row locks,
+   so ``enqueue`` never waits on the calendar service;
+3. deletes delivered events and reschedules failed ones with exponential
+   backoff and full jitter. Events that fail ``CALENDAR_SYNC_MAX_ATTEMPTS``
+   times, or that the service rejects outright (a 4xx other than 408/429),
+   move to ``calendar_sync_dead_letters``. Events replaced by ``enqueue``
+   while they were being sent are left alone; the newer event goes out with
+   the next flush.
+
+A flush that dies mid-batch leaves its events claimed until the lease
+(``CALENDAR_SYNC_LEASE_SECONDS``) runs out, then they are sent again.
+"""
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import CalendarSyncDeadLetter, CalendarSyncEvent
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+events = CalendarSyncEvent.__table__
+dead_letters = CalendarSyncDeadLetter.__table__
+
+# Client errors worth retrying; any other 4xx will fail again the same way
+RETRYABLE_STATUS = (408, 429)
+
+
+def calendar_payload(
+    employee_id: int, leave_request_id: int, status: str, start_date: str, end_date: str
+) -> dict:
+    """Body of a calendar service ``/sync`` request"""
+    return {
+        "employee_id": employee_id,
+        "leave_request_id": leave_request_id,
+        "status": status,
+        "date_range": {
+            "start": start_date,
+            "end": end_date
+        }
+    }
+
+
+def enqueue(session: Session, decisions: Iterable[dict]):
+    """Queue leave decisions for the calendar; the caller owns the transaction
+
+    ``decisions`` are dicts with employee_id, leave_request_id, status,
+    start_date and end_date.
+    """
+    decisions = list({d["leave_request_id"]: d for d in decisions}.values())
+    if not decisions:
+        return
+    session.execute(delete(events).where(
+        events.c.leave_request_id.in_([d["leave_request_id"] for d in decisions])
+    ))
+    now = datetime.utcnow()
+    session.execute(insert(events), [
+        {
+            "leave_request_id": d["leave_request_id"],
+            "employee_id": d["employee_id"],
+            "status": d["status"],
+            "start_date": d["start_date"],
+            "end_date": d["end_date"],
+            "attempts": 0,
+            "next_attempt_at": now
+        }
+        for d in decisions
+    ])
+
+
+# One pool per worker process: connections are reused across batches and
+# tasks, and a forked child never shares its parent's sockets
+_client: Optional[httpx.Client] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = httpx.Client(
+                base_url=settings.CALENDAR_SERVICE_URL,
+                headers={"X-API-Key": settings.WEBHOOK_API_KEY},
+                timeout=settings.CALENDAR_SYNC_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.CALENDAR_SYNC_CONCURRENCY,
+                    max_keepalive_connections=settings.CALENDAR_SYNC_CONCURRENCY
+                )
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number ``attempts`` (1-based): full jitter over a capped exponential"""
+    ceiling = min(
+        settings.CALENDAR_SYNC_BACKOFF_MAX_SECONDS,
+        settings.CALENDAR_SYNC_BACKOFF_SECONDS * 2 ** (attempts - 1)
+    )
+    return random.uniform(0, ceiling)
+
+
+def _payload(event) -> dict:
+    return calendar_payload(
+        event.employee_id, event.leave_request_id, event.status,
+        str(event.start_date), str(event.end_date)
+    )
+
+
+def _send(client: httpx.Client, event) -> Optional[Tuple[str, bool]]:
+    """None when delivered, else (error, permanent)"""
+    try:
+        response = client.post("sync", json=_payload(event))
+    except httpx.HTTPError as e:
+        return f"{type(e).__name__}: {e}", False
+    if response.is_success:
+        return None
+    permanent = response.is_client_error and response.status_code not in RETRYABLE_STATUS
+    return f"HTTP {response.status_code}: {response.text[:200]}", permanent
+
+
+def _claim(db: Session, last_id: int) -> Tuple[list, datetime]:
+    """Lease the next batch of due events after ``last_id`` to this flush"""
+    now = datetime.utcnow()
+    due = db.execute(
+        select(events)
+        .where(events.c.id > last_id, events.c.next_attempt_at <= now)
+        .order_by(events.c.id)
+        .limit(settings.CALENDAR_SYNC_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    ).all()
+    # Whole seconds, so the lease compares equal on backends without fractional timestamps
+    lease_until = (now + timedelta(seconds=settings.CALENDAR_SYNC_LEASE_SECONDS)).replace(microsecond=0)
+    if due:
+        db.execute(
+            update(events)
+            .where(events.c.id.in_([event.id for event in due]))
+            .values(next_attempt_at=lease_until)
+        )
+    db.commit()
+    return due, lease_until
+
+
+def flush(db: Session, client: Optional[httpx.Client] = None) -> Dict[str, int]:
+    """Send every due event; returns counts of sent, retried and dead-lettered events"""
+    client = client or get_client()
+    summary = {"sent": 0, "retried": 0, "dead": 0}
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=settings.CALENDAR_SYNC_CONCURRENCY) as pool:
+        # One pass in id order: an event rescheduled by this flush waits for the next one
+        while True:
+            due, lease_until = _claim(db, last_id)
+            if not due:
+                break
+            last_id = due[-1].id
+            outcomes = list(pool.map(lambda event: _send(client, event), due))
+            _record(db, due, outcomes, lease_until, summary)
+            db.commit()
+            if len(due) < settings.CALENDAR_SYNC_BATCH_SIZE:
+                break
+    return summary
+
+
+def _record(db: Session, due, outcomes, lease_until: datetime, summary: Dict[str, int]):
+    # Events still under this flush's lease; enqueue replaces an event by
+    # deleting it, and an expired lease hands it to another flush
+    owned = set(db.scalars(
+        select(events.c.id)
+        .where(events.c.id.in_([event.id for event in due]), events.c.next_attempt_at == lease_until)
+        .with_for_update()
+    ))
+    now = datetime.utcnow()
+    delivered, retries, dead = [], [], []
+    for event, outcome in zip(due, outcomes):
+        if event.id not in owned:
+            continue
+        if outcome is None:
+            delivered.append(event.id)
+            continue
+        error, permanent = outcome
+        attempts = event.attempts + 1
+        if permanent or attempts >= settings.CALENDAR_SYNC_MAX_ATTEMPTS:
+            logger.error(f"Giving up calendar sync of leave request {event.leave_request_id}: {error}")
+            dead.append((event, attempts, error))
+        else:
+            retries.append({
+                "event_id": event.id,
+                "new_attempts": attempts,
+                "retry_at": now + timedelta(seconds=backoff_seconds(attempts)),
+                "error": error
+            })
+
+    if dead:
+        db.execute(insert(dead_letters), [
+            {"leave_request_id": event.leave_request_id, "payload": _payload(event),
+             "attempts": attempts, "last_error": error}
+            for event, attempts, error in dead
+        ])
+    finished = delivered + [event.id for event, _, _ in dead]
+    if finished:
+        db.execute(delete(events).where(events.c.id.in_(finished)))
+    if retries:
+        db.execute(
+            update(events)
+            .where(events.c.id == bindparam("event_id"))
+            .values(attempts=bindparam("new_attempts"), next_attempt_at=bindparam("retry_at"),
+                    last_error=bindparam("error")),
+            retries
+        )
+    summary["sent"] += len(delivered)
+    summary["retried"] += len(retries)
+    summary["dead"] += len(dead)
+
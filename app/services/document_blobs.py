@@ -0,0 +1,368 @@
+"""Content-addressed, deduplicated store for employee document files
+
+A document's bytes are stored once per distinct content, at
+``UPLOAD_DIR/blobs/ab/cd/<sha256>``, however many EmployeeDocument rows
+point at them. ``document_blobs`` holds one row per stored blob. Its
+``ref_count`` is the number of employee_documents rows with that
+``content_sha256``, kept in step in three ways:
+- EmployeeDocument mapper hooks adjust it in the same transaction as the
+  document row;
+- the bulk writes here recount the blobs they touch;
+- the nightly ``collect_document_blobs`` task recounts every blob, to correct
+  drift from writes that bypass both.
+
+A blob whose count drops to zero is stamped ``unreferenced_at``. ``collect``
+removes blobs that stay unreferenced for DOCUMENT_BLOB_GC_GRACE_HOURS, as well
+as files that no row accounts for: temporary files of interrupted uploads,
+or blobs whose document row never committed.
+
+An upload is received into ``temp_dir()`` and hashed on the way in. It is
+stored in three steps:
+- ``link`` hard-links it into place, but only if the store does not already
+  have those bytes; a known blob costs a metadata insert only;
+- the document row commits;
+- ``settle`` removes the temporary file.
+
+``collect`` deletes a blob's row (only while its count is still zero) and
+unlinks its file in one transaction. Row locks therefore order it with any
+upload of the same bytes that found the file just before. That upload commits
+after the unlink, so ``settle`` sees the blob missing and links it again from
+the temporary file, which it kept until then.
+
+``deduplicate`` is the one-off pass that moves documents stored before the
+blob store (``uploads/employees/{id}/{timestamp}_{name}``) into it.
+"""
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, delete, event, func, inspect, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import insert_ignore
+from app.models import DocumentBlob, EmployeeDocument
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+blobs = DocumentBlob.__table__
+documents = EmployeeDocument.__table__
+
+READ_SIZE = 1024 * 1024
+TEMP_DIR_NAME = "tmp"
+
+
+# Paths
+def blob_root() -> str:
+    return os.path.join(settings.UPLOAD_DIR, "blobs")
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(blob_root(), sha256[:2], sha256[2:4], sha256)
+
+
+def temp_dir() -> str:
+    """Where uploads are received: inside the store, so ``link`` never crosses filesystems"""
+    return os.path.join(blob_root(), TEMP_DIR_NAME)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _hash_file(path: str) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+# Files
+def link(path: str, sha256: str) -> bool:
+    """Add the file at ``path`` to the store as blob ``sha256``, unless it is already there
+
+    The file is fsynced and hard-linked, so ``path`` stays valid. Returns
+    whether a new blob was added.
+    """
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        return False
+    return True
+
+
+def settle(path: str, sha256: str):
+    """Remove a received file once a committed document row references its blob"""
+    try:
+        if not os.path.exists(blob_path(sha256)):
+            # Collected between link() and the commit: put it back
+            link(path, sha256)
+    finally:
+        _remove(path)
+
+
+def discard(path: str):
+    """Remove a received file whose document row was not stored"""
+    _remove(path)
+
+
+# Reference counts
+def _add_reference(connection: Connection, sha256: str, size: Optional[int]):
+    connection.execute(insert_ignore(blobs), {"sha256": sha256, "size": size, "ref_count": 0})
+    connection.execute(
+        update(blobs)
+        .where(blobs.c.sha256 == sha256)
+        .values(ref_count=blobs.c.ref_count + 1, unreferenced_at=None)
+    )
+
+
+def _drop_reference(connection: Connection, sha256: str):
+    # unreferenced_at goes first: MySQL evaluates SET clauses in order, against
+    # the values already assigned
+    connection.execute(
+        update(blobs)
+        .where(blobs.c.sha256 == sha256, blobs.c.ref_count > 0)
+        .ordered_values(
+            (blobs.c.unreferenced_at, case(
+                (blobs.c.ref_count == 1, datetime.utcnow()), else_=blobs.c.unreferenced_at
+            )),
+            (blobs.c.ref_count, blobs.c.ref_count - 1)
+        )
+    )
+
+
+def reconcile(connection: Connection, sha256s: Optional[Iterable[str]] = None) -> int:
+    """Recount references of the given blobs (default: all); returns how many counts changed"""
+    references = (
+        select(func.count())
+        .select_from(documents)
+        .where(documents.c.content_sha256 == blobs.c.sha256)
+        .scalar_subquery()
+    )
+    statement = (
+        update(blobs)
+        .where(blobs.c.ref_count != references)
+        .ordered_values(
+            (blobs.c.unreferenced_at, case(
+                (references == 0, func.coalesce(blobs.c.unreferenced_at, datetime.utcnow())), else_=None
+            )),
+            (blobs.c.ref_count, references)
+        )
+    )
+    if sha256s is None:
+        return connection.execute(statement).rowcount
+    sha256s = list(sha256s)
+    if not sha256s:
+        return 0
+    return connection.execute(statement.where(blobs.c.sha256.in_(sha256s))).rowcount
+
+
+@event.listens_for(EmployeeDocument, "after_insert")
+def _document_inserted(mapper, connection, target):
+    if target.content_sha256:
+        _add_reference(connection, target.content_sha256, target.file_size)
+
+
+@event.listens_for(EmployeeDocument, "after_update")
+def _document_updated(mapper, connection, target):
+    history = inspect(target).attrs.content_sha256.history
+    if not history.has_changes():
+        return
+    for sha256 in history.deleted:
+        if sha256:
+            _drop_reference(connection, sha256)
+    if target.content_sha256:
+        _add_reference(connection, target.content_sha256, target.file_size)
+
+
+@event.listens_for(EmployeeDocument, "after_delete")
+def _document_deleted(mapper, connection, target):
+    if target.content_sha256:
+        _drop_reference(connection, target.content_sha256)
+
+
+# Garbage collection
+def _scan(directory: str, directories: bool = False) -> List[os.DirEntry]:
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(
+                (entry for entry in entries if (
+                    entry.is_dir(follow_symlinks=False) if directories else entry.is_file(follow_symlinks=False)
+                )),
+                key=lambda entry: entry.name
+            )
+    except FileNotFoundError:
+        return []
+
+
+def _stray_files(connection: Connection, cutoff: float) -> Iterator[str]:
+    """Paths of store files older than ``cutoff`` that no document_blobs row accounts for"""
+    # st_ctime: linking a file into the store updates it, even when the data is old
+    for entry in _scan(temp_dir()):
+        if entry.stat().st_ctime < cutoff:
+            yield entry.path
+    for first in _scan(blob_root(), directories=True):
+        if first.name == TEMP_DIR_NAME:
+            continue
+        for second in _scan(first.path, directories=True):
+            candidates = {
+                entry.name: entry.path for entry in _scan(second.path)
+                if entry.stat().st_ctime < cutoff
+            }
+            if not candidates:
+                continue
+            known = set(connection.execute(
+                select(blobs.c.sha256).where(blobs.c.sha256.in_(list(candidates)))
+            ).scalars())
+            yield from (path for name, path in candidates.items() if name not in known)
+
+
+def collect(session: Session, grace: Optional[timedelta] = None, batch_size: int = 500) -> Dict[str, int]:
+    """Recount references, then delete blobs unreferenced for longer than ``grace`` and stray files
+
+    Each blob is deleted in its own transaction: the row only if its count
+    is still zero, and the file before the commit.
+    """
+    grace = grace if grace is not None else timedelta(hours=settings.DOCUMENT_BLOB_GC_GRACE_HOURS)
+    recounted = reconcile(session.connection())
+    session.commit()
+
+    cutoff = datetime.utcnow() - grace
+    collected = bytes_freed = 0
+    last_id = 0
+    while True:
+        candidates = session.execute(
+            select(blobs.c.id, blobs.c.sha256, blobs.c.size)
+            .where(blobs.c.id > last_id, blobs.c.ref_count == 0, blobs.c.unreferenced_at < cutoff)
+            .order_by(blobs.c.id)
+            .limit(batch_size)
+        ).all()
+        session.commit()
+        if not candidates:
+            break
+        last_id = candidates[-1].id
+        for blob_id, sha256, size in candidates:
+            deleted = session.execute(
+                delete(blobs).where(blobs.c.id == blob_id, blobs.c.ref_count == 0)
+            ).rowcount
+            if not deleted:
+                session.rollback()
+                continue
+            try:
+                _remove(blob_path(sha256))
+            except OSError as e:
+                session.rollback()
+                logger.warning(f"Could not remove document blob {sha256}: {e}")
+                continue
+            session.commit()
+            collected += 1
+            bytes_freed += size or 0
+
+    stray_files = 0
+    for path in _stray_files(session.connection(), time.time() - grace.total_seconds()):
+        _remove(path)
+        stray_files += 1
+    session.commit()
+    return {
+        "recounted": recounted,
+        "collected": collected,
+        "bytes_freed": bytes_freed,
+        "stray_files": stray_files
+    }
+
+
+# One-off migration of documents stored before the blob store
+def deduplicate(session: Session, batch_size: int = 200) -> Dict[str, int]:
+    """Move every document file outside the store into it, in batches of ``batch_size`` rows
+
+    Each file is hashed and linked into the store, its row repointed at the
+    blob, and only once that commits is the old file removed. Bytes the
+    store already had are freed rather than stored twice. Rows already in
+    the store are skipped, so the pass can be interrupted and run again.
+    """
+    summary = dict.fromkeys(("documents", "duplicates", "bytes_freed", "missing"), 0)
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(documents.c.id, documents.c.file_path, documents.c.content_sha256)
+            .where(documents.c.id > last_id)
+            .order_by(documents.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        moved: List[dict] = []
+        old_files: Dict[str, Tuple[bool, int]] = {}
+        for doc_id, path, stored_sha256 in rows:
+            if stored_sha256 and path == blob_path(stored_sha256):
+                continue
+            try:
+                sha256, size = _hash_file(path)
+            except FileNotFoundError:
+                # Another row of this batch run may have moved the same file already
+                if not (stored_sha256 and os.path.exists(blob_path(stored_sha256))):
+                    summary["missing"] += 1
+                    continue
+                sha256, size = stored_sha256, os.path.getsize(blob_path(stored_sha256))
+            else:
+                added = link(path, sha256)
+                old_files.setdefault(path, (added, size))
+            moved.append({
+                "doc_id": doc_id, "blob_path": blob_path(sha256), "blob_sha256": sha256,
+                "blob_size": size, "previous_sha256": stored_sha256
+            })
+
+        if moved:
+            connection = session.connection()
+            connection.execute(insert_ignore(blobs), [
+                {"sha256": sha256, "size": size, "ref_count": 0, "unreferenced_at": datetime.utcnow()}
+                for sha256, size in {row["blob_sha256"]: row["blob_size"] for row in moved}.items()
+            ])
+            connection.execute(
+                update(documents)
+                .where(documents.c.id == bindparam("doc_id"))
+                .values(
+                    file_path=bindparam("blob_path"),
+                    content_sha256=bindparam("blob_sha256"),
+                    file_size=bindparam("blob_size")
+                ),
+                moved
+            )
+            reconcile(connection, {
+                sha256 for row in moved for sha256 in (row["blob_sha256"], row["previous_sha256"]) if sha256
+            })
+        session.commit()
+
+        for path, (added, size) in old_files.items():
+            _remove(path)
+            if not added:
+                summary["duplicates"] += 1
+                summary["bytes_freed"] += size
+        summary["documents"] += len(moved)
+        logger.info(f"Document store: {summary['documents']} documents moved so far")
+    return summary
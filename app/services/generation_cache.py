@@ -0,0 +1,126 @@
+"""Process-wide caches of small tables, invalidated on commit
+
+A ``GenerationCache`` holds one value built from the rows of a query: the
+org-tree index, the shift schedule, the business calendar. The value is
+rebuilt after a committed transaction changes the watched model, and at
+most every ``ttl_setting`` seconds so that changes made by other workers
+are picked up.
+
+Changed caches are noted on the session at flush time and invalidated only
+after the commit. Invalidation bumps a generation counter, so a rebuild that
+raced with the commit is discarded instead of caching pre-commit rows.
+"""
+import threading
+import time
+from typing import Callable, Generic, Iterable, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.config import get_settings
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+_caches: List["GenerationCache"] = []
+
+
+class GenerationCache(Generic[T]):
+    """``build(rows of query)``, cached until ``watch`` rows change or the TTL runs out
+
+    ``attributes`` narrows which updates of ``watch`` objects count as a
+    change; inserts and deletes always do.
+    """
+
+    def __init__(
+        self,
+        query: Select,
+        build: Callable[[Iterable], T],
+        watch: type,
+        ttl_setting: str,
+        attributes: Optional[Sequence[str]] = None
+    ):
+        self.query = query
+        self.build = build
+        self.watch = watch
+        self.ttl_setting = ttl_setting
+        self.attributes = attributes
+        self._value: Optional[T] = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        _caches.append(self)
+
+    def _current(self) -> Optional[T]:
+        if self._value is not None and time.monotonic() < self._expires_at:
+            return self._value
+        return None
+
+    def _store(self, value: T, generation: int):
+        with self._lock:
+            # Drop the result if an invalidation raced with the load
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = time.monotonic() + getattr(settings, self.ttl_setting)
+
+    async def get(self, db: AsyncSession) -> T:
+        value = self._current()
+        if value is not None:
+            return value
+        generation = self._generation
+        value = self.build((await db.execute(self.query)).all())
+        self._store(value, generation)
+        return value
+
+    def get_sync(self, db: Session) -> T:
+        value = self._current()
+        if value is not None:
+            return value
+        generation = self._generation
+        value = self.build(db.execute(self.query).all())
+        self._store(value, generation)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._value = None
+
+    def changed_by(self, session: Session) -> bool:
+        """True if the session's pending flush touched the watched rows"""
+        if any(isinstance(obj, self.watch) for obj in session.new | session.deleted):
+            return True
+        for obj in session.dirty:
+            if not isinstance(obj, self.watch):
+                continue
+            if self.attributes is None:
+                return True
+            attrs = inspect(obj).attrs
+            if any(getattr(attrs, name).history.has_changes() for name in self.attributes):
+                return True
+        return False
+
+
+_PENDING_KEY = "changed_generation_caches"
+
+
+@event.listens_for(Session, "after_flush")
+def _detect_changes(session, flush_context):
+    pending = session.info.get(_PENDING_KEY, set())
+    changed = {cache for cache in _caches if cache not in pending and cache.changed_by(session)}
+    if changed:
+        session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed(session):
+    for cache in session.info.pop(_PENDING_KEY, ()):
+        cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,248 @@
+"""Headcount snapshots: materialization, incremental maintenance and reads
+
+``headcount_snapshots`` holds one row per (date, department, position,
+employment status) bucket. The most recent date is kept current by mapper
+hooks on Employee, so reading the headcount report never scans employees.
+Earlier dates are left untouched and serve ``as_of`` queries.
+
+When the first Employee write of a day happens, the previous snapshot is
+copied forward to today before the delta is applied; the nightly
+``refresh_headcount_snapshot`` task rebuilds today's rows from scratch to
+correct any drift (e.g. bulk UPDATEs that bypass the ORM).
+
+Reads never write. Until the nightly task has materialized the first
+snapshot (a fresh database), the report is counted from employees directly.
+The hooks are registered by ``app.models``.
+"""
+import logging
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import case, delete, event, func, insert, inspect, literal, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.database import insert_ignore
+from app.models import Department, Employee, EmploymentStatus, HeadcountSnapshot, Position
+
+logger = logging.getLogger(__name__)
+
+snapshots = HeadcountSnapshot.__table__
+
+# (department_id, position_id, employment_status, headcount); 0 = unassigned
+Bucket = Tuple[int, int, EmploymentStatus, int]
+
+
+def count_headcount_buckets(connection: Connection) -> List[Bucket]:
+    """Count employees per bucket in a single conditional-aggregation pass"""
+    department_id = func.coalesce(Employee.department_id, 0)
+    position_id = func.coalesce(Employee.position_id, 0)
+    rows = connection.execute(
+        select(
+            department_id,
+            position_id,
+            *(
+                func.sum(case((Employee.employment_status == employment_status, 1), else_=0))
+                for employment_status in EmploymentStatus
+            )
+        ).group_by(department_id, position_id)
+    ).all()
+
+    buckets = []
+    for department, position, *counts in rows:
+        for employment_status, count in zip(EmploymentStatus, counts):
+            if count:
+                buckets.append((department, position, employment_status, int(count)))
+    return buckets
+
+
+def rebuild_snapshot(connection: Connection, snapshot_date: date) -> int:
+    """Replace the snapshot for ``snapshot_date`` with live counts; returns the bucket count"""
+    buckets = count_headcount_buckets(connection)
+    connection.execute(delete(snapshots).where(snapshots.c.snapshot_date == snapshot_date))
+    if buckets:
+        connection.execute(insert(snapshots), [
+            {
+                "snapshot_date": snapshot_date,
+                "department_id": department,
+                "position_id": position,
+                "employment_status": employment_status,
+                "headcount": count
+            }
+            for department, position, employment_status, count in buckets
+        ])
+    return len(buckets)
+
+
+def get_headcount_report(session: Session, as_of: Optional[date] = None) -> Optional[dict]:
+    """Build the headcount report from the snapshot in effect on ``as_of``
+
+    Without ``as_of`` the current snapshot is used, or live counts while no
+    snapshot has been materialized yet. Returns None when no snapshot exists
+    on or before a past ``as_of``.
+    """
+    connection = session.connection()
+    today = date.today()
+    # One round trip: the snapshot in effect, with its labels as they are today
+    in_effect = (
+        select(func.max(snapshots.c.snapshot_date))
+        .where(snapshots.c.snapshot_date <= (as_of or today))
+        .scalar_subquery()
+    )
+    rows = connection.execute(
+        select(
+            snapshots.c.snapshot_date,
+            snapshots.c.employment_status,
+            snapshots.c.headcount,
+            Department.name,
+            Position.title
+        )
+        .outerjoin(Department, Department.id == snapshots.c.department_id)
+        .outerjoin(Position, Position.id == snapshots.c.position_id)
+        .where(snapshots.c.snapshot_date == in_effect)
+    ).all()
+    if rows:
+        snapshot_date = rows[0].snapshot_date
+        buckets = [(employment_status, count, name, title) for _, employment_status, count, name, title in rows]
+    elif as_of is not None and as_of < today:
+        return None
+    else:
+        snapshot_date = today
+        departments = dict(connection.execute(select(Department.id, Department.name)).all())
+        positions = dict(connection.execute(select(Position.id, Position.title)).all())
+        buckets = [
+            (employment_status, count, departments.get(department), positions.get(position))
+            for department, position, employment_status, count in count_headcount_buckets(connection)
+        ]
+
+    report = {
+        "total_employees": 0,
+        "active_employees": 0,
+        "inactive_employees": 0,
+        "by_department": {},
+        "by_position": {},
+        "as_of": snapshot_date
+    }
+    for employment_status, count, name, title in buckets:
+        if not count:
+            continue
+        report["total_employees"] += count
+        if employment_status == EmploymentStatus.ACTIVE:
+            report["active_employees"] += count
+        else:
+            report["inactive_employees"] += count
+        if name is not None:
+            report["by_department"][name] = report["by_department"].get(name, 0) + count
+        if title is not None:
+            report["by_position"][title] = report["by_position"].get(title, 0) + count
+    return report
+
+
+# Incremental maintenance
+def _ensure_today(connection: Connection, today: date) -> bool:
+    """Make sure today's snapshot exists, carrying the previous one forward
+
+    Returns False when no snapshot has ever been built: reads count live
+    data until the nightly task materializes one, so there is nothing to
+    adjust yet.
+    """
+    if connection.scalar(select(snapshots.c.id).where(snapshots.c.snapshot_date == today).limit(1)):
+        return True
+    previous = connection.scalar(
+        select(func.max(snapshots.c.snapshot_date)).where(snapshots.c.snapshot_date < today)
+    )
+    if previous is None:
+        return False
+    columns = ["snapshot_date", "department_id", "position_id", "employment_status", "headcount"]
+    connection.execute(insert_ignore(snapshots).from_select(
+        columns,
+        select(
+            literal(today, snapshots.c.snapshot_date.type),
+            snapshots.c.department_id,
+            snapshots.c.position_id,
+            snapshots.c.employment_status,
+            snapshots.c.headcount
+        ).where(snapshots.c.snapshot_date == previous)
+    ))
+    return True
+
+
+def _bucket_filter(today: date, key: tuple):
+    department, position, employment_status = key
+    return (
+        (snapshots.c.snapshot_date == today)
+        & (snapshots.c.department_id == department)
+        & (snapshots.c.position_id == position)
+        & (snapshots.c.employment_status == employment_status)
+    )
+
+
+def apply_headcount_delta(connection: Connection, old: Optional[tuple], new: Optional[tuple]):
+    """Move one employee from bucket ``old`` to bucket ``new`` in today's snapshot"""
+    if old == new:
+        return
+    today = date.today()
+    if not _ensure_today(connection, today):
+        return
+    if old is not None:
+        connection.execute(
+            update(snapshots).where(_bucket_filter(today, old))
+            .values(headcount=snapshots.c.headcount - 1)
+        )
+    if new is not None:
+        department, position, employment_status = new
+        connection.execute(insert_ignore(snapshots).values(
+            snapshot_date=today,
+            department_id=department,
+            position_id=position,
+            employment_status=employment_status,
+            headcount=0
+        ))
+        connection.execute(
+            update(snapshots).where(_bucket_filter(today, new))
+            .values(headcount=snapshots.c.headcount + 1)
+        )
+
+
+def _bucket_key(department_id, position_id, employment_status) -> tuple:
+    return (
+        department_id or 0,
+        position_id or 0,
+        EmploymentStatus(employment_status or EmploymentStatus.ACTIVE)
+    )
+
+
+@event.listens_for(Employee, "after_insert")
+def _employee_inserted(mapper, connection, target):
+    apply_headcount_delta(connection, None, _bucket_key(
+        target.department_id, target.position_id, target.employment_status
+    ))
+
+
+@event.listens_for(Employee, "after_update")
+def _employee_updated(mapper, connection, target):
+    state = inspect(target)
+    old_values = []
+    for attribute in ("department_id", "position_id", "employment_status"):
+        history = state.attrs[attribute].history
+        if not history.has_changes():
+            old_values.append(getattr(target, attribute))
+        elif history.deleted:
+            old_values.append(history.deleted[0])
+        else:
+            # Previous value was never loaded; leave it to the nightly rebuild
+            logger.warning(f"Headcount snapshot skipped update of employee {target.id}: unknown {attribute}")
+            return
+    apply_headcount_delta(connection, _bucket_key(*old_values), _bucket_key(
+        target.department_id, target.position_id, target.employment_status
+    ))
+
+
+@event.listens_for(Employee, "after_delete")
+def _employee_deleted(mapper, connection, target):
+    state = inspect(target)
+    old_values = []
+    for attribute in ("department_id", "position_id", "employment_status"):
+        history = state.attrs[attribute].history
+        old_values.append(history.deleted[0] if history.deleted else getattr(target, attribute))
+    apply_headcount_delta(connection, _bucket_key(*old_values), None)
@@ -0,0 +1,171 @@
+"""Monthly leave accrual
+
+Each month, every ACTIVE or ON_LEAVE employee earns
+``LeaveType.max_days_per_year / 12`` days of each active leave type that
+has a yearly entitlement. Employees hired during the month get the share of
+the month's calendar days from their hire date. Accruals are ACCRUAL entries
+of the leave ledger (see app.services.leave_ledger) keyed
+``accrual:<YYYY-MM>:<employee>:<leave type>``, so a month can be posted any
+number of times and credits each pair once.
+
+``accrue_month`` walks employees in id-range chunks of
+``LEAVE_ACCRUAL_CHUNK_SIZE``. Each chunk runs three set-based statements and
+loads no rows into Python:
+
+1. INSERT IGNORE ... SELECT of the ledger entries from employees x leave types;
+2. INSERT IGNORE ... SELECT of the balance rows that do not exist yet;
+3. one UPDATE adding the entries inserted by step 1 to the balances.
+
+A chunk commits together with its ``leave_accrual_runs`` progress row, so a
+run that crashes resumes after the last committed chunk.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import Float, String, case, cast, extract, func, literal, select, true, update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import insert_ignore
+from app.models import (
+    Employee, EmploymentStatus, LeaveAccrualRun, LeaveBalance, LeaveLedgerEntry,
+    LeaveLedgerEntryType, LeaveType
+)
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+runs = LeaveAccrualRun.__table__
+ledger = LeaveLedgerEntry.__table__
+balances = LeaveBalance.__table__
+employees = Employee.__table__
+leave_types = LeaveType.__table__
+
+RUNNING = "running"
+COMPLETED = "completed"
+
+ACCRUING_STATUSES = (EmploymentStatus.ACTIVE, EmploymentStatus.ON_LEAVE)
+
+
+@dataclass
+class AccrualStats:
+    """Outcome of one call to accrue_month"""
+    period: str
+    entries: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def entries_per_second(self) -> float:
+        return self.entries / self.elapsed if self.elapsed else 0.0
+
+
+def previous_month(today: date) -> Tuple[int, int]:
+    last = today.replace(day=1) - timedelta(days=1)
+    return last.year, last.month
+
+
+def _accrue_chunk(db: Session, year: int, month: int, low: int, high: int) -> int:
+    """Post and apply the accruals of employees ``low < id <= high``; returns entries posted"""
+    period = f"{year}-{month:02d}"
+    first = date(year, month, 1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    key_prefix = f"accrual:{period}:"
+
+    monthly = cast(leave_types.c.max_days_per_year, Float) / 12
+    days = func.round(case(
+        (employees.c.hire_date < first, monthly),
+        else_=monthly * (last.day + 1 - extract("day", employees.c.hire_date)) / last.day
+    ), 2)
+
+    # Entries inserted by this transaction are the ones above the watermark
+    watermark = db.scalar(select(func.coalesce(func.max(ledger.c.id), 0)))
+    posted = db.execute(insert_ignore(ledger).from_select(
+        ["employee_id", "leave_type_id", "year", "entry_type", "days", "idempotency_key"],
+        select(
+            employees.c.id,
+            leave_types.c.id,
+            literal(year),
+            literal(LeaveLedgerEntryType.ACCRUAL.value),
+            days,
+            literal(key_prefix) + cast(employees.c.id, String) + literal(":") + cast(leave_types.c.id, String)
+        ).select_from(employees.join(leave_types, true())).where(
+            employees.c.id > low,
+            employees.c.id <= high,
+            employees.c.employment_status.in_(ACCRUING_STATUSES),
+            employees.c.hire_date <= last,
+            leave_types.c.is_active == True,
+            leave_types.c.max_days_per_year > 0
+        )
+    )).rowcount
+    if not posted:
+        return 0
+
+    new_entries = (
+        ledger.c.id > watermark,
+        ledger.c.idempotency_key.like(f"{key_prefix}%"),
+        ledger.c.employee_id > low,
+        ledger.c.employee_id <= high
+    )
+    db.execute(insert_ignore(balances).from_select(
+        ["employee_id", "leave_type_id", "year", "total_days", "used_days", "available_days"],
+        select(
+            ledger.c.employee_id, ledger.c.leave_type_id, ledger.c.year, literal(0), literal(0), literal(0)
+        ).where(*new_entries)
+    ))
+    accrued = select(func.coalesce(func.sum(ledger.c.days), 0)).where(
+        ledger.c.employee_id == balances.c.employee_id,
+        ledger.c.leave_type_id == balances.c.leave_type_id,
+        ledger.c.year == balances.c.year,
+        *new_entries
+    ).scalar_subquery()
+    db.execute(
+        update(balances)
+        .where(balances.c.year == year, balances.c.employee_id > low, balances.c.employee_id <= high)
+        .values(
+            total_days=balances.c.total_days + accrued,
+            available_days=balances.c.available_days + accrued
+        )
+    )
+    return posted
+
+
+def accrue_month(db: Session, year: int, month: int, chunk_size: Optional[int] = None) -> AccrualStats:
+    """Accrue one month of leave for every eligible employee, resuming an interrupted run"""
+    chunk_size = chunk_size or settings.LEAVE_ACCRUAL_CHUNK_SIZE
+    period = f"{year}-{month:02d}"
+    stats = AccrualStats(period)
+    started = time.perf_counter()
+
+    db.execute(insert_ignore(runs).values(period=period, status=RUNNING, last_employee_id=0, entries_posted=0))
+    db.commit()
+    while True:
+        # Locks the run row (MySQL), so two workers never process the same chunk
+        run = db.execute(select(runs).where(runs.c.period == period).with_for_update()).one()
+        if run.status == COMPLETED:
+            db.rollback()
+            break
+        low = run.last_employee_id
+        chunk = select(employees.c.id).where(employees.c.id > low).order_by(employees.c.id).limit(chunk_size)
+        high = db.scalar(select(func.max(chunk.subquery().c.id)))
+        if high is None:
+            db.execute(update(runs).where(runs.c.period == period).values(
+                status=COMPLETED, completed_at=datetime.utcnow()
+            ))
+            db.commit()
+            break
+
+        posted = _accrue_chunk(db, year, month, low, high)
+        db.execute(update(runs).where(runs.c.period == period).values(
+            last_employee_id=high, entries_posted=runs.c.entries_posted + posted
+        ))
+        db.commit()
+        stats.entries += posted
+        stats.chunks += 1
+
+    stats.elapsed = time.perf_counter() - started
+    logger.info(f"Leave accrual {period}: {stats.entries} entries in {stats.chunks} chunks, {stats.elapsed:.2f}s")
+    return stats
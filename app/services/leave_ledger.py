@@ -0,0 +1,317 @@
+"""Leave balance ledger
+
+Every change to a leave balance is an append-only ``leave_ledger_entries``
+row:
+- ACCRUAL entries add entitlement;
+- DEBIT entries consume it (approved requests);
+- CREDIT entries give days back.
+
+``leave_balances`` holds the materialized totals per (employee, leave type,
+year). They are updated in the same transaction with relative
+``SET used_days = used_days + :n`` statements, never read-modify-write in
+Python, so concurrent approvals cannot lose updates and a balance row is
+only locked for the length of one short transaction.
+
+Each entry carries an idempotency key with a unique constraint. Posting the
+same key twice is a no-op, so a retried or duplicated approval never debits
+twice. Request decisions are a compare-and-set on ``status = 'PENDING'``,
+which makes exactly one of several concurrent deciders win.
+
+``decide_requests`` applies one decision to hundreds of requests with a
+fixed number of statements: one SELECT, one UPDATE, and one batch of
+ledger and balance writes.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.database import insert_ignore
+from app.models import (
+    LeaveBalance, LeaveLedgerEntry, LeaveLedgerEntryType, LeaveRequest, LeaveRequestStatus
+)
+
+ledger = LeaveLedgerEntry.__table__
+balances = LeaveBalance.__table__
+requests = LeaveRequest.__table__
+
+# Effect of one day of each entry type on (total_days, used_days)
+_EFFECTS = {
+    LeaveLedgerEntryType.ACCRUAL: (1, 0),
+    LeaveLedgerEntryType.DEBIT: (0, 1),
+    LeaveLedgerEntryType.CREDIT: (0, -1),
+}
+
+
+def request_key(leave_request_id: int, entry_type: LeaveLedgerEntryType) -> str:
+    return f"leave-request:{leave_request_id}:{entry_type.value.lower()}"
+
+
+def post_entry(
+    session: Session,
+    employee_id: int,
+    leave_type_id: int,
+    year: int,
+    entry_type: LeaveLedgerEntryType,
+    days: float,
+    idempotency_key: str,
+    leave_request_id: Optional[int] = None,
+    created_by: Optional[int] = None
+) -> bool:
+    """Append a ledger entry and apply it to the balance; False if the key was already posted
+
+    The caller owns the transaction.
+    """
+    inserted = session.execute(insert_ignore(ledger).values(
+        employee_id=employee_id,
+        leave_type_id=leave_type_id,
+        year=year,
+        entry_type=entry_type,
+        days=days,
+        leave_request_id=leave_request_id,
+        idempotency_key=idempotency_key,
+        created_by=created_by
+    )).rowcount
+    if not inserted:
+        return False
+
+    total, used = _EFFECTS[entry_type]
+    _apply_to_balances(session, {(employee_id, leave_type_id, year): (days * total, days * used)})
+    return True
+
+
+_posted_keys = select(ledger.c.idempotency_key).where(
+    ledger.c.idempotency_key.in_(bindparam("keys", expanding=True))
+)
+
+
+def post_entries(session: Session, entries: Iterable[dict]) -> List[str]:
+    """Append many ledger entries and apply them to the balances; returns the keys posted
+
+    ``entries`` are dicts of ledger columns. Keys already in the ledger are
+    skipped. A key posted concurrently by another transaction fails this one
+    with an IntegrityError instead of being skipped, so callers must own
+    their keys (as ``decide_requests`` does through the status
+    compare-and-set, or a run that is the only writer of its keys). The
+    caller owns the transaction.
+    """
+    by_key = {entry["idempotency_key"]: entry for entry in entries}
+    if not by_key:
+        return []
+    existing = set(session.scalars(_posted_keys, {"keys": list(by_key)}))
+    fresh = [entry for key, entry in by_key.items() if key not in existing]
+    if not fresh:
+        return []
+
+    session.execute(insert(ledger), [
+        {"leave_request_id": None, "created_by": None, **entry} for entry in fresh
+    ])
+    deltas = defaultdict(lambda: [0, 0])
+    for entry in fresh:
+        total, used = _EFFECTS[entry["entry_type"]]
+        delta = deltas[(entry["employee_id"], entry["leave_type_id"], entry["year"])]
+        delta[0] += entry["days"] * total
+        delta[1] += entry["days"] * used
+    _apply_to_balances(session, deltas)
+    return [entry["idempotency_key"] for entry in fresh]
+
+
+def _apply_to_balances(session: Session, deltas: Dict[Tuple[int, int, int], Tuple[float, float]]):
+    """Add (total, used) deltas to balance rows, creating missing rows at zero"""
+    session.execute(insert_ignore(balances), [
+        {"employee_id": employee_id, "leave_type_id": leave_type_id, "year": year,
+         "total_days": 0, "used_days": 0, "available_days": 0}
+        for employee_id, leave_type_id, year in deltas
+    ])
+    session.execute(
+        update(balances)
+        .where(
+            balances.c.employee_id == bindparam("balance_employee"),
+            balances.c.leave_type_id == bindparam("balance_leave_type"),
+            balances.c.year == bindparam("balance_year")
+        )
+        .values(
+            total_days=balances.c.total_days + bindparam("delta_total"),
+            used_days=balances.c.used_days + bindparam("delta_used"),
+            available_days=balances.c.available_days + bindparam("delta_total") - bindparam("delta_used")
+        ),
+        [
+            {"balance_employee": employee_id, "balance_leave_type": leave_type_id, "balance_year": year,
+             "delta_total": total, "delta_used": used}
+            for (employee_id, leave_type_id, year), (total, used) in deltas.items()
+        ]
+    )
+
+
+def decide_request(
+    session: Session,
+    leave_request_id: int,
+    approve: bool,
+    decided_by: int,
+    comment: Optional[str] = None
+) -> Optional[LeaveRequestStatus]:
+    """Approve or reject a pending request; returns the new status, or None if it was not pending
+
+    An approval debits the request's days from the balance of the year the
+    leave starts in. The caller owns the transaction.
+    """
+    new_status = LeaveRequestStatus.APPROVED if approve else LeaveRequestStatus.REJECTED
+    # Writing first takes the write lock up front (SQLite) and makes the
+    # status change the arbiter between concurrent deciders
+    decided = session.execute(
+        update(requests)
+        .where(requests.c.id == leave_request_id, requests.c.status == LeaveRequestStatus.PENDING)
+        .values(
+            status=new_status,
+            approved_by=decided_by,
+            approval_comment=comment,
+            approved_at=datetime.utcnow()
+        )
+    ).rowcount
+    if not decided:
+        return None
+
+    if approve:
+        employee_id, leave_type_id, start_date, total_days = session.execute(
+            select(requests.c.employee_id, requests.c.leave_type_id, requests.c.start_date,
+                   requests.c.total_days)
+            .where(requests.c.id == leave_request_id)
+        ).one()
+        post_entry(
+            session, employee_id, leave_type_id, start_date.year, LeaveLedgerEntryType.DEBIT,
+            total_days, request_key(leave_request_id, LeaveLedgerEntryType.DEBIT),
+            leave_request_id=leave_request_id, created_by=decided_by
+        )
+    return new_status
+
+
+# Outcomes of one request of a bulk decision
+APPROVED = "approved"
+REJECTED = "rejected"
+NOT_FOUND = "not_found"
+FORBIDDEN = "forbidden"
+NOT_PENDING = "not_pending"
+
+
+@dataclass
+class Decision:
+    """Outcome of one request of a bulk decision, reported in input order"""
+    leave_request_id: int
+    outcome: str
+    employee_id: Optional[int] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    detail: Optional[str] = None
+
+
+_bulk_requests = select(
+    requests.c.id, requests.c.employee_id, requests.c.leave_type_id, requests.c.start_date,
+    requests.c.end_date, requests.c.total_days, requests.c.status
+).where(requests.c.id.in_(bindparam("request_ids", expanding=True)))
+
+
+def decide_requests(
+    session: Session,
+    leave_request_ids: Iterable[int],
+    approve: bool,
+    decided_by: int,
+    comment: Optional[str] = None,
+    in_scope: Optional[Callable[[int], bool]] = None
+) -> List[Decision]:
+    """Approve or reject many requests at once; one Decision per distinct id
+
+    ``in_scope`` filters the employees the decider may act for (None = all).
+    Requests that are missing, out of scope or no longer pending are
+    reported and left alone; the rest change status in one UPDATE guarded
+    by ``status = 'PENDING'`` and approvals are debited in one batch. The
+    caller owns the transaction.
+    """
+    leave_request_ids = list(dict.fromkeys(leave_request_ids))
+    new_status = LeaveRequestStatus.APPROVED if approve else LeaveRequestStatus.REJECTED
+    rows = {row.id: row for row in session.execute(_bulk_requests, {"request_ids": leave_request_ids})}
+
+    decisions = {}
+    candidates = []
+    for request_id in leave_request_ids:
+        row = rows.get(request_id)
+        if row is None:
+            decisions[request_id] = Decision(request_id, NOT_FOUND, detail="Leave request not found")
+        elif in_scope is not None and not in_scope(row.employee_id):
+            decisions[request_id] = Decision(
+                request_id, FORBIDDEN, row.employee_id, detail="Not authorized to action this request"
+            )
+        elif row.status != LeaveRequestStatus.PENDING:
+            decisions[request_id] = Decision(
+                request_id, NOT_PENDING, row.employee_id,
+                detail=f"Cannot action request with status: {row.status}"
+            )
+        else:
+            candidates.append(request_id)
+
+    won = set(candidates)
+    if candidates:
+        # Second precision, so the stamp reads back equal on MySQL DATETIME
+        decided_at = datetime.utcnow().replace(microsecond=0)
+        decided = session.execute(
+            update(requests)
+            .where(requests.c.id.in_(candidates), requests.c.status == LeaveRequestStatus.PENDING)
+            .values(status=new_status, approved_by=decided_by, approval_comment=comment, approved_at=decided_at)
+        ).rowcount
+        if decided < len(candidates):
+            # Someone else decided some of them since the SELECT
+            won = set(session.scalars(
+                select(requests.c.id).where(
+                    requests.c.id.in_(candidates), requests.c.status == new_status,
+                    requests.c.approved_by == decided_by, requests.c.approved_at == decided_at
+                )
+            ))
+    for request_id in candidates:
+        row = rows[request_id]
+        if request_id in won:
+            decisions[request_id] = Decision(
+                request_id, APPROVED if approve else REJECTED, row.employee_id, row.start_date, row.end_date
+            )
+        else:
+            decisions[request_id] = Decision(
+                request_id, NOT_PENDING, row.employee_id, detail="Request was actioned concurrently"
+            )
+
+    if approve and won:
+        post_entries(session, [
+            {
+                "employee_id": rows[request_id].employee_id,
+                "leave_type_id": rows[request_id].leave_type_id,
+                "year": rows[request_id].start_date.year,
+                "entry_type": LeaveLedgerEntryType.DEBIT,
+                "days": rows[request_id].total_days,
+                "idempotency_key": request_key(request_id, LeaveLedgerEntryType.DEBIT),
+                "leave_request_id": request_id,
+                "created_by": decided_by
+            }
+            for request_id in candidates if request_id in won
+        ])
+    return [decisions[request_id] for request_id in leave_request_ids]
+
+
+def ledger_totals(session: Session, employee_id: int, leave_type_id: int, year: int) -> Dict[str, float]:
+    """Balance totals recomputed from the ledger (for audits and reconciliation)"""
+    total, used = session.execute(
+        select(
+            func.coalesce(func.sum(case(
+                (ledger.c.entry_type == LeaveLedgerEntryType.ACCRUAL, ledger.c.days), else_=0
+            )), 0),
+            func.coalesce(func.sum(case(
+                (ledger.c.entry_type == LeaveLedgerEntryType.DEBIT, ledger.c.days),
+                (ledger.c.entry_type == LeaveLedgerEntryType.CREDIT, -ledger.c.days),
+                else_=0
+            )), 0)
+        ).where(
+            ledger.c.employee_id == employee_id,
+            ledger.c.leave_type_id == leave_type_id,
+            ledger.c.year == year
+        )
+    ).one()
+    return {"total_days": total, "used_days": used, "available_days": total - used}
@@ -0,0 +1,117 @@
+"""Org-tree index for manager scope checks
+
+The ``employees.manager_id`` hierarchy is loaded once into an in-memory
+index (one ``SELECT id, manager_id`` over employees) and laid out in DFS
+order, so every subtree is a contiguous slice:
+
+- ``is_in_subtree(x, y)`` compares entry/exit positions, O(1);
+- ``subtree_ids(y)`` returns the slice, O(k) in the size of the team.
+
+The index is rebuilt when a committed transaction changes an employee's
+manager (or adds/removes employees), and at most every
+``ORG_TREE_TTL_SECONDS`` so changes made by other workers are picked up.
+
+``MANAGER_SCOPE_DEPTH`` sets how far down a manager's authority reaches:
+1 = direct reports (the historical behaviour), 2 = skip-level, 0 = the
+whole subtree.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models import Employee
+from app.services.generation_cache import GenerationCache
+
+settings = get_settings()
+
+
+class OrgTree:
+    """Immutable DFS-ordered index of the reporting hierarchy"""
+
+    def __init__(self, edges: Iterable[Tuple[int, Optional[int]]]):
+        self.manager_of: Dict[int, Optional[int]] = {}
+        children: Dict[Optional[int], List[int]] = {}
+        for employee_id, manager_id in edges:
+            self.manager_of[employee_id] = manager_id
+            children.setdefault(manager_id, []).append(employee_id)
+
+        self.order: List[int] = []
+        self.entry: Dict[int, int] = {}
+        self.exit: Dict[int, int] = {}
+        self.level: Dict[int, int] = {}
+
+        # Roots are employees without a (known) manager; anything left after
+        # that sits on a manager_id cycle and is walked from an arbitrary member
+        roots = [e for e, m in self.manager_of.items() if m is None or m not in self.manager_of]
+        for root in roots + list(self.manager_of):
+            if root in self.entry:
+                continue
+            self.level[root] = 0
+            stack = [(root, False)]
+            while stack:
+                node, done = stack.pop()
+                if done:
+                    self.exit[node] = len(self.order) - 1
+                    continue
+                if node in self.entry:
+                    continue
+                self.entry[node] = len(self.order)
+                self.order.append(node)
+                stack.append((node, True))
+                for child in reversed(children.get(node, [])):
+                    if child not in self.entry:
+                        self.level[child] = self.level[node] + 1
+                        stack.append((child, False))
+
+    def is_in_subtree(self, employee_id: int, manager_id: int, depth: int = 0) -> bool:
+        """True if ``employee_id`` reports to ``manager_id`` within ``depth`` levels (0 = any)"""
+        if employee_id == manager_id or employee_id not in self.entry or manager_id not in self.entry:
+            return False
+        if not self.entry[manager_id] < self.entry[employee_id] <= self.exit[manager_id]:
+            return False
+        return not depth or self.level[employee_id] - self.level[manager_id] <= depth
+
+    def subtree_ids(self, manager_id: int, depth: int = 0) -> List[int]:
+        """Ids of everyone under ``manager_id`` within ``depth`` levels (0 = any)"""
+        if manager_id not in self.entry:
+            return []
+        members = self.order[self.entry[manager_id] + 1:self.exit[manager_id] + 1]
+        if not depth:
+            return members
+        limit = self.level[manager_id] + depth
+        return [member for member in members if self.level[member] <= limit]
+
+
+org_tree: GenerationCache[OrgTree] = GenerationCache(
+    select(Employee.id, Employee.manager_id), OrgTree,
+    watch=Employee, ttl_setting="ORG_TREE_TTL_SECONDS", attributes=("manager_id",)
+)
+
+
+async def manages(db: AsyncSession, principal, employee_id: int) -> bool:
+    """True if ``employee_id`` is within ``principal``'s management scope"""
+    if not principal.employee_id:
+        return False
+    tree = await org_tree.get(db)
+    return tree.is_in_subtree(employee_id, principal.employee_id, settings.MANAGER_SCOPE_DEPTH)
+
+
+async def scope_check(db: AsyncSession, principal) -> Callable[[int], bool]:
+    """``manages`` for many employees: one index lookup, then O(1) per check"""
+    if not principal.employee_id:
+        return lambda employee_id: False
+    tree = await org_tree.get(db)
+    return lambda employee_id: tree.is_in_subtree(
+        employee_id, principal.employee_id, settings.MANAGER_SCOPE_DEPTH
+    )
+
+
+async def team_ids(db: AsyncSession, principal) -> List[int]:
+    """Employee ids within ``principal``'s management scope"""
+    if not principal.employee_id:
+        return []
+    tree = await org_tree.get(db)
+    return tree.subtree_ids(principal.employee_id, settings.MANAGER_SCOPE_DEPTH)
+
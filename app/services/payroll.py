@@ -0,0 +1,405 @@
+"""Chunked payroll computation
+
+Employees are read in keyset-paginated chunks of plain rows (no ORM objects,
+no identity map), pay components are computed row by row with exact Decimal
+arithmetic and every chunk is written with one bulk INSERT.
+
+Employees hired after the start of the pay period are paid for the share of
+the period's workdays (business calendar, at their department's location)
+they were employed.
+
+Runs are split into employee-id range shards processed by parallel Celery
+tasks (or one after another by ``run_payroll``). A worker claims a shard
+with a conditional UPDATE, so a duplicate delivery of the same shard finds
+it taken and does nothing. A shard commits its payslips, its COMPLETED
+status and its share of the run total in one transaction, and deletes its
+own range first. It can be re-run safely, finished shards are never
+recomputed, and the run total grows as shards complete.
+
+Once a run completes, its payslip PDFs are rendered across a process pool
+(app.services.payslip_pdf). Each rendered batch records its file paths and
+content hashes in one bulk UPDATE.
+"""
+import math
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, delete, func, insert, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import (
+    Department, Employee, EmploymentStatus, PayrollRun, PayrollRunShard, PayrollStatus, Payslip
+)
+from app.services import payslip_pdf
+from app.services.business_calendar import BusinessCalendar, business_calendar
+
+settings = get_settings()
+
+ALLOWANCE_RATE = Decimal("0.10")
+TAX_RATE = Decimal("0.15")
+DEDUCTION_RATE = Decimal("0.05")
+CENT = Decimal("0.01")
+
+
+@dataclass
+class PayrollStats:
+    """Outcome of computing a payroll run (or a slice of one)"""
+    payslips: int = 0
+    total_amount: Decimal = Decimal("0.00")
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.payslips / self.elapsed if self.elapsed else 0.0
+
+
+class Proration:
+    """Share of a pay period's workdays an employee was employed for"""
+
+    def __init__(self, calendar: BusinessCalendar, period_start: date, period_end: date):
+        self.calendar = calendar
+        self.period_start = period_start
+        self.period_end = period_end
+
+    @classmethod
+    def for_run(cls, db: Session, payroll_run_id: int) -> "Proration":
+        period_start, period_end = db.execute(
+            select(PayrollRun.period_start, PayrollRun.period_end).where(PayrollRun.id == payroll_run_id)
+        ).one()
+        return cls(business_calendar.get_sync(db), period_start, period_end)
+
+    def factor(self, hire_date: Optional[date], location: Optional[str]) -> Decimal:
+        if hire_date is None or hire_date <= self.period_start:
+            return Decimal(1)
+        if hire_date > self.period_end:
+            return Decimal(0)
+        workdays = self.calendar.workdays_between(self.period_start, self.period_end, location)
+        if not workdays:
+            return Decimal(1)
+        employed = self.calendar.workdays_between(hire_date, self.period_end, location)
+        return Decimal(employed) / Decimal(workdays)
+
+
+def _money(value: Decimal) -> Decimal:
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _payable():
+    return (
+        Employee.employment_status == EmploymentStatus.ACTIVE,
+        Employee.salary.isnot(None),
+        Employee.salary != 0
+    )
+
+
+def iter_payable_employees(
+    db: Session,
+    chunk_size: int,
+    min_id: Optional[int] = None,
+    max_id: Optional[int] = None
+) -> Iterator[List[Row]]:
+    """Yield (id, salary, currency, hire_date, location) rows of active, salaried employees in id order
+
+    Each chunk is a fresh keyset query, so the caller may commit between chunks.
+    """
+    last_id = (min_id - 1) if min_id is not None else 0
+    while True:
+        query = (
+            select(Employee.id, Employee.salary, Employee.currency, Employee.hire_date, Department.location)
+            .outerjoin(Department, Department.id == Employee.department_id)
+            .where(*_payable(), Employee.id > last_id)
+            .order_by(Employee.id)
+            .limit(chunk_size)
+        )
+        if max_id is not None:
+            query = query.where(Employee.id <= max_id)
+        rows = db.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def compute_payslips(
+    payroll_run_id: int, employees: List[Row], proration: Optional[Proration] = None
+) -> Tuple[List[dict], Decimal]:
+    """Compute payslip rows for a chunk of employees; returns (rows, net total)
+
+    Employees not yet hired by the end of the period get no payslip.
+    """
+    payslips = []
+    total = Decimal("0.00")
+    for employee_id, salary, currency, hire_date, location in employees:
+        factor = proration.factor(hire_date, location) if proration else Decimal(1)
+        if not factor:
+            continue
+        basic_salary = _money(Decimal(salary) * factor)
+        allowances = _money(basic_salary * ALLOWANCE_RATE)
+        tax = _money(basic_salary * TAX_RATE)
+        deductions = _money(basic_salary * DEDUCTION_RATE)
+        net_salary = basic_salary + allowances - tax - deductions
+        total += net_salary
+        payslips.append({
+            "employee_id": employee_id,
+            "payroll_run_id": payroll_run_id,
+            "basic_salary": basic_salary,
+            "allowances": allowances,
+            "deductions": deductions,
+            "tax": tax,
+            "net_salary": net_salary,
+            "currency": currency or "USD"
+        })
+    return payslips, total
+
+
+# Sharded runs
+def plan_shards(db: Session, payroll_run_id: int, shard_size: Optional[int] = None) -> List[PayrollRunShard]:
+    """Split the payable employees into id ranges of ``shard_size`` employees
+
+    Existing shards are returned unchanged, so re-dispatching a run keeps the
+    original ranges and the work already completed in them.
+    """
+    shards = db.scalars(
+        select(PayrollRunShard)
+        .where(PayrollRunShard.payroll_run_id == payroll_run_id)
+        .order_by(PayrollRunShard.shard_index)
+    ).all()
+    if shards:
+        return list(shards)
+
+    # Completed shards add to the total as they commit
+    db.execute(update(PayrollRun).where(PayrollRun.id == payroll_run_id).values(total_amount=0))
+
+    shard_size = shard_size or settings.PAYROLL_SHARD_SIZE
+    last_id = 0
+    while True:
+        first_id = db.scalar(
+            select(func.min(Employee.id)).where(*_payable(), Employee.id > last_id)
+        )
+        if first_id is None:
+            break
+        # Id of the shard_size-th payable employee from here, or the last one
+        end_id = db.scalar(
+            select(Employee.id).where(*_payable(), Employee.id > last_id)
+            .order_by(Employee.id).offset(shard_size - 1).limit(1)
+        ) or db.scalar(select(func.max(Employee.id)).where(*_payable()))
+        shards.append(PayrollRunShard(
+            payroll_run_id=payroll_run_id,
+            shard_index=len(shards),
+            min_employee_id=first_id,
+            max_employee_id=end_id,
+            status=PayrollStatus.PENDING
+        ))
+        last_id = end_id
+    db.add_all(shards)
+    db.commit()
+    return list(shards)
+
+
+def _claim_shard(db: Session, shard_id: int) -> Optional[int]:
+    """Move a PENDING or FAILED shard (or one whose worker outlived its lease) to
+    PROCESSING; returns the attempt number now owning it, or None if it is not claimable"""
+    now = datetime.utcnow()
+    shards = PayrollRunShard.__table__
+    claimed = db.execute(
+        update(shards)
+        .where(shards.c.id == shard_id, or_(
+            shards.c.status.in_([PayrollStatus.PENDING, PayrollStatus.FAILED]),
+            and_(
+                shards.c.status == PayrollStatus.PROCESSING,
+                shards.c.started_at < now - timedelta(seconds=settings.PAYROLL_SHARD_LEASE_SECONDS)
+            )
+        ))
+        .values(
+            status=PayrollStatus.PROCESSING,
+            attempts=func.coalesce(shards.c.attempts, 0) + 1,
+            error=None,
+            started_at=now
+        )
+    ).rowcount
+    attempt = db.scalar(select(shards.c.attempts).where(shards.c.id == shard_id)) if claimed else None
+    db.commit()
+    return attempt
+
+
+def _owned_by(shard_id: int, attempt: int):
+    shards = PayrollRunShard.__table__
+    return (
+        shards.c.id == shard_id,
+        shards.c.status == PayrollStatus.PROCESSING,
+        shards.c.attempts == attempt
+    )
+
+
+def process_shard(db: Session, shard_id: int, chunk_size: Optional[int] = None) -> Optional[PayrollStats]:
+    """Compute the payslips of one shard; returns None if it is completed or another worker has it
+
+    Completion is recorded only if this attempt still owns the shard, and the
+    run total is bumped in the same transaction, so a shard is counted once.
+    """
+    chunk_size = chunk_size or settings.PAYROLL_CHUNK_SIZE
+    attempt = _claim_shard(db, shard_id)
+    if attempt is None:
+        return None
+    shard = db.get(PayrollRunShard, shard_id)
+    shards = PayrollRunShard.__table__
+
+    stats = PayrollStats()
+    started = time.perf_counter()
+    try:
+        # Payslips from an interrupted attempt are replaced in the same transaction
+        db.execute(delete(Payslip).where(
+            Payslip.payroll_run_id == shard.payroll_run_id,
+            Payslip.employee_id >= shard.min_employee_id,
+            Payslip.employee_id <= shard.max_employee_id
+        ))
+        proration = Proration.for_run(db, shard.payroll_run_id)
+        for employees in iter_payable_employees(
+            db, chunk_size, shard.min_employee_id, shard.max_employee_id
+        ):
+            payslips, chunk_total = compute_payslips(shard.payroll_run_id, employees, proration)
+            if payslips:
+                db.execute(insert(Payslip), payslips)
+            stats.payslips += len(payslips)
+            stats.total_amount += chunk_total
+        completed = db.execute(
+            update(shards).where(*_owned_by(shard_id, attempt)).values(
+                status=PayrollStatus.COMPLETED,
+                payslip_count=stats.payslips,
+                total_amount=stats.total_amount,
+                completed_at=datetime.utcnow()
+            )
+        ).rowcount
+        if not completed:
+            # Reclaimed by a later attempt after our lease ran out: leave it the range
+            db.rollback()
+            return None
+        db.execute(
+            update(PayrollRun)
+            .where(PayrollRun.id == shard.payroll_run_id)
+            .values(total_amount=func.coalesce(PayrollRun.total_amount, 0) + stats.total_amount)
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        db.execute(
+            update(shards).where(*_owned_by(shard_id, attempt)).values(status=PayrollStatus.FAILED, error=str(e))
+        )
+        db.commit()
+        raise
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def finalize_run(db: Session, payroll_run_id: int) -> PayrollRun:
+    """Mark the run COMPLETED if every shard is, FAILED otherwise"""
+    payroll_run = db.get(PayrollRun, payroll_run_id)
+    shard_statuses = db.scalars(
+        select(PayrollRunShard.status).where(PayrollRunShard.payroll_run_id == payroll_run_id)
+    ).all()
+    if all(shard_status == PayrollStatus.COMPLETED for shard_status in shard_statuses):
+        payroll_run.status = PayrollStatus.COMPLETED
+        payroll_run.processed_at = datetime.utcnow()
+    else:
+        payroll_run.status = PayrollStatus.FAILED
+    db.commit()
+    return payroll_run
+
+
+def run_payroll(
+    db: Session, payroll_run_id: int, chunk_size: Optional[int] = None, shard_size: Optional[int] = None
+) -> PayrollStats:
+    """Process a run's pending shards one after another in this process, then finalize it
+
+    The same steps as the Celery tasks, without the fan-out: for scripts,
+    benchmarks and tests.
+    """
+    stats = PayrollStats()
+    started = time.perf_counter()
+    db.execute(
+        update(PayrollRun).where(PayrollRun.id == payroll_run_id).values(status=PayrollStatus.PROCESSING)
+    )
+    db.commit()
+    for shard in plan_shards(db, payroll_run_id, shard_size):
+        shard_stats = process_shard(db, shard.id, chunk_size)
+        if shard_stats is not None:
+            stats.payslips += shard_stats.payslips
+            stats.total_amount += shard_stats.total_amount
+    finalize_run(db, payroll_run_id)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+# Payslip documents
+def _unrendered(payroll_run_id: int):
+    return (Payslip.payroll_run_id == payroll_run_id, Payslip.file_path.is_(None))
+
+
+def iter_unrendered_payslips(db: Session, payroll_run_id: int, batch_size: int) -> Iterator[List[dict]]:
+    """Yield batches of render-ready dicts for the run's payslips that have no file yet"""
+    query = (
+        select(
+            Payslip.id, Payslip.payroll_run_id, Payslip.basic_salary, Payslip.allowances, Payslip.tax,
+            Payslip.deductions, Payslip.net_salary, Payslip.currency, Employee.employee_number,
+            Employee.first_name, Employee.last_name, Department.name.label("department"),
+            PayrollRun.period_start, PayrollRun.period_end
+        )
+        .join(Employee, Employee.id == Payslip.employee_id)
+        .join(PayrollRun, PayrollRun.id == Payslip.payroll_run_id)
+        .outerjoin(Department, Department.id == Employee.department_id)
+        .where(*_unrendered(payroll_run_id))
+        .order_by(Payslip.id)
+        .limit(batch_size)
+    )
+    last_id = 0
+    while True:
+        rows = db.execute(query.where(Payslip.id > last_id)).all()
+        if not rows:
+            return
+        yield [
+            {
+                **row._asdict(),
+                "employee_name": f"{row.first_name} {row.last_name}",
+                "period": f"{row.period_start} to {row.period_end}",
+                "path": payslip_pdf.payslip_path(payroll_run_id, row.id)
+            }
+            for row in rows
+        ]
+        last_id = rows[-1].id
+
+
+_store_file_path = (
+    update(Payslip.__table__)
+    .where(Payslip.__table__.c.id == bindparam("payslip_id"))
+    .values(file_path=bindparam("path"), content_sha256=bindparam("sha256"))
+)
+
+
+def render_payslips(
+    db: Session, payroll_run_id: int, workers: Optional[int] = None, batch_size: Optional[int] = None
+) -> PayrollStats:
+    """Render the PDFs of a run's payslips that have none yet, committing their paths per batch
+
+    Safe to re-run: payslips whose path was stored are skipped, and a PDF
+    rendered before a crash is simply rewritten.
+    """
+    batch_size = batch_size or settings.PAYSLIP_RENDER_BATCH_SIZE
+    stats = PayrollStats()
+    started = time.perf_counter()
+    pending = db.scalar(select(func.count()).select_from(Payslip).where(*_unrendered(payroll_run_id)))
+    if pending:
+        workers = min(workers or payslip_pdf.default_workers(), math.ceil(pending / batch_size))
+        batches = iter_unrendered_payslips(db, payroll_run_id, batch_size)
+        for stored in payslip_pdf.render_batches(batches, workers):
+            db.execute(_store_file_path, [
+                {"payslip_id": payslip_id, "path": path, "sha256": sha256} for payslip_id, path, sha256 in stored
+            ])
+            db.commit()
+            stats.payslips += len(stored)
+    stats.elapsed = time.perf_counter() - started
+    return stats
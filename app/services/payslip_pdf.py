@@ -0,0 +1,176 @@
+"""Payslip PDF rendering in a process pool
+
+Rendering is CPU-bound, so ``render_batches`` spreads batches of payslips
+over a ``ProcessPoolExecutor`` with one worker per core. Each worker builds a
+``PayslipTemplate`` once, when the pool starts it. The template holds the
+fonts, the layout and the PDF operators of everything that is the same on
+every payslip: header, labels and rules. A document then only adds its
+values on top of that template. Workers write their PDFs themselves: to a
+temporary name first, then renamed into place. The parent only receives
+``(payslip_id, path, sha256)`` tuples, which it stores in bulk.
+
+This module does not touch the database, so spawned workers import only
+reportlab and the settings.
+"""
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+
+from app.config import get_settings
+
+settings = get_settings()
+
+FONT = "Helvetica"
+BOLD_FONT = "Helvetica-Bold"
+LEFT = 50
+RIGHT = A4[0] - 50
+VALUE_X = 200
+
+DETAILS = (
+    ("Employee", "employee_name"),
+    ("Employee number", "employee_number"),
+    ("Department", "department"),
+    ("Pay period", "period"),
+)
+COMPONENTS = (
+    ("Basic salary", "basic_salary"),
+    ("Allowances", "allowances"),
+    ("Tax", "tax"),
+    ("Deductions", "deductions"),
+)
+NET = ("Net salary", "net_salary")
+
+
+def payslip_path(payroll_run_id: int, payslip_id: int) -> str:
+    return os.path.join(settings.UPLOAD_DIR, "payslips", str(payroll_run_id), f"{payslip_id}.pdf")
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class PayslipTemplate:
+    """Fonts, layout and static page content, built once per worker process"""
+
+    def __init__(self, title: str = None):
+        self.title = title or settings.APP_NAME
+        self.detail_y = [740 - i * 18 for i in range(len(DETAILS))]
+        self.component_y = [640 - i * 18 for i in range(len(COMPONENTS))]
+        self.net_y = self.component_y[-1] - 30
+        self.static_code = self._static_code()
+
+    def _static_code(self) -> str:
+        # Plain PDF operators; fonts are referenced by the internal names the
+        # canvas gives them in use_fonts(), F1 and F2 in that order
+        lines = [
+            "BT /F2 16 Tf 1 0 0 1 %d %d Tm (%s) Tj ET" % (LEFT, 790, _escape(self.title)),
+            "BT /F1 11 Tf 1 0 0 1 %d %d Tm (Payslip) Tj ET" % (LEFT, 772),
+        ]
+        for (label, _), y in zip(DETAILS, self.detail_y):
+            lines.append("BT /F1 10 Tf 1 0 0 1 %d %d Tm (%s) Tj ET" % (LEFT, y, _escape(label)))
+        lines.append("BT /F2 10 Tf 1 0 0 1 %d %d Tm (Earnings and deductions) Tj ET" % (LEFT, 662))
+        for (label, _), y in zip(COMPONENTS, self.component_y):
+            lines.append("BT /F1 10 Tf 1 0 0 1 %d %d Tm (%s) Tj ET" % (LEFT, y, _escape(label)))
+        lines.append("BT /F2 11 Tf 1 0 0 1 %d %d Tm (%s) Tj ET" % (LEFT, self.net_y, NET[0]))
+        for y in (760, 676, self.net_y + 16):
+            lines.append("%d %d m %d %d l S" % (LEFT, y, RIGHT, y))
+        return "\n".join(lines)
+
+    def use_fonts(self, canvas: Canvas):
+        canvas.setFont(FONT, 10)
+        canvas.setFont(BOLD_FONT, 10)
+
+    def render(self, payslip: dict) -> bytes:
+        buffer = io.BytesIO()
+        canvas = Canvas(buffer, pagesize=A4, invariant=1, pageCompression=0)
+        self.use_fonts(canvas)
+        canvas.addLiteral(self.static_code)
+
+        text = canvas.beginText()
+        text.setFont(FONT, 10)
+        for (_, key), y in zip(DETAILS, self.detail_y):
+            text.setTextOrigin(VALUE_X, y)
+            text.textOut(str(payslip[key] or ""))
+        currency = payslip["currency"] or "USD"
+        for (_, key), y in zip(COMPONENTS, self.component_y):
+            self._amount(text, FONT, 10, payslip[key], currency, y)
+        self._amount(text, BOLD_FONT, 11, payslip[NET[1]], currency, self.net_y)
+        canvas.drawText(text)
+
+        canvas.showPage()
+        canvas.save()
+        return buffer.getvalue()
+
+    @staticmethod
+    def _amount(text, font: str, size: int, value, currency: str, y: int):
+        amount = f"{value or 0:,.2f} {currency}"
+        text.setFont(font, size)
+        text.setTextOrigin(RIGHT - stringWidth(amount, font, size), y)
+        text.textOut(amount)
+
+
+_template: Optional[PayslipTemplate] = None
+
+
+def _init_worker():
+    global _template
+    _template = PayslipTemplate()
+
+
+def write_atomic(path: str, data: bytes):
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+def render_batch(payslips: List[dict]) -> List[Tuple[int, str, str]]:
+    """Render and store a batch of payslips; returns (payslip_id, path, sha256) tuples
+
+    Each dict carries the payslip columns plus employee_name,
+    employee_number, department, period and the path to write to.
+    """
+    template = _template or PayslipTemplate()
+    stored = []
+    directories = set()
+    for payslip in payslips:
+        path = payslip["path"]
+        directory = os.path.dirname(path)
+        if directory not in directories:
+            os.makedirs(directory, exist_ok=True)
+            directories.add(directory)
+        pdf = template.render(payslip)
+        write_atomic(path, pdf)
+        stored.append((payslip["id"], path, hashlib.sha256(pdf).hexdigest()))
+    return stored
+
+
+def default_workers() -> int:
+    return settings.PAYSLIP_RENDER_WORKERS or os.cpu_count() or 1
+
+
+def render_batches(
+    batches: Iterable[List[dict]], workers: Optional[int] = None
+) -> Iterator[List[Tuple[int, str, str]]]:
+    """Render batches across a process pool, yielding each batch's (id, path, sha256) tuples in order
+
+    At most two batches per worker are in flight, so a large run is never
+    held in memory at once.
+    """
+    workers = workers or default_workers()
+    # spawn: the caller may hold database connections and threads
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn"), initializer=_init_worker) as pool:
+        pending = []
+        for batch in batches:
+            pending.append(pool.submit(render_batch, batch))
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
@@ -0,0 +1,493 @@
+"""Write-behind buffer for clock-in/clock-out punches
+
+With ``ATTENDANCE_WRITE_BEHIND`` enabled, /attendance/clock-in and
+/attendance/clock-out do not write to the database. The punch is appended
+to a buffer and acknowledged at once; the ``flush_punch_buffer`` Celery
+task moves buffered punches into ``attendance_records`` in batches through
+app.services.punches, one transaction per batch.
+
+The buffer is a Redis stream, read by the flush task through a consumer
+group. Each append runs as one Lua script, which also enforces the
+duplicate clock-in rule atomically. The script keeps a per-day hash of
+employee state: ``open <time> <stamp>`` or ``closed <time> <stamp>``, where
+``<time>`` is the punch time as stored and ``<stamp>`` orders the states. An employee with no known state that day is looked up in the
+database once.
+
+Every process on a host also shares a SQLite file (``PUNCH_BUFFER_LOCAL_PATH``)
+holding the same per-day state, plus a local punch log:
+- punches accepted by Redis are mirrored into its state, so a fallback to
+  the local log mid-day still knows who is clocked in;
+- when Redis is unreachable, punches are checked against that state and
+  appended to the log in one SQLite transaction, so the duplicate rule
+  holds across all API workers of the host;
+- both tiers pass the newer of their two states to the check, so punches
+  taken locally during an outage still count once Redis is back.
+
+The flush task drains the local log too, so it must share the file system
+with the API (as the docker-compose services do). Across hosts, the rule is
+only enforced while Redis is up.
+
+A crash between commit and acknowledgement re-delivers a batch. This is
+harmless because replayed punches are reported as duplicates by
+apply_punches.
+
+Buffered punches are also kept per employee, so the read endpoints can merge
+them into the records they return until they are flushed.
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import AttendanceRecord
+from app.services.punches import CLOCK_IN, REJECTED, Punch, apply_punches
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+OPEN = "open"
+CLOSED = "closed"
+STATE_TTL_SECONDS = 2 * 24 * 3600
+
+# KEYS: day state hash, stream, employee pending list
+# ARGV: employee id, action, state known outside Redis ("" if none), punch JSON,
+#       ttl, state after the punch
+# Returns {"ok", previous state}, {"rejected", state} or {"unknown", ""}
+_APPEND_SCRIPT = """
+local function stamp(state)
+    local space = string.find(state, ' ', 1, true)
+    if space then return string.sub(state, space + 1) end
+    return ''
+end
+local state = redis.call('HGET', KEYS[1], ARGV[1])
+local known = ARGV[3]
+if known ~= '' and (not state or stamp(known) > stamp(state)) then state = known end
+if not state then return {'unknown', ''} end
+local is_open = string.sub(state, 1, 4) == 'open'
+if (ARGV[2] == 'clock_in') == is_open then return {'rejected', state} end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[6])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('XADD', KEYS[2], '*', 'punch', ARGV[4])
+redis.call('RPUSH', KEYS[3], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+return {'ok', state}
+"""
+
+# Releases the flush lock only if it still holds this flusher's token, so a
+# flush that outlived the lock TTL cannot drop the lock of the next one
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+_LOCAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS punches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_id INTEGER NOT NULL,
+    punch TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_punches_employee_id ON punches (employee_id);
+CREATE TABLE IF NOT EXISTS punch_state (
+    day TEXT NOT NULL,
+    employee_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    stamp TEXT NOT NULL,
+    PRIMARY KEY (day, employee_id)
+);
+CREATE TABLE IF NOT EXISTS flush_lock (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class PunchRejected(Exception):
+    """The punch breaks the clock-in/clock-out rules"""
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def _rejection(action: str) -> PunchRejected:
+    if action == CLOCK_IN:
+        return PunchRejected("Already clocked in today. Please clock out first.")
+    return PunchRejected("No clock-in record found for today")
+
+
+def _open_since(state: str) -> Optional[datetime]:
+    """Clock-in time of an ``open <iso time> ...`` state"""
+    parts = state.split(" ")
+    if parts[0] == OPEN and len(parts) > 1 and parts[1]:
+        return datetime.fromisoformat(parts[1])
+    return None
+
+
+def _state_after(punch: dict, stamp: str) -> str:
+    return f"{OPEN if punch['action'] == CLOCK_IN else CLOSED} {punch['timestamp']} {stamp}"
+
+
+def _stamp(state: str) -> str:
+    return state.partition(" ")[2]
+
+
+def _newer(state: str, other: str) -> str:
+    """The more recently stamped of two states ("" when neither is known)"""
+    if not state or (other and _stamp(other) > _stamp(state)):
+        return other
+    return state
+
+
+class LocalPunchLog:
+    """Per-day punch state and fallback punch log in a SQLite file
+
+    Writes run in ``BEGIN IMMEDIATE`` transactions, which SQLite serializes
+    across processes, so every API worker and the flush task on the host see
+    one consistent state. Connections are kept per thread. Call these methods
+    through ``asyncio.to_thread`` from async code.
+    """
+
+    def __init__(self):
+        self._connections = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        path = settings.PUNCH_BUFFER_LOCAL_PATH
+        connections = self._connections.__dict__.setdefault("by_path", {})
+        connection = connections.get(path)
+        if connection is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_LOCAL_SCHEMA)
+            connections[path] = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def _set_state(connection: sqlite3.Connection, punch: dict, state: str):
+        day = punch["timestamp"][:10]
+        # Mirrored punches may arrive out of order; the latest stamp wins
+        connection.execute(
+            "INSERT INTO punch_state (day, employee_id, state, stamp) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (day, employee_id) DO UPDATE SET state = excluded.state, stamp = excluded.stamp "
+            "WHERE excluded.stamp > punch_state.stamp",
+            (day, punch["employee_id"], state, _stamp(state))
+        )
+        # Earlier days can no longer affect a punch
+        connection.execute("DELETE FROM punch_state WHERE day < ?", (day,))
+
+    def state(self, punch: dict) -> str:
+        """State of the punch's employee on the punch's day ("" if none)"""
+        row = self._connect().execute(
+            "SELECT state FROM punch_state WHERE day = ? AND employee_id = ?",
+            (punch["timestamp"][:10], punch["employee_id"])
+        ).fetchone()
+        return row[0] if row else ""
+
+    def append(self, punch: dict, known: str, after: str) -> Tuple[str, str]:
+        """Check the punch against the stored (or ``known``) state, log it and store ``after``"""
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT state FROM punch_state WHERE day = ? AND employee_id = ?",
+                (punch["timestamp"][:10], punch["employee_id"])
+            ).fetchone()
+            state = _newer(row[0] if row else "", known)
+            if not state:
+                return "unknown", ""
+            if (punch["action"] == CLOCK_IN) == state.startswith(OPEN):
+                return "rejected", state
+            self._set_state(connection, punch, after)
+            connection.execute(
+                "INSERT INTO punches (employee_id, punch) VALUES (?, ?)",
+                (punch["employee_id"], json.dumps(punch))
+            )
+        return "ok", state
+
+    def record(self, punch: dict, state: str):
+        """Mirror the state set by a punch another tier accepted"""
+        with self._transaction() as connection:
+            self._set_state(connection, punch, state)
+
+    def pending_for(self, employee_id: int) -> List[dict]:
+        rows = self._connect().execute(
+            "SELECT punch FROM punches WHERE employee_id = ? ORDER BY id", (employee_id,)
+        ).fetchall()
+        return [json.loads(punch) for punch, in rows]
+
+    def take(self, limit: int) -> List[Tuple[int, dict]]:
+        """The oldest ``limit`` logged punches, with their log ids"""
+        rows = self._connect().execute("SELECT id, punch FROM punches ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(punch_id, json.loads(punch)) for punch_id, punch in rows]
+
+    def remove(self, last_id: int):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM punches WHERE id <= ?", (last_id,))
+
+    def acquire_flush(self, seconds: int) -> bool:
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute("SELECT expires_at FROM flush_lock WHERE id = 1").fetchone()
+            if row and row[0] > now:
+                return False
+            connection.execute(
+                "INSERT OR REPLACE INTO flush_lock (id, expires_at) VALUES (1, ?)", (now + seconds,)
+            )
+        return True
+
+    def release_flush(self):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM flush_lock")
+
+    def clear(self):
+        with self._transaction() as connection:
+            for table in ("punches", "punch_state", "flush_lock"):
+                connection.execute(f"DELETE FROM {table}")
+
+
+class PunchBuffer:
+    """Redis-stream punch buffer with a local SQLite log fallback"""
+
+    STREAM = "hrms:punches"
+    GROUP = "hrms-punch-flush"
+    CONSUMER = "flusher"
+    STATE_PREFIX = "hrms:punches:state:"
+    PENDING_PREFIX = "hrms:punches:pending:"
+    FLUSH_LOCK_KEY = "hrms:punches:flush-lock"
+
+    def __init__(self):
+        self._local = LocalPunchLog()
+        self._redis: Optional[aioredis.Redis] = None
+        self._sync_redis: Optional[redis.Redis] = None
+        self._append_script = None
+        self._release_script = None
+        self._redis_down_until = 0.0
+
+    # Redis tier
+    def _redis_available(self) -> bool:
+        return settings.PUNCH_BUFFER_REDIS_ENABLED and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: Exception):
+        logger.warning(f"Punch buffer Redis unavailable, using local log: {error}")
+        self._redis_down_until = time.monotonic() + settings.PUNCH_BUFFER_REDIS_RETRY_SECONDS
+
+    def _get_redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.Redis(**settings.redis_connection_kwargs)
+            self._append_script = self._redis.register_script(_APPEND_SCRIPT)
+        return self._redis
+
+    def _get_sync_redis(self) -> redis.Redis:
+        if self._sync_redis is None:
+            self._sync_redis = redis.Redis(**settings.redis_connection_kwargs)
+            self._release_script = self._sync_redis.register_script(_RELEASE_SCRIPT)
+        return self._sync_redis
+
+    async def _redis_append(self, punch: dict, known: str, after: str) -> Tuple[str, str]:
+        self._get_redis()
+        day = punch["timestamp"][:10]
+        result, state = await self._append_script(
+            keys=[
+                f"{self.STATE_PREFIX}{day}", self.STREAM,
+                f"{self.PENDING_PREFIX}{punch['employee_id']}"
+            ],
+            args=[
+                punch["employee_id"], punch["action"], known, json.dumps(punch),
+                STATE_TTL_SECONDS, after
+            ],
+        )
+        return result.decode(), state.decode()
+
+    async def _local_state(self, punch: dict) -> str:
+        try:
+            return await asyncio.to_thread(self._local.state, punch)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Punch buffer local state unavailable: {e}")
+            return ""
+
+    async def _database_state(self, db: AsyncSession, employee_id: int, day: date) -> str:
+        record = (await db.execute(
+            select(AttendanceRecord.id, AttendanceRecord.clock_in).where(
+                AttendanceRecord.employee_id == employee_id,
+                AttendanceRecord.date == day,
+                AttendanceRecord.clock_out == None
+            )
+        )).first()
+        if record is None:
+            return CLOSED
+        return f"{OPEN} {record.clock_in.isoformat() if record.clock_in else ''}".rstrip()
+
+    async def append(
+        self,
+        db: AsyncSession,
+        employee_id: int,
+        action: str,
+        geo_location: Optional[dict] = None
+    ) -> Tuple[dict, Optional[datetime]]:
+        """Buffer a punch stamped now
+
+        Returns the punch and, for a clock-out, the clock-in time it closes.
+        Raises PunchRejected when the punch breaks the clock-in/out rules.
+        """
+        now = datetime.now()
+        punch = {
+            "employee_id": employee_id,
+            "action": action,
+            # Whole seconds, as attendance_records stores them
+            "timestamp": now.replace(microsecond=0).isoformat(),
+            "geo_location": geo_location,
+        }
+        after = _state_after(punch, now.isoformat(timespec="microseconds"))
+        known = await self._local_state(punch)
+        while True:
+            result = None
+            if self._redis_available():
+                try:
+                    result, state = await self._redis_append(punch, known, after)
+                except (redis.RedisError, OSError) as e:
+                    self._redis_failed(e)
+                else:
+                    if result == "ok":
+                        await self._mirror(punch, after)
+            if result is None:
+                result, state = await asyncio.to_thread(self._local.append, punch, known, after)
+            if result != "unknown":
+                break
+            # No state known anywhere today: the database decides, once
+            known = await self._database_state(db, employee_id, now.date())
+        if result == "rejected":
+            raise _rejection(action)
+        return punch, _open_since(state)
+
+    async def _mirror(self, punch: dict, state: str):
+        try:
+            await asyncio.to_thread(self._local.record, punch, state)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Punch buffer local state not updated: {e}")
+
+    async def pending_for(self, employee_id: int) -> List[dict]:
+        """Buffered, not yet flushed punches of one employee in append order"""
+        punches = []
+        if self._redis_available():
+            try:
+                raw = await self._get_redis().lrange(f"{self.PENDING_PREFIX}{employee_id}", 0, -1)
+                punches.extend(json.loads(item) for item in raw)
+            except (redis.RedisError, OSError) as e:
+                self._redis_failed(e)
+        punches.extend(await asyncio.to_thread(self._local.pending_for, employee_id))
+        return sorted(punches, key=lambda p: p["timestamp"])
+
+    # Flushing (Celery)
+    def flush(self, db: Session) -> int:
+        """Write every buffered punch to attendance_records; returns the count"""
+        flushed = self._flush_local(db)
+        if settings.PUNCH_BUFFER_REDIS_ENABLED:
+            try:
+                flushed += self._flush_redis(db)
+            except (redis.RedisError, OSError) as e:
+                logger.warning(f"Punch buffer Redis flush failed: {e}")
+        return flushed
+
+    def _apply(self, db: Session, punches: List[dict]):
+        results = apply_punches(db, [
+            Punch(p["employee_id"], p["action"], datetime.fromisoformat(p["timestamp"]),
+                  p.get("geo_location"))
+            for p in punches
+        ])
+        db.commit()
+        for result in results:
+            if result.status == REJECTED:
+                logger.warning(
+                    f"Buffered {result.action} of employee {result.employee_id} rejected: {result.detail}"
+                )
+
+    def _flush_redis(self, db: Session) -> int:
+        r = self._get_sync_redis()
+        try:
+            r.xgroup_create(self.STREAM, self.GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        # Beat may fire again while a large flush is still running
+        token = secrets.token_hex(16)
+        if not r.set(self.FLUSH_LOCK_KEY, token, nx=True, ex=settings.PUNCH_BUFFER_FLUSH_LOCK_SECONDS):
+            return 0
+        flushed = 0
+        try:
+            # "0" first re-delivers entries a crashed flush read but never acked
+            position = "0"
+            while True:
+                response = r.xreadgroup(
+                    self.GROUP, self.CONSUMER, {self.STREAM: position},
+                    count=settings.ATTENDANCE_PUNCH_BATCH_MAX
+                )
+                entries = response[0][1] if response else []
+                if not entries:
+                    if position == "0":
+                        position = ">"
+                        continue
+                    break
+                # Backlog entries deleted from the stream come back without fields
+                punches = [json.loads(fields[b"punch"]) for _, fields in entries if fields]
+                if punches:
+                    self._apply(db, punches)
+
+                ids = [entry_id for entry_id, _ in entries]
+                pipe = r.pipeline()
+                pipe.xack(self.STREAM, self.GROUP, *ids)
+                pipe.xdel(self.STREAM, *ids)
+                # Pending lists are appended in stream order by the same script
+                for employee_id, count in Counter(p["employee_id"] for p in punches).items():
+                    pipe.lpop(f"{self.PENDING_PREFIX}{employee_id}", count)
+                pipe.execute()
+                flushed += len(punches)
+        finally:
+            self._release_script(keys=[self.FLUSH_LOCK_KEY], args=[token])
+        return flushed
+
+    def _flush_local(self, db: Session) -> int:
+        if not self._local.acquire_flush(settings.PUNCH_BUFFER_FLUSH_LOCK_SECONDS):
+            return 0
+        flushed = 0
+        try:
+            while True:
+                rows = self._local.take(settings.ATTENDANCE_PUNCH_BATCH_MAX)
+                if not rows:
+                    break
+                self._apply(db, [punch for _, punch in rows])
+                self._local.remove(rows[-1][0])
+                flushed += len(rows)
+        finally:
+            self._local.release_flush()
+        return flushed
+
+    def clear_local(self):
+        self._local.clear()
+
+
+punch_buffer = PunchBuffer()
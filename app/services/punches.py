@@ -0,0 +1,225 @@
+"""Set-based ingestion of clock-in/clock-out punches
+
+Badge terminals and kiosks queue punches while offline and replay them in
+bulk. A batch is applied with a fixed number of statements regardless of
+its size:
+
+1. one SELECT of the batch employees' records on the batch dates (which
+   also catches replays of punches that were already stored);
+2. the punches are replayed in timestamp order per employee in memory,
+   with the same rules as the single-punch endpoints (no second open
+   record per day, clock-out needs an open record) and classified against
+   the cached shift schedule;
+3. one bulk INSERT for new records and one executemany UPDATE for records
+   closed by this batch, followed by a SELECT to report record ids;
+4. one rollup refresh for the (employee, day) pairs that changed.
+
+Every punch gets a result in input order; a rejected punch never fails the
+rest of the batch.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import AttendanceRecord, AttendanceStatus, Employee
+from app.services.attendance_rollups import refresh_employee_days
+from app.services.shift_schedule import shift_schedule
+
+CLOCK_IN = "clock_in"
+CLOCK_OUT = "clock_out"
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+
+
+@dataclass
+class Punch:
+    """One clock event as reported by a terminal"""
+    employee_id: int
+    action: str
+    timestamp: datetime
+    geo_location: Optional[dict] = None
+
+
+@dataclass
+class PunchResult:
+    """Outcome of one punch of a batch, reported in input order"""
+    index: int
+    employee_id: int
+    action: str
+    status: str
+    record_id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+def _naive(value: datetime) -> datetime:
+    # clock_in/clock_out are stored as naive local time (see the single-punch
+    # endpoints) in whole seconds (MySQL DATETIME has no fraction), so convert
+    # aware timestamps and drop microseconds before comparing or storing
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+
+def _whole_seconds(value: Optional[datetime]) -> Optional[datetime]:
+    return value.replace(microsecond=0) if value is not None else None
+
+
+def hours_between(clock_in: datetime, clock_out: datetime) -> float:
+    return round((clock_out - clock_in).total_seconds() / 3600, 2)
+
+
+# Batches carry thousands of ids; pre-declared expanding parameters skip
+# coercing every element of the IN lists into a literal
+_known_employees = select(Employee.id).where(
+    Employee.id.in_(bindparam("employee_ids", expanding=True))
+)
+_day_records = select(
+    AttendanceRecord.id, AttendanceRecord.employee_id, AttendanceRecord.date,
+    AttendanceRecord.clock_in, AttendanceRecord.clock_out, AttendanceRecord.shift_id,
+    AttendanceRecord.status
+).where(
+    AttendanceRecord.employee_id.in_(bindparam("employee_ids", expanding=True)),
+    AttendanceRecord.date.in_(bindparam("dates", expanding=True))
+).order_by(AttendanceRecord.id)
+
+
+def _load_records(session: Session, employee_ids, dates) -> List:
+    return session.execute(
+        _day_records, {"employee_ids": list(employee_ids), "dates": list(dates)}
+    ).all()
+
+
+def apply_punches(session: Session, punches: Iterable[Punch]) -> List[PunchResult]:
+    """Apply a batch of punches in bulk and return one result per punch
+
+    The caller owns the transaction and commits it.
+    """
+    punches = list(punches)
+    stamps = [_naive(p.timestamp) for p in punches]
+    results: List[Optional[PunchResult]] = [None] * len(punches)
+    if not punches:
+        return []
+
+    employee_ids = {p.employee_id for p in punches}
+    known = set(session.scalars(_known_employees, {"employee_ids": list(employee_ids)}))
+    dates = {stamp.date() for stamp in stamps}
+    schedule = shift_schedule.get_sync(session)
+
+    # (employee_id, date) -> records of that day as mutable dicts; "key" is the
+    # record id for stored rows or a negative placeholder for rows to insert
+    days: Dict[Tuple[int, date], List[dict]] = {}
+    for record_id, employee_id, day, clock_in, clock_out, shift_id, status in _load_records(
+        session, known, dates
+    ):
+        days.setdefault((employee_id, day), []).append({
+            "key": record_id, "clock_in": _whole_seconds(clock_in), "clock_out": _whole_seconds(clock_out),
+            "shift_id": shift_id,
+            "status": status or AttendanceStatus.PRESENT, "hours_worked": None, "geo_location": None, "dirty": False,
+        })
+
+    new_records: List[dict] = []
+    pending: Dict[int, List[int]] = {}  # record key -> punch indexes to resolve after writing
+
+    order = sorted(range(len(punches)), key=lambda i: (punches[i].employee_id, stamps[i]))
+    for index in order:
+        punch, stamp = punches[index], stamps[index]
+        result = PunchResult(index, punch.employee_id, punch.action, REJECTED)
+        results[index] = result
+        if punch.employee_id not in known:
+            result.detail = "Employee not found"
+            continue
+
+        records = days.setdefault((punch.employee_id, stamp.date()), [])
+        field = CLOCK_IN if punch.action == CLOCK_IN else CLOCK_OUT
+        replayed = next((r for r in records if r[field] == stamp), None)
+        if replayed is not None:
+            result.status = DUPLICATE
+            pending.setdefault(replayed["key"], []).append(index)
+            continue
+
+        open_record = next((r for r in reversed(records) if r["clock_out"] is None), None)
+        if punch.action == CLOCK_IN:
+            if open_record is not None:
+                result.detail = "Already clocked in today. Please clock out first."
+                continue
+            # A late replay must not reopen time already covered by a shift
+            if any(
+                r["clock_in"] and r["clock_out"] and r["clock_in"] <= stamp < r["clock_out"]
+                for r in records
+            ):
+                result.detail = "Clock-in falls within an existing attendance record"
+                continue
+            shift_id, status = schedule.classify_clock_in(stamp)
+            record = {
+                "key": -(len(new_records) + 1), "clock_in": stamp, "clock_out": None,
+                "shift_id": shift_id, "status": status, "hours_worked": 0,
+                "geo_location": punch.geo_location, "dirty": False,
+                "employee_id": punch.employee_id, "date": stamp.date(),
+            }
+            records.append(record)
+            new_records.append(record)
+        else:
+            if open_record is None:
+                result.detail = "No clock-in record found for today"
+                continue
+            if open_record["clock_in"] and stamp < open_record["clock_in"]:
+                result.detail = "Clock-out is earlier than clock-in"
+                continue
+            record = open_record
+            record["clock_out"] = stamp
+            if record["clock_in"]:
+                record["hours_worked"] = hours_between(record["clock_in"], stamp)
+            record["status"] = schedule.classify_clock_out(
+                record["shift_id"], record["status"], record["hours_worked"]
+            )
+            record["dirty"] = record["key"] > 0
+        result.status = ACCEPTED
+        pending.setdefault(record["key"], []).append(index)
+
+    if new_records:
+        rows = [
+            {
+                "employee_id": r["employee_id"], "date": r["date"], "clock_in": r["clock_in"],
+                "clock_out": r["clock_out"], "hours_worked": r["hours_worked"],
+                "geo_location": r["geo_location"], "shift_id": r["shift_id"],
+                "status": r["status"], "is_reviewed": False,
+            }
+            for r in new_records
+        ]
+        session.connection().execute(insert(AttendanceRecord.__table__), rows)
+        # Resolve generated ids with one indexed read instead of per-row
+        # RETURNING; (employee, date, clock_in) identifies a record
+        stored = {
+            (employee_id, day, _whole_seconds(clock_in)): record_id
+            for record_id, employee_id, day, clock_in, *_ in _load_records(
+                session, {r["employee_id"] for r in new_records}, {r["date"] for r in new_records}
+            )
+        }
+        ids = [stored[(r["employee_id"], r["date"], r["clock_in"])] for r in new_records]
+        for record, record_id in zip(new_records, ids):
+            record["id"] = record_id
+    closed = [r for records in days.values() for r in records if r["dirty"]]
+    if closed:
+        # ORM bulk UPDATE by primary key: one executemany
+        session.execute(update(AttendanceRecord), [
+            {
+                "id": r["key"], "clock_out": r["clock_out"], "hours_worked": r["hours_worked"] or 0,
+                "status": r["status"]
+            }
+            for r in closed
+        ])
+    # Both writes bypass the AttendanceRecord mapper hooks
+    refresh_employee_days(session.connection(), {
+        key for key, records in days.items() if any(r["dirty"] or r["key"] < 0 for r in records)
+    })
+
+    generated = {r["key"]: r["id"] for r in new_records}
+    for key, indexes in pending.items():
+        for index in indexes:
+            results[index].record_id = generated.get(key, key)
+    return results
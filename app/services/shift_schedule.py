@@ -0,0 +1,197 @@
+"""Shift-aware attendance status classification
+
+Active ``shifts`` rows are parsed once into a ``ShiftSchedule``: parallel
+arrays of shift ids, start minutes and lengths in minutes. Overnight shifts
+end past midnight. Punches are classified against the cached schedule
+without touching the database:
+
+- at clock-in, the record gets the shift whose start is nearest the punch
+  (within ``SHIFT_MATCH_WINDOW_MINUTES``, across midnight), and LATE when it
+  is more than ``SHIFT_LATE_GRACE_MINUTES`` after that start;
+- at clock-out, a record covering less than ``SHIFT_HALF_DAY_RATIO`` of its
+  shift becomes HALF_DAY.
+
+ABSENT is never assigned or overridden here. The schedule is rebuilt after a
+commit that changes shifts, and at most every ``SHIFT_SCHEDULE_TTL_SECONDS``
+so that other workers see the changes too. ``reclassify_month`` re-scores
+stored records in vectorized chunks after shift definitions change.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import AttendanceRecord, AttendanceStatus, Shift
+from app.services.attendance_rollups import reconcile
+from app.services.generation_cache import GenerationCache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+RECLASSIFY_CHUNK = 50000
+
+# Status codes of the vectorized path, indexes into STATUSES
+STATUSES = (AttendanceStatus.PRESENT, AttendanceStatus.LATE, AttendanceStatus.HALF_DAY)
+PRESENT, LATE, HALF_DAY = range(3)
+
+
+def parse_hhmm(value: str) -> int:
+    """Minutes after midnight of an "HH:MM" string"""
+    hours, minutes = value.strip().split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time of day: {value!r}")
+    return hours * 60 + minutes
+
+
+def minute_of_day(value: datetime) -> int:
+    return value.hour * 60 + value.minute
+
+
+class ShiftSchedule:
+    """Immutable table of active shifts"""
+
+    def __init__(self, shifts: Iterable[Tuple[int, str, str]]):
+        ids, starts, lengths = [], [], []
+        for shift_id, start_time, end_time in shifts:
+            try:
+                start, end = parse_hhmm(start_time), parse_hhmm(end_time)
+            except ValueError:
+                logger.warning(f"Skipping shift {shift_id} with invalid times {start_time}-{end_time}")
+                continue
+            ids.append(shift_id)
+            starts.append(start)
+            lengths.append((end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.length_of = dict(zip(ids, lengths))
+        # Plain lists for the per-punch path, where numpy call overhead dominates
+        self._shifts = list(zip(ids, starts))
+
+    def __len__(self) -> int:
+        return len(self._shifts)
+
+    @staticmethod
+    def _offset(minute, start):
+        # Signed distance from the shift start, wrapped into [-12h, 12h)
+        return (minute - start + MINUTES_PER_DAY // 2) % MINUTES_PER_DAY - MINUTES_PER_DAY // 2
+
+    def classify_clock_in(self, clock_in: datetime) -> Tuple[Optional[int], AttendanceStatus]:
+        """(shift_id, status) for a clock-in; no shift and PRESENT when none is near"""
+        minute = minute_of_day(clock_in)
+        best = None
+        for shift_id, start in self._shifts:
+            offset = self._offset(minute, start)
+            if abs(offset) <= settings.SHIFT_MATCH_WINDOW_MINUTES and (
+                best is None or abs(offset) < abs(best[1])
+            ):
+                best = (shift_id, offset)
+        if best is None:
+            return None, AttendanceStatus.PRESENT
+        shift_id, offset = best
+        if offset > settings.SHIFT_LATE_GRACE_MINUTES:
+            return shift_id, AttendanceStatus.LATE
+        return shift_id, AttendanceStatus.PRESENT
+
+    def classify_clock_out(
+        self, shift_id: Optional[int], status: AttendanceStatus, hours_worked: float
+    ) -> AttendanceStatus:
+        """Status of a record once it is closed with ``hours_worked``"""
+        length = self.length_of.get(shift_id)
+        if status == AttendanceStatus.ABSENT or length is None:
+            return status
+        if (hours_worked or 0) * 60 < length * settings.SHIFT_HALF_DAY_RATIO:
+            return AttendanceStatus.HALF_DAY
+        return status
+
+    def classify_many(
+        self, minutes: np.ndarray, hours_worked: np.ndarray, closed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized classification of many records
+
+        ``minutes`` are clock-in minutes of day, ``closed`` marks records with a
+        clock-out. Returns shift ids (0 = none) and codes indexing STATUSES.
+        """
+        count = len(minutes)
+        if not len(self):
+            return np.zeros(count, dtype=np.int64), np.full(count, PRESENT, dtype=np.int8)
+        # records x shifts: small, since a company defines a handful of shifts
+        offsets = self._offset(minutes[:, None], self.starts[None, :])
+        nearest = np.abs(offsets).argmin(axis=1)
+        offset = offsets[np.arange(count), nearest]
+        matched = np.abs(offset) <= settings.SHIFT_MATCH_WINDOW_MINUTES
+
+        shift_ids = np.where(matched, self.ids[nearest], 0)
+        codes = np.where(matched & (offset > settings.SHIFT_LATE_GRACE_MINUTES), LATE, PRESENT)
+        short = closed & matched & (
+            hours_worked * 60 < self.lengths[nearest] * settings.SHIFT_HALF_DAY_RATIO
+        )
+        return shift_ids, np.where(short, HALF_DAY, codes).astype(np.int8)
+
+
+_active_shifts = select(Shift.id, Shift.start_time, Shift.end_time).where(Shift.is_active == True)
+
+
+shift_schedule: GenerationCache[ShiftSchedule] = GenerationCache(
+    _active_shifts, ShiftSchedule, watch=Shift, ttl_setting="SHIFT_SCHEDULE_TTL_SECONDS"
+)
+
+
+def reclassify_month(db: Session, year: int, month: int) -> int:
+    """Re-score the shift and status of a month of records; returns the number changed
+
+    Records are read in primary-key chunks, classified with numpy, and only
+    changed rows are written back. ABSENT records and records without a
+    clock-in are left alone. The month's attendance rollups are rebuilt
+    afterwards, since the bulk UPDATE bypasses their hooks. The caller commits.
+    """
+    schedule = ShiftSchedule(db.execute(_active_shifts).all())
+    first = date(year, month, 1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    query = select(
+        AttendanceRecord.id, AttendanceRecord.clock_in, AttendanceRecord.clock_out,
+        AttendanceRecord.hours_worked, AttendanceRecord.shift_id, AttendanceRecord.status
+    ).where(
+        AttendanceRecord.date.between(first, last),
+        AttendanceRecord.clock_in != None,
+        AttendanceRecord.status != AttendanceStatus.ABSENT
+    ).order_by(AttendanceRecord.id).limit(RECLASSIFY_CHUNK)
+
+    changed = 0
+    last_id = 0
+    while True:
+        rows = db.execute(query.where(AttendanceRecord.id > last_id)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ids, clock_ins, clock_outs, hours, shift_ids, statuses = zip(*rows)
+        minutes = np.fromiter((minute_of_day(c) for c in clock_ins), dtype=np.int64, count=len(rows))
+        closed = np.fromiter((c is not None for c in clock_outs), dtype=bool, count=len(rows))
+        new_shift_ids, codes = schedule.classify_many(
+            minutes, np.array([h or 0 for h in hours], dtype=np.float64), closed
+        )
+        old_shift_ids = np.array([s or 0 for s in shift_ids], dtype=np.int64)
+        old_codes = np.array([STATUSES.index(s) if s in STATUSES else -1 for s in statuses], dtype=np.int8)
+        dirty = np.flatnonzero((new_shift_ids != old_shift_ids) | (codes != old_codes))
+        if len(dirty):
+            # ORM bulk UPDATE by primary key: one executemany per chunk
+            db.execute(update(AttendanceRecord), [
+                {
+                    "id": ids[i],
+                    "shift_id": int(new_shift_ids[i]) or None,
+                    "status": STATUSES[codes[i]]
+                }
+                for i in dirty.tolist()
+            ])
+            changed += len(dirty)
+    if changed:
+        reconcile(db.connection(), first, last)
+    logger.info(f"Reclassified {year}-{month:02d}: {changed} attendance records changed")
+    return changed
+
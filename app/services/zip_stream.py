@@ -0,0 +1,235 @@
+"""Streaming ZIP archives of files on disk
+
+``ZipStream`` builds an uncompressed (STORED) archive on the fly. Nothing is
+written to a temporary file, and no member is ever held in memory: file data
+is read and sent in ``CHUNK_SIZE`` pieces. Because members are stored, every
+offset in the archive follows from the member names and sizes. That gives:
+- the total size up front (a real Content-Length);
+- any byte range, served without producing the bytes before it, which is
+  what lets an interrupted download resume.
+
+The CRC-32 of a member goes in a data descriptor after its data (general
+purpose flag bit 3) and in the central directory. It is computed while the
+member streams by. For a range that starts past a member, its CRC is computed
+by reading the file; the data itself is not sent. ZIP64 records are added
+when the archive has 65535 members or more, or passes 4 GiB. Each member
+must stay under 4 GiB.
+"""
+import hashlib
+import os
+import struct
+import time
+import zlib
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_ZIP64_OFFSET_EXTRA = struct.Struct("<HHQ")
+_ZIP64_END = struct.Struct("<IQHHIIQQQQ")
+_ZIP64_LOCATOR = struct.Struct("<IIQI")
+_END = struct.Struct("<IHHHHIIH")
+
+_FLAGS = 0x0808  # bit 3: sizes and CRC in a data descriptor; bit 11: UTF-8 names
+_VERSION = 20
+_VERSION_ZIP64 = 45
+_LIMIT = 0xFFFFFFFF
+_MEMBER_LIMIT = 0xFFFF
+
+
+@dataclass(frozen=True)
+class ZipMember:
+    """A file on disk and its name in the archive"""
+    name: str
+    path: str
+    size: int
+    mtime: float
+
+
+def stat_members(files: Iterable[Tuple[str, str]]) -> List[ZipMember]:
+    """ZipMembers for (name, path) pairs; files that are missing or too large are skipped"""
+    members = []
+    for name, path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if stat.st_size < _LIMIT:
+            members.append(ZipMember(name, path, stat.st_size, stat.st_mtime))
+    return members
+
+
+def _dos_datetime(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    )
+
+
+class ZipStream:
+    """Byte layout of a STORED archive over ``members``, readable by range"""
+
+    def __init__(self, members: Iterable[ZipMember]):
+        self.members = list(members)
+        self._names = [member.name.encode("utf-8") for member in self.members]
+        self._crcs: Dict[int, int] = {}
+
+        self._offsets = []
+        offset = 0
+        for name, member in zip(self._names, self.members):
+            self._offsets.append(offset)
+            offset += _LOCAL_HEADER.size + len(name) + member.size + _DATA_DESCRIPTOR.size
+        self._directory_offset = offset
+        self._directory_size = sum(self._central_header_size(i) for i in range(len(self.members)))
+        self._zip64 = (
+            len(self.members) >= _MEMBER_LIMIT
+            or self._directory_offset >= _LIMIT
+            or self._directory_size >= _LIMIT
+        )
+        self._end_size = _END.size + (_ZIP64_END.size + _ZIP64_LOCATOR.size if self._zip64 else 0)
+        self.size = self._directory_offset + self._directory_size + self._end_size
+
+    @property
+    def etag(self) -> str:
+        """Strong validator of the archive's bytes, from the names, sizes and mtimes of its members"""
+        digest = hashlib.sha256()
+        for member in self.members:
+            digest.update(f"{member.name}\0{member.size}\0{member.mtime!r}\n".encode("utf-8"))
+        return f'"{digest.hexdigest()[:32]}"'
+
+    # Segments
+    def _local_header(self, i: int) -> bytes:
+        member, name = self.members[i], self._names[i]
+        dos_time, dos_date = _dos_datetime(member.mtime)
+        return _LOCAL_HEADER.pack(
+            0x04034B50, _VERSION, _FLAGS, 0, dos_time, dos_date, 0, member.size, member.size, len(name), 0
+        ) + name
+
+    def _data_descriptor(self, i: int) -> bytes:
+        size = self.members[i].size
+        return _DATA_DESCRIPTOR.pack(0x08074B50, self._crc(i), size, size)
+
+    def _central_header_size(self, i: int) -> int:
+        extra = _ZIP64_OFFSET_EXTRA.size if self._offsets[i] >= _LIMIT else 0
+        return _CENTRAL_HEADER.size + len(self._names[i]) + extra
+
+    def _central_header(self, i: int) -> bytes:
+        member, name, local_offset = self.members[i], self._names[i], self._offsets[i]
+        dos_time, dos_date = _dos_datetime(member.mtime)
+        extra = b""
+        if local_offset >= _LIMIT:
+            extra = _ZIP64_OFFSET_EXTRA.pack(0x0001, 8, local_offset)
+            local_offset = _LIMIT
+        version = _VERSION_ZIP64 if extra else _VERSION
+        return _CENTRAL_HEADER.pack(
+            0x02014B50, version, version, _FLAGS, 0, dos_time, dos_date, self._crc(i),
+            member.size, member.size, len(name), len(extra), 0, 0, 0, 0, local_offset
+        ) + name + extra
+
+    def _end_records(self) -> bytes:
+        count = len(self.members)
+        records = b""
+        if self._zip64:
+            zip64_end_offset = self._directory_offset + self._directory_size
+            records += _ZIP64_END.pack(
+                0x06064B50, _ZIP64_END.size - 12, _VERSION_ZIP64, _VERSION_ZIP64, 0, 0,
+                count, count, self._directory_size, self._directory_offset
+            )
+            records += _ZIP64_LOCATOR.pack(0x07064B50, 0, zip64_end_offset, 1)
+        return records + _END.pack(
+            0x06054B50, 0, 0, min(count, _MEMBER_LIMIT), min(count, _MEMBER_LIMIT),
+            min(self._directory_size, _LIMIT), min(self._directory_offset, _LIMIT), 0
+        )
+
+    def _crc(self, i: int) -> int:
+        crc = self._crcs.get(i)
+        if crc is None:
+            crc = 0
+            for chunk in self._read(i, 0, self.members[i].size):
+                crc = zlib.crc32(chunk, crc)
+            self._crcs[i] = crc
+        return crc
+
+    def _read(self, i: int, start: int, end: int) -> Iterator[bytes]:
+        member = self.members[i]
+        with open(member.path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise OSError(f"{member.path} changed size while being archived")
+                remaining -= len(chunk)
+                yield chunk
+
+    def _data(self, i: int, start: int, end: int) -> Iterator[bytes]:
+        if start == 0 and end == self.members[i].size and i not in self._crcs:
+            crc = 0
+            for chunk in self._read(i, start, end):
+                crc = zlib.crc32(chunk, crc)
+                yield chunk
+            self._crcs[i] = crc
+        else:
+            yield from self._read(i, start, end)
+
+    # Reading
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield archive bytes ``start`` <= offset < ``end`` (default: to the end)"""
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return
+
+        def window(segment_start: int, length: int) -> Optional[Tuple[int, int]]:
+            lower = max(start - segment_start, 0)
+            upper = min(end - segment_start, length)
+            return (lower, upper) if lower < upper else None
+
+        first = max(bisect_right(self._offsets, start) - 1, 0)
+        for i in range(first, len(self.members)):
+            position = self._offsets[i]
+            if position >= end:
+                return
+            header = self._local_header(i)
+            span = window(position, len(header))
+            if span:
+                yield header[span[0]:span[1]]
+            position += len(header)
+
+            span = window(position, self.members[i].size)
+            if span:
+                yield from self._data(i, *span)
+            position += self.members[i].size
+
+            span = window(position, _DATA_DESCRIPTOR.size)
+            if span:
+                yield self._data_descriptor(i)[span[0]:span[1]]
+
+        position = self._directory_offset
+        buffer = []
+        buffered = 0
+        for i in range(len(self.members)):
+            length = self._central_header_size(i)
+            span = window(position, length)
+            position += length
+            if span:
+                buffer.append(self._central_header(i)[span[0]:span[1]])
+                buffered += span[1] - span[0]
+                if buffered >= CHUNK_SIZE:
+                    yield b"".join(buffer)
+                    buffer, buffered = [], 0
+            if position >= end:
+                break
+        if buffer:
+            yield b"".join(buffer)
+
+        records = self._end_records()
+        span = window(position, len(records))
+        if span:
+            yield records[span[0]:span[1]]
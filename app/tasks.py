@@ -1,5 +1,6 @@
 """Celery configuration and task definitions"""
 from celery import Celery
+from celery.schedules import crontab
 from app.config import get_settings
 import httpx
 import logging
@@ -24,13 +25,51 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=30 * 60,  # 30 minutes
     task_soft_time_limit=25 * 60,  # 25 minutes
+    # Payslip rendering runs its own process pool: keep it off the prefork workers
+    task_routes={"render_payslips": {"queue": "payslips"}},
 )
 
+# Celery Beat schedule
+celery_app.conf.beat_schedule = {
+    "refresh-headcount-snapshot": {
+        "task": "refresh_headcount_snapshot",
+        "schedule": crontab(hour=0, minute=5),
+    },
+    "reconcile-attendance-rollups": {
+        "task": "reconcile_attendance_rollups",
+        "schedule": crontab(hour=0, minute=15),
+    },
+    "collect-document-blobs": {
+        "task": "collect_document_blobs",
+        "schedule": crontab(hour=0, minute=45),
+    },
+    "attendance-reminders": {
+        "task": "daily_attendance_reminder",
+        "schedule": settings.ATTENDANCE_REMINDER_INTERVAL_MINUTES * 60,
+    },
+    "monthly-leave-accrual": {
+        "task": "monthly_leave_balance_update",
+        "schedule": crontab(day_of_month=1, hour=0, minute=30),
+    },
+    "flush-calendar-sync": {
+        "task": "flush_calendar_sync",
+        "schedule": settings.CALENDAR_SYNC_FLUSH_SECONDS,
+    },
+}
+if settings.ATTENDANCE_WRITE_BEHIND:
+    celery_app.conf.beat_schedule["flush-punch-buffer"] = {
+        "task": "flush_punch_buffer",
+        "schedule": settings.PUNCH_BUFFER_FLUSH_SECONDS,
+    }
+
 
 @celery_app.task(name="sync_calendar")
 def sync_calendar_async(employee_id: int, leave_request_id: int, status: str, start_date: str, end_date: str):
     """
-    Asynchronously sync leave request to external calendar service
+    Queue a leave request for the calendar sync outbox
+    
+    Kept for messages queued before the outbox existed; the endpoints now
+    write outbox events directly and flush_calendar_sync delivers them.
     
     Args:
         employee_id: Employee ID
@@ -39,35 +78,47 @@ def sync_calendar_async(employee_id: int, leave_request_id: int, status: str, st
         start_date: Leave start date (string)
         end_date: Leave end date (string)
     """
+    from datetime import date
+    from app.database import SessionLocal
+    from app.services import calendar_sync
+    
+    db = SessionLocal()
     try:
-        logger.info(f"Syncing leave request {leave_request_id} to calendar for employee {employee_id}")
-        
-        # Prepare payload
-        payload = {
+        calendar_sync.enqueue(db, [{
             "employee_id": employee_id,
             "leave_request_id": leave_request_id,
             "status": status,
-            "date_range": {
-                "start": start_date,
-                "end": end_date
-            }
-        }
-        
-        # Send to external calendar service
-        response = httpx.post(
-            f"{settings.CALENDAR_SERVICE_URL}/sync",
-            json=payload,
-            headers={"X-API-Key": settings.WEBHOOK_API_KEY},
-            timeout=30.0
-        )
+            "start_date": date.fromisoformat(start_date),
+            "end_date": date.fromisoformat(end_date)
+        }])
+        db.commit()
+    finally:
+        db.close()
+    return {"status": "queued", "leave_request_id": leave_request_id}
+
+
+@celery_app.task(name="flush_calendar_sync")
+def flush_calendar_sync():
+    """Deliver due calendar sync events, retrying failures with backoff"""
+    try:
+        from app.database import SessionLocal
+        from app.services import calendar_sync
         
-        response.raise_for_status()
-        logger.info(f"Successfully synced leave request {leave_request_id} to calendar")
+        db = SessionLocal()
+        try:
+            summary = calendar_sync.flush(db)
+        finally:
+            db.close()
         
-        return {"status": "success", "leave_request_id": leave_request_id}
+        if any(summary.values()):
+            logger.info(
+                f"Calendar sync: {summary['sent']} sent, {summary['retried']} to retry, "
+                f"{summary['dead']} dead-lettered"
+            )
+        return {"status": "success", **summary}
         
     except Exception as e:
-        logger.error(f"Failed to sync leave request {leave_request_id} to calendar: {str(e)}")
+        logger.error(f"Failed to flush calendar sync events: {str(e)}")
         return {"status": "failed", "error": str(e)}
 
 
@@ -76,21 +127,28 @@ def process_payroll_async(payroll_run_id: int):
     """
     Asynchronously process payroll run
     
+    The run is split into employee-id range shards of PAYROLL_SHARD_SIZE
+    employees, processed in parallel by process_payroll_shard tasks; a chord
+    callback (finalize_payroll_run) aggregates the result. Calling this again
+    for a failed run only re-dispatches the shards that did not complete.
+    
     Args:
         payroll_run_id: Payroll run ID to process
     """
+    # Import here to avoid circular dependencies
+    from celery import chord
+    from app.database import SessionLocal
+    from app.models import PayrollRun, PayrollStatus
+    from app.services.payroll import plan_shards
+    
     try:
         logger.info(f"Processing payroll run {payroll_run_id}")
         
-        # Import here to avoid circular dependencies
-        from app.database import SessionLocal
-        from app.models import PayrollRun, Employee, Payslip, PayrollStatus
-        
         db = SessionLocal()
         
         try:
             # Get payroll run
-            payroll_run = db.query(PayrollRun).filter(PayrollRun.id == payroll_run_id).first()
+            payroll_run = db.get(PayrollRun, payroll_run_id)
             
             if not payroll_run:
                 logger.error(f"Payroll run {payroll_run_id} not found")
@@ -100,71 +158,29 @@ def process_payroll_async(payroll_run_id: int):
             payroll_run.status = PayrollStatus.PROCESSING
             db.commit()
             
-            # Get all active employees
-            employees = db.query(Employee).filter(Employee.employment_status == "ACTIVE").all()
-            
-            total_amount = 0
-            
-            # Generate payslips for each employee
-            for employee in employees:
-                if employee.salary:
-                    # Calculate net salary (simplified)
-                    basic_salary = employee.salary
-                    allowances = basic_salary * 0.1  # 10% allowances
-                    tax = basic_salary * 0.15  # 15% tax
-                    deductions = basic_salary * 0.05  # 5% deductions
-                    net_salary = basic_salary + allowances - tax - deductions
-                    
-                    # Create payslip
-                    payslip = Payslip(
-                        employee_id=employee.id,
-                        payroll_run_id=payroll_run_id,
-                        basic_salary=basic_salary,
-                        allowances=allowances,
-                        deductions=deductions,
-                        tax=tax,
-                        net_salary=net_salary,
-                        currency=employee.currency
-                    )
-                    
-                    db.add(payslip)
-                    total_amount += float(net_salary)
-            
-            # Update payroll run
-            payroll_run.total_amount = total_amount
-            payroll_run.status = PayrollStatus.COMPLETED
-            
-            db.commit()
-            
-            logger.info(f"Successfully processed payroll run {payroll_run_id}")
-            
-            # Notify external payroll service (optional)
-            try:
-                response = httpx.post(
-                    f"{settings.PAYROLL_SERVICE_URL}/notify",
-                    json={
-                        "run_id": payroll_run_id,
-                        "status": "success",
-                        "total_amount": total_amount
-                    },
-                    headers={"X-API-Key": settings.WEBHOOK_API_KEY},
-                    timeout=30.0
-                )
-            except:
-                pass  # Don't fail if notification fails
-            
-            return {"status": "success", "payroll_run_id": payroll_run_id, "total_amount": total_amount}
-            
+            shards = plan_shards(db, payroll_run_id)
+            pending = [shard.id for shard in shards if shard.status != PayrollStatus.COMPLETED]
         finally:
             db.close()
-            
+        
+        if pending:
+            chord(
+                process_payroll_shard.s(shard_id) for shard_id in pending
+            )(finalize_payroll_run.s(payroll_run_id))
+        else:
+            finalize_payroll_run.delay([], payroll_run_id)
+        
+        logger.info(f"Dispatched {len(pending)} of {len(shards)} shards for payroll run {payroll_run_id}")
+        
+        return {"status": "dispatched", "payroll_run_id": payroll_run_id, "shards": len(pending)}
+        
     except Exception as e:
         logger.error(f"Failed to process payroll run {payroll_run_id}: {str(e)}")
         
         # Update payroll run status to failed
         try:
             db = SessionLocal()
-            payroll_run = db.query(PayrollRun).filter(PayrollRun.id == payroll_run_id).first()
+            payroll_run = db.get(PayrollRun, payroll_run_id)
             if payroll_run:
                 payroll_run.status = PayrollStatus.FAILED
                 db.commit()
@@ -175,6 +191,130 @@ def process_payroll_async(payroll_run_id: int):
         return {"status": "failed", "error": str(e)}
 
 
+@celery_app.task(name="process_payroll_shard")
+def process_payroll_shard(shard_id: int):
+    """
+    Compute and store the payslips of one payroll run shard
+    
+    Failures are recorded on the shard and returned instead of raised, so the
+    chord callback still runs and can mark the run FAILED.
+    
+    Args:
+        shard_id: Payroll run shard ID
+    """
+    from app.database import SessionLocal
+    from app.services.payroll import process_shard
+    
+    db = SessionLocal()
+    try:
+        stats = process_shard(db, shard_id)
+        if stats is None:
+            return {"status": "skipped", "shard_id": shard_id}
+        
+        logger.info(
+            f"Processed payroll shard {shard_id}: {stats.payslips} payslips "
+            f"in {stats.elapsed:.2f}s ({stats.rows_per_second:.0f} rows/s)"
+        )
+        return {
+            "status": "success",
+            "shard_id": shard_id,
+            "payslips": stats.payslips,
+            "rows_per_second": round(stats.rows_per_second, 1)
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to process payroll shard {shard_id}: {str(e)}")
+        return {"status": "failed", "shard_id": shard_id, "error": str(e)}
+    
+    finally:
+        db.close()
+
+
+@celery_app.task(name="finalize_payroll_run")
+def finalize_payroll_run(shard_results: list, payroll_run_id: int):
+    """
+    Chord callback: aggregate shard totals and complete (or fail) the run
+    
+    Args:
+        shard_results: Results of the shard tasks (informational)
+        payroll_run_id: Payroll run ID
+    """
+    from app.database import SessionLocal
+    from app.models import PayrollStatus
+    from app.services.payroll import finalize_run
+    
+    db = SessionLocal()
+    try:
+        payroll_run = finalize_run(db, payroll_run_id)
+        total_amount = float(payroll_run.total_amount or 0)
+        run_status = payroll_run.status
+    finally:
+        db.close()
+    
+    if run_status != PayrollStatus.COMPLETED:
+        logger.error(f"Payroll run {payroll_run_id} has failed shards")
+        return {"status": "failed", "payroll_run_id": payroll_run_id}
+    
+    logger.info(f"Successfully processed payroll run {payroll_run_id}")
+    
+    try:
+        render_payslips_async.delay(payroll_run_id)
+    except Exception as e:
+        logger.error(f"Failed to queue payslip rendering for run {payroll_run_id}: {str(e)}")
+    
+    # Notify external payroll service (optional)
+    try:
+        response = httpx.post(
+            f"{settings.PAYROLL_SERVICE_URL}/notify",
+            json={
+                "run_id": payroll_run_id,
+                "status": "success",
+                "total_amount": total_amount
+            },
+            headers={"X-API-Key": settings.WEBHOOK_API_KEY},
+            timeout=30.0
+        )
+    except:
+        pass  # Don't fail if notification fails
+    
+    return {"status": "success", "payroll_run_id": payroll_run_id, "total_amount": total_amount}
+
+
+@celery_app.task(name="render_payslips")
+def render_payslips_async(payroll_run_id: int):
+    """
+    Render the PDFs of a completed payroll run's payslips
+    
+    Rendering runs in a process pool of PAYSLIP_RENDER_WORKERS processes (one
+    per core by default). The task is routed to the "payslips" queue, which
+    is consumed by a worker started with --pool=solo (celery_payslip_worker
+    in docker-compose.yml) rather than sharing a prefork worker's cores.
+    Re-running it only renders the payslips that have no file yet.
+    
+    Args:
+        payroll_run_id: Payroll run ID
+    """
+    try:
+        from app.database import SessionLocal
+        from app.services.payroll import render_payslips
+        
+        db = SessionLocal()
+        try:
+            stats = render_payslips(db, payroll_run_id)
+        finally:
+            db.close()
+        
+        logger.info(
+            f"Rendered {stats.payslips} payslips of run {payroll_run_id} "
+            f"in {stats.elapsed:.2f}s ({stats.rows_per_second:.0f}/s)"
+        )
+        return {"status": "success", "payroll_run_id": payroll_run_id, "payslips": stats.payslips}
+        
+    except Exception as e:
+        logger.error(f"Failed to render payslips of run {payroll_run_id}: {str(e)}")
+        return {"status": "failed", "payroll_run_id": payroll_run_id, "error": str(e)}
+
+
 @celery_app.task(name="send_email_notification")
 def send_email_notification(to_email: str, subject: str, body: str):
     """
@@ -227,15 +367,192 @@ def generate_report_async(report_type: str, parameters: dict):
 # Periodic tasks (if using Celery Beat)
 @celery_app.task(name="daily_attendance_reminder")
 def daily_attendance_reminder():
-    """Send daily attendance reminder to employees who haven't clocked in"""
-    logger.info("Running daily attendance reminder task")
-    # Implement logic here
-    return {"status": "success"}
+    """Send daily attendance reminder to employees who haven't clocked in
+    
+    Runs every ATTENDANCE_REMINDER_INTERVAL_MINUTES; each employee is reminded
+    at most once a day, once their shift has started.
+    """
+    try:
+        logger.info("Running daily attendance reminder task")
+        
+        from app.database import SessionLocal
+        from app.services.attendance_reminders import send_reminders
+        
+        db = SessionLocal()
+        try:
+            summary = send_reminders(db)
+        finally:
+            db.close()
+        
+        return {"status": "success", **summary}
+        
+    except Exception as e:
+        logger.error(f"Failed to send attendance reminders: {str(e)}")
+        return {"status": "failed", "error": str(e)}
 
 
 @celery_app.task(name="monthly_leave_balance_update")
-def monthly_leave_balance_update():
-    """Update leave balances monthly"""
-    logger.info("Running monthly leave balance update task")
-    # Implement logic here
-    return {"status": "success"}
+def monthly_leave_balance_update(year: int = None, month: int = None):
+    """Accrue a month of leave (by default the month that just ended)
+    
+    Idempotent per month: running it again, or after a crash, only posts the
+    accruals that are missing.
+    """
+    try:
+        logger.info("Running monthly leave balance update task")
+        
+        from datetime import date
+        from app.database import SessionLocal
+        from app.services.leave_accrual import accrue_month, previous_month
+        
+        if year is None or month is None:
+            year, month = previous_month(date.today())
+        
+        db = SessionLocal()
+        try:
+            stats = accrue_month(db, year, month)
+        finally:
+            db.close()
+        
+        return {"status": "success", "period": stats.period, "entries": stats.entries}
+        
+    except Exception as e:
+        logger.error(f"Failed to accrue leave balances: {str(e)}")
+        return {"status": "failed", "error": str(e)}
+
+
+@celery_app.task(name="refresh_headcount_snapshot")
+def refresh_headcount_snapshot():
+    """Rebuild today's headcount snapshot from the employees table
+    
+    Runs just after midnight: it starts the new day's snapshot and corrects any
+    drift in the incrementally maintained counts.
+    """
+    try:
+        logger.info("Refreshing headcount snapshot")
+        
+        from datetime import date
+        from app.database import SessionLocal
+        from app.services.headcount import rebuild_snapshot
+        
+        db = SessionLocal()
+        try:
+            buckets = rebuild_snapshot(db.connection(), date.today())
+            db.commit()
+        finally:
+            db.close()
+        
+        logger.info(f"Headcount snapshot refreshed ({buckets} buckets)")
+        return {"status": "success", "buckets": buckets}
+        
+    except Exception as e:
+        logger.error(f"Failed to refresh headcount snapshot: {str(e)}")
+        return {"status": "failed", "error": str(e)}
+
+
+@celery_app.task(name="reconcile_attendance_rollups")
+def reconcile_attendance_rollups():
+    """Rebuild recent attendance rollups from attendance_records
+    
+    Covers the last ATTENDANCE_ROLLUP_RECONCILE_DAYS days, correcting drift
+    from writes that bypassed the incremental maintenance.
+    """
+    try:
+        logger.info("Reconciling attendance rollups")
+        
+        from datetime import date, timedelta
+        from app.database import SessionLocal
+        from app.services.attendance_rollups import reconcile
+        
+        end = date.today()
+        start = end - timedelta(days=settings.ATTENDANCE_ROLLUP_RECONCILE_DAYS)
+        db = SessionLocal()
+        try:
+            employee_days = reconcile(db.connection(), start, end)
+            db.commit()
+        finally:
+            db.close()
+        
+        logger.info(f"Attendance rollups reconciled for {start}..{end} ({employee_days} employee-days)")
+        return {"status": "success", "employee_days": employee_days}
+        
+    except Exception as e:
+        logger.error(f"Failed to reconcile attendance rollups: {str(e)}")
+        return {"status": "failed", "error": str(e)}
+
+
+@celery_app.task(name="collect_document_blobs")
+def collect_document_blobs():
+    """Garbage-collect the deduplicated document store
+    
+    Recounts blob references, then removes blobs and stray files left
+    unreferenced for longer than DOCUMENT_BLOB_GC_GRACE_HOURS.
+    """
+    try:
+        from app.database import SessionLocal
+        from app.services import document_blobs
+        
+        db = SessionLocal()
+        try:
+            summary = document_blobs.collect(db)
+        finally:
+            db.close()
+        
+        logger.info(
+            f"Document store: {summary['collected']} blobs collected ({summary['bytes_freed']} bytes), "
+            f"{summary['stray_files']} stray files removed, {summary['recounted']} counts corrected"
+        )
+        return {"status": "success", **summary}
+        
+    except Exception as e:
+        logger.error(f"Failed to collect document blobs: {str(e)}")
+        return {"status": "failed", "error": str(e)}
+
+
+@celery_app.task(name="reclassify_attendance")
+def reclassify_attendance(year: int, month: int):
+    """
+    Re-score a month of attendance records against the active shifts
+    
+    Args:
+        year: Year of the month to reclassify
+        month: Month to reclassify (1-12)
+    """
+    try:
+        from app.database import SessionLocal
+        from app.services.shift_schedule import reclassify_month
+        
+        db = SessionLocal()
+        try:
+            changed = reclassify_month(db, year, month)
+            db.commit()
+        finally:
+            db.close()
+        
+        return {"status": "success", "year": year, "month": month, "changed": changed}
+        
+    except Exception as e:
+        logger.error(f"Failed to reclassify attendance for {year}-{month:02d}: {str(e)}")
+        return {"status": "failed", "error": str(e)}
+
+
+@celery_app.task(name="flush_punch_buffer")
+def flush_punch_buffer():
+    """Move write-behind clock-in/clock-out punches into attendance_records"""
+    try:
+        from app.database import SessionLocal
+        from app.services.punch_buffer import punch_buffer
+        
+        db = SessionLocal()
+        try:
+            flushed = punch_buffer.flush(db)
+        finally:
+            db.close()
+        
+        if flushed:
+            logger.info(f"Flushed {flushed} buffered punches")
+        return {"status": "success", "flushed": flushed}
+        
+    except Exception as e:
+        logger.error(f"Failed to flush punch buffer: {str(e)}")
+        return {"status": "failed", "error": str(e)}
@@ -0,0 +1 @@
+"""Load and throughput benchmarks (run with ``python -m benchmarks.<name>``)"""
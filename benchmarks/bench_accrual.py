@@ -0,0 +1,70 @@
+"""Monthly leave accrual benchmark: ledger entries per second for a large workforce
+
+Seeds N active employees (a tenth of them hired during the month) and four
+leave types, then accrues one month with app.services.leave_accrual and runs
+it again to show the cost of an idempotent re-run:
+
+    python -m benchmarks.bench_accrual --employees 100000 --chunk-size 5000
+"""
+import argparse
+import resource
+
+from benchmarks.common import use_sqlite_database
+
+BATCH = 10000
+
+
+def seed(employees: int):
+    from datetime import date
+    from sqlalchemy import insert
+    from app.database import SessionLocal, init_db
+    from app.models import Employee, LeaveType
+
+    init_db()
+    db = SessionLocal()
+    db.execute(insert(LeaveType), [
+        {"name": name, "max_days_per_year": days, "is_active": True}
+        for name, days in (("Annual", 24), ("Sick", 12), ("Personal", 6), ("Study", 5))
+    ])
+    for start in range(0, employees, BATCH):
+        db.execute(insert(Employee), [
+            {"employee_number": f"E{i:07d}", "first_name": "Bench", "last_name": f"Employee {i}",
+             "email": f"e{i}@bench.example.com",
+             "hire_date": date(2025, 3, 1 + i % 31) if i % 10 == 0 else date(2020, 1, 1)}
+            for i in range(start, min(start + BATCH, employees))
+        ])
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    use_sqlite_database("accrual")
+    seed(args.employees)
+
+    from app.database import SessionLocal
+    from app.models import LeaveAccrualRun
+    from app.services.leave_accrual import accrue_month
+
+    db = SessionLocal()
+    try:
+        first = accrue_month(db, 2025, 3, chunk_size=args.chunk_size)
+        # A fresh run of the same month (e.g. a retried task) re-scans but posts nothing
+        db.query(LeaveAccrualRun).delete()
+        db.commit()
+        again = accrue_month(db, 2025, 3, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nLeave accrual of {args.employees} employees, chunk size {args.chunk_size}")
+    print(f"{first.entries} entries in {first.elapsed:.2f}s: {first.entries_per_second:.0f} entries/s, "
+          f"peak RSS {peak_rss:.0f} MB")
+    print(f"Re-run of the same month: {again.entries} entries in {again.elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
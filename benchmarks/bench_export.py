@@ -0,0 +1,86 @@
+"""Report export benchmark: throughput and server memory for large exports
+
+Seeds N employees spread over departments and positions, downloads
+/reports/export/employees as CSV and Excel, and reports rows per second,
+bytes and the uvicorn worker's peak RSS (Linux only):
+
+    python -m benchmarks.bench_export --rows 500000
+"""
+import argparse
+import time
+
+from benchmarks.common import free_port, start_server, use_sqlite_database
+
+BATCH = 10000
+
+
+def seed(rows: int):
+    from datetime import date
+    from sqlalchemy import insert
+    from app.auth.jwt import get_password_hash
+    from app.database import SessionLocal, init_db
+    from app.models import Department, Employee, Position, RoleType, User
+
+    init_db()
+    db = SessionLocal()
+    db.add(User(email="hr@bench.example.com", hashed_password=get_password_hash("benchpass123"),
+                role=RoleType.HR_ADMIN, is_active=True))
+    db.execute(insert(Department), [{"name": f"Department {i}"} for i in range(20)])
+    db.execute(insert(Position), [{"title": f"Position {i}"} for i in range(50)])
+    for start in range(0, rows, BATCH):
+        db.execute(insert(Employee), [
+            {"employee_number": f"E{i:07d}", "first_name": "Bench", "last_name": f"Employee {i}",
+             "email": f"e{i}@bench.example.com", "hire_date": date(2020, 1, 1),
+             "department_id": i % 20 + 1, "position_id": i % 50 + 1}
+            for i in range(start, min(start + BATCH, rows))
+        ])
+    db.commit()
+    db.close()
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main():
+    import httpx
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    use_sqlite_database("export")
+    seed(args.rows)
+    port = free_port()
+    server = start_server(port)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        token = httpx.post(f"{base_url}/api/v1/auth/login", json={
+            "email": "hr@bench.example.com", "password": "benchpass123"
+        }).json()["access"]
+        headers = {"Authorization": f"Bearer {token}"}
+        print(f"\nExport of {args.rows} employees (idle worker RSS {peak_rss_mb(server.pid):.0f} MB)")
+        for format in ("csv", "excel"):
+            started = time.perf_counter()
+            size = first_byte = 0
+            with httpx.stream("GET", f"{base_url}/api/v1/reports/export/employees",
+                              params={"format": format}, headers=headers, timeout=None) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes():
+                    if not size:
+                        first_byte = time.perf_counter() - started
+                    size += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"{format:<6} {args.rows / elapsed:>10.0f} rows/s  {size / 2**20:>8.1f} MB  "
+                  f"first byte {first_byte * 1000:>7.0f} ms  peak RSS {peak_rss_mb(server.pid):>6.0f} MB")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""File serving benchmark: app.api.files.serve_file against a plain FileResponse
+
+Starts one uvicorn worker with two routes over the same files: the previous
+download path (``os.path.exists`` then ``FileResponse``) and ``serve_file``
+(direct, or x-accel with --mode x-accel). Then it drives full downloads,
+revalidations (If-None-Match) and 1 MB range reads, and reports throughput
+and the server's CPU time per request:
+
+    python -m benchmarks.bench_file_serving --size-mb 20 --requests 200
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import free_port
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def build_app(directory: str):
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import FileResponse
+    from app.api.files import serve_file
+
+    app = FastAPI()
+    hashes = {}
+
+    @app.get("/legacy/{name}")
+    async def legacy(name: str):
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404)
+        return FileResponse(path=path, filename=name, media_type="application/octet-stream")
+
+    @app.get("/served/{name}")
+    async def served(name: str, request: Request):
+        path = os.path.join(directory, name)
+        if name not in hashes:
+            with open(path, "rb") as f:
+                hashes[name] = hashlib.file_digest(f, "sha256").hexdigest()
+        return await serve_file(request, path, name, hashes[name])
+
+    return app
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+async def drive(base_url: str, path: str, requests: int, concurrency: int, headers: dict) -> tuple:
+    import httpx
+
+    received = 0
+    remaining = requests
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def worker():
+            nonlocal received, remaining
+            while remaining > 0:
+                remaining -= 1
+                async with client.stream("GET", path, headers=headers) as response:
+                    async for chunk in response.aiter_raw():
+                        received += len(chunk)
+                    if response.status_code >= 400:
+                        raise RuntimeError(f"{path} failed: {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=("direct", "x-accel"), default="direct")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="hrms_files_")
+    with open(os.path.join(directory, "scan.pdf"), "wb") as f:
+        f.write(os.urandom(args.size_mb * 1024 * 1024))
+    port = free_port()
+    env = {**os.environ, "UPLOAD_DIR": directory, "FILE_SERVING_MODE": args.mode, "LOG_LEVEL": "WARNING",
+           "LOG_FILE": os.path.join(directory, "app.log")}
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_file_serving", "serve", str(port), directory],
+                              env=env)
+    try:
+        import httpx
+
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.time() + 30
+        while True:
+            try:
+                etag = httpx.get(f"{base_url}/served/scan.pdf", headers={"Range": "bytes=0-0"}).headers["etag"]
+                break
+            except httpx.HTTPError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+
+        middle = args.size_mb * 1024 * 1024 // 2
+        scenarios = [
+            ("full download", {}),
+            ("revalidate (If-None-Match)", {"If-None-Match": etag}),
+            ("1 MB range", {"Range": f"bytes={middle}-{middle + 1024 * 1024 - 1}"}),
+        ]
+        print(f"\n{args.requests} requests per row, concurrency {args.concurrency}, "
+              f"{args.size_mb} MB file, serve_file mode {args.mode}")
+        print(f"{'':<30}{'route':>8}{'req/s':>10}{'MB/s':>10}{'CPU ms/req':>12}")
+        for name, headers in scenarios:
+            for route in ("legacy", "served"):
+                before = cpu_seconds(server.pid)
+                elapsed, received = asyncio.run(
+                    drive(base_url, f"/{route}/scan.pdf", args.requests, args.concurrency, headers)
+                )
+                cpu = cpu_seconds(server.pid) - before
+                print(f"{name:<30}{route:>8}{args.requests / elapsed:>10.1f}"
+                      f"{received / elapsed / 1024 / 1024:>10.1f}{cpu / args.requests * 1000:>12.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["serve"]:
+        import uvicorn
+
+        uvicorn.run(build_app(sys.argv[3]), port=int(sys.argv[2]), log_level="warning")
+    else:
+        main()
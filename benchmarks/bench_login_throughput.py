@@ -0,0 +1,98 @@
+"""Login throughput benchmark for a single uvicorn worker
+
+Fires concurrent /auth/login requests (bcrypt verification) while a probe
+keeps hitting /health, and reports logins per second, login latency, how many
+logins were shed with 503, and /health latency. The /health numbers show
+whether password hashing still stalls the event loop.
+
+Pool settings are read from the environment, e.g.:
+
+    PASSWORD_HASH_WORKERS=8 PASSWORD_HASH_EXECUTOR=process \\
+        python -m benchmarks.bench_login_throughput --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import free_port, percentiles, print_table, start_server, use_sqlite_database
+
+
+def seed(users: int):
+    from sqlalchemy import insert
+    from app.auth.jwt import get_password_hash
+    from app.database import SessionLocal, init_db
+    from app.models import RoleType, User
+
+    init_db()
+    password = get_password_hash("benchpass123")
+    db = SessionLocal()
+    db.execute(insert(User), [
+        {"email": f"user{i}@bench.example.com", "hashed_password": password,
+         "role": RoleType.EMPLOYEE, "is_active": True}
+        for i in range(users)
+    ])
+    db.commit()
+    db.close()
+
+
+async def drive(base_url: str, users: int, concurrency: int, duration: float):
+    import httpx
+
+    logins, health, shed = [], [], 0
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def login_worker(worker: int):
+            nonlocal shed
+            n = worker
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.post("/api/v1/auth/login", json={
+                    "email": f"user{n % users}@bench.example.com", "password": "benchpass123"
+                })
+                if response.status_code == 503:
+                    shed += 1
+                    await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+                    continue
+                response.raise_for_status()
+                logins.append(time.perf_counter() - started)
+                n += concurrency
+
+        async def health_probe():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                await client.get("/health")
+                health.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        await asyncio.gather(health_probe(), *(login_worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print_table(
+        f"Logins: {len(logins) / elapsed:.2f}/s per worker, concurrency {concurrency}, "
+        f"{shed} shed with 503",
+        {"login": percentiles(logins), "health (event loop)": percentiles(health)},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    use_sqlite_database("login_throughput")
+    seed(args.users)
+    port = free_port()
+    server = start_server(port)
+    try:
+        asyncio.run(drive(f"http://127.0.0.1:{port}", args.users, args.concurrency, args.duration))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Mixed-traffic latency benchmark for a single uvicorn worker
+
+Seeds a SQLite database, starts one uvicorn worker and drives a weighted mix
+of cheap requests (clock-in style lookups, /auth/me) alongside expensive ones
+(headcount report, team listings) at a fixed concurrency. Every statement pays
+a simulated database round trip (--db-latency-ms) so the run reflects a
+networked MySQL server rather than an in-process SQLite file. Reports
+p50/p95/p99 latency per endpoint and overall.
+
+Run it on two checkouts to compare before/after, e.g.:
+
+    git stash && python -m benchmarks.bench_mixed_traffic   # before
+    git stash pop && python -m benchmarks.bench_mixed_traffic  # after
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import free_port, percentiles, print_table, start_server, use_sqlite_database
+
+
+def seed(employees: int, days: int):
+    from sqlalchemy import insert
+    from app.auth.jwt import get_password_hash
+    from app.database import SessionLocal, init_db
+    from app.models import (
+        AttendanceRecord, Department, Employee, Position, RoleType, User
+    )
+    from app.services.headcount import rebuild_snapshot
+
+    init_db()
+    db = SessionLocal()
+    db.execute(insert(Department), [{"name": f"Dept {i}", "code": f"D{i}"} for i in range(1, 11)])
+    db.execute(insert(Position), [{"title": f"Position {i}", "code": f"P{i}"} for i in range(1, 21)])
+    db.execute(insert(Employee), [
+        {
+            "id": i,
+            "employee_number": f"EMP{i:07d}",
+            "first_name": "Bench",
+            "last_name": f"User{i}",
+            "email": f"emp{i}@bench.example.com",
+            "hire_date": date(2020, 1, 1),
+            "employment_status": "ACTIVE" if i % 17 else "TERMINATED",
+            "department_id": i % 10 + 1,
+            "position_id": i % 20 + 1,
+            "manager_id": None if i <= 10 else (i % 10) + 1,
+            "salary": 4000,
+        }
+        for i in range(1, employees + 1)
+    ])
+    today = date.today()
+    batch = []
+    for offset in range(days):
+        day = today - timedelta(days=offset + 1)
+        for i in range(1, employees + 1):
+            clock_in = datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+            batch.append({
+                "employee_id": i,
+                "date": day,
+                "clock_in": clock_in,
+                "clock_out": clock_in + timedelta(hours=8),
+                "status": "PRESENT",
+                "hours_worked": 8,
+            })
+        if len(batch) >= 50000:
+            db.execute(insert(AttendanceRecord), batch)
+            batch = []
+    if batch:
+        db.execute(insert(AttendanceRecord), batch)
+    password = get_password_hash("benchpass123")
+    db.execute(insert(User), [
+        {"email": "hr@bench.example.com", "hashed_password": password, "role": RoleType.HR_ADMIN, "is_active": True},
+        {"email": "mgr@bench.example.com", "hashed_password": password, "role": RoleType.MANAGER,
+         "is_active": True, "employee_id": 1},
+    ])
+    # As the nightly refresh_headcount_snapshot task leaves it
+    rebuild_snapshot(db.connection(), today)
+    db.commit()
+    db.close()
+
+
+async def drive(base_url: str, employees: int, concurrency: int, total: int):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        tokens = {}
+        for role, email in (("hr", "hr@bench.example.com"), ("mgr", "mgr@bench.example.com")):
+            response = await client.post("/api/v1/auth/login", json={"email": email, "password": "benchpass123"})
+            response.raise_for_status()
+            tokens[role] = {"Authorization": f"Bearer {response.json()['access']}"}
+
+        mix = [
+            ("attendance_records", 40, "hr", lambda: f"/api/v1/attendance/records/{random.randint(1, employees)}"),
+            ("auth_me", 25, "mgr", lambda: "/api/v1/auth/me"),
+            ("list_employees", 15, "hr", lambda: "/api/v1/employees?limit=50"),
+            ("team_leave", 10, "mgr", lambda: "/api/v1/leave/requests/team"),
+            ("headcount_report", 10, "hr", lambda: "/api/v1/reports/headcount"),
+        ]
+        names = [m[0] for m in mix]
+        weights = [m[1] for m in mix]
+        samples = {name: [] for name in names}
+        remaining = total
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                name, _, role, path = mix[random.choices(range(len(mix)), weights)[0]]
+                started = time.perf_counter()
+                response = await client.get(path(), headers=tokens[role])
+                samples[name].append(time.perf_counter() - started)
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{name} failed: {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    rows = {name: percentiles(values) for name, values in samples.items()}
+    rows["ALL"] = percentiles([v for values in samples.values() for v in values])
+    print_table(f"Mixed traffic: {total} requests, concurrency {concurrency}, {total / elapsed:.1f} req/s", rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0,
+                        help="simulated database round trip added to every statement")
+    args = parser.parse_args()
+
+    use_sqlite_database("mixed_traffic")
+    seed(args.employees, args.days)
+    port = free_port()
+    server = start_server(port, args.db_latency_ms)
+    try:
+        asyncio.run(drive(f"http://127.0.0.1:{port}", args.employees, args.concurrency, args.requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Deep-page latency: OFFSET vs keyset cursor pagination
+
+Seeds one employee with N attendance records and fetches page P (limit 100)
+of /attendance/records/{employee_id} both ways: ?skip=(P-1)*100 and
+?cursor=... pointing at the last row of page P-1.
+
+    python -m benchmarks.bench_pagination --records 200000 --page 1000
+"""
+import argparse
+import time
+
+from benchmarks.common import free_port, percentiles, print_table, start_server, use_sqlite_database
+
+BATCH = 20000
+LIMIT = 100
+
+
+def seed(records: int):
+    from datetime import date, timedelta
+    from sqlalchemy import insert
+    from app.auth.jwt import get_password_hash
+    from app.database import SessionLocal, init_db
+    from app.models import AttendanceRecord, AttendanceStatus, Employee, RoleType, User
+
+    init_db()
+    db = SessionLocal()
+    db.add(User(email="hr@bench.example.com", hashed_password=get_password_hash("benchpass123"),
+                role=RoleType.HR_ADMIN, is_active=True))
+    db.add(Employee(employee_number="E0000001", first_name="Bench", last_name="Employee",
+                    email="e1@bench.example.com", hire_date=date(2000, 1, 1)))
+    db.flush()
+    # Several punches per day so the id tie-breaker matters
+    start = date(2000, 1, 1)
+    for offset in range(0, records, BATCH):
+        db.execute(insert(AttendanceRecord), [
+            {"employee_id": 1, "date": start + timedelta(days=i // 4), "status": AttendanceStatus.PRESENT}
+            for i in range(offset, min(offset + BATCH, records))
+        ])
+    db.commit()
+    db.close()
+    return start, start + timedelta(days=records // 4 + 1)
+
+
+def cursor_for_page(page: int) -> str:
+    from sqlalchemy import select
+    from app.api.pagination import encode_cursor
+    from app.database import SessionLocal
+    from app.models import AttendanceRecord
+
+    db = SessionLocal()
+    last = db.execute(
+        select(AttendanceRecord.date, AttendanceRecord.id)
+        .order_by(AttendanceRecord.date.desc(), AttendanceRecord.id.desc())
+        .offset((page - 1) * LIMIT - 1).limit(1)
+    ).one()
+    db.close()
+    return encode_cursor(list(last))
+
+
+def main():
+    import httpx
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    use_sqlite_database("pagination")
+    start_date, end_date = seed(args.records)
+    cursor = cursor_for_page(args.page)
+    port = free_port()
+    server = start_server(port)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            token = client.post("/api/v1/auth/login", json={
+                "email": "hr@bench.example.com", "password": "benchpass123"
+            }).json()["access"]
+            headers = {"Authorization": f"Bearer {token}"}
+            base = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat(), "limit": LIMIT}
+            variants = {
+                f"offset (skip={(args.page - 1) * LIMIT})": {**base, "skip": (args.page - 1) * LIMIT},
+                "cursor": {**base, "cursor": cursor},
+                "first page": base,
+            }
+            results, pages = {}, {}
+            for name, params in variants.items():
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = client.get("/api/v1/attendance/records/1", params=params, headers=headers)
+                    samples.append(time.perf_counter() - started)
+                    response.raise_for_status()
+                results[name] = percentiles(samples)
+                pages[name] = [row["id"] for row in response.json()]
+        assert pages["cursor"] == pages[next(iter(pages))], "cursor and offset pages differ"
+        print_table(f"Page {args.page} of {args.records} attendance records", results)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
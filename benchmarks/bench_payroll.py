@@ -0,0 +1,64 @@
+"""Payroll engine benchmark: payslips per second for a large run
+
+Seeds N active, salaried employees and processes one payroll run in-process
+with app.services.payroll, reporting rows per second and peak RSS:
+
+    python -m benchmarks.bench_payroll --employees 50000 --chunk-size 1000
+"""
+import argparse
+import resource
+
+from benchmarks.common import use_sqlite_database
+
+BATCH = 10000
+
+
+def seed(employees: int) -> int:
+    from datetime import date
+    from decimal import Decimal
+    from sqlalchemy import insert
+    from app.database import SessionLocal, init_db
+    from app.models import Employee, PayrollRun
+
+    init_db()
+    db = SessionLocal()
+    for start in range(0, employees, BATCH):
+        db.execute(insert(Employee), [
+            {"employee_number": f"E{i:07d}", "first_name": "Bench", "last_name": f"Employee {i}",
+             "email": f"e{i}@bench.example.com", "hire_date": date(2020, 1, 1),
+             "salary": Decimal(30000 + i % 5000) + Decimal("0.55")}
+            for i in range(start, min(start + BATCH, employees))
+        ])
+    payroll_run = PayrollRun(period_start=date(2025, 1, 1), period_end=date(2025, 1, 31))
+    db.add(payroll_run)
+    db.commit()
+    run_id = payroll_run.id
+    db.close()
+    return run_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    use_sqlite_database("payroll")
+    run_id = seed(args.employees)
+
+    from app.database import SessionLocal
+    from app.services.payroll import run_payroll
+
+    db = SessionLocal()
+    try:
+        stats = run_payroll(db, run_id, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPayroll run of {args.employees} employees, chunk size {args.chunk_size}")
+    print(f"{stats.payslips} payslips in {stats.elapsed:.2f}s: {stats.rows_per_second:.0f} rows/s, "
+          f"total {stats.total_amount}, peak RSS {peak_rss:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
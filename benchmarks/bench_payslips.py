@@ -0,0 +1,67 @@
+"""Payslip PDF benchmark: payslips rendered per minute
+
+Seeds N active, salaried employees, computes one payroll run and renders all
+its payslip PDFs with app.services.payroll.render_payslips, reporting the
+rendering rate (the target is 10k payslips a minute on 8 cores):
+
+    python -m benchmarks.bench_payslips --employees 20000 --workers 8
+"""
+import argparse
+import os
+
+from benchmarks.common import use_sqlite_database
+
+BATCH = 10000
+
+
+def seed(employees: int) -> int:
+    from datetime import date
+    from decimal import Decimal
+    from sqlalchemy import insert
+    from app.database import SessionLocal, init_db
+    from app.models import Employee, PayrollRun
+
+    init_db()
+    db = SessionLocal()
+    for start in range(0, employees, BATCH):
+        db.execute(insert(Employee), [
+            {"employee_number": f"E{i:07d}", "first_name": "Bench", "last_name": f"Employee {i}",
+             "email": f"e{i}@bench.example.com", "hire_date": date(2020, 1, 1),
+             "salary": Decimal(30000 + i % 5000) + Decimal("0.55")}
+            for i in range(start, min(start + BATCH, employees))
+        ])
+    payroll_run = PayrollRun(period_start=date(2025, 1, 1), period_end=date(2025, 1, 31))
+    db.add(payroll_run)
+    db.commit()
+    run_id = payroll_run.id
+    db.close()
+    return run_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=250)
+    args = parser.parse_args()
+
+    workdir = use_sqlite_database("payslips")
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    run_id = seed(args.employees)
+
+    from app.database import SessionLocal
+    from app.services.payroll import render_payslips, run_payroll
+
+    db = SessionLocal()
+    try:
+        run_payroll(db, run_id)
+        stats = render_payslips(db, run_id, workers=args.workers, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"\nPayslip PDFs for {args.employees} employees, {args.workers} workers, batch size {args.batch_size}")
+    print(f"{stats.payslips} PDFs in {stats.elapsed:.2f}s: {stats.rows_per_second * 60:.0f} payslips/min "
+          f"({stats.rows_per_second / args.workers:.0f}/s per worker)")
+
+
+if __name__ == "__main__":
+    main()
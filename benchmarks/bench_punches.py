@@ -0,0 +1,95 @@
+"""Batch punch ingestion throughput
+
+Seeds N employees, then replays one shift change through POST
+/attendance/punches on a single uvicorn worker: every employee clocks in,
+then every employee clocks out, in batches of B punches. Reports punches
+per second for each phase and for a replay of the clock-ins (all
+duplicates).
+
+    python -m benchmarks.bench_punches --employees 50000 --batch-size 5000
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.common import free_port, start_server, use_sqlite_database
+
+BATCH = 10000
+KIOSK_KEY = "bench-kiosk-key"
+
+
+def seed(employees: int):
+    from datetime import date
+    from sqlalchemy import insert
+    from app.database import SessionLocal, init_db
+    from app.models import Employee
+
+    init_db()
+    db = SessionLocal()
+    for start in range(0, employees, BATCH):
+        db.execute(insert(Employee), [
+            {"employee_number": f"E{i:07d}", "first_name": "Bench", "last_name": f"Employee {i}",
+             "email": f"e{i}@bench.example.com", "hire_date": date(2020, 1, 1)}
+            for i in range(start, min(start + BATCH, employees))
+        ])
+    db.commit()
+    db.close()
+
+
+def main():
+    import httpx
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    use_sqlite_database("punches")
+    os.environ["KIOSK_API_KEY"] = KIOSK_KEY
+    seed(args.employees)
+
+    def punches(action: str, hour: int):
+        return [
+            {"employee_id": i, "action": action, "timestamp": f"2025-03-03T{hour:02d}:{i % 60:02d}:00"}
+            for i in range(1, args.employees + 1)
+        ]
+
+    phases = {
+        "clock in": punches("clock_in", 8),
+        "clock out": punches("clock_out", 17),
+        "replayed clock in": punches("clock_in", 8),
+    }
+    port = free_port()
+    server = start_server(port)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=300,
+                          headers={"X-API-Key": KIOSK_KEY}) as client:
+            print(f"\n{args.employees} employees, batches of {args.batch_size} punches")
+            for name, batch in phases.items():
+                # Encode up front: client and server share the CPU here, and
+                # building request bodies is the terminals' work, not the API's
+                bodies = [
+                    json.dumps({"punches": batch[offset:offset + args.batch_size]}).encode()
+                    for offset in range(0, len(batch), args.batch_size)
+                ]
+                responses = []
+                started = time.perf_counter()
+                for body in bodies:
+                    response = client.post("/api/v1/attendance/punches", content=body,
+                                           headers={"Content-Type": "application/json"})
+                    response.raise_for_status()
+                    responses.append(response)
+                elapsed = time.perf_counter() - started
+                counts = {
+                    key: sum(response.json()[key] for response in responses)
+                    for key in ("accepted", "duplicates", "rejected")
+                }
+                print(f"{name:<20}{len(batch) / elapsed:>10.0f} punches/s  {counts}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Attendance reminder benchmark: one reminder run over a large workforce
+
+Seeds N active employees on three shifts, clocks in 70% of them and puts 5%
+on approved leave, then times a reminder run at 11:00 with the email queue
+stubbed out (the run records reminders and paces the email tasks):
+
+    python -m benchmarks.bench_reminders --employees 100000
+"""
+import argparse
+from datetime import date, datetime
+
+from benchmarks.common import use_sqlite_database
+
+BATCH = 10000
+DAY = date(2025, 3, 12)  # a Wednesday
+
+
+def seed(employees: int):
+    from sqlalchemy import insert
+    from app.database import SessionLocal, init_db
+    from app.models import AttendanceRecord, Employee, LeaveRequest, LeaveRequestStatus, LeaveType, Shift
+
+    init_db()
+    db = SessionLocal()
+    db.add(LeaveType(name="Annual"))
+    db.add_all([
+        Shift(name="Early", start_time="06:00", end_time="14:00"),
+        Shift(name="Day", start_time="09:00", end_time="17:00"),
+        Shift(name="Late", start_time="14:00", end_time="22:00"),
+    ])
+    db.flush()
+    for start in range(0, employees, BATCH):
+        ids = range(start, min(start + BATCH, employees))
+        db.execute(insert(Employee), [
+            {"employee_number": f"E{i:07d}", "first_name": "Bench", "last_name": f"Employee {i}",
+             "email": f"e{i}@bench.example.com", "hire_date": date(2020, 1, 1), "shift_id": i % 3 + 1}
+            for i in ids
+        ])
+        db.execute(insert(AttendanceRecord.__table__), [
+            {"employee_id": i + 1, "date": DAY, "clock_in": datetime(2025, 3, 12, 8, 0),
+             "is_reviewed": False}
+            for i in ids if i % 10 < 7
+        ])
+        db.execute(insert(LeaveRequest), [
+            {"employee_id": i + 1, "leave_type_id": 1, "start_date": DAY, "end_date": DAY,
+             "total_days": 1, "status": LeaveRequestStatus.APPROVED}
+            for i in ids if i % 20 == 7
+        ])
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=100000)
+    args = parser.parse_args()
+
+    use_sqlite_database("reminders")
+    seed(args.employees)
+
+    from app.database import SessionLocal
+    from app.services.attendance_reminders import send_reminders
+
+    queued = []
+    db = SessionLocal()
+    try:
+        summary = send_reminders(db, datetime(2025, 3, 12, 11, 0),
+                                 queue=lambda emails, countdown: queued.append(len(emails)))
+    finally:
+        db.close()
+    print(f"\nReminder run over {args.employees} employees")
+    print(f"{summary['reminded']} reminded in {summary['batches']} email tasks, {summary['elapsed']:.2f}s; "
+          f"last task scheduled {summary['last_batch_countdown']:.0f}s out")
+
+
+if __name__ == "__main__":
+    main()
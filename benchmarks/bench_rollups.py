@@ -0,0 +1,128 @@
+"""Attendance report latency over a year, served from the daily rollups
+
+Seeds N employees with one attendance record per weekday of 2024, builds
+the rollups with the nightly reconciler (timed), then reports latency of
+the absenteeism, hours and lateness reports for the full year, next to the
+raw-table COUNT the absenteeism report used to run:
+
+    python -m benchmarks.bench_rollups --employees 2000
+"""
+import argparse
+import time
+
+from benchmarks.common import free_port, percentiles, print_table, start_server, use_sqlite_database
+
+BATCH = 10000
+YEAR = {"period_start": "2024-01-01", "period_end": "2024-12-31"}
+
+
+def seed(employees: int):
+    from datetime import date, timedelta
+    from sqlalchemy import insert
+    from app.auth.jwt import get_password_hash
+    from app.database import SessionLocal, init_db
+    from app.models import AttendanceRecord, AttendanceStatus, Department, Employee, RoleType, User
+
+    init_db()
+    db = SessionLocal()
+    db.add(User(email="hr@bench.example.com", hashed_password=get_password_hash("benchpass123"),
+                role=RoleType.HR_ADMIN, is_active=True))
+    db.execute(insert(Department), [{"name": f"Department {i}"} for i in range(20)])
+    db.execute(insert(Employee), [
+        {"employee_number": f"E{i:07d}", "first_name": "Bench", "last_name": f"Employee {i}",
+         "email": f"e{i}@bench.example.com", "hire_date": date(2020, 1, 1),
+         "department_id": i % 20 + 1}
+        for i in range(employees)
+    ])
+    days = [date(2024, 1, 1) + timedelta(days=i) for i in range(366)]
+    statuses = [AttendanceStatus.PRESENT] * 16 + [AttendanceStatus.LATE] * 2 + [
+        AttendanceStatus.ABSENT, AttendanceStatus.HALF_DAY
+    ]
+    # Core inserts bypass the incremental hooks; the reconciler builds the rollups
+    rows = (
+        {"employee_id": employee_id, "date": day, "status": statuses[(employee_id + n) % len(statuses)],
+         "hours_worked": 8.0, "is_reviewed": False}
+        for n, day in enumerate(d for d in days if d.weekday() < 5)
+        for employee_id in range(1, employees + 1)
+    )
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            db.execute(insert(AttendanceRecord.__table__), batch)
+            batch = []
+    if batch:
+        db.execute(insert(AttendanceRecord.__table__), batch)
+    db.commit()
+    db.close()
+
+
+def reconcile_year() -> float:
+    from datetime import date
+    from app.database import SessionLocal
+    from app.services.attendance_rollups import reconcile
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    reconcile(db.connection(), date(2024, 1, 1), date(2024, 12, 31))
+    db.commit()
+    elapsed = time.perf_counter() - started
+    db.close()
+    return elapsed
+
+
+def raw_absence_count() -> float:
+    from datetime import date
+    from sqlalchemy import func, select
+    from app.database import SessionLocal
+    from app.models import AttendanceRecord, AttendanceStatus
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    db.scalar(select(func.count(AttendanceRecord.id)).where(
+        AttendanceRecord.date >= date(2024, 1, 1),
+        AttendanceRecord.date <= date(2024, 12, 31),
+        AttendanceRecord.status == AttendanceStatus.ABSENT
+    ))
+    elapsed = time.perf_counter() - started
+    db.close()
+    return elapsed
+
+
+def main():
+    import httpx
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    use_sqlite_database("rollups")
+    seed(args.employees)
+    print(f"\nReconciled a year of rollups in {reconcile_year():.2f}s")
+
+    port = free_port()
+    server = start_server(port)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        token = httpx.post(f"{base_url}/api/v1/auth/login", json={
+            "email": "hr@bench.example.com", "password": "benchpass123"
+        }).json()["access"]
+        results = {"raw COUNT (previous)": percentiles([raw_absence_count() for _ in range(5)])}
+        with httpx.Client(base_url=base_url, headers={"Authorization": f"Bearer {token}"}) as client:
+            for report in ("absenteeism", "attendance-hours", "lateness"):
+                samples = []
+                for _ in range(args.requests):
+                    started = time.perf_counter()
+                    client.get(f"/api/v1/reports/{report}", params=YEAR).raise_for_status()
+                    samples.append(time.perf_counter() - started)
+                results[f"/reports/{report}"] = percentiles(samples)
+        print_table(f"One-year reports, {args.employees} employees "
+                    f"({args.employees * 262} attendance records)", results)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
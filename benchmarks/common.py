@@ -0,0 +1,116 @@
+"""Shared helpers for the benchmark scripts"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+
+def use_sqlite_database(name: str) -> str:
+    """Point the app at a throwaway SQLite file (must run before importing app.*)"""
+    workdir = tempfile.mkdtemp(prefix=f"hrms_{name}_")
+    path = os.path.join(workdir, f"{name}.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("LOG_FILE", os.path.join(workdir, "app.log"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return workdir
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples (seconds) as milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(pick(0.50), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]):
+    """Print a small fixed-width results table"""
+    print(f"\n{title}")
+    columns = ["count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    print(f"{'':<28}" + "".join(f"{c:>10}" for c in columns))
+    for name, stats in rows.items():
+        print(f"{name:<28}" + "".join(f"{stats.get(c, ''):>10}" for c in columns))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def add_sqlite_latency(latency_ms: float):
+    """Make every SQLite statement wait ``latency_ms`` inside the driver call
+
+    SQLite answers from the page cache in microseconds, which hides the cost of
+    blocking on the database. Sleeping inside ``cursor.execute`` models the
+    network round trip to MySQL: sync drivers block the calling thread, async
+    drivers (aiosqlite runs sqlite3 in its own thread) do not.
+    """
+    import sqlite3
+
+    delay = latency_ms / 1000
+
+    class SlowCursor(sqlite3.Cursor):
+        def execute(self, *args, **kwargs):
+            time.sleep(delay)
+            return super().execute(*args, **kwargs)
+
+        def executemany(self, *args, **kwargs):
+            time.sleep(delay)
+            return super().executemany(*args, **kwargs)
+
+    class SlowConnection(sqlite3.Connection):
+        def cursor(self, factory=SlowCursor):
+            return super().cursor(factory)
+
+    original_connect = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        kwargs.setdefault("factory", SlowConnection)
+        return original_connect(*args, **kwargs)
+
+    sqlite3.connect = connect
+    sqlite3.dbapi2.connect = connect
+
+
+def start_server(port: int, db_latency_ms: float = 0) -> subprocess.Popen:
+    """Start a single uvicorn worker for the app and wait until it answers /health"""
+    import httpx
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.common", str(port), str(db_latency_ms)],
+        env=os.environ.copy(),
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start in time")
+
+
+if __name__ == "__main__":
+    # Server entry point used by start_server(): python -m benchmarks.common PORT LATENCY_MS
+    import uvicorn
+
+    if float(sys.argv[2]) > 0:
+        add_sqlite_latency(float(sys.argv[2]))
+    uvicorn.run("app.main:app", port=int(sys.argv[1]), workers=1, log_level="warning")
@@ -0,0 +1,38 @@
+"""One-off pass moving existing employee documents into the deduplicated store
+
+Run once after `alembic upgrade head` (revision 0010), with the app's settings:
+
+    python dedupe_documents.py
+
+Each file is hashed and linked into UPLOAD_DIR/blobs, its document record is
+repointed at the blob, and the old file is removed. Copies of a file the store
+already holds are freed. Safe to interrupt and run again.
+"""
+from app.database import SessionLocal
+from app.services import document_blobs
+import sys
+
+
+def dedupe_documents():
+    """Move every stored employee document into the blob store"""
+    db = SessionLocal()
+
+    try:
+        print("Moving employee documents into the blob store...")
+        summary = document_blobs.deduplicate(db)
+
+        print(f"Documents moved: {summary['documents']}")
+        print(f"Duplicate copies removed: {summary['duplicates']} ({summary['bytes_freed']} bytes freed)")
+        if summary["missing"]:
+            print(f"Documents whose file is missing (left as they are): {summary['missing']}")
+
+    except Exception as e:
+        print(f"Error moving documents: {str(e)}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    dedupe_documents()
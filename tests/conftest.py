@@ -0,0 +1,100 @@
+"""Shared pytest configuration"""
+import os
+
+# Keep tests hermetic: never talk to a developer's local Redis
+os.environ.setdefault("PRINCIPAL_CACHE_REDIS_ENABLED", "false")
+os.environ.setdefault("PUNCH_BUFFER_REDIS_ENABLED", "false")
+
+import anyio
+import pytest
+from app.auth.jwt import get_password_hash
+from app.auth.principal_cache import principal_cache
+from app.database import Base
+from app.models import User, RoleType
+from app.services.business_calendar import business_calendar
+from app.services.org_tree import org_tree
+from app.services.shift_schedule import shift_schedule
+from tests.support import TestingSessionLocal, client, engine
+
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """Create test database tables for each test to ensure isolation and make
+    the schema available to tests that don't request the fixture explicitly."""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def shared_event_loop(monkeypatch):
+    """Serve every request of the test from one event loop, as uvicorn does;
+    async Redis clients stay bound to the loop that created them"""
+    with anyio.from_thread.start_blocking_portal() as portal:
+        monkeypatch.setattr(client, "portal", portal)
+        yield
+
+
+@pytest.fixture
+def test_user(setup_database):
+    """Create a test user"""
+    db = TestingSessionLocal()
+    user = User(
+        email="test@example.com",
+        hashed_password=get_password_hash("testpassword"),
+        role=RoleType.EMPLOYEE,
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    return user
+
+
+@pytest.fixture
+def hr_headers(setup_database):
+    """Authorization headers for an HR admin"""
+    db = TestingSessionLocal()
+    db.add(User(
+        email="hr@example.com",
+        hashed_password=get_password_hash("hrpassword"),
+        role=RoleType.HR_ADMIN,
+        is_active=True
+    ))
+    db.commit()
+    db.close()
+    
+    response = client.post(
+        "/api/v1/auth/login",
+        json={"email": "hr@example.com", "password": "hrpassword"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access']}"}
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """User ids are reused across tests, so cached principals must not leak"""
+    principal_cache.clear_local()
+    yield
+    principal_cache.clear_local()
+
+
+@pytest.fixture(autouse=True)
+def clear_org_tree():
+    """Each test builds its own hierarchy, often with Core inserts that bypass
+    the session events, so the org-tree index must start empty"""
+    org_tree.invalidate()
+    yield
+    org_tree.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def clear_calendars():
+    """Shifts and holidays are recreated by every test, so their cached
+    schedules must start empty"""
+    shift_schedule.invalidate()
+    business_calendar.invalidate()
+    yield
+    shift_schedule.invalidate()
+    business_calendar.invalidate()
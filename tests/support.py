@@ -0,0 +1,30 @@
+"""Test database and API client shared by the test modules"""
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.database import get_db
+
+# Test database URL (a SQLite file, recreated for every test)
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+AsyncTestingSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+async def override_get_db():
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
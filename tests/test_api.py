@@ -1,59 +1,5 @@
 """Basic tests for HRMS API"""
-import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.main import app
-from app.database import Base, get_db
-from app.models import User, RoleType
-from app.auth.jwt import get_password_hash
-
-# Test database URL (use in-memory SQLite for tests)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-
-app.dependency_overrides[get_db] = override_get_db
-
-client = TestClient(app)
-
-
-@pytest.fixture(autouse=True)
-def setup_database():
-    """Create test database tables for each test to ensure isolation and make
-    the schema available to tests that don't request the fixture explicitly."""
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture
-def test_user(setup_database):
-    """Create a test user"""
-    db = TestingSessionLocal()
-    user = User(
-        email="test@example.com",
-        hashed_password=get_password_hash("testpassword"),
-        role=RoleType.EMPLOYEE,
-        is_active=True
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    db.close()
-    return user
+from tests.support import client
 
 
 def test_health_check():
@@ -66,63 +12,6 @@ def test_health_check():
     assert "version" in data
 
 
-def test_login_success(test_user):
-    """Test successful login"""
-    response = client.post(
-        "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "testpassword"}
-    )
-    assert response.status_code == 200
-    data = response.json()
-    assert "access" in data
-    assert "refresh" in data
-    assert data["token_type"] == "bearer"
-
-
-def test_login_invalid_credentials():
-    """Test login with invalid credentials"""
-    response = client.post(
-        "/api/v1/auth/login",
-        json={"email": "wrong@example.com", "password": "wrongpassword"}
-    )
-    assert response.status_code == 401
-
-
-def test_unauthorized_access():
-    """Test accessing protected endpoint without token"""
-    response = client.get("/api/v1/employees")
-    assert response.status_code == 403  # No Authorization header
-
-
-def test_get_current_user(test_user):
-    """Test getting current user info"""
-    # Login first
-    login_response = client.post(
-        "/api/v1/auth/login",
-        json={"email": "test@example.com", "password": "testpassword"}
-    )
-    token = login_response.json()["access"]
-    
-    # Get current user
-    response = client.get(
-        "/api/v1/auth/me",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-    assert response.status_code == 200
-    data = response.json()
-    assert data["email"] == "test@example.com"
-    assert data["role"] == "EMPLOYEE"
-
-
-def test_invalid_token():
-    """Test with invalid token"""
-    response = client.get(
-        "/api/v1/employees",
-        headers={"Authorization": "Bearer invalid_token"}
-    )
-    assert response.status_code == 401
-
-
 def test_api_documentation():
     """Test API documentation is accessible"""
     response = client.get("/api/docs")
@@ -130,7 +19,3 @@ def test_api_documentation():
     
     response = client.get("/api/openapi.json")
     assert response.status_code == 200
-
-
-if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
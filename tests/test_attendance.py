@@ -0,0 +1,448 @@
+"""Attendance punch, rollup, shift and reminder tests"""
+import pytest
+from app.models import User, RoleType
+from tests.support import TestingSessionLocal, client
+
+
+def test_batch_punches_apply_in_bulk_and_replay_idempotently():
+    """Kiosk batches close open records, pair in-batch punches and flag replays"""
+    from datetime import date, datetime
+    from app.config import get_settings
+    from app.models import AttendanceRecord, Employee
+    
+    db = TestingSessionLocal()
+    for i in (1, 2):
+        db.add(Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Punch",
+            last_name=str(i),
+            email=f"punch{i}@example.com",
+            hire_date=date(2024, 1, 1)
+        ))
+    db.flush()
+    db.add(AttendanceRecord(employee_id=1, date=date(2025, 3, 3), clock_in=datetime(2025, 3, 3, 8, 0)))
+    db.commit()
+    
+    punches = [
+        {"employee_id": 2, "action": "clock_out", "timestamp": "2025-03-03T12:30:00"},
+        {"employee_id": 1, "action": "clock_out", "timestamp": "2025-03-03T17:00:00"},
+        {"employee_id": 2, "action": "clock_in", "timestamp": "2025-03-03T09:00:00",
+         "geo_location": {"lat": 1.0, "long": 2.0}},
+        {"employee_id": 2, "action": "clock_in", "timestamp": "2025-03-03T09:30:00"},
+        {"employee_id": 99, "action": "clock_in", "timestamp": "2025-03-03T09:00:00"},
+        {"employee_id": 1, "action": "clock_out", "timestamp": "2025-03-04T17:00:00.250"},
+        {"employee_id": 1, "action": "clock_in", "timestamp": "2025-03-04T08:00:00.731"},
+    ]
+    headers = {"X-API-Key": get_settings().KIOSK_API_KEY}
+    response = client.post("/api/v1/attendance/punches", json={"punches": punches}, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert [r["status"] for r in body["results"]] == [
+        "accepted", "accepted", "accepted", "rejected", "rejected", "accepted", "accepted"
+    ]
+    assert (body["accepted"], body["duplicates"], body["rejected"]) == (5, 0, 2)
+    assert body["results"][0]["record_id"] == body["results"][2]["record_id"]
+    
+    records = {(r.employee_id, r.date.day): r for r in db.query(AttendanceRecord).all()}
+    assert len(records) == 3
+    assert records[(1, 3)].hours_worked == 9.0
+    assert records[(1, 4)].hours_worked == 9.0
+    # Stored in whole seconds, as MySQL DATETIME keeps them
+    assert records[(1, 4)].clock_in == datetime(2025, 3, 4, 8, 0)
+    assert records[(2, 3)].hours_worked == 3.5
+    assert records[(2, 3)].geo_location == {"lat": 1.0, "long": 2.0}
+    
+    # A terminal replaying the same batch does not create or move anything
+    response = client.post("/api/v1/attendance/punches", json={"punches": punches}, headers=headers)
+    body = response.json()
+    assert (body["accepted"], body["duplicates"], body["rejected"]) == (0, 5, 2)
+    assert db.query(AttendanceRecord).count() == 3
+    db.close()
+    
+    response = client.post("/api/v1/attendance/punches", json={"punches": punches},
+                           headers={"X-API-Key": "wrong"})
+    assert response.status_code == 401
+
+
+def test_write_behind_punches_are_buffered_merged_and_flushed(monkeypatch, tmp_path):
+    """Write-behind clock-in/out answer from the buffer and reach the table on flush"""
+    from datetime import date
+    from app.auth.jwt import create_access_token
+    from app.config import get_settings
+    from app.models import AttendanceRecord, Employee
+    from app.services.punch_buffer import punch_buffer
+    
+    settings = get_settings()
+    monkeypatch.setattr(settings, "ATTENDANCE_WRITE_BEHIND", True)
+    monkeypatch.setattr(settings, "PUNCH_BUFFER_LOCAL_PATH", str(tmp_path / "punches.db"))
+    punch_buffer.clear_local()
+    
+    db = TestingSessionLocal()
+    db.add(Employee(
+        employee_number="EMP001",
+        first_name="Buffer",
+        last_name="One",
+        email="buffer@example.com",
+        hire_date=date(2024, 1, 1)
+    ))
+    db.flush()
+    db.add(User(email="buffer@example.com", hashed_password="x", role=RoleType.EMPLOYEE,
+                employee_id=1, is_active=True))
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '1', 'role': 'EMPLOYEE'})}"}
+    
+    response = client.post("/api/v1/attendance/clock-in", json={"employee_id": 1}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["pending"] is True and response.json()["id"] is None
+    assert db.query(AttendanceRecord).count() == 0
+    
+    # The duplicate clock-in rule is enforced by the buffer
+    response = client.post("/api/v1/attendance/clock-in", json={"employee_id": 1}, headers=headers)
+    assert response.status_code == 400
+    
+    records = client.get("/api/v1/attendance/records/1", headers=headers).json()
+    assert [(r["pending"], r["clock_out"]) for r in records] == [(True, None)]
+    
+    assert punch_buffer.flush(db) == 1
+    records = client.get("/api/v1/attendance/records/1", headers=headers).json()
+    assert [(r["pending"], r["id"]) for r in records] == [(False, 1)]
+    
+    response = client.post("/api/v1/attendance/clock-out", json={"employee_id": 1}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["clock_in"] == records[0]["clock_in"]
+    records = client.get("/api/v1/attendance/records/1", headers=headers).json()
+    assert [(r["pending"], r["id"], r["clock_out"] is not None) for r in records] == [(True, 1, True)]
+    
+    assert punch_buffer.flush(db) == 1
+    db.expire_all()
+    record = db.query(AttendanceRecord).one()
+    assert record.clock_out is not None
+    assert client.get("/api/v1/attendance/records/1", headers=headers).json()[0]["pending"] is False
+    db.close()
+    punch_buffer.clear_local()
+
+
+def test_write_behind_redis_tier_survives_an_outage(shared_event_loop, monkeypatch, tmp_path):
+    """Punches go through the Redis script and stream; during an outage the
+    local log takes over without forgetting who is clocked in, and back"""
+    import asyncio
+    from datetime import date
+    import fakeredis
+    from app.auth.jwt import create_access_token
+    from app.config import get_settings
+    from app.models import AttendanceRecord, Employee
+    from app.services import punch_buffer as buffer_module
+    from app.services.punch_buffer import PunchBuffer, PunchRejected, punch_buffer
+    from app.services.punches import CLOCK_OUT
+    
+    settings = get_settings()
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(settings, "ATTENDANCE_WRITE_BEHIND", True)
+    monkeypatch.setattr(settings, "PUNCH_BUFFER_REDIS_ENABLED", True)
+    monkeypatch.setattr(settings, "PUNCH_BUFFER_LOCAL_PATH", str(tmp_path / "punches.db"))
+    monkeypatch.setattr(buffer_module.aioredis, "Redis", lambda **kwargs: fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(buffer_module.redis, "Redis", lambda **kwargs: fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(punch_buffer, "_redis", None)
+    monkeypatch.setattr(punch_buffer, "_sync_redis", None)
+    r = fakeredis.FakeRedis(server=server)
+    
+    db = TestingSessionLocal()
+    db.add(Employee(
+        employee_number="EMP001", first_name="Redis", last_name="Buffer", email="redis@example.com",
+        hire_date=date(2024, 1, 1)
+    ))
+    db.flush()
+    db.add(User(email="redis@example.com", hashed_password="x", role=RoleType.EMPLOYEE,
+                employee_id=1, is_active=True))
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '1', 'role': 'EMPLOYEE'})}"}
+    
+    def punch(action):
+        return client.post(f"/api/v1/attendance/{action}", json={"employee_id": 1}, headers=headers).status_code
+    assert punch("clock-in") == 200
+    assert punch("clock-in") == 400
+    assert r.xlen(PunchBuffer.STREAM) == 1 and r.llen(f"{PunchBuffer.PENDING_PREFIX}1") == 1
+    assert punch_buffer.flush(db) == 1
+    assert r.xlen(PunchBuffer.STREAM) == 0 and r.llen(f"{PunchBuffer.PENDING_PREFIX}1") == 0
+    assert not r.exists(PunchBuffer.FLUSH_LOCK_KEY)
+    # A flush only ever releases its own lock
+    r.set(PunchBuffer.FLUSH_LOCK_KEY, "other-flusher")
+    assert punch_buffer.flush(db) == 0
+    punch_buffer._release_script(keys=[PunchBuffer.FLUSH_LOCK_KEY], args=["stale-token"])
+    assert r.get(PunchBuffer.FLUSH_LOCK_KEY) == b"other-flusher"
+    r.delete(PunchBuffer.FLUSH_LOCK_KEY)
+    
+    # Redis down: the mirrored state still rejects a second clock-in
+    server.connected = False
+    assert punch("clock-in") == 400
+    assert punch("clock-out") == 200
+    # Another worker process shares the local state
+    with pytest.raises(PunchRejected):
+        asyncio.run(PunchBuffer().append(None, 1, CLOCK_OUT))
+    
+    # Redis back: the clock-out taken locally is newer than Redis' state
+    server.connected = True
+    monkeypatch.setattr(punch_buffer, "_redis_down_until", 0.0)
+    assert punch("clock-out") == 400
+    assert punch("clock-in") == 200
+    assert r.xlen(PunchBuffer.STREAM) == 1
+    
+    assert punch_buffer.flush(db) == 2
+    records = client.get("/api/v1/attendance/records/1", headers=headers).json()
+    assert [r["pending"] for r in records] == [False]
+    db.expire_all()
+    assert db.query(AttendanceRecord).first().clock_out is not None
+    db.close()
+    punch_buffer.clear_local()
+
+
+def test_attendance_rollups_track_writes_and_feed_reports(hr_headers):
+    """Record writes keep the daily rollups exact; the reports read only rollups"""
+    from datetime import date
+    from sqlalchemy import select
+    from app.config import get_settings
+    from app.models import (
+        AttendanceDailyRollup, AttendanceRecord, AttendanceStatus, Department,
+        DepartmentDailyRollup, Employee
+    )
+    from app.services.attendance_rollups import reconcile
+    
+    db = TestingSessionLocal()
+    engineering = Department(name="Engineering")
+    db.add(engineering)
+    db.flush()
+    for i in range(3):
+        db.add(Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Rollup",
+            last_name=str(i),
+            email=f"rollup{i}@example.com",
+            hire_date=date(2024, 1, 1),
+            department_id=engineering.id if i < 2 else None
+        ))
+    db.flush()
+    monday = date(2025, 3, 3)
+    db.add_all([
+        AttendanceRecord(employee_id=1, date=monday, status=AttendanceStatus.LATE, hours_worked=7.5),
+        AttendanceRecord(employee_id=2, date=monday, status=AttendanceStatus.ABSENT),
+        AttendanceRecord(employee_id=3, date=monday, status=AttendanceStatus.HALF_DAY, hours_worked=4),
+        AttendanceRecord(employee_id=1, date=date(2025, 3, 4), status=AttendanceStatus.LATE, hours_worked=8),
+    ])
+    db.commit()
+    
+    # Adjustments: a status correction, a record moved to another day, a delete
+    records = {(r.employee_id, r.date): r for r in db.query(AttendanceRecord).all()}
+    records[(1, date(2025, 3, 4))].status = AttendanceStatus.PRESENT
+    records[(3, monday)].date = date(2025, 3, 5)
+    db.delete(records[(2, monday)])
+    db.commit()
+    
+    # Bulk kiosk punches maintain the rollups too
+    response = client.post("/api/v1/attendance/punches", json={"punches": [
+        {"employee_id": 2, "action": "clock_in", "timestamp": "2025-03-05T09:00:00"},
+        {"employee_id": 2, "action": "clock_out", "timestamp": "2025-03-05T17:00:00"},
+    ]}, headers={"X-API-Key": get_settings().KIOSK_API_KEY})
+    assert response.json()["accepted"] == 2
+    
+    def snapshot():
+        db.expire_all()
+        return (
+            sorted(db.execute(select(
+                AttendanceDailyRollup.employee_id, AttendanceDailyRollup.day,
+                AttendanceDailyRollup.department_id, AttendanceDailyRollup.present_count,
+                AttendanceDailyRollup.late_count, AttendanceDailyRollup.absent_count,
+                AttendanceDailyRollup.half_day_count, AttendanceDailyRollup.record_count,
+                AttendanceDailyRollup.hours_worked
+            )).all()),
+            sorted(
+                row for row in db.execute(select(
+                    DepartmentDailyRollup.day, DepartmentDailyRollup.department_id,
+                    DepartmentDailyRollup.present_count, DepartmentDailyRollup.late_count,
+                    DepartmentDailyRollup.absent_count, DepartmentDailyRollup.half_day_count,
+                    DepartmentDailyRollup.record_count, DepartmentDailyRollup.hours_worked
+                )).all()
+                if row[6]
+            )
+        )
+    
+    incremental = snapshot()
+    assert incremental[0] == [
+        (1, monday, engineering.id, 0, 1, 0, 0, 1, 7.5),
+        (1, date(2025, 3, 4), engineering.id, 1, 0, 0, 0, 1, 8.0),
+        (2, date(2025, 3, 5), engineering.id, 1, 0, 0, 0, 1, 8.0),
+        (3, date(2025, 3, 5), 0, 0, 0, 0, 1, 1, 4.0),
+    ]
+    reconcile(db.connection(), date(2025, 3, 1), date(2025, 3, 31))
+    db.commit()
+    assert snapshot() == incremental
+    db.close()
+    
+    period = {"period_start": "2025-03-03", "period_end": "2025-03-09"}
+    absenteeism = client.get("/api/v1/reports/absenteeism", params=period, headers=hr_headers).json()
+    assert absenteeism["total_workdays"] == 5
+    assert absenteeism["total_absences"] == 0
+    
+    hours = client.get("/api/v1/reports/attendance-hours", params=period, headers=hr_headers).json()
+    assert hours["total_hours"] == 27.5
+    assert hours["attendance_records"] == 4
+    assert hours["by_department"] == {"Engineering": 23.5, "Unassigned": 4.0}
+    
+    lateness = client.get("/api/v1/reports/lateness", params=period, headers=hr_headers).json()
+    assert lateness["late_arrivals"] == 1
+    assert lateness["half_days"] == 1
+    assert lateness["lateness_rate"] == 25.0
+    assert lateness["by_department"] == {"Engineering": 33.33, "Unassigned": 0}
+
+
+def test_shift_schedule_classifies_punches_and_reclassifies_month():
+    """Punches get the nearest shift and LATE/HALF_DAY; a month re-scores after edits"""
+    from datetime import date
+    from app.config import get_settings
+    from app.models import AttendanceRecord, AttendanceStatus, Employee, Shift
+    from app.services.shift_schedule import reclassify_month
+    
+    db = TestingSessionLocal()
+    db.add_all([
+        Shift(name="Morning", start_time="09:00", end_time="17:00"),
+        Shift(name="Night", start_time="22:00", end_time="06:00"),
+        Shift(name="Retired", start_time="13:00", end_time="21:00", is_active=False),
+    ])
+    for i in range(4):
+        db.add(Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Shift",
+            last_name=str(i),
+            email=f"shift{i}@example.com",
+            hire_date=date(2024, 1, 1)
+        ))
+    db.commit()
+    
+    response = client.post("/api/v1/attendance/punches", json={"punches": [
+        {"employee_id": 1, "action": "clock_in", "timestamp": "2025-03-03T09:05:00"},
+        {"employee_id": 1, "action": "clock_out", "timestamp": "2025-03-03T17:00:00"},
+        {"employee_id": 2, "action": "clock_in", "timestamp": "2025-03-03T09:30:00"},
+        {"employee_id": 2, "action": "clock_out", "timestamp": "2025-03-03T17:30:00"},
+        {"employee_id": 3, "action": "clock_in", "timestamp": "2025-03-03T08:55:00"},
+        {"employee_id": 3, "action": "clock_out", "timestamp": "2025-03-03T11:00:00"},
+        {"employee_id": 4, "action": "clock_in", "timestamp": "2025-03-03T21:50:00"},
+        {"employee_id": 4, "action": "clock_out", "timestamp": "2025-03-03T23:59:00"},
+    ]}, headers={"X-API-Key": get_settings().KIOSK_API_KEY})
+    assert response.json()["accepted"] == 8
+    
+    def classified():
+        db.expire_all()
+        return {
+            r.employee_id: (r.shift.name if r.shift else None, r.status)
+            for r in db.query(AttendanceRecord).all()
+        }
+    
+    assert classified() == {
+        1: ("Morning", AttendanceStatus.PRESENT),
+        2: ("Morning", AttendanceStatus.LATE),
+        3: ("Morning", AttendanceStatus.HALF_DAY),
+        4: ("Night", AttendanceStatus.HALF_DAY),
+    }
+    
+    # Moving the morning shift later turns the late arrival on time
+    db.query(Shift).filter(Shift.name == "Morning").one().start_time = "09:30"
+    db.commit()
+    assert reclassify_month(db, 2025, 3) == 1
+    db.commit()
+    assert classified()[2] == ("Morning", AttendanceStatus.PRESENT)
+    assert reclassify_month(db, 2025, 3) == 0
+    db.close()
+
+
+def test_attendance_reminders_skip_clocked_in_on_leave_and_not_yet_due(monkeypatch):
+    """One anti-join picks the employees to remind; shifts, leave, location
+    holidays and earlier reminders are honoured and emails are paced"""
+    from datetime import date, datetime
+    import fakeredis
+    from app.models import (
+        AttendanceRecord, Department, Employee, EmploymentStatus, Holiday, LeaveRequest,
+        LeaveRequestStatus, LeaveType, Shift
+    )
+    from app.services import attendance_reminders
+    from app.services.attendance_reminders import TokenBucket, send_reminders
+    
+    wednesday = date(2025, 3, 12)
+    db = TestingSessionLocal()
+    berlin = Department(name="Berlin Office", location="Berlin")
+    db.add_all([berlin, LeaveType(name="Annual"),
+                Shift(name="Early", start_time="06:00", end_time="14:00"),
+                Shift(name="Late", start_time="14:00", end_time="22:00"),
+                Holiday(holiday_date=wednesday, name="Berlin Day", location="Berlin")])
+    db.flush()
+    for i, (shift_id, department_id, employment_status) in enumerate([
+        (None, None, EmploymentStatus.ACTIVE),      # 1: due at the default start
+        (None, None, EmploymentStatus.ACTIVE),      # 2: clocked in
+        (None, None, EmploymentStatus.ACTIVE),      # 3: on approved leave
+        (None, None, EmploymentStatus.ACTIVE),      # 4: leave still pending
+        (2, None, EmploymentStatus.ACTIVE),         # 5: late shift
+        (None, None, EmploymentStatus.TERMINATED),  # 6
+        (None, berlin.id, EmploymentStatus.ACTIVE), # 7: local holiday
+        (1, None, EmploymentStatus.ACTIVE),         # 8: early shift
+    ], start=1):
+        db.add(Employee(employee_number=f"EMP{i:03d}", first_name=f"Person{i}", last_name="Reminder",
+                        email=f"person{i}@example.com", hire_date=date(2024, 1, 1), shift_id=shift_id,
+                        department_id=department_id, employment_status=employment_status))
+    db.add_all([
+        AttendanceRecord(employee_id=2, date=wednesday, clock_in=datetime(2025, 3, 12, 8, 55)),
+        LeaveRequest(employee_id=3, leave_type_id=1, start_date=date(2025, 3, 10),
+                     end_date=date(2025, 3, 14), total_days=5, status=LeaveRequestStatus.APPROVED),
+        LeaveRequest(employee_id=4, leave_type_id=1, start_date=wednesday, end_date=wednesday,
+                     total_days=1, status=LeaveRequestStatus.PENDING),
+    ])
+    db.commit()
+    
+    monkeypatch.setattr(attendance_reminders.settings, "ATTENDANCE_REMINDER_BATCH_SIZE", 2)
+    monkeypatch.setattr(attendance_reminders.settings, "ATTENDANCE_REMINDER_EMAILS_PER_SECOND", 1.0)
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(attendance_reminders.redis, "Redis", lambda **kwargs: fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(attendance_reminders, "_buckets", {})
+    queued = []
+    queue = lambda emails, countdown: queued.append((emails, countdown))
+    
+    summary = send_reminders(db, datetime(2025, 3, 12, 10, 0), queue=queue)
+    assert (summary["reminded"], summary["batches"]) == (3, 2)
+    assert [email for emails, _ in queued for email, _, _ in emails] == [
+        "person1@example.com", "person4@example.com", "person8@example.com"
+    ]
+    assert queued[0][1] == 0 and queued[1][1] >= 0
+    assert "2025-03-12" in queued[0][0][0][2]
+    
+    # Already reminded today; the late shift becomes due in the afternoon
+    assert send_reminders(db, datetime(2025, 3, 12, 10, 15), queue=queue)["reminded"] == 0
+    queued.clear()
+    assert send_reminders(db, datetime(2025, 3, 12, 14, 45), queue=queue)["reminded"] == 1
+    assert queued[0][0][0][0] == "person5@example.com"
+    # The bucket carried over from the morning run: this batch still waits
+    assert queued[0][1] > 0
+    assert send_reminders(db, datetime(2025, 3, 15, 12, 0), queue=queue)["reminded"] == 0  # Saturday
+    
+    # An overlapping run that selected the same employees queues nothing
+    stale = [(i, f"person{i}@example.com", f"Person{i}") for i in (1, 4, 5, 8)]
+    monkeypatch.setattr(attendance_reminders, "find_unclocked", lambda db, now: stale)
+    queued.clear()
+    assert send_reminders(db, datetime(2025, 3, 12, 14, 50), queue=queue)["reminded"] == 0
+    assert queued == []
+    db.close()
+    
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=5, clock=lambda: now[0])
+    assert [bucket.reserve(5), bucket.reserve(5), bucket.reserve(5)] == [0.0, 0.5, 1.0]
+    now[0] = 10.0
+    assert bucket.reserve(5) == 0.0
+    
+    # Shared buckets pace across runs and workers through Redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(attendance_reminders.redis, "Redis", lambda **kwargs: fakeredis.FakeRedis(server=server))
+    first, second = (
+        attendance_reminders.SharedTokenBucket("bucket", rate=10, capacity=5, clock=lambda: now[0])
+        for _ in range(2)
+    )
+    assert [first.reserve(5), second.reserve(5), first.reserve(5)] == [0.0, 0.5, 1.0]
+    now[0] = 20.0
+    assert second.reserve(5) == 0.0
+    server.connected = False
+    assert first.reserve(5) == 0.0  # falls back to a bucket of its own
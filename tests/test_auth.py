@@ -0,0 +1,164 @@
+"""Authentication and principal tests"""
+from app.models import User
+from app.auth.jwt import get_password_hash
+from tests.support import TestingSessionLocal, client
+
+
+def test_login_success(test_user):
+    """Test successful login"""
+    response = client.post(
+        "/api/v1/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert "access" in data
+    assert "refresh" in data
+    assert data["token_type"] == "bearer"
+
+
+def test_login_invalid_credentials():
+    """Test login with invalid credentials"""
+    response = client.post(
+        "/api/v1/auth/login",
+        json={"email": "wrong@example.com", "password": "wrongpassword"}
+    )
+    assert response.status_code == 401
+
+
+def test_unauthorized_access():
+    """Test accessing protected endpoint without token"""
+    response = client.get("/api/v1/employees")
+    assert response.status_code == 403  # No Authorization header
+
+
+def test_get_current_user(test_user):
+    """Test getting current user info"""
+    # Login first
+    login_response = client.post(
+        "/api/v1/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access"]
+    
+    # Get current user
+    response = client.get(
+        "/api/v1/auth/me",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["email"] == "test@example.com"
+    assert data["role"] == "EMPLOYEE"
+
+
+def test_invalid_token():
+    """Test with invalid token"""
+    response = client.get(
+        "/api/v1/employees",
+        headers={"Authorization": "Bearer invalid_token"}
+    )
+    assert response.status_code == 401
+
+
+def test_deactivated_user_loses_access_immediately(test_user):
+    """Cached principals are invalidated when the users row changes"""
+    login_response = client.post(
+        "/api/v1/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access']}"}
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+    
+    db = TestingSessionLocal()
+    user = db.get(User, test_user.id)
+    user.is_active = False
+    db.commit()
+    db.close()
+    
+    response = client.get("/api/v1/leave/types", headers=headers)
+    assert response.status_code == 403
+
+
+def test_login_rehashes_outdated_password_hash(test_user):
+    """Hashes made with a different bcrypt work factor are upgraded on login"""
+    db = TestingSessionLocal()
+    user = db.get(User, test_user.id)
+    user.hashed_password = get_password_hash("testpassword", rounds=4)
+    db.commit()
+    db.close()
+    
+    response = client.post(
+        "/api/v1/auth/login",
+        json={"email": "test@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 200
+    
+    db = TestingSessionLocal()
+    assert db.get(User, test_user.id).hashed_password.startswith("$2b$12$")
+    db.close()
+
+
+def test_login_rejected_when_hash_pool_saturated(test_user):
+    """A saturated password hash pool answers 503 instead of queueing"""
+    from app.auth.password_pool import password_pool
+    
+    max_pending = password_pool.max_pending
+    password_pool.max_pending = 0
+    try:
+        response = client.post(
+            "/api/v1/auth/login",
+            json={"email": "test@example.com", "password": "testpassword"}
+        )
+    finally:
+        password_pool.max_pending = max_pending
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_principal_loaded_before_an_invalidation_is_not_cached(monkeypatch):
+    """A cache miss racing with a deactivation must not re-cache the old row"""
+    import asyncio
+    import fakeredis
+    from app.auth import principal_cache as cache_module
+    from app.auth.principal_cache import Principal, PrincipalCache
+    from app.models import RoleType
+    
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cache_module.settings, "PRINCIPAL_CACHE_REDIS_ENABLED", True)
+    monkeypatch.setattr(cache_module.aioredis, "Redis", lambda **kwargs: fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache_module.redis, "Redis", lambda **kwargs: fakeredis.FakeRedis(server=server))
+    r = fakeredis.FakeRedis(server=server)
+    principal = Principal(id=7, role=RoleType.EMPLOYEE, employee_id=None, is_active=True)
+    
+    async def scenario():
+        worker, other_worker = PrincipalCache(), PrincipalCache()
+        
+        # Invalidated in this worker while the row was being loaded
+        generation = await worker.generation(7)
+        worker.invalidate(7)
+        await asyncio.gather(*worker._background_tasks)
+        await worker.set(principal, generation)
+        assert worker._local_get(7) is None
+        assert r.get(f"{PrincipalCache.KEY_PREFIX}7") is None
+        
+        # Invalidated by another worker: neither tier keeps the stale row
+        generation = await worker.generation(7)
+        other_worker.invalidate(7)
+        await asyncio.gather(*other_worker._background_tasks)
+        await worker.set(principal, generation)
+        assert worker._local_get(7) is None
+        assert r.get(f"{PrincipalCache.KEY_PREFIX}7") is None
+        
+        # Without an invalidation the principal is cached in both tiers
+        await worker.set(principal, await worker.generation(7))
+        assert worker._local_get(7) == principal
+        assert r.get(f"{PrincipalCache.KEY_PREFIX}7") is not None
+    
+    asyncio.run(scenario())
+    
+    # Redis is cleared even while the cache is backing off after a failure
+    worker = PrincipalCache()
+    worker._redis_down_until = float("inf")
+    worker.invalidate(7)
+    assert r.get(f"{PrincipalCache.KEY_PREFIX}7") is None
@@ -0,0 +1,253 @@
+"""Employee document storage and download tests"""
+import pytest
+from tests.support import TestingSessionLocal, client
+
+
+def test_document_download_honours_validators_ranges_and_x_accel(hr_headers, monkeypatch, tmp_path):
+    """Downloads carry a strong ETag from the stored hash, answer conditional
+    requests with 304, serve byte ranges and can hand off to nginx"""
+    import asyncio
+    import hashlib
+    import os
+    from datetime import date
+    from app.api.files import FileSendResponse
+    from app.config import get_settings
+    from app.models import Employee
+    
+    monkeypatch.setattr(get_settings(), "UPLOAD_DIR", str(tmp_path))
+    db = TestingSessionLocal()
+    employee = Employee(
+        employee_number="DOC001", first_name="Doc", last_name="Owner", email="doc@example.com",
+        hire_date=date(2024, 1, 1)
+    )
+    db.add(employee)
+    db.commit()
+    employee_id = employee.id
+    db.close()
+    
+    content = os.urandom(300000)
+    response = client.post(
+        f"/api/v1/employees/{employee_id}/documents",
+        files={"document": ("scan.pdf", content, "application/pdf")},
+        data={"document_type": "ID"},
+        headers=hr_headers
+    )
+    assert response.status_code == 200
+    url = f"/api/v1/employees/{employee_id}/documents/{response.json()['id']}"
+    
+    response = client.get(url, headers=hr_headers)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["accept-ranges"] == "bytes"
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+    assert etag == f'"{hashlib.sha256(content).hexdigest()}"'
+    
+    response = client.get(url, headers={**hr_headers, "If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304 and response.content == b""
+    response = client.get(url, headers={**hr_headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    
+    response = client.get(url, headers={**hr_headers, "Range": "bytes=1000-1999", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 1000-1999/{len(content)}"
+    assert response.content == content[1000:2000]
+    response = client.get(url, headers={**hr_headers, "Range": "bytes=1000-1999", "If-Range": '"stale"'})
+    assert response.status_code == 200 and len(response.content) == len(content)
+    response = client.get(url, headers={**hr_headers, "Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+    
+    monkeypatch.setattr(get_settings(), "FILE_SERVING_MODE", "x-accel")
+    response = client.get(url, headers=hr_headers)
+    assert response.status_code == 200 and response.content == b""
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert response.headers["x-accel-redirect"] == f"/protected-files/blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+    assert response.headers["etag"] == etag
+    
+    # Servers offering the zero-copy extension are handed the file instead of chunks
+    sent = []
+    
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            message = {**message, "file": os.pread(message["file"].fileno(), message["count"], message["offset"])}
+        sent.append(message)
+    
+    path = next(tmp_path.rglob(sha256))
+    fd = os.open(path, os.O_RDONLY)
+    scope = {"type": "http", "method": "GET", "extensions": {"http.response.zerocopysend": {}}}
+    asyncio.run(FileSendResponse(fd, 10, 20, 206, {}, "application/pdf")(scope, None, send))
+    assert sent[1]["file"] == content[10:20]
+    
+    os.remove(path)
+    monkeypatch.setattr(get_settings(), "FILE_SERVING_MODE", "direct")
+    assert client.get(url, headers=hr_headers).status_code == 404
+
+
+def test_document_upload_streams_and_rejects_early(hr_headers, monkeypatch, tmp_path):
+    """Uploads are streamed to a temp file, hashed on the way and linked into
+    the store; oversized, disallowed or incomplete uploads leave nothing behind"""
+    import asyncio
+    import hashlib
+    import os
+    from datetime import date
+    from fastapi import HTTPException
+    from starlette.requests import Request
+    from app.api.uploads import receive_upload
+    from app.config import get_settings
+    from app.models import Employee, EmployeeDocument
+    
+    monkeypatch.setattr(get_settings(), "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(get_settings(), "MAX_UPLOAD_SIZE", 3 * 1024 * 1024)
+    db = TestingSessionLocal()
+    employee = Employee(
+        employee_number="UPL001", first_name="Up", last_name="Loader", email="upload@example.com",
+        hire_date=date(2024, 1, 1)
+    )
+    db.add(employee)
+    db.commit()
+    employee_id = employee.id
+    url = f"/api/v1/employees/{employee_id}/documents"
+    directory = tmp_path / "blobs" / "tmp"
+    
+    content = os.urandom(2 * 1024 * 1024 + 123)
+    response = client.post(
+        url, files={"document": ("C:\\scans\\contract.pdf", content, "application/pdf")},
+        data={"document_type": "CONTRACT", "description": "Signed"}, headers=hr_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["file_name"] == "contract.pdf"
+    assert response.json()["file_size"] == len(content)
+    document = db.get(EmployeeDocument, response.json()["id"])
+    assert document.content_sha256 == hashlib.sha256(content).hexdigest()
+    assert document.description == "Signed"
+    assert open(document.file_path, "rb").read() == content
+    assert os.path.basename(document.file_path) == document.content_sha256
+    assert list(directory.iterdir()) == []
+    
+    response = client.post(
+        url, files={"document": ("big.pdf", os.urandom(3 * 1024 * 1024 + 1), "application/pdf")},
+        data={"document_type": "ID"}, headers=hr_headers
+    )
+    assert response.status_code == 400 and "too large" in response.json()["detail"]
+    response = client.post(
+        url, files={"document": ("tool.exe", b"MZ", "application/octet-stream")},
+        data={"document_type": "ID"}, headers=hr_headers
+    )
+    assert response.status_code == 400 and "not allowed" in response.json()["detail"]
+    response = client.post(url, files={"document": ("id.png", b"png", "image/png")}, headers=hr_headers)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "document_type"]
+    assert list(directory.iterdir()) == []
+    assert len([p for p in (tmp_path / "blobs").rglob("*") if p.is_file()]) == 1
+    
+    # Without a Content-Length the body is read only until the limit is passed
+    chunk = b"x" * 65536
+    head = (b'--b\r\nContent-Disposition: form-data; name="document"; filename="a.pdf"\r\n'
+            b"Content-Type: application/pdf\r\n\r\n")
+    received = []
+    
+    async def receive():
+        received.append(1)
+        return {"type": "http.request", "body": head if len(received) == 1 else chunk, "more_body": True}
+    
+    scope = {"type": "http", "method": "POST", "headers": [(b"content-type", b"multipart/form-data; boundary=b")]}
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(receive_upload(
+            Request(scope, receive), "document", str(directory), 1024 * 1024, lambda name: None
+        ))
+    assert error.value.status_code == 400
+    assert len(received) == 1 + 1024 * 1024 // len(chunk) + 1
+    assert list(directory.iterdir()) == []
+    db.close()
+
+
+def test_document_store_dedupes_and_collects(hr_headers, monkeypatch, tmp_path):
+    """Identical documents share one blob; unreferenced blobs are collected,
+    and files stored before the blob store are moved into it once"""
+    import hashlib
+    import os
+    from datetime import date, timedelta
+    from app.config import get_settings
+    from app.models import DocumentBlob, Employee, EmployeeDocument
+    from app.services import document_blobs
+    
+    monkeypatch.setattr(get_settings(), "UPLOAD_DIR", str(tmp_path))
+    db = TestingSessionLocal()
+    employees = [
+        Employee(
+            employee_number=f"BLB00{i}", first_name="Blob", last_name=str(i), email=f"blob{i}@example.com",
+            hire_date=date(2024, 1, 1)
+        )
+        for i in range(2)
+    ]
+    db.add_all(employees)
+    db.commit()
+    
+    content = os.urandom(300 * 1024)
+    sha256 = hashlib.sha256(content).hexdigest()
+    documents = []
+    for employee in employees:
+        response = client.post(
+            f"/api/v1/employees/{employee.id}/documents",
+            files={"document": ("offer.pdf", content, "application/pdf")},
+            data={"document_type": "OFFER"}, headers=hr_headers
+        )
+        assert response.status_code == 200
+        documents.append(response.json()["id"])
+    paths = {db.get(EmployeeDocument, doc_id).file_path for doc_id in documents}
+    assert paths == {document_blobs.blob_path(sha256)}
+    assert os.stat(document_blobs.blob_path(sha256)).st_nlink == 1
+    blob = db.query(DocumentBlob).filter_by(sha256=sha256).one()
+    assert (blob.ref_count, blob.size, blob.unreferenced_at) == (2, len(content), None)
+    
+    response = client.get(f"/api/v1/employees/{employees[1].id}/documents/{documents[1]}", headers=hr_headers)
+    assert response.content == content
+    for employee, doc_id in zip(employees, documents):
+        response = client.delete(f"/api/v1/employees/{employee.id}/documents/{doc_id}", headers=hr_headers)
+        assert response.status_code == 204
+        db.refresh(blob)
+    assert blob.ref_count == 0 and blob.unreferenced_at is not None
+    
+    # Within the grace period nothing goes; after it, the blob and stray temp files do
+    os.makedirs(document_blobs.temp_dir(), exist_ok=True)
+    stray = os.path.join(document_blobs.temp_dir(), ".upload-stray.part")
+    open(stray, "wb").close()
+    assert document_blobs.collect(db)["collected"] == 0
+    assert os.path.exists(document_blobs.blob_path(sha256))
+    summary = document_blobs.collect(db, grace=timedelta(0))
+    assert (summary["collected"], summary["bytes_freed"], summary["stray_files"]) == (1, len(content), 1)
+    assert not os.path.exists(document_blobs.blob_path(sha256)) and not os.path.exists(stray)
+    assert db.query(DocumentBlob).filter_by(sha256=sha256).count() == 0
+    
+    # A blob collected between link() and the document commit is put back by settle()
+    received = tmp_path / "received.part"
+    received.write_bytes(content)
+    assert document_blobs.link(str(received), sha256) is True
+    os.remove(document_blobs.blob_path(sha256))
+    document_blobs.settle(str(received), sha256)
+    assert open(document_blobs.blob_path(sha256), "rb").read() == content and not received.exists()
+    os.remove(document_blobs.blob_path(sha256))
+    
+    # One-off pass over documents stored the old way
+    legacy = tmp_path / "employees" / str(employees[0].id)
+    legacy.mkdir(parents=True)
+    scans = {"a_id.png": content, "b_id.png": content, "c_cv.pdf": b"curriculum vitae"}
+    for name, data in scans.items():
+        (legacy / name).write_bytes(data)
+        db.add(EmployeeDocument(
+            employee_id=employees[0].id, document_type="ID", file_name=name,
+            file_path=str(legacy / name), file_size=len(data)
+        ))
+    db.commit()
+    summary = document_blobs.deduplicate(db, batch_size=2)
+    assert summary["documents"] >= 3 and summary["missing"] == 0
+    assert summary["duplicates"] >= 1 and summary["bytes_freed"] >= len(content)
+    assert list(legacy.iterdir()) == []
+    moved = db.query(EmployeeDocument).filter(EmployeeDocument.file_name.in_(scans)).all()
+    for document in moved:
+        assert document.file_path == document_blobs.blob_path(document.content_sha256)
+        assert open(document.file_path, "rb").read() == scans[document.file_name]
+    blob = db.query(DocumentBlob).filter_by(sha256=sha256).one()
+    assert blob.ref_count == 2 and blob.unreferenced_at is None
+    assert document_blobs.deduplicate(db)["documents"] == 0
+    db.close()
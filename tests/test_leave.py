@@ -0,0 +1,415 @@
+"""Leave, business calendar and calendar sync tests"""
+from app.models import User, RoleType
+from tests.support import TestingSessionLocal, client
+
+
+def test_business_calendar_drives_leave_absenteeism_and_proration(hr_headers):
+    """Weekends and location holidays are excluded from leave days, possible
+    workdays and payroll proration"""
+    from datetime import date, timedelta
+    from decimal import Decimal
+    from app.auth.jwt import create_access_token
+    from app.models import (
+        AttendanceRecord, AttendanceStatus, Department, Employee, LeaveType, PayrollRun, Payslip
+    )
+    from app.services.business_calendar import BusinessCalendar
+    from app.services.payroll import run_payroll
+    
+    db = TestingSessionLocal()
+    berlin = Department(name="Berlin Office", location="Berlin")
+    austin = Department(name="Austin Office", location="Austin")
+    db.add_all([berlin, austin, LeaveType(name="Annual")])
+    db.flush()
+    for i, (department, hire_date, salary) in enumerate([
+        (berlin, date(2024, 1, 1), Decimal("1000.00")),
+        (austin, date(2025, 3, 17), Decimal("2200.00")),
+        (austin, date(2025, 4, 1), Decimal("500.00")),
+    ]):
+        db.add(Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Calendar",
+            last_name=str(i),
+            email=f"calendar{i}@example.com",
+            hire_date=hire_date,
+            department_id=department.id,
+            salary=salary
+        ))
+    db.add(User(email="berliner@example.com", hashed_password="x", role=RoleType.EMPLOYEE,
+                employee_id=1, is_active=True))
+    db.commit()
+    
+    for holiday in (
+        {"holiday_date": "2025-03-10", "name": "Founders Day"},
+        {"holiday_date": "2025-03-12", "name": "Berlin Day", "location": "Berlin"},
+    ):
+        assert client.post("/api/v1/leave/holidays", json=holiday, headers=hr_headers).status_code == 201
+    response = client.post("/api/v1/leave/holidays", json={"holiday_date": "2025-03-10", "name": "Again"},
+                           headers=hr_headers)
+    assert response.status_code == 400
+    response = client.get("/api/v1/leave/holidays?year=2025&location=Austin", headers=hr_headers)
+    assert [h["name"] for h in response.json()] == ["Founders Day"]
+    
+    # Fri 7th to Fri 14th: the weekend and both holidays do not count
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '2', 'role': 'EMPLOYEE'})}"}
+    response = client.post("/api/v1/leave/requests", json={
+        "leave_type_id": 1, "start_date": "2025-03-07", "end_date": "2025-03-14"
+    }, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["total_days"] == 4
+    response = client.post("/api/v1/leave/requests", json={
+        "leave_type_id": 1, "start_date": "2025-03-08", "end_date": "2025-03-09"
+    }, headers=headers)
+    assert response.status_code == 400
+    
+    # 20 workdays in March; 19 in Berlin
+    db.add(AttendanceRecord(employee_id=1, date=date(2025, 3, 3), status=AttendanceStatus.ABSENT))
+    db.commit()
+    period = {"period_start": "2025-03-01", "period_end": "2025-03-31"}
+    report = client.get("/api/v1/reports/absenteeism", params=period, headers=hr_headers).json()
+    assert report["total_workdays"] == 20
+    assert report["absenteeism_rate"] == round(1 / (19 + 20 + 20) * 100, 2)
+    
+    # Hired on the 17th: 11 of Austin's 20 March workdays; April hires get nothing
+    payroll_run = PayrollRun(period_start=date(2025, 3, 1), period_end=date(2025, 3, 31))
+    db.add(payroll_run)
+    db.commit()
+    run_payroll(db, payroll_run.id)
+    basics = dict(db.query(Payslip.employee_id, Payslip.basic_salary).all())
+    assert basics == {1: Decimal("1000.00"), 2: Decimal("1210.00")}
+    db.close()
+    
+    calendar = BusinessCalendar([(date(2024, 12, 25), None), (date(2025, 1, 1), "Berlin")])
+    for start, end in [(date(2024, 12, 20), date(2025, 1, 3)), (date(2023, 6, 1), date(2026, 2, 1))]:
+        for location in (None, "Berlin"):
+            days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+            expected = sum(calendar.is_workday(day, location) for day in days)
+            assert calendar.workdays_between(start, end, location) == expected
+
+
+def test_leave_ledger_survives_concurrent_approvals(hr_headers):
+    """Racing approvers debit each request exactly once and the balance always
+    matches the ledger"""
+    import random
+    import threading
+    from datetime import date, timedelta
+    from app.models import (
+        CalendarSyncEvent, Employee, LeaveBalance, LeaveLedgerEntry, LeaveLedgerEntryType,
+        LeaveRequest, LeaveType
+    )
+    from app.services import leave_ledger
+    
+    db = TestingSessionLocal()
+    db.add(LeaveType(name="Annual"))
+    db.add(Employee(employee_number="EMP001", first_name="Ledger", last_name="Test",
+                    email="ledger@example.com", hire_date=date(2020, 1, 1)))
+    db.flush()
+    leave_ledger.post_entry(db, 1, 1, 2025, LeaveLedgerEntryType.ACCRUAL, 400, "accrual:1:1:2025")
+    assert not leave_ledger.post_entry(db, 1, 1, 2025, LeaveLedgerEntryType.ACCRUAL, 400, "accrual:1:1:2025")
+    db.add_all([
+        LeaveRequest(employee_id=1, leave_type_id=1, start_date=date(2025, 1, 6) + timedelta(days=i),
+                     end_date=date(2025, 1, 6) + timedelta(days=i), total_days=1 + i % 3)
+        for i in range(50)
+    ])
+    db.commit()
+    request_ids = [r.id for r in db.query(LeaveRequest.id).all()]
+    expected_used = sum(1 + i % 3 for i in range(50))
+    
+    winners = []
+    
+    def approver(seed):
+        session = TestingSessionLocal()
+        ids = list(request_ids)
+        random.Random(seed).shuffle(ids)
+        for request_id in ids:
+            if leave_ledger.decide_request(session, request_id, True, 1) is not None:
+                winners.append(request_id)
+            session.commit()
+        session.close()
+    
+    threads = [threading.Thread(target=approver, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(winners) == sorted(request_ids)
+    debits = db.query(LeaveLedgerEntry).filter_by(entry_type=LeaveLedgerEntryType.DEBIT).count()
+    assert debits == 50
+    balance = db.query(LeaveBalance).one()
+    assert (balance.total_days, balance.used_days, balance.available_days) == (
+        400, expected_used, 400 - expected_used
+    )
+    assert leave_ledger.ledger_totals(db, 1, 1, 2025) == {
+        "total_days": 400, "used_days": expected_used, "available_days": 400 - expected_used
+    }
+    
+    # Through the endpoint: one decision per request
+    db.add(LeaveRequest(employee_id=1, leave_type_id=1, start_date=date(2025, 12, 31),
+                        end_date=date(2025, 12, 31), total_days=1))
+    db.commit()
+    url = "/api/v1/leave/requests/51/action"
+    response = client.put(url, json={"action": "Approve"}, headers=hr_headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "APPROVED"
+    assert client.put(url, json={"action": "Reject"}, headers=hr_headers).status_code == 400
+    assert db.query(CalendarSyncEvent).count() == 1
+    db.expire_all()
+    assert db.query(LeaveBalance).one().used_days == expected_used + 1
+    db.close()
+
+
+def test_bulk_leave_action_decides_in_one_transaction():
+    """A manager approves hundreds of requests in one call; out-of-scope,
+    missing and already decided ids are reported per id and left alone"""
+    import time
+    from datetime import date, timedelta
+    from sqlalchemy import insert
+    from app.auth.jwt import create_access_token
+    from app.models import (
+        CalendarSyncEvent, Employee, LeaveBalance, LeaveLedgerEntry, LeaveRequest, LeaveRequestStatus,
+        LeaveType
+    )
+    
+    db = TestingSessionLocal()
+    db.add(LeaveType(name="Annual"))
+    # 1 manages 2 and 3; 4 reports to nobody
+    for i in range(1, 5):
+        db.add(Employee(employee_number=f"EMP{i:03d}", first_name="Bulk", last_name=str(i),
+                        email=f"bulk{i}@example.com", hire_date=date(2024, 1, 1),
+                        manager_id=1 if i in (2, 3) else None))
+    db.add(User(email="lead@example.com", hashed_password="x", role=RoleType.MANAGER,
+                employee_id=1, is_active=True))
+    db.flush()
+    day = date(2025, 6, 2)
+    db.execute(insert(LeaveRequest), [
+        {"employee_id": 2 + i % 2, "leave_type_id": 1, "start_date": day + timedelta(days=i % 150),
+         "end_date": day + timedelta(days=i % 150), "total_days": 1, "status": LeaveRequestStatus.PENDING}
+        for i in range(500)
+    ] + [
+        {"employee_id": 4, "leave_type_id": 1, "start_date": day, "end_date": day, "total_days": 1,
+         "status": LeaveRequestStatus.PENDING},
+        {"employee_id": 2, "leave_type_id": 1, "start_date": day, "end_date": day, "total_days": 1,
+         "status": LeaveRequestStatus.REJECTED},
+    ])
+    db.commit()
+    
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '1', 'role': 'MANAGER'})}"}
+    ids = list(range(1, 503)) + [9999, 1]
+    started = time.perf_counter()
+    response = client.post("/api/v1/leave/requests/bulk-action",
+                           json={"request_ids": ids, "action": "Approve", "comment": "Enjoy"},
+                           headers=headers)
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["actioned"], body["failed"]) == (500, 3)
+    assert [r["id"] for r in body["results"]] == list(range(1, 503)) + [9999]
+    outcomes = {r["id"]: r["status"] for r in body["results"]}
+    assert {outcomes[i] for i in range(1, 501)} == {"approved"}
+    assert (outcomes[501], outcomes[502], outcomes[9999]) == ("forbidden", "not_pending", "not_found")
+    assert elapsed < 5  # sub-second on a developer machine; generous for CI
+    
+    assert db.query(CalendarSyncEvent).count() == 500
+    assert db.query(LeaveLedgerEntry).count() == 500
+    assert sorted((b.employee_id, b.used_days) for b in db.query(LeaveBalance).all()) == [(2, 250), (3, 250)]
+    assert db.query(LeaveRequest).filter_by(status=LeaveRequestStatus.PENDING).count() == 1
+    
+    # Nothing left to decide: a replay changes nothing
+    response = client.post("/api/v1/leave/requests/bulk-action",
+                           json={"request_ids": [1, 2], "action": "Reject"}, headers=headers)
+    assert response.json()["actioned"] == 0
+    assert db.query(CalendarSyncEvent).count() == 500
+    db.expire_all()
+    assert db.query(LeaveBalance).filter_by(employee_id=2).one().used_days == 250
+    db.close()
+
+
+def test_calendar_sync_outbox_delivers_over_pooled_connections(monkeypatch):
+    """Queued decisions are coalesced per request, sent concurrently over a few
+    keep-alive connections, retried with backoff and finally dead-lettered"""
+    import json
+    import threading
+    import time
+    from datetime import date, datetime, timedelta
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from sqlalchemy import insert
+    from app.models import CalendarSyncDeadLetter, CalendarSyncEvent, Employee, LeaveRequest, LeaveType
+    from app.services import calendar_sync
+    
+    received = []
+    connections = set()
+    failing = {}  # leave_request_id -> HTTP status
+    replace_during = {}  # leave_request_id -> status enqueued while the request is in flight
+    
+    class StubCalendar(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True
+        
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            connections.add(self.client_address)
+            code = failing.get(body["leave_request_id"], 200)
+            if body["leave_request_id"] in replace_during:
+                # The flush holds no locks while sending, so this does not block
+                other = TestingSessionLocal()
+                calendar_sync.enqueue(other, [decision(body["leave_request_id"],
+                                                       replace_during.pop(body["leave_request_id"]))])
+                other.commit()
+                other.close()
+            if self.path == "/api/sync" and code == 200:
+                received.append(body)
+            self.send_response(code)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCalendar)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(calendar_sync.settings, "CALENDAR_SERVICE_URL",
+                        f"http://127.0.0.1:{server.server_port}/api")
+    monkeypatch.setattr(calendar_sync.settings, "CALENDAR_SYNC_BATCH_SIZE", 200)
+    monkeypatch.setattr(calendar_sync.settings, "CALENDAR_SYNC_MAX_ATTEMPTS", 2)
+    calendar_sync.close_client()
+    
+    db = TestingSessionLocal()
+    try:
+        db.add(LeaveType(name="Annual"))
+        db.add(Employee(employee_number="EMP001", first_name="Sync", last_name="Test",
+                        email="sync@example.com", hire_date=date(2024, 1, 1)))
+        db.flush()
+        day = date(2025, 7, 1)
+        db.execute(insert(LeaveRequest), [
+            {"employee_id": 1, "leave_type_id": 1, "start_date": day, "end_date": day, "total_days": 1}
+            for _ in range(1000)
+        ])
+        decision = lambda request_id, status: {
+            "employee_id": 1, "leave_request_id": request_id, "status": status,
+            "start_date": day, "end_date": day
+        }
+        calendar_sync.enqueue(db, [decision(i, "approved") for i in range(1, 1001)])
+        # A later decision replaces the one still waiting
+        calendar_sync.enqueue(db, [decision(i, "cancelled") for i in range(1, 11)])
+        db.commit()
+        assert db.query(CalendarSyncEvent).count() == 1000
+        
+        started = time.perf_counter()
+        summary = calendar_sync.flush(db)
+        elapsed = time.perf_counter() - started
+        assert summary == {"sent": 1000, "retried": 0, "dead": 0}
+        assert sorted(e["leave_request_id"] for e in received) == list(range(1, 1001))
+        assert {e["status"] for e in received if e["leave_request_id"] <= 10} == {"cancelled"}
+        assert len(connections) <= calendar_sync.settings.CALENDAR_SYNC_CONCURRENCY
+        assert 1000 / elapsed > 200  # events per second; ~600 against this stub server
+        assert db.query(CalendarSyncEvent).count() == 0
+        
+        # 503 is retried later, 400 is dead-lettered at once
+        failing.update({1: 503, 2: 400})
+        calendar_sync.enqueue(db, [decision(i, "approved") for i in (1, 2, 3)])
+        db.commit()
+        assert calendar_sync.flush(db) == {"sent": 1, "retried": 1, "dead": 1}
+        retry = db.query(CalendarSyncEvent).one()
+        assert (retry.leave_request_id, retry.attempts) == (1, 1)
+        assert retry.last_error.startswith("HTTP 503")
+        retry.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        assert calendar_sync.flush(db) == {"sent": 0, "retried": 0, "dead": 1}
+        letters = {d.leave_request_id: d for d in db.query(CalendarSyncDeadLetter).all()}
+        assert (letters[1].attempts, letters[2].attempts) == (2, 1)
+        assert letters[1].payload["date_range"] == {"start": "2025-07-01", "end": "2025-07-01"}
+        assert db.query(CalendarSyncEvent).count() == 0
+        
+        # A decision replaced mid-send is not recorded; the newer one follows
+        failing.clear()
+        received.clear()
+        replace_during[4] = "cancelled"
+        calendar_sync.enqueue(db, [decision(4, "approved")])
+        db.commit()
+        assert calendar_sync.flush(db) == {"sent": 0, "retried": 0, "dead": 0}
+        assert db.query(CalendarSyncEvent).one().status == "cancelled"
+        assert calendar_sync.flush(db) == {"sent": 1, "retried": 0, "dead": 0}
+        assert [e["status"] for e in received] == ["approved", "cancelled"]
+        assert db.query(CalendarSyncEvent).count() == 0
+    finally:
+        db.close()
+        calendar_sync.close_client()
+        server.shutdown()
+        server.server_close()
+    
+    for attempts in range(1, 15):
+        ceiling = min(calendar_sync.settings.CALENDAR_SYNC_BACKOFF_MAX_SECONDS,
+                      calendar_sync.settings.CALENDAR_SYNC_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        assert 0 <= calendar_sync.backoff_seconds(attempts) <= ceiling
+
+
+def test_monthly_leave_accrual_is_prorated_idempotent_and_resumable(monkeypatch):
+    """Accrual credits each (employee, leave type) once per month, prorates
+    mid-month hires and picks up after a crashed chunk"""
+    from datetime import date
+    from app.models import (
+        Employee, EmploymentStatus, LeaveAccrualRun, LeaveBalance, LeaveLedgerEntry, LeaveType
+    )
+    from app.services import leave_accrual
+    from app.services.leave_ledger import ledger_totals
+    
+    db = TestingSessionLocal()
+    db.add_all([
+        LeaveType(name="Annual", max_days_per_year=24),
+        LeaveType(name="Sick", max_days_per_year=12),
+        LeaveType(name="Unpaid", max_days_per_year=0),
+        LeaveType(name="Retired", max_days_per_year=30, is_active=False),
+    ])
+    for i, (hire_date, employment_status) in enumerate([
+        (date(2020, 1, 1), EmploymentStatus.ACTIVE),
+        (date(2025, 4, 21), EmploymentStatus.ACTIVE),  # 10 of April's 30 days
+        (date(2025, 5, 1), EmploymentStatus.ACTIVE),
+        (date(2020, 1, 1), EmploymentStatus.TERMINATED),
+        (date(2020, 1, 1), EmploymentStatus.ON_LEAVE),
+    ], start=1):
+        db.add(Employee(employee_number=f"EMP{i:03d}", first_name="Accrual", last_name=str(i),
+                        email=f"accrual{i}@example.com", hire_date=hire_date,
+                        employment_status=employment_status))
+    db.commit()
+    
+    # The second chunk dies mid-flight; nothing of it may stick
+    accrue_chunk = leave_accrual._accrue_chunk
+    
+    def crash_on_employee_two(session, year, month, low, high):
+        posted = accrue_chunk(session, year, month, low, high)
+        if high == 2:
+            raise RuntimeError("worker lost")
+        return posted
+    
+    monkeypatch.setattr(leave_accrual, "_accrue_chunk", crash_on_employee_two)
+    try:
+        leave_accrual.accrue_month(db, 2025, 4, chunk_size=1)
+    except RuntimeError:
+        db.rollback()
+    run = db.query(LeaveAccrualRun).one()
+    assert (run.status, run.last_employee_id, run.entries_posted) == ("running", 1, 2)
+    
+    monkeypatch.setattr(leave_accrual, "_accrue_chunk", accrue_chunk)
+    stats = leave_accrual.accrue_month(db, 2025, 4, chunk_size=2)
+    assert stats.entries == 4
+    assert leave_accrual.accrue_month(db, 2025, 4).entries == 0
+    db.expire_all()
+    assert db.query(LeaveAccrualRun).one().status == "completed"
+    
+    balances = {(b.employee_id, b.leave_type_id): b.total_days for b in db.query(LeaveBalance).all()}
+    assert balances == {
+        (1, 1): 2.0, (1, 2): 1.0,
+        (2, 1): round(2 * 10 / 30, 2), (2, 2): round(10 / 30, 2),
+        (5, 1): 2.0, (5, 2): 1.0,
+    }
+    
+    # A second month adds to the same balances and matches the ledger
+    assert leave_accrual.accrue_month(db, 2025, 5).entries == 8
+    db.expire_all()
+    balance = db.query(LeaveBalance).filter_by(employee_id=2, leave_type_id=1).one()
+    assert balance.total_days == balance.available_days == round(2 * 10 / 30, 2) + 2
+    assert ledger_totals(db, 2, 1, 2025)["total_days"] == balance.total_days
+    assert db.query(LeaveLedgerEntry).count() == 14
+    assert leave_accrual.previous_month(date(2026, 1, 15)) == (2025, 12)
+    db.close()
@@ -0,0 +1,60 @@
+"""Manager scope tests"""
+from app.models import User, RoleType
+from tests.support import TestingSessionLocal, client
+
+
+def test_manager_scope_follows_org_tree(monkeypatch):
+    """Managers act on their subtree up to MANAGER_SCOPE_DEPTH; reassignment
+    is picked up as soon as it commits"""
+    from datetime import date
+    from app.auth.jwt import create_access_token
+    from app.models import Employee
+    from app.services import org_tree
+    from app.services.org_tree import OrgTree
+    
+    db = TestingSessionLocal()
+    # 1 -> 2 -> 3 -> 4, plus 5 reporting to nobody
+    employees = []
+    for i in range(1, 6):
+        employee = Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Org",
+            last_name=str(i),
+            email=f"org{i}@example.com",
+            hire_date=date(2024, 1, 1),
+            manager_id=i - 1 if 1 < i < 5 else None
+        )
+        db.add(employee)
+        db.flush()
+        employees.append(employee)
+    db.add(User(email="boss@example.com", hashed_password="x", role=RoleType.MANAGER,
+                employee_id=1, is_active=True))
+    db.commit()
+    
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '1', 'role': 'MANAGER'})}"}
+    
+    def visible():
+        response = client.get("/api/v1/employees", headers=headers)
+        assert response.status_code == 200
+        return sorted(e["id"] for e in response.json())
+    
+    assert visible() == [2]
+    assert client.get("/api/v1/employees/2", headers=headers).status_code == 200
+    assert client.get("/api/v1/employees/3", headers=headers).status_code == 403
+    
+    monkeypatch.setattr(org_tree.settings, "MANAGER_SCOPE_DEPTH", 2)
+    assert visible() == [2, 3]
+    monkeypatch.setattr(org_tree.settings, "MANAGER_SCOPE_DEPTH", 0)
+    assert visible() == [2, 3, 4]
+    assert client.get("/api/v1/employees/3", headers=headers).status_code == 200
+    
+    # Moving 5 under 3 is visible without waiting for the TTL
+    employees[4].manager_id = 3
+    db.commit()
+    db.close()
+    assert visible() == [2, 3, 4, 5]
+    
+    # Cycles in manager_id must not hang or grant access to everyone
+    tree = OrgTree([(1, 2), (2, 1), (3, None)])
+    assert tree.is_in_subtree(2, 1) != tree.is_in_subtree(1, 2)
+    assert tree.subtree_ids(3) == []
@@ -0,0 +1,55 @@
+"""Cursor pagination tests"""
+from tests.support import TestingSessionLocal, client
+
+
+def test_cursor_pagination_walks_every_row_once(hr_headers):
+    """Following X-Next-Cursor visits each row exactly once, ties included"""
+    from datetime import date
+    from sqlalchemy import insert
+    from app.models import AttendanceRecord, Employee, PayrollRun
+    
+    db = TestingSessionLocal()
+    employee = Employee(
+        employee_number="EMP001",
+        first_name="Page",
+        last_name="One",
+        email="page@example.com",
+        hire_date=date(2024, 1, 1)
+    )
+    db.add(employee)
+    db.flush()
+    for day in [1, 2, 2, 2, 3, 5, 5]:
+        db.add(AttendanceRecord(employee_id=employee.id, date=date(2025, 4, day)))
+    # One multi-row INSERT gives every run the same server-default created_at,
+    # which exercises the id tie-breaker on the stored timestamp form
+    db.execute(insert(PayrollRun).values([
+        {"period_start": date(2024, month, 1), "period_end": date(2024, month, 28)}
+        for month in range(1, 6)
+    ]))
+    db.commit()
+    db.close()
+    
+    def walk(url):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            response = client.get(url, params=params, headers=hr_headers)
+            assert response.status_code == 200
+            seen.extend(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return seen
+    
+    records = walk("/api/v1/attendance/records/1?start_date=2025-04-01&end_date=2025-04-30")
+    assert [r["date"][-1] for r in records] == ["5", "5", "3", "2", "2", "2", "1"]
+    assert len({r["id"] for r in records}) == 7
+    
+    runs = walk("/api/v1/payroll/runs")
+    assert [r["id"] for r in runs] == [5, 4, 3, 2, 1]
+    
+    # Offset pagination is still available
+    response = client.get("/api/v1/payroll/runs?skip=3&limit=3", headers=hr_headers)
+    assert [r["id"] for r in response.json()] == [2, 1]
+    
+    response = client.get("/api/v1/payroll/runs?cursor=not-a-cursor", headers=hr_headers)
+    assert response.status_code == 400
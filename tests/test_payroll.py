@@ -0,0 +1,301 @@
+"""Payroll run and payslip tests"""
+from tests.support import TestingSessionLocal, client
+
+
+def test_payroll_run_bulk_computes_payslips():
+    """Payslips are computed in chunks with exact Decimal amounts"""
+    from datetime import date
+    from decimal import Decimal
+    from app.models import Employee, EmploymentStatus, PayrollRun, PayrollStatus, Payslip
+    from app.services.payroll import run_payroll
+    
+    db = TestingSessionLocal()
+    salaries = [Decimal("1000.00"), Decimal("2500.55"), None, Decimal("3333.33"), Decimal("900.00")]
+    for i, salary in enumerate(salaries):
+        db.add(Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Pay",
+            last_name=str(i),
+            email=f"pay{i}@example.com",
+            hire_date=date(2024, 1, 1),
+            salary=salary,
+            employment_status=EmploymentStatus.TERMINATED if i == 4 else EmploymentStatus.ACTIVE
+        ))
+    payroll_run = PayrollRun(period_start=date(2025, 1, 1), period_end=date(2025, 1, 31))
+    db.add(payroll_run)
+    db.commit()
+    
+    stats = run_payroll(db, payroll_run.id, chunk_size=2)
+    # Running again skips the completed shards instead of duplicating payslips
+    assert run_payroll(db, payroll_run.id, chunk_size=2).payslips == 0
+    
+    assert stats.payslips == 3
+    payslips = db.query(Payslip).order_by(Payslip.employee_id).all()
+    assert [p.net_salary for p in payslips] == [Decimal("900.00"), Decimal("2250.50"), Decimal("2999.99")]
+    assert payslips[1].tax == Decimal("375.08")
+    db.refresh(payroll_run)
+    assert payroll_run.status == PayrollStatus.COMPLETED
+    assert payroll_run.total_amount == Decimal("6150.49") == stats.total_amount
+    db.close()
+
+
+def test_sharded_payroll_run_retries_only_failed_shards(hr_headers, monkeypatch):
+    """Shards write idempotently and a retry skips the completed ones"""
+    from datetime import date
+    from decimal import Decimal
+    from app.models import Employee, PayrollRun, PayrollStatus, Payslip
+    from app.services import payroll
+    
+    db = TestingSessionLocal()
+    for i in range(7):
+        db.add(Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Shard",
+            last_name=str(i),
+            email=f"shard{i}@example.com",
+            hire_date=date(2024, 1, 1),
+            salary=Decimal("1000.00")
+        ))
+    payroll_run = PayrollRun(period_start=date(2025, 2, 1), period_end=date(2025, 2, 28))
+    db.add(payroll_run)
+    db.commit()
+    run_id = payroll_run.id
+    
+    shards = payroll.plan_shards(db, run_id, shard_size=3)
+    assert [(s.min_employee_id, s.max_employee_id) for s in shards] == [(1, 3), (4, 6), (7, 7)]
+    shard_ids = [shard.id for shard in shards]
+    
+    compute_payslips = payroll.compute_payslips
+    
+    def fail_on_second_shard(payroll_run_id, employees, proration=None):
+        if employees[0].id == 4:
+            raise RuntimeError("worker lost")
+        return compute_payslips(payroll_run_id, employees, proration)
+    
+    monkeypatch.setattr(payroll, "compute_payslips", fail_on_second_shard)
+    for shard_id in shard_ids:
+        try:
+            payroll.process_shard(db, shard_id)
+        except RuntimeError:
+            pass
+    payroll_run = payroll.finalize_run(db, run_id)
+    assert payroll_run.status == PayrollStatus.FAILED
+    # The total already holds the completed shards' share
+    assert payroll_run.total_amount == Decimal("3600.00")
+    db.close()
+    
+    response = client.get(f"/api/v1/payroll/runs/{run_id}", headers=hr_headers)
+    assert response.status_code == 200
+    assert [s["status"] for s in response.json()["shards"]] == ["COMPLETED", "FAILED", "COMPLETED"]
+    assert response.json()["shards"][1]["error"] == "worker lost"
+    
+    monkeypatch.setattr(payroll, "compute_payslips", compute_payslips)
+    db = TestingSessionLocal()
+    assert payroll.plan_shards(db, run_id, shard_size=3)[0].id == shard_ids[0]
+    results = [payroll.process_shard(db, shard_id) for shard_id in shard_ids]
+    assert results[0] is None and results[2] is None
+    assert results[1].payslips == 3
+    
+    payroll_run = payroll.finalize_run(db, run_id)
+    assert payroll_run.status == PayrollStatus.COMPLETED
+    assert payroll_run.total_amount == Decimal("6300.00")
+    assert db.query(Payslip).filter(Payslip.payroll_run_id == run_id).count() == 7
+    db.close()
+
+
+def test_payroll_shard_is_claimed_once(monkeypatch):
+    """A shard delivered twice, or while another attempt holds it, is computed
+    and added to the run total once"""
+    from datetime import date, datetime, timedelta
+    from decimal import Decimal
+    from sqlalchemy import update
+    from app.models import Employee, PayrollRun, PayrollRunShard, Payslip
+    from app.services import payroll
+    
+    db = TestingSessionLocal()
+    for i in range(3):
+        db.add(Employee(employee_number=f"EMP{i:03d}", first_name="Claim", last_name=str(i),
+                        email=f"claim{i}@example.com", hire_date=date(2024, 1, 1), salary=Decimal("1000.00")))
+    payroll_run = PayrollRun(period_start=date(2025, 3, 1), period_end=date(2025, 3, 31))
+    db.add(payroll_run)
+    db.commit()
+    run_id = payroll_run.id
+    shard_id = payroll.plan_shards(db, run_id)[0].id
+    
+    def run_total():
+        db.expire_all()
+        return db.get(PayrollRun, run_id).total_amount
+    
+    # Another worker is still on it: a second delivery does nothing
+    assert payroll._claim_shard(db, shard_id) == 1
+    assert payroll.process_shard(db, shard_id) is None
+    assert run_total() == 0
+    
+    # Once that worker outlives its lease, the shard can be reclaimed
+    db.execute(update(PayrollRunShard).where(PayrollRunShard.id == shard_id).values(
+        started_at=datetime.utcnow() - timedelta(seconds=payroll.settings.PAYROLL_SHARD_LEASE_SECONDS + 1)
+    ))
+    db.commit()
+    assert payroll.process_shard(db, shard_id).payslips == 3
+    assert payroll.process_shard(db, shard_id) is None
+    assert run_total() == Decimal("2700.00")
+    assert db.query(Payslip).filter(Payslip.payroll_run_id == run_id).count() == 3
+    
+    # An attempt that lost the shard while computing leaves no trace
+    db.execute(update(PayrollRunShard).where(PayrollRunShard.id == shard_id).values(
+        status=payroll.PayrollStatus.FAILED
+    ))
+    db.commit()
+    owned_by = payroll._owned_by
+    monkeypatch.setattr(payroll, "_owned_by", lambda shard_id, attempt: owned_by(shard_id, attempt - 1))
+    assert payroll.process_shard(db, shard_id) is None
+    assert run_total() == Decimal("2700.00")
+    db.close()
+
+
+def test_payslip_pdfs_render_in_process_pool(hr_headers, monkeypatch, tmp_path):
+    """Payslip PDFs are rendered by pool workers, stored atomically and
+    their paths recorded in bulk, so the download endpoint serves them"""
+    import hashlib
+    from datetime import date
+    from decimal import Decimal
+    from app.config import get_settings
+    from app.models import Employee, PayrollRun, Payslip
+    from app.services.payroll import render_payslips, run_payroll
+    
+    monkeypatch.setattr(get_settings(), "UPLOAD_DIR", str(tmp_path))
+    db = TestingSessionLocal()
+    for i in range(5):
+        db.add(Employee(
+            employee_number=f"PDF{i:03d}",
+            first_name="Slip",
+            last_name=str(i),
+            email=f"slip{i}@example.com",
+            hire_date=date(2024, 1, 1),
+            salary=Decimal("1000.00") + i
+        ))
+    payroll_run = PayrollRun(period_start=date(2025, 1, 1), period_end=date(2025, 1, 31))
+    db.add(payroll_run)
+    db.commit()
+    run_payroll(db, payroll_run.id)
+    
+    payslip = db.query(Payslip).filter(Payslip.payroll_run_id == payroll_run.id).first()
+    response = client.get(f"/api/v1/payroll/payslips/{payslip.employee_id}/{payslip.id}", headers=hr_headers)
+    assert response.status_code == 404
+    
+    stats = render_payslips(db, payroll_run.id, workers=2, batch_size=2)
+    assert stats.payslips == 5
+    paths = [p.file_path for p in db.query(Payslip).filter(Payslip.payroll_run_id == payroll_run.id)]
+    assert all(path and path.startswith(str(tmp_path)) for path in paths)
+    assert sorted(tmp_path.rglob("*.tmp")) == []
+    # Already rendered payslips are skipped on a re-run
+    assert render_payslips(db, payroll_run.id).payslips == 0
+    
+    response = client.get(f"/api/v1/payroll/payslips/{payslip.employee_id}/{payslip.id}", headers=hr_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    assert response.headers["etag"] == f'"{hashlib.sha256(response.content).hexdigest()}"'
+    assert b"(Slip 0) Tj" in response.content and b"(1,000.00 USD) Tj" in response.content
+    db.close()
+
+
+def test_payslip_archive_streams_zip_with_ranges(hr_headers, tmp_path):
+    """A run's payslips stream as one ZIP; department filter, Range and
+    If-Range requests are honoured"""
+    import io
+    import zipfile
+    from datetime import date
+    from decimal import Decimal
+    from app.models import Department, Employee, PayrollRun, Payslip
+    
+    db = TestingSessionLocal()
+    sales, support = Department(name="Sales"), Department(name="Support")
+    db.add_all([sales, support])
+    payroll_run = PayrollRun(period_start=date(2025, 4, 1), period_end=date(2025, 4, 30))
+    db.add(payroll_run)
+    db.flush()
+    contents = {}
+    for i in range(6):
+        employee = Employee(
+            employee_number=f"ZIP{i:03d}", first_name="Zip", last_name=str(i), email=f"zip{i}@example.com",
+            hire_date=date(2024, 1, 1), department_id=sales.id if i % 2 else support.id
+        )
+        db.add(employee)
+        db.flush()
+        path = tmp_path / f"{i}.pdf"
+        path.write_bytes(b"%PDF-" + bytes([i]) * (1000 * i))
+        payslip = Payslip(
+            employee_id=employee.id, payroll_run_id=payroll_run.id, basic_salary=Decimal("1"),
+            net_salary=Decimal("1"), file_path=str(path) if i != 5 else None
+        )
+        db.add(payslip)
+        db.flush()
+        contents[f"ZIP{i:03d}_payslip_{payslip.id}.pdf"] = path.read_bytes()
+    db.commit()
+    url = f"/api/v1/payroll/runs/{payroll_run.id}/payslips/archive"
+    
+    response = client.get(url, headers=hr_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert int(response.headers["content-length"]) == len(response.content)
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    # The payslip without a rendered file is left out
+    assert sorted(archive.namelist()) == sorted(list(contents)[:5])
+    assert all(archive.read(name) == contents[name] for name in archive.namelist())
+    
+    full, etag = response.content, response.headers["etag"]
+    response = client.get(url, headers={**hr_headers, "Range": "bytes=1234-"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 1234-{len(full) - 1}/{len(full)}"
+    assert full[:1234] + response.content == full
+    response = client.get(url, headers={**hr_headers, "Range": "bytes=-100", "If-Range": etag})
+    assert response.status_code == 206 and response.content == full[-100:]
+    response = client.get(url, headers={**hr_headers, "Range": "bytes=0-99", "If-Range": '"stale"'})
+    assert response.status_code == 200 and response.content == full
+    response = client.get(url, headers={**hr_headers, "Range": f"bytes={len(full)}-"})
+    assert response.status_code == 416
+    
+    response = client.get(f"{url}?department_id={sales.id}", headers=hr_headers)
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert sorted(names) == [name for name in sorted(contents) if int(name[3:6]) in (1, 3)]
+    assert client.get(f"{url}?department_id=999999", headers=hr_headers).status_code == 404
+    db.close()
+
+
+def test_payslip_archive_of_20k_files_streams_in_constant_memory(tmp_path):
+    """Streaming a 20k-member archive keeps peak RSS far below the archive size"""
+    import os
+    import subprocess
+    import sys
+    
+    for i in range(20000):
+        (tmp_path / f"{i}.pdf").write_bytes(b"%PDF-" + i.to_bytes(4, "big") * 1024)
+    script = """
+import hashlib, os, resource, sys
+from app.services.zip_stream import ZipStream, stat_members
+
+directory = sys.argv[1]
+names = [(f"payslip_{i}.pdf", os.path.join(directory, f"{i}.pdf")) for i in range(20000)]
+archive = ZipStream(stat_members(names))
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+whole, sent = hashlib.sha256(), 0
+for chunk in archive.iter_bytes():
+    whole.update(chunk)
+    sent += len(chunk)
+resumed = hashlib.sha256()
+for start, end in ((0, archive.size // 3), (archive.size // 3, None)):
+    for chunk in ZipStream(archive.members).iter_bytes(start, end):
+        resumed.update(chunk)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(archive.size, sent, whole.hexdigest() == resumed.hexdigest(), (peak - baseline) // 1024)
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(tmp_path)], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    size, sent, resumes_identically, growth_mb = result.stdout.split()
+    assert int(sent) == int(size) > 80 * 1000 * 1000
+    assert resumes_identically == "True"
+    assert int(growth_mb) < 16
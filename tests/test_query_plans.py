@@ -0,0 +1,182 @@
+"""Query-plan regression tests for hot router queries
+
+Each case drives an endpoint through the API against seeded data, captures
+the SELECT statements it sends, and runs EXPLAIN QUERY PLAN on them. A
+full scan of a large table (``SCAN <table>``) fails the test, which catches
+dropped indexes and predicates that stop matching them.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from app.auth.jwt import create_access_token
+from app.models import (
+    AttendanceRecord, Employee, LeaveBalance, LeaveRequest, LeaveRequestStatus,
+    LeaveType, PayrollRun, Payslip, RoleType, User
+)
+from app.services.org_tree import org_tree
+from tests.support import async_engine, client, engine
+
+# Tables that grow with headcount or time; small lookup tables may be scanned
+LARGE_TABLES = {
+    "employees", "attendance_records", "leave_balances", "leave_requests", "payslips", "users"
+}
+
+EMPLOYEES = 200
+MANAGER_ID = 1
+EMPLOYEE_ID = 2
+
+
+@pytest.fixture
+def seeded():
+    """Seed enough rows that every hot table has more than a handful of pages"""
+    today = date.today()
+    with engine.begin() as connection:
+        connection.execute(insert(LeaveType), [
+            {"name": "Annual", "code": "AL", "max_days_per_year": 20},
+            {"name": "Sick", "code": "SL", "max_days_per_year": 10},
+        ])
+        connection.execute(insert(Employee), [
+            {"employee_number": f"EMP{i:04d}", "first_name": "Plan", "last_name": str(i),
+             "email": f"plan{i}@example.com", "hire_date": date(2020, 1, 1),
+             "manager_id": None if i == 1 else (i - 1) // 10 + 1}
+            for i in range(1, EMPLOYEES + 1)
+        ])
+        connection.execute(insert(User), [
+            {"email": "manager@example.com", "hashed_password": "x", "role": RoleType.MANAGER,
+             "employee_id": MANAGER_ID, "is_active": True},
+            {"email": "employee@example.com", "hashed_password": "x", "role": RoleType.EMPLOYEE,
+             "employee_id": EMPLOYEE_ID, "is_active": True},
+        ])
+        connection.execute(insert(AttendanceRecord), [
+            {"employee_id": employee_id, "date": today - timedelta(days=day),
+             "clock_in": None, "clock_out": None}
+            for employee_id in range(1, EMPLOYEES + 1) for day in range(1, 31)
+        ])
+        connection.execute(insert(LeaveBalance), [
+            {"employee_id": employee_id, "leave_type_id": leave_type_id, "year": year,
+             "total_days": 20, "used_days": 0, "available_days": 20}
+            for employee_id in range(1, EMPLOYEES + 1)
+            for leave_type_id in (1, 2) for year in (today.year - 1, today.year)
+        ])
+        connection.execute(insert(LeaveRequest), [
+            {"employee_id": employee_id, "leave_type_id": 1, "total_days": 1,
+             "start_date": today - timedelta(days=n * 7), "end_date": today - timedelta(days=n * 7),
+             "status": LeaveRequestStatus.PENDING if n % 3 == 0 else LeaveRequestStatus.APPROVED}
+            for employee_id in range(1, EMPLOYEES + 1) for n in range(10)
+        ])
+        connection.execute(insert(PayrollRun), [
+            {"period_start": date(2024, month, 1), "period_end": date(2024, month, 28)}
+            for month in range(1, 13)
+        ])
+        connection.execute(insert(Payslip), [
+            {"employee_id": employee_id, "payroll_run_id": run_id, "basic_salary": 1000,
+             "net_salary": 900}
+            for employee_id in range(1, EMPLOYEES + 1) for run_id in range(1, 13)
+        ])
+        connection.exec_driver_sql("ANALYZE")
+    # The org-tree index reads all of employees once and is then cached;
+    # measure the steady state where requests are served from the cache
+    with Session(engine) as session:
+        org_tree.get_sync(session)
+    yield
+
+
+def headers_for(user_id: int, role: RoleType) -> dict:
+    token = create_access_token(data={"sub": str(user_id), "role": role.value})
+    return {"Authorization": f"Bearer {token}"}
+
+
+class QueryRecorder:
+    """Collect SELECT statements executed by the API's (async) engine"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(async_engine.sync_engine, "before_cursor_execute", self)
+
+
+def full_scans(statement: str, parameters) -> list:
+    connection = engine.raw_connection()
+    try:
+        rows = connection.cursor().execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    finally:
+        connection.close()
+    details = [row[-1] for row in rows]
+    return [
+        detail for detail in details
+        if detail.startswith("SCAN ") and detail.split()[1] in LARGE_TABLES
+    ]
+
+
+LEAVE_START = date.today() + timedelta(days=35 - date.today().weekday())
+
+MANAGER = (1, RoleType.MANAGER)
+EMPLOYEE = (2, RoleType.EMPLOYEE)
+
+ROUTE_CASES = [
+    ("clock-in", EMPLOYEE, "post", "/api/v1/attendance/clock-in", {"employee_id": EMPLOYEE_ID}),
+    ("attendance records", EMPLOYEE, "get", f"/api/v1/attendance/records/{EMPLOYEE_ID}", None),
+    ("attendance records (manager)", MANAGER, "get", f"/api/v1/attendance/records/{EMPLOYEE_ID}", None),
+    ("leave balances", EMPLOYEE, "get", f"/api/v1/leave/balances/{EMPLOYEE_ID}", None),
+    ("create leave request", EMPLOYEE, "post", "/api/v1/leave/requests", {
+        "leave_type_id": 1,
+        # A Monday-Tuesday a month out, so the range has working days
+        "start_date": LEAVE_START.isoformat(),
+        "end_date": (LEAVE_START + timedelta(days=1)).isoformat(),
+    }),
+    ("my leave requests", EMPLOYEE, "get", "/api/v1/leave/requests", None),
+    ("team leave requests", MANAGER, "get", "/api/v1/leave/requests/team", None),
+    ("payslips", EMPLOYEE, "get", f"/api/v1/payroll/payslips/{EMPLOYEE_ID}", None),
+    ("direct reports", MANAGER, "get", "/api/v1/employees", None),
+]
+
+
+@pytest.mark.parametrize(
+    "role,method,url,body", [case[1:] for case in ROUTE_CASES], ids=[case[0] for case in ROUTE_CASES]
+)
+def test_route_queries_avoid_full_scans(seeded, role, method, url, body):
+    with QueryRecorder() as recorder:
+        kwargs = {"json": body} if body is not None else {}
+        response = getattr(client, method)(url, headers=headers_for(*role), **kwargs)
+    assert response.status_code < 400, response.text
+    assert recorder.statements
+
+    problems = [
+        f"{plan}\n    {statement}"
+        for statement, parameters in recorder.statements
+        for plan in full_scans(statement, parameters)
+    ]
+    assert not problems, "Full table scans:\n" + "\n".join(problems)
+
+
+def test_clock_out_uses_open_record_index(seeded):
+    headers = headers_for(*EMPLOYEE)
+    assert client.post(
+        "/api/v1/attendance/clock-in", json={"employee_id": EMPLOYEE_ID}, headers=headers
+    ).status_code == 200
+
+    with QueryRecorder() as recorder:
+        response = client.post(
+            "/api/v1/attendance/clock-out", json={"employee_id": EMPLOYEE_ID}, headers=headers
+        )
+    assert response.status_code == 200
+    lookup = next(s for s in recorder.statements if "attendance_records.clock_out IS NULL" in s[0])
+
+    connection = engine.raw_connection()
+    try:
+        plan = connection.cursor().execute(f"EXPLAIN QUERY PLAN {lookup[0]}", lookup[1]).fetchall()
+    finally:
+        connection.close()
+    assert "ix_attendance_records_employee_date_clock_out" in plan[0][-1]
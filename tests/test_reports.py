@@ -0,0 +1,122 @@
+"""Report and export tests"""
+from tests.support import TestingSessionLocal, client
+
+
+def test_headcount_report_tracks_employee_changes(hr_headers):
+    """Headcount is served from the snapshot table and kept current on writes"""
+    from datetime import date, timedelta
+    from app.models import Department, Employee, EmploymentStatus, HeadcountSnapshot
+    from app.services.headcount import rebuild_snapshot
+    
+    db = TestingSessionLocal()
+    engineering = Department(name="Engineering")
+    db.add(engineering)
+    db.flush()
+    for i in range(3):
+        db.add(Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Test",
+            last_name=str(i),
+            email=f"emp{i}@example.com",
+            hire_date=date(2024, 1, 1),
+            department_id=engineering.id
+        ))
+    db.commit()
+    db.close()
+    
+    # Before the nightly task has built a snapshot, reads count employees
+    # directly and write nothing
+    report = client.get("/api/v1/reports/headcount", headers=hr_headers).json()
+    assert report["total_employees"] == 3
+    assert report["active_employees"] == 3
+    assert report["by_department"] == {"Engineering": 3}
+    assert report["as_of"] == date.today().isoformat()
+    db = TestingSessionLocal()
+    assert db.query(HeadcountSnapshot).count() == 0
+    
+    rebuild_snapshot(db.connection(), date.today())
+    db.commit()
+    employee = db.query(Employee).filter(Employee.employee_number == "EMP000").first()
+    employee.employment_status = EmploymentStatus.TERMINATED
+    employee.department_id = None
+    db.add(Employee(
+        employee_number="EMP100",
+        first_name="New",
+        last_name="Hire",
+        email="new@example.com",
+        hire_date=date.today()
+    ))
+    db.commit()
+    db.close()
+    
+    report = client.get("/api/v1/reports/headcount", headers=hr_headers).json()
+    assert report["total_employees"] == 4
+    assert report["active_employees"] == 3
+    assert report["inactive_employees"] == 1
+    assert report["by_department"] == {"Engineering": 2}
+    
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    response = client.get(f"/api/v1/reports/headcount?as_of={yesterday}", headers=hr_headers)
+    assert response.status_code == 404
+
+
+def test_export_streams_csv_and_excel(hr_headers):
+    """Exports join their labels in SQL and stream CSV text and XLSX workbooks"""
+    import csv
+    import io
+    from datetime import date
+    import openpyxl
+    from app.models import Department, Employee, LeaveRequest, LeaveType
+    
+    db = TestingSessionLocal()
+    sales = Department(name="Sales")
+    annual = LeaveType(name="Annual", code="AL")
+    db.add_all([sales, annual])
+    db.flush()
+    for i in range(5):
+        employee = Employee(
+            employee_number=f"EMP{i:03d}",
+            first_name="Export",
+            last_name=str(i),
+            email=f"export{i}@example.com",
+            hire_date=date(2024, 1, 1),
+            department_id=sales.id if i % 2 else None
+        )
+        db.add(employee)
+        db.flush()
+        db.add(LeaveRequest(
+            employee_id=employee.id,
+            leave_type_id=annual.id,
+            start_date=date(2025, 3, i + 1),
+            end_date=date(2025, 3, i + 1),
+            total_days=1
+        ))
+    db.commit()
+    db.close()
+    
+    response = client.get("/api/v1/reports/export/employees?format=csv", headers=hr_headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 5
+    assert rows[1] == {
+        "Employee Number": "EMP001", "Name": "Export 1", "Email": "export1@example.com",
+        "Department": "Sales", "Position": "", "Status": "ACTIVE"
+    }
+    
+    response = client.get(
+        "/api/v1/reports/export/leave?period_start=2025-03-02&period_end=2025-03-03",
+        headers=hr_headers
+    )
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["Employee Number"] for row in rows] == ["EMP001", "EMP002"]
+    assert rows[0]["Leave Type"] == "Annual"
+    
+    response = client.get("/api/v1/reports/export/headcount?format=excel", headers=hr_headers)
+    assert response.status_code == 200
+    sheet = openpyxl.load_workbook(io.BytesIO(response.content)).active
+    values = list(sheet.values)
+    assert values[0] == ("Department", "Position", "Status", "Headcount")
+    assert sum(row[3] for row in values[1:]) == 5
+    
+    response = client.get("/api/v1/reports/export/payroll", headers=hr_headers)
+    assert response.status_code == 400